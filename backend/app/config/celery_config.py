@@ -17,6 +17,14 @@ else:
     CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
     CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 
+# 索引队列: 交互式 (单个上传/高优先级) 与批量 (大批量重建) 分开排队
+# IndexTask.priority >= INDEX_INTERACTIVE_MIN_PRIORITY 的任务进入交互式队列
+INDEX_QUEUE_INTERACTIVE = os.getenv("INDEX_QUEUE_INTERACTIVE", "indexing_interactive")
+INDEX_QUEUE_BULK = os.getenv("INDEX_QUEUE_BULK", "indexing")
+INDEX_INTERACTIVE_MIN_PRIORITY = int(os.getenv("INDEX_INTERACTIVE_MIN_PRIORITY", "7"))
+# 未指定优先级的索引请求: 文档数不超过该值按交互式优先级提交, 否则按批量默认优先级
+INDEX_INTERACTIVE_MAX_DOCS = int(os.getenv("INDEX_INTERACTIVE_MAX_DOCS", "20"))
+
 # Celery配置
 CELERY_CONFIG = {
     'broker_url': CELERY_BROKER_URL,
@@ -33,20 +41,36 @@ CELERY_CONFIG = {
     'worker_max_tasks_per_child': 1000,  # Worker重启前最多执行1000个任务
     'task_acks_late': True,  # 任务完成后才确认
     'task_reject_on_worker_lost': True,  # Worker丢失时拒绝任务
-    'task_default_queue': 'indexing',  # 默认队列
+    # Redis 按优先级拆分子队列 (0 最高, 9 最低), worker 按 -Q 中列出的顺序消费队列
+    'broker_transport_options': {
+        'priority_steps': list(range(10)),
+        'sep': ':',
+        'queue_order_strategy': 'priority',
+    },
+    'task_default_priority': 5,
+    'task_default_queue': INDEX_QUEUE_BULK,  # 默认队列
     'task_default_exchange': 'indexing',
     'task_default_routing_key': 'index.default',
     'task_routes': {
+        # 以下为默认路由, 经 index_scheduler 提交的任务按 IndexTask.priority 显式指定队列
         'app.tasks.index_tasks.index_document_task': {
-            'queue': 'indexing',
-            'routing_key': 'index.document',
+            'queue': INDEX_QUEUE_INTERACTIVE,
+            'routing_key': 'index.interactive',
         },
         'app.tasks.index_tasks.batch_index_task': {
-            'queue': 'indexing',
+            'queue': INDEX_QUEUE_BULK,
+            'routing_key': 'index.batch',
+        },
+        'app.tasks.index_tasks.index_sub_batch_task': {
+            'queue': INDEX_QUEUE_BULK,
+            'routing_key': 'index.batch',
+        },
+        'app.tasks.index_tasks.finalize_batch_index_task': {
+            'queue': INDEX_QUEUE_BULK,
             'routing_key': 'index.batch',
         },
         'app.tasks.index_tasks.delete_index_task': {
-            'queue': 'indexing',
+            'queue': INDEX_QUEUE_BULK,
             'routing_key': 'index.delete',
         },
     },
@@ -54,7 +78,11 @@ CELERY_CONFIG = {
 
 # 队列定义
 CELERY_QUEUES = {
-    'indexing': {
+    INDEX_QUEUE_INTERACTIVE: {
+        'exchange': 'indexing',
+        'routing_key': 'index.interactive',
+    },
+    INDEX_QUEUE_BULK: {
         'exchange': 'indexing',
         'routing_key': 'index.#',
     },
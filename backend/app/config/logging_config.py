@@ -4,11 +4,16 @@
 """
 
 import os
+import atexit
+import queue
 import logging
 import logging.handlers
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
+
+# 异步日志监听器, 由 stop_logging() 在应用关闭时统一停止
+_queue_listeners: List[logging.handlers.QueueListener] = []
 
 class LoggingConfig:
     """日志配置类"""
@@ -19,7 +24,8 @@ class LoggingConfig:
                  max_file_size: int = 10 * 1024 * 1024,  # 10MB
                  backup_count: int = 5,
                  enable_console: bool = True,
-                 enable_file: bool = True):
+                 enable_file: bool = True,
+                 enable_async: bool = True):
         """
         初始化日志配置
         
@@ -30,6 +36,7 @@ class LoggingConfig:
             backup_count (int): 保留的备份文件数量
             enable_console (bool): 是否启用控制台输出
             enable_file (bool): 是否启用文件输出
+            enable_async (bool): 是否通过 QueueHandler/QueueListener 异步写日志
         """
         self.log_dir = Path(log_dir)
         self.log_level = getattr(logging, log_level.upper(), logging.INFO)
@@ -37,6 +44,7 @@ class LoggingConfig:
         self.backup_count = backup_count
         self.enable_console = enable_console
         self.enable_file = enable_file
+        self.enable_async = enable_async
         
         # 创建日志目录
         self._create_log_directories()
@@ -49,6 +57,7 @@ class LoggingConfig:
             self.log_dir / "error",    # 错误日志
             self.log_dir / "access",   # 访问日志
             self.log_dir / "debug",    # 调试日志
+            self.log_dir / "profile",  # 慢请求采样
             self.log_dir / "archive"   # 归档日志
         ]
         
@@ -102,12 +111,14 @@ class LoggingConfig:
         # 清除现有的处理器
         logger.handlers.clear()
         
+        handlers = []
+        
         # 添加控制台处理器
         if self.enable_console:
             console_handler = logging.StreamHandler()
             console_handler.setLevel(self.log_level)
             console_handler.setFormatter(self.get_formatter())
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
         
         # 添加文件处理器
         if self.enable_file and log_file:
@@ -120,7 +131,20 @@ class LoggingConfig:
             )
             file_handler.setLevel(self.log_level)
             file_handler.setFormatter(self.get_formatter())
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
+        
+        if self.enable_async and handlers:
+            # 调用方只把记录放入内存队列, 格式化和磁盘 I/O 由监听线程完成, 不阻塞事件循环
+            log_queue = queue.SimpleQueue()
+            logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            listener = logging.handlers.QueueListener(
+                log_queue, *handlers, respect_handler_level=True
+            )
+            listener.start()
+            _queue_listeners.append(listener)
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
         
         return logger
     
@@ -134,6 +158,9 @@ class LoggingConfig:
         for handler in root_logger.handlers[:]:
             root_logger.removeHandler(handler)
         
+        # 重复初始化时先停止旧的监听线程
+        stop_logging()
+        
         # 应用日志器
         app_logger = self.setup_logger(
             "app",
@@ -239,7 +266,8 @@ def get_logging_config() -> LoggingConfig:
         max_file_size=int(os.getenv("LOG_MAX_SIZE", "10485760")),  # 10MB
         backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
         enable_console=os.getenv("LOG_ENABLE_CONSOLE", "true").lower() == "true",
-        enable_file=os.getenv("LOG_ENABLE_FILE", "true").lower() == "true"
+        enable_file=os.getenv("LOG_ENABLE_FILE", "true").lower() == "true",
+        enable_async=os.getenv("LOG_ENABLE_ASYNC", "true").lower() == "true"
     )
 
 # 便捷函数
@@ -248,6 +276,17 @@ def setup_logging():
     config = get_logging_config()
     return config.setup_application_logging()
 
+def stop_logging():
+    """停止异步日志监听线程, 刷出队列中剩余的日志"""
+    while _queue_listeners:
+        listener = _queue_listeners.pop()
+        try:
+            listener.stop()
+        except Exception:
+            pass
+
+atexit.register(stop_logging)
+
 def get_logger(name: str) -> logging.Logger:
     """获取指定名称的日志器"""
     return logging.getLogger(name)
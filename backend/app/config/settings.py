@@ -36,12 +36,31 @@ LOG_MAX_SIZE = int(os.getenv("LOG_MAX_SIZE", "10485760"))  # 10MB
 LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 LOG_ENABLE_CONSOLE = os.getenv("LOG_ENABLE_CONSOLE", "true").lower() == "true"
 LOG_ENABLE_FILE = os.getenv("LOG_ENABLE_FILE", "true").lower() == "true"
+LOG_SLOW_REQUEST_THRESHOLD = float(os.getenv("LOG_SLOW_REQUEST_THRESHOLD", "2.0"))  # 秒
+
+# 慢请求采样分析配置
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.0"))  # 0.0-1.0, 0 表示仅在 X-Debug-Profile 头时采样
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # 采样间隔(秒)
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "64"))
+PROFILE_ALL_THREADS = os.getenv("PROFILE_ALL_THREADS", "false").lower() == "true"
 
 # 检索配置
 USE_CHUNK_RETRIEVAL = os.getenv("USE_CHUNK_RETRIEVAL", "false").lower() == "true"
 EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
 HUGGINGFACE_MODEL = os.getenv("HUGGINGFACE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "auto")
+# 文档/文档块向量列的存储类型: vector (float32), halfvec (float16, 表与索引约减半, 需要 pgvector >= 0.7)
+# 已有数据先用 app/migrations/convert_embedding_storage.py 转换列类型, 再切换该配置
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))  # 向量列维度, 须与当前嵌入模型一致
+
+# 分块配置 (所有入库路径共用)
+# 1500 字符 ≈ 750-1125 tokens (中文); 按 token 计时取嵌入模型的分词器,
+# 如 all-MiniLM-L6-v2 最大 256 tokens, 可设 CHUNK_SIZE_UNIT=token CHUNK_MAX_SIZE=256 CHUNK_MIN_SIZE=96 CHUNK_OVERLAP=48
+CHUNK_SIZE_UNIT = os.getenv("CHUNK_SIZE_UNIT", "char")  # char, token
+CHUNK_MAX_SIZE = int(os.getenv("CHUNK_MAX_SIZE", "1500"))
+CHUNK_MIN_SIZE = int(os.getenv("CHUNK_MIN_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "300"))
 
 # Rerank 配置
 ENABLE_RERANK = os.getenv("ENABLE_RERANK", "true").lower() == "true"
@@ -59,6 +78,104 @@ REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 # Celery配置
 CELERY_ENABLED = os.getenv("CELERY_ENABLED", "true").lower() == "true"
 
+# 批量索引扇出配置 (Celery chord, 按内容长度切分子批次)
+INDEX_SUBBATCH_MAX_CHARS = int(os.getenv("INDEX_SUBBATCH_MAX_CHARS", "2000000"))  # 每个子批次的内容字符数上限
+INDEX_SUBBATCH_MAX_DOCS = int(os.getenv("INDEX_SUBBATCH_MAX_DOCS", "50"))  # 每个子批次的文档数上限
+INDEX_EMBED_BATCH_SIZE = int(os.getenv("INDEX_EMBED_BATCH_SIZE", "256"))  # 子批次内跨文档合并后每次调用模型的分块数
+
+# 变更检测配置
+CHANGE_HASH_READ_SIZE = int(os.getenv("CHANGE_HASH_READ_SIZE", str(1024 * 1024)))  # 文件哈希每次读取的字节数
+CHANGE_HASH_BATCH = int(os.getenv("CHANGE_HASH_BATCH", "1000"))  # SQL 中补算内容哈希的每批文档数
+
+# 目录监听配置 (持续增量索引)
+# WATCH_DIRECTORIES 格式: "命名空间:目录,命名空间:目录", 如 "tech:/data/docs/tech,default:/data/docs/misc"
+WATCH_DIRECTORIES = os.getenv("WATCH_DIRECTORIES", "")
+WATCH_BACKEND = os.getenv("WATCH_BACKEND", "auto")  # auto, inotify, polling
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "2"))  # 事件静默多久后提交一批
+WATCH_MAX_DELAY_SECONDS = float(os.getenv("WATCH_MAX_DELAY_SECONDS", "10"))  # 持续有事件时, 一批最多等待多久
+WATCH_MAX_BATCH = int(os.getenv("WATCH_MAX_BATCH", "500"))  # 一批最多文件数
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "5"))  # 轮询模式的扫描间隔(秒)
+WATCH_PRIORITY = int(os.getenv("WATCH_PRIORITY", "6"))  # 监听触发的索引任务优先级 (1-10)
+WATCH_OWNER_USER_ID = int(os.getenv("WATCH_OWNER_USER_ID", "0"))  # 监听入库文档的所有者, 0 表示不关联用户
+
+# 索引队列公平调度: 命名空间排队文档每达到 INDEX_FAIR_SHARE_DOCS 的 2 的幂倍, 新任务降一级优先级
+INDEX_FAIR_SHARE_DOCS = int(os.getenv("INDEX_FAIR_SHARE_DOCS", "500"))
+INDEX_FAIR_SHARE_MAX_PENALTY = int(os.getenv("INDEX_FAIR_SHARE_MAX_PENALTY", "4"))
+
+# 进程内向量索引配置
+# 后端: sql (每次从数据库加载全部向量精确计算, 原行为), exact (常驻内存的 float32 精确检索),
+#       int8 (int8 标量量化粗排 + float32 精排), binary (1 bit 符号码 Hamming 粗排 + float32 精排),
+#       hnsw (HNSW 图近似检索, 适用于数据库没有 pgvector 向量索引的部署), ivf (k-means 倒排分区),
+#       shard (向量按块ID哈希分到本机的分片进程, 见 scripts/run_vector_shards.py)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "sql")
+# 按命名空间覆盖后端, 格式: "命名空间:后端,命名空间:后端"
+VECTOR_INDEX_NAMESPACE_BACKENDS = os.getenv("VECTOR_INDEX_NAMESPACE_BACKENDS", "")
+VECTOR_INDEX_SYNC_INTERVAL = float(os.getenv("VECTOR_INDEX_SYNC_INTERVAL", "5"))  # 与数据库核对新增/删除块的最小间隔(秒)
+VECTOR_INDEX_LOAD_BATCH = int(os.getenv("VECTOR_INDEX_LOAD_BATCH", "10000"))  # 从数据库加载向量的每批行数
+VECTOR_INDEX_BLOCK_ROWS = int(os.getenv("VECTOR_INDEX_BLOCK_ROWS", "8192"))  # 量化向量分块打分的每块行数
+VECTOR_INT8_RESCORE = int(os.getenv("VECTOR_INT8_RESCORE", "200"))  # int8 粗排后用 float32 精排的候选数
+VECTOR_BINARY_RESCORE = int(os.getenv("VECTOR_BINARY_RESCORE", "1000"))  # 二值码粗排后用 float32 精排的候选数
+VECTOR_BINARY_BLOCK_ROWS = int(os.getenv("VECTOR_BINARY_BLOCK_ROWS", "65536"))  # 二值码分块计算 Hamming 距离的每块行数
+VECTOR_SEARCH_THREADS = int(os.getenv("VECTOR_SEARCH_THREADS", "0"))  # 精确检索分块并行的线程数 (0 表示 CPU 核数)
+VECTOR_SEARCH_BLOCK_ROWS = int(os.getenv("VECTOR_SEARCH_BLOCK_ROWS", "32768"))  # 精确检索每个并行块的行数 (不超过一块时在当前线程计算)
+VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", "16"))  # HNSW 每个节点的邻居数 (第 0 层为 2 倍)
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "100"))  # HNSW 插入时的候选集大小
+VECTOR_HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "64"))  # HNSW 检索的默认候选集大小 (可按请求覆盖)
+VECTOR_HNSW_REBUILD_DELETED_RATIO = float(os.getenv("VECTOR_HNSW_REBUILD_DELETED_RATIO", "0.3"))  # 标记删除超过该比例时后台重建图
+VECTOR_IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "0"))  # IVF 列表数, 0 表示按向量数自动选择 (约 4 * sqrt(n))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "16"))  # IVF 检索默认扫描的列表数 (可按请求覆盖)
+VECTOR_IVF_KMEANS_ITERS = int(os.getenv("VECTOR_IVF_KMEANS_ITERS", "10"))  # IVF k-means 迭代次数
+VECTOR_IVF_TRAIN_SAMPLE = int(os.getenv("VECTOR_IVF_TRAIN_SAMPLE", "100000"))  # IVF 训练采样的向量数上限
+VECTOR_IVF_MERGE_ROWS = int(os.getenv("VECTOR_IVF_MERGE_ROWS", "20000"))  # IVF 追加区并入连续存储的行数阈值
+VECTOR_IVF_RETRAIN_GROWTH = float(os.getenv("VECTOR_IVF_RETRAIN_GROWTH", "2.0"))  # 向量数增长到训练时的该倍数后后台重新训练
+# 向量分片进程 (shard 后端): 各 uvicorn worker 共用同一组分片, 不再各自持有一份向量
+VECTOR_SHARD_COUNT = int(os.getenv("VECTOR_SHARD_COUNT", "4"))  # 分片进程数 (改变后需清空分片重新加载)
+VECTOR_SHARD_SOCKET_DIR = os.getenv("VECTOR_SHARD_SOCKET_DIR", str(current_dir / "run" / "vector-shards"))  # 分片 Unix socket 所在目录 (须为当前用户私有, 权限 0700)
+VECTOR_SHARD_BACKEND = os.getenv("VECTOR_SHARD_BACKEND", "exact")  # 分片进程内使用的索引后端
+VECTOR_SHARD_AUTHKEY = os.getenv("VECTOR_SHARD_AUTHKEY", "")  # 分片连接的认证密钥, 无默认值, 部署时生成随机值 (未配置时拒绝启动分片)
+VECTOR_SHARD_TIMEOUT = float(os.getenv("VECTOR_SHARD_TIMEOUT", "10"))  # 等待分片响应的超时(秒)
+# 构建代价高的索引 (hnsw) 持久化到该目录, 进程重启后加载并只同步增量; 留空表示不持久化
+VECTOR_INDEX_PERSIST_DIR = os.getenv("VECTOR_INDEX_PERSIST_DIR", "vector_index")
+VECTOR_INDEX_SAVE_INTERVAL = float(os.getenv("VECTOR_INDEX_SAVE_INTERVAL", "300"))  # 索引有变化时两次落盘的最小间隔(秒)
+
+# 按命名空间的 pgvector 部分 HNSW 索引 (WHERE namespace = '<ns>'):
+# 创建领域时后台 CREATE INDEX CONCURRENTLY, 删除领域时删除; sql 后端检索单个领域时按该索引做 ANN 检索
+NAMESPACE_VECTOR_INDEX_ENABLED = os.getenv("NAMESPACE_VECTOR_INDEX_ENABLED", "true").lower() == "true"
+NAMESPACE_VECTOR_INDEX_M = int(os.getenv("NAMESPACE_VECTOR_INDEX_M", "16"))  # HNSW 每个节点的邻居数
+NAMESPACE_VECTOR_INDEX_EF_CONSTRUCTION = int(os.getenv("NAMESPACE_VECTOR_INDEX_EF_CONSTRUCTION", "64"))  # 建索引时的候选集大小
+NAMESPACE_VECTOR_INDEX_EF_SEARCH = int(os.getenv("NAMESPACE_VECTOR_INDEX_EF_SEARCH", "64"))  # 检索时的 hnsw.ef_search (可按请求覆盖)
+NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM = os.getenv("NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM", "")  # 建索引会话的 maintenance_work_mem, 如 1GB; 留空用服务器默认值
+NAMESPACE_VECTOR_INDEX_CACHE_TTL = float(os.getenv("NAMESPACE_VECTOR_INDEX_CACHE_TTL", "30"))  # 可用部分索引列表的缓存时间(秒)
+
+# 领域统计配置
+DOMAIN_STATS_TTL = float(os.getenv("DOMAIN_STATS_TTL", "30"))  # 秒
+DOMAIN_STATS_COUNT_MODE = os.getenv("DOMAIN_STATS_COUNT_MODE", "auto")  # exact, estimate, auto
+DOMAIN_STATS_ESTIMATE_THRESHOLD = int(os.getenv("DOMAIN_STATS_ESTIMATE_THRESHOLD", "2000000"))
+DOMAIN_STATS_SAMPLE_PERCENT = float(os.getenv("DOMAIN_STATS_SAMPLE_PERCENT", "1.0"))
+
+# 嵌入向量存储配置 (按模型 + 规范化文本哈希去重)
+EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "true").lower() == "true"
+EMBEDDING_STORE_LOOKUP_BATCH = int(os.getenv("EMBEDDING_STORE_LOOKUP_BATCH", "500"))
+
+# 嵌入模型在线迁移 (影子向量列 + 双写 + 回填 + 按命名空间切换读取, 见 scripts/reembed_chunks.py)
+EMBEDDING_MIGRATION_BATCH_SIZE = int(os.getenv("EMBEDDING_MIGRATION_BATCH_SIZE", "256"))  # 每批回填的分块数
+EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND = float(os.getenv("EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND", "200"))  # 回填限速, 0 表示不限
+EMBEDDING_MIGRATION_STATE_TTL = float(os.getenv("EMBEDDING_MIGRATION_STATE_TTL", "10"))  # 各进程缓存迁移状态的时间(秒)
+EMBEDDING_MIGRATION_SHADOW_COMPARE_RATE = float(os.getenv("EMBEDDING_MIGRATION_SHADOW_COMPARE_RATE", "0"))  # 线上查询影子对比的抽样比例 (0-1)
+
+# 流式入库配置
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "32"))  # 每批向量化的分块数
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))  # 待向量化批次队列上限
+INGEST_SPOOL_MAX_MEMORY = int(os.getenv("INGEST_SPOOL_MAX_MEMORY", str(1024 * 1024)))  # 全文溢写到磁盘前的内存上限(字节)
+
+# 文本提取进程池配置
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0"))  # 0 表示使用 CPU 核数
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "120"))  # 单文件提取超时(秒)
+EXTRACT_PDF_PAGES_PER_TASK = int(os.getenv("EXTRACT_PDF_PAGES_PER_TASK", "8"))  # 每个提取任务的页数
+EXTRACT_PDF_FANOUT_MIN_PAGES = int(os.getenv("EXTRACT_PDF_FANOUT_MIN_PAGES", "16"))  # 达到该页数才按页拆分
+EXTRACT_START_METHOD = os.getenv("EXTRACT_START_METHOD", "spawn")  # spawn, forkserver, fork
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "20"))  # 多文件上传单次最多文件数
+
 # 验证必要的环境变量
 def validate_config():
     """验证配置是否完整"""
@@ -6,6 +6,7 @@
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 from app.config.settings import DB_URL
+from app.utils.vector_codec import typecast_vector
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,10 @@ logger = logging.getLogger(__name__)
 _engine = None
 _session_factory = None
 
+def _typecast_raw(value, cursor):
+    return value
+
+
 # 全局注册 pgvector 类型（在模块加载时立即执行）
 def _register_vector_types_globally():
     """在全局范围内注册 pgvector 自定义类型"""
@@ -43,15 +48,13 @@ def _register_vector_types_globally():
         custom_types = cursor.fetchall()
 
         # 为每个自定义类型注册全局处理器
+        # vector / halfvec 直接解码为 float32 ndarray (NumPy C 解析器, 读取路径不再逐行 json / eval);
+        # sparsevec 原样返回文本
         for oid, typname in custom_types:
-            # 创建类型转换器
-            def typecast_vector(value, cursor):
-                if value is None:
-                    return None
-                return value
+            typecaster = typecast_vector if typname in ('vector', 'halfvec') else _typecast_raw
 
             # 注册为全局类型（不需要每次连接都注册）
-            vector_type = new_type((oid,), typname.upper(), typecast_vector)
+            vector_type = new_type((oid,), typname.upper(), typecaster)
             register_type(vector_type)  # 不传 conn 参数表示全局注册
             logger.info(f"Globally registered PostgreSQL type: {typname} (OID: {oid})")
 
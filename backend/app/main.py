@@ -5,8 +5,8 @@ from datetime import datetime
 from prometheus_client import make_asgi_app
 from app.routers import documents, query, logs, settings, llm_models, auth, chat, users, roles, dashboard, knowledge_domains, classification, query_v2, performance, websocket, document_index
 from app.config.logging_config import setup_logging, get_app_logger
-from app.middleware.logging_middleware import LoggingMiddleware, ErrorLoggingMiddleware, PerformanceLoggingMiddleware
-from app.config.settings import validate_config
+from app.middleware.logging_middleware import RequestLoggingMiddleware
+from app.config.settings import validate_config, LOG_SLOW_REQUEST_THRESHOLD
 
 from traceloop.sdk import Traceloop
 
@@ -61,6 +61,8 @@ async def startup_event():
 
         # 创建索引记录表
         from app.models.index_record import Base as IndexRecordBase
+        import app.models.embedding_store  # noqa: F401 注册 embedding_store 表
+        import app.models.embedding_migration  # noqa: F401 注册 embedding_migrations 表
         IndexRecordBase.metadata.create_all(bind=engine)
         logger.info("Index record tables initialized successfully")
 
@@ -93,10 +95,21 @@ async def startup_event():
         import traceback
         logger.error(traceback.format_exc())
 
-# 添加日志中间件
-app.add_middleware(LoggingMiddleware)
-app.add_middleware(ErrorLoggingMiddleware)
-app.add_middleware(PerformanceLoggingMiddleware, slow_request_threshold=2.0)
+# 关闭时停止提取进程池、保存进程内向量索引并刷出异步日志队列
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时执行"""
+    from app.services.extraction_pool import shutdown_extraction_pool
+    shutdown_extraction_pool()
+
+    from app.services.vector_index import save_vector_indexes
+    save_vector_indexes()
+
+    from app.config.logging_config import stop_logging
+    stop_logging()
+
+# 添加日志中间件 (纯 ASGI, 合并请求日志/错误日志/慢请求检测)
+app.add_middleware(RequestLoggingMiddleware, slow_request_threshold=LOG_SLOW_REQUEST_THRESHOLD)
 
 # 配置CORS中间件，允许前端跨域访问
 app.add_middleware(
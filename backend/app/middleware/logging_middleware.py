@@ -1,175 +1,174 @@
 """
 日志中间件
 记录HTTP请求和响应信息
+
+纯 ASGI 实现: 不经过 BaseHTTPMiddleware 的任务与内存流包装,
+流式响应 (SSE) 原样透传, 每个请求只产生一条访问日志
 """
 
+import os
 import time
-import json
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.config.logging_config import get_access_logger, get_error_logger
+import asyncio
 import logging
+from typing import Optional
+
+from app.config.logging_config import get_access_logger, get_error_logger
+from app.monitoring.tracing import start_trace, end_trace
+from app.monitoring.profiler import should_profile, start_profiler, save_profile
 
 logger = get_access_logger()
 error_logger = get_error_logger()
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """HTTP请求日志中间件"""
-    
-    async def dispatch(self, request: Request, call_next):
-        """处理HTTP请求并记录日志"""
-        start_time = time.time()
-        
-        # 获取请求信息
-        client_ip = self._get_client_ip(request)
-        method = request.method
-        url = str(request.url)
-        path = request.url.path
-        query_params = str(request.query_params)
-        user_agent = request.headers.get("user-agent", "")
-        
-        # 记录请求开始
-        request_id = self._generate_request_id()
-        logger.info(
-            f"[{request_id}] 请求开始 - {method} {path} "
-            f"来自 {client_ip} - User-Agent: {user_agent}"
-        )
-        
-        if query_params:
-            logger.debug(f"[{request_id}] 查询参数: {query_params}")
-        
-        # 处理请求
-        try:
-            response = await call_next(request)
-            
-            # 计算处理时间
-            process_time = time.time() - start_time
-            
-            # 记录响应信息
-            status_code = response.status_code
-            response_size = self._get_response_size(response)
-            
-            logger.info(
-                f"[{request_id}] 请求完成 - {method} {path} "
-                f"状态码: {status_code} 处理时间: {process_time:.3f}s "
-                f"响应大小: {response_size} bytes"
-            )
-            
-            # 添加响应头
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-Process-Time"] = str(process_time)
-            
-            return response
-            
-        except Exception as e:
-            # 记录错误
-            process_time = time.time() - start_time
-            error_logger.error(
-                f"[{request_id}] 请求失败 - {method} {path} "
-                f"错误: {str(e)} 处理时间: {process_time:.3f}s",
-                exc_info=True
-            )
-            
-            # 重新抛出异常
-            raise
-    
-    def _get_client_ip(self, request: Request) -> str:
-        """获取客户端IP地址"""
-        # 检查代理头
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip
-        
-        # 直接连接
-        if hasattr(request.client, "host"):
-            return request.client.host
-        
-        return "unknown"
-    
-    def _generate_request_id(self) -> str:
-        """生成请求ID"""
-        import uuid
-        return str(uuid.uuid4())[:8]
-    
-    def _get_response_size(self, response: Response) -> int:
-        """获取响应大小"""
-        try:
-            if hasattr(response, "body"):
-                return len(response.body)
-            return 0
-        except:
-            return 0
 
-class ErrorLoggingMiddleware(BaseHTTPMiddleware):
-    """错误日志中间件"""
+class RequestLoggingMiddleware:
+    """
+    HTTP请求日志与性能中间件
+
+    合并了原先的 LoggingMiddleware / ErrorLoggingMiddleware / PerformanceLoggingMiddleware:
+    - 生成或透传请求ID, 写入 scope["state"]["request_id"] 并通过 X-Request-ID 响应头返回
+    - 记录状态码、处理时间、响应大小
+    - 超过阈值的请求记录慢请求警告
+    - 未处理异常记录详细错误信息后重新抛出
+    - 请求带 X-Debug-Trace 头时记录完整 span 树, 通过 Server-Timing 头返回阶段耗时
+    - 按采样率或 X-Debug-Profile 头开启栈采样, 慢请求的折叠栈写入日志目录
+    """
+
+    def __init__(self, app, slow_request_threshold: float = 1.0):
+        self.app = app
+        self.slow_request_threshold = slow_request_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+
+        # 一次遍历提取需要的请求头, 避免构造 Request/Headers 对象
+        request_id = None
+        user_agent = ""
+        forwarded_for = None
+        real_ip = None
+        debug_trace = False
+        debug_profile = False
+        for key, value in scope.get("headers", ()):
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+            elif key == b"user-agent":
+                user_agent = value.decode("latin-1")
+            elif key == b"x-forwarded-for":
+                forwarded_for = value
+            elif key == b"x-real-ip":
+                real_ip = value
+            elif key == b"x-debug-trace":
+                debug_trace = value not in (b"", b"0", b"false")
+            elif key == b"x-debug-profile":
+                debug_profile = value not in (b"", b"0", b"false")
+
+        if not request_id:
+            request_id = os.urandom(4).hex()
+
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+
+        status_code = 500
+        response_size = 0
+        request_id_header = request_id.encode("latin-1")
+
+        trace = trace_tokens = None
+        if debug_trace:
+            trace, trace_tokens = start_trace(request_id, scope.get("method", ""), scope.get("path", ""))
+
+        sampler = start_profiler() if should_profile(debug_profile) else None
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-request-id", request_id_header))
+                headers.append((
+                    b"x-process-time",
+                    f"{time.perf_counter() - start_time:.6f}".encode("latin-1")
+                ))
+                if trace is not None:
+                    # 流式响应在此时尚未结束, 完整 span 树通过 trace 接口查询
+                    headers.append((b"x-trace-id", request_id_header))
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message["headers"] = headers
+            elif message_type == "http.response.body":
+                response_size += len(message.get("body", b""))
+
+            await send(message)
 
-    async def dispatch(self, request: Request, call_next):
-        """处理请求并记录错误"""
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            # 记录详细错误信息
+            process_time = time.perf_counter() - start_time
             error_info = {
-                "method": request.method,
-                "url": str(request.url),
-                "path": request.url.path,
-                "query_params": str(request.query_params),
-                "headers": dict(request.headers),
-                "client_ip": self._get_client_ip(request),
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "client_ip": self._get_client_ip(scope, forwarded_for, real_ip),
+                "user_agent": user_agent,
                 "error": str(e),
                 "error_type": type(e).__name__
             }
-
             error_logger.error(
-                f"HTTP错误 - {request.method} {request.url.path}",
+                f"[{request_id}] 请求失败 - {scope.get('method')} {scope.get('path')} "
+                f"错误: {str(e)} 处理时间: {process_time:.3f}s",
                 extra={"error_info": error_info},
                 exc_info=True
             )
-
             raise
+        finally:
+            if trace is not None:
+                end_trace(trace, trace_tokens, status_code)
+            if sampler is not None:
+                sampler.stop()
+
+        process_time = time.perf_counter() - start_time
+        method = scope.get("method")
+        path = scope.get("path")
+
+        if sampler is not None and (debug_profile or process_time > self.slow_request_threshold):
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, save_profile, sampler, request_id, method, path, process_time
+                )
+            except Exception as e:
+                logger.warning(f"[{request_id}] 保存采样结果失败: {e}")
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                f"[{request_id}] {method} {path} "
+                f"来自 {self._get_client_ip(scope, forwarded_for, real_ip)} "
+                f"状态码: {status_code} 处理时间: {process_time:.3f}s "
+                f"响应大小: {response_size} bytes - User-Agent: {user_agent}"
+            )
 
-    def _get_client_ip(self, request: Request) -> str:
+        # 记录慢请求
+        if process_time > self.slow_request_threshold:
+            logger.warning(
+                f"[{request_id}] 慢请求检测 - {method} {path} "
+                f"处理时间: {process_time:.3f}s (阈值: {self.slow_request_threshold}s)"
+            )
+
+    @staticmethod
+    def _get_client_ip(scope, forwarded_for: Optional[bytes], real_ip: Optional[bytes]) -> str:
         """获取客户端IP地址"""
         # 检查代理头
-        forwarded_for = request.headers.get("x-forwarded-for")
         if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
+            return forwarded_for.decode("latin-1").split(",")[0].strip()
 
-        real_ip = request.headers.get("x-real-ip")
         if real_ip:
-            return real_ip
+            return real_ip.decode("latin-1")
 
         # 直接连接
-        if hasattr(request.client, "host"):
-            return request.client.host
+        client = scope.get("client")
+        if client:
+            return client[0]
 
         return "unknown"
-
-class PerformanceLoggingMiddleware(BaseHTTPMiddleware):
-    """性能日志中间件"""
-    
-    def __init__(self, app, slow_request_threshold: float = 1.0):
-        super().__init__(app)
-        self.slow_request_threshold = slow_request_threshold
-    
-    async def dispatch(self, request: Request, call_next):
-        """记录性能信息"""
-        start_time = time.time()
-        
-        response = await call_next(request)
-        
-        process_time = time.time() - start_time
-        
-        # 记录慢请求
-        if process_time > self.slow_request_threshold:
-            logger.warning(
-                f"慢请求检测 - {request.method} {request.url.path} "
-                f"处理时间: {process_time:.3f}s (阈值: {self.slow_request_threshold}s)"
-            )
-        
-        return response
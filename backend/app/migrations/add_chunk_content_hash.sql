@@ -0,0 +1,16 @@
+-- ========================================
+-- 分块级增量索引 - 分块内容哈希
+-- ========================================
+-- 用途: 文档更新时按分块哈希比对, 只对新增分块生成向量
+-- 已有分块的哈希在首次增量索引时由 IncrementalIndexer 回填
+-- ========================================
+
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+-- 按文档比对分块哈希
+CREATE INDEX IF NOT EXISTS idx_chunks_document_hash
+ON document_chunks(document_id, content_hash);
+
+-- 按哈希查找可复用的向量
+CREATE INDEX IF NOT EXISTS ix_document_chunks_content_hash
+ON document_chunks(content_hash);
@@ -0,0 +1,21 @@
+-- ========================================
+-- 分层变更检测 - 文档变更追踪字段
+-- ========================================
+-- 用途: 变更检测在 SQL 中按 (大小, 修改时间) 与内容哈希比对,
+--       不再把全文读到 Python 中逐个计算 MD5
+-- 与 add_incremental_update_tables.sql 中的字段一致, 可重复执行
+-- ========================================
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_size BIGINT DEFAULT 0;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_modified_at TIMESTAMP;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS last_indexed_at TIMESTAMP;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS index_status VARCHAR(20) DEFAULT 'pending';
+
+-- 回填内容哈希 (与 ChangeDetector.compute_content_hash 一致: 空内容为空串)
+UPDATE documents
+SET content_hash = CASE WHEN content IS NULL OR content = '' THEN '' ELSE md5(content) END
+WHERE content_hash IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_doc_content_hash ON documents(content_hash);
+CREATE INDEX IF NOT EXISTS idx_doc_namespace_id ON documents(namespace, id);
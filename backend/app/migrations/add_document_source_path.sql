@@ -0,0 +1,11 @@
+-- ========================================
+-- 目录监听 - 文档源文件路径
+-- ========================================
+-- 用途: 目录监听服务按源文件路径定位文档, 文件修改/删除时更新对应文档
+-- 上传的文档没有源文件, 该列为空
+-- ========================================
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS source_path VARCHAR(1024);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_doc_source_path
+ON documents(source_path) WHERE source_path IS NOT NULL;
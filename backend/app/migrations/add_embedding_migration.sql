@@ -0,0 +1,28 @@
+-- ========================================
+-- 嵌入模型在线迁移记录
+-- ========================================
+-- 用途: 切换嵌入模型时记录影子向量列的回填断点、进度和已切换读取的命名空间,
+-- 由 scripts/reembed_chunks.py 驱动; 服务启动时也会自动建表
+-- ========================================
+
+CREATE TABLE IF NOT EXISTS embedding_migrations (
+    id SERIAL PRIMARY KEY,
+    backend VARCHAR(50) NOT NULL,
+    model_name VARCHAR(200) NOT NULL,
+    dimension INTEGER NOT NULL,
+    storage VARCHAR(20) NOT NULL DEFAULT 'vector',
+    column_name VARCHAR(63) NOT NULL,
+    state VARCHAR(20) NOT NULL DEFAULT 'backfilling',
+    checkpoint_id BIGINT DEFAULT 0,
+    sweeps INTEGER DEFAULT 0,
+    rows_total BIGINT DEFAULT 0,
+    rows_done BIGINT DEFAULT 0,
+    read_namespaces JSONB DEFAULT '[]'::jsonb,
+    error_message TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_embedding_migrations_state
+ON embedding_migrations(state);
@@ -0,0 +1,21 @@
+-- ========================================
+-- 内容寻址嵌入向量存储
+-- ========================================
+-- 用途: 按 (模型标识, 规范化文本哈希) 缓存嵌入向量,
+-- 上传和增量索引在调用模型前先查询, 相同文本跨文档只生成一次向量
+-- ========================================
+
+CREATE TABLE IF NOT EXISTS embedding_store (
+    model_name VARCHAR(200) NOT NULL,
+    text_hash VARCHAR(64) NOT NULL,
+    embedding vector NOT NULL,
+    text_length INTEGER DEFAULT 0,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    last_used_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (model_name, text_hash)
+);
+
+-- 按最近使用时间清理冷数据
+CREATE INDEX IF NOT EXISTS ix_embedding_store_last_used_at
+ON embedding_store(last_used_at);
@@ -0,0 +1,152 @@
+"""
+数据库迁移脚本: 转换向量列的存储类型 (vector <-> halfvec)
+
+halfvec 以 float16 存储, 384 维向量每行由 1544 字节降为 776 字节, 表、ANN 索引与
+每次扫描的 I/O 约减半; 检索时统一按 float32 计算, 召回率与 float32 基本一致。
+
+执行步骤 (每张表):
+1. 添加临时列 embedding_converted (目标类型)
+2. 按 id 区间分批 UPDATE 写入临时列, 每批单独提交, 不长时间锁表;
+   中断后重新执行会跳过已转换的行
+3. 短事务内锁表: 补齐分批期间新写入的行, 删除旧列, 临时列改名为 embedding
+4. 用目标类型的操作符类重建原有的向量索引 (CREATE INDEX CONCURRENTLY)
+5. ANALYZE; 旧列的数据在行被重写前仍占用空间, 可加 --vacuum-full 立即回收 (会锁表)
+
+完成后设置 EMBEDDING_STORAGE=halfvec (或 vector) 并重启服务。
+
+用法:
+    python app/migrations/convert_embedding_storage.py --to halfvec --batch-size 5000
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# 添加项目根目录到 Python 路径
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import create_engine, text
+from app.config.settings import DB_URL, EMBEDDING_DIM
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STORAGE_TYPES = ('vector', 'halfvec')
+TEMP_COLUMN = 'embedding_converted'
+TABLES = ('document_chunks', 'documents')
+
+
+def replace_index_opclass(indexdef: str, target: str) -> str:
+    """把索引定义中的向量操作符类 (如 vector_cosine_ops) 换成目标类型的操作符类"""
+    return re.sub(r'\b(?:vector|halfvec)_(l2|ip|cosine|l1)_ops\b', rf'{target}_\1_ops', indexdef)
+
+
+def _column_type(conn, table: str, column: str):
+    return conn.execute(text("""
+        SELECT udt_name FROM information_schema.columns
+        WHERE table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar()
+
+
+def _embedding_indexes(conn, table: str) -> List[str]:
+    """表上引用 embedding 列的索引定义"""
+    rows = conn.execute(text("""
+        SELECT indexdef FROM pg_indexes
+        WHERE tablename = :table AND indexdef ~ '\\(embedding\\M'
+    """), {"table": table})
+    return [row.indexdef for row in rows]
+
+
+def convert_table(engine, table: str, target: str, batch_size: int, vacuum_full: bool = False) -> bool:
+    """转换一张表的 embedding 列, 返回是否做了转换"""
+    cast = f"{target}({EMBEDDING_DIM})"
+
+    with engine.begin() as conn:
+        current = _column_type(conn, table, 'embedding')
+        if current is None:
+            logger.info(f"   - {table} 没有 embedding 列, 跳过")
+            return False
+        if current == target:
+            logger.info(f"   - {table}.embedding 已经是 {target}, 跳过")
+            return False
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {TEMP_COLUMN} {cast}"))
+        min_id, max_id = conn.execute(text(f"SELECT min(id), max(id) FROM {table}")).first()
+        size_before = conn.execute(text(f"SELECT pg_total_relation_size('{table}')")).scalar()
+        index_defs = _embedding_indexes(conn, table)
+        comment = conn.execute(text(f"""
+            SELECT col_description('{table}'::regclass, attnum) FROM pg_attribute
+            WHERE attrelid = '{table}'::regclass AND attname = 'embedding'
+        """)).scalar()
+
+    # 分批写入临时列, 每批一个事务
+    converted = 0
+    start = time.perf_counter()
+    if min_id is not None:
+        for low in range(min_id, max_id + 1, batch_size):
+            with engine.begin() as conn:
+                result = conn.execute(text(f"""
+                    UPDATE {table} SET {TEMP_COLUMN} = embedding::{cast}
+                    WHERE id >= :low AND id < :high
+                      AND embedding IS NOT NULL AND {TEMP_COLUMN} IS NULL
+                """), {"low": low, "high": low + batch_size})
+            converted += result.rowcount
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"   {table}: id {low}-{low + batch_size - 1}/{max_id}, 已转换 {converted} 行, "
+                f"{converted / max(elapsed, 1e-9):.0f} 行/秒"
+            )
+
+    # 锁表补齐新写入的行并替换列 (旧列上的索引随列一起删除)
+    with engine.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+        result = conn.execute(text(f"""
+            UPDATE {table} SET {TEMP_COLUMN} = embedding::{cast}
+            WHERE embedding IS NOT NULL AND {TEMP_COLUMN} IS NULL
+        """))
+        logger.info(f"   {table}: 补齐分批期间新写入的 {result.rowcount} 行, 替换列")
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN embedding"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {TEMP_COLUMN} TO embedding"))
+        if comment:
+            conn.execute(text(f"COMMENT ON COLUMN {table}.embedding IS :comment"), {"comment": comment})
+
+    # CONCURRENTLY 不能在事务内执行
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for indexdef in index_defs:
+            statement = replace_index_opclass(indexdef, target).replace(
+                'CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1
+            )
+            logger.info(f"   重建索引: {statement}")
+            conn.execute(text(statement))
+        conn.execute(text(f"VACUUM (FULL, ANALYZE) {table}" if vacuum_full else f"ANALYZE {table}"))
+        size_after = conn.execute(text(f"SELECT pg_total_relation_size('{table}')")).scalar()
+
+    logger.info(
+        f"   ✓ {table}.embedding: {current} -> {target}, 表+索引 "
+        f"{size_before / 1024 / 1024:.1f}MB -> {size_after / 1024 / 1024:.1f}MB"
+    )
+    return True
+
+
+def run_migration(target: str = 'halfvec', batch_size: int = 5000, vacuum_full: bool = False):
+    """执行向量列存储类型转换"""
+    if target not in STORAGE_TYPES:
+        raise ValueError(f"不支持的存储类型: {target}")
+    engine = create_engine(DB_URL)
+    logger.info(f"开始转换向量列存储类型 -> {target} (每批 {batch_size} 行)...")
+    for table in TABLES:
+        convert_table(engine, table, target, batch_size, vacuum_full)
+    logger.info(f"✅ 转换完成, 请设置 EMBEDDING_STORAGE={target} 后重启服务")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="转换向量列的存储类型")
+    parser.add_argument("--to", dest="target", choices=STORAGE_TYPES, default="halfvec", help="目标存储类型")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每批转换的行数 (按 id 区间)")
+    parser.add_argument("--vacuum-full", action="store_true", help="转换后 VACUUM FULL 立即回收旧列空间 (会锁表)")
+    args = parser.parse_args()
+    run_migration(args.target, args.batch_size, args.vacuum_full)
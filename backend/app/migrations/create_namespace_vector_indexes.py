@@ -0,0 +1,63 @@
+"""
+数据库迁移脚本: 为已有领域补建按命名空间的部分 HNSW 向量索引
+
+新建领域时服务会自动建索引, 本脚本用于启用该功能前已存在的领域。
+索引逐个以 CREATE INDEX CONCURRENTLY 构建, 不阻塞写入; 已有效的索引会跳过,
+中断后留下的无效索引会先删除再重建。
+
+建议先设置 NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM (如 1GB),
+HNSW 图能放进 maintenance_work_mem 时构建快得多。
+
+用法:
+    python app/migrations/create_namespace_vector_indexes.py
+    python app/migrations/create_namespace_vector_indexes.py --namespace legal --namespace finance
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.database import get_session_local
+from app.services.namespace_vector_index import get_namespace_index_manager
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration(namespaces=None):
+    """为指定 (默认全部) 领域构建部分向量索引并输出状态"""
+    manager = get_namespace_index_manager()
+    if not manager.enabled:
+        logger.info("NAMESPACE_VECTOR_INDEX_ENABLED=false, 跳过")
+        return
+
+    db = get_session_local()()
+    try:
+        if namespaces:
+            for namespace in namespaces:
+                manager.create(namespace, wait=True)
+        else:
+            namespaces = manager.sync_all(db, wait=True)
+            logger.info(f"补建了 {len(namespaces)} 个领域的部分向量索引")
+
+        db.rollback()  # 结束读取快照, 看到刚构建的索引
+        for namespace in namespaces:
+            status = manager.status(db, namespace)
+            logger.info(
+                f"   {namespace}: {status.index_name} {status.state}, "
+                f"{status.size_bytes / 1024 / 1024:.1f}MB" + (f", 错误: {status.error}" if status.error else "")
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="为已有领域补建部分 HNSW 向量索引")
+    parser.add_argument("--namespace", action="append", help="只处理指定的命名空间 (可重复)")
+    args = parser.parse_args()
+    run_migration(args.namespace)
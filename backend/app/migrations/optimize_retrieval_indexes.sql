@@ -11,6 +11,7 @@
 -- 为 document_chunks 表的 embedding 字段创建 IVFFlat 索引
 -- IVFFlat 是 pgvector 的近似最近邻索引,可以大幅提升向量检索速度
 -- lists=100 表示聚类中心数量,适合中等规模数据(10w-100w条)
+-- EMBEDDING_STORAGE=halfvec 时操作符类改为 halfvec_cosine_ops
 DROP INDEX IF EXISTS idx_chunks_embedding_ivfflat;
 CREATE INDEX idx_chunks_embedding_ivfflat
 ON document_chunks
@@ -0,0 +1,61 @@
+"""
+通用 SQL 迁移执行脚本
+
+用法:
+    python app/migrations/run_sql_migration.py add_chunk_content_hash.sql
+"""
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.database.connection import get_engine
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration(sql_filename: str):
+    """执行指定的SQL迁移文件"""
+    sql_file = os.path.join(os.path.dirname(__file__), sql_filename)
+
+    logger.info(f"读取SQL文件: {sql_file}")
+
+    with open(sql_file, 'r', encoding='utf-8') as f:
+        sql_content = f.read()
+
+    # 去掉注释行后按分号切分
+    lines = [line for line in sql_content.splitlines() if not line.strip().startswith('--')]
+    statements = [s.strip() for s in '\n'.join(lines).split(';') if s.strip()]
+
+    engine = get_engine()
+
+    # CONCURRENTLY 语句不能在事务中执行, 使用 AUTOCOMMIT
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for i, statement in enumerate(statements, 1):
+            try:
+                connection.execute(text(statement))
+                logger.info(f"✓ 执行语句 {i}/{len(statements)}")
+            except Exception as e:
+                if 'already exists' in str(e).lower():
+                    logger.info(f"- 语句 {i} 已执行过, 跳过")
+                else:
+                    logger.error(f"✗ 语句 {i} 执行失败: {e}")
+                    raise
+
+    logger.info("✓ 数据库迁移成功完成！")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("用法: python app/migrations/run_sql_migration.py <migration.sql>")
+        sys.exit(1)
+
+    logger.info("=" * 60)
+    logger.info(f"开始执行迁移: {sys.argv[1]}")
+    logger.info("=" * 60)
+
+    run_migration(sys.argv[1])
@@ -2,14 +2,36 @@
 文档模型类
 存储文档内容和嵌入向量信息
 """
-from sqlalchemy import Column, Integer, String, Text, Float
+from sqlalchemy import Column, Integer, String, Text, Float, BigInteger, DateTime
+from sqlalchemy.orm import deferred
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
 from datetime import datetime
+import numpy as np
+from app.config.settings import EMBEDDING_DIM, EMBEDDING_STORAGE
 
 Base = declarative_base()
 
+
+class HalfVec(HALFVEC):
+    """halfvec 列: 全局类型转换器已把读取的值解码为 float32 ndarray, 原样返回"""
+
+    cache_ok = True
+
+    def result_processor(self, dialect, coltype):
+        process = super().result_processor(dialect, coltype)
+
+        def passthrough(value):
+            if value is None or isinstance(value, np.ndarray):
+                return value
+            return process(value) if process else value
+        return passthrough
+
+
+# 向量列类型: float32 (vector) 或 float16 (halfvec), 读写接口相同
+EmbeddingType = HalfVec if EMBEDDING_STORAGE == 'halfvec' else Vector
+
 class Document(Base):
     """
     文档模型类
@@ -19,7 +41,7 @@ class Document(Base):
 
     id = Column(Integer, primary_key=True)
     content = Column(Text, comment="文档内容")
-    embedding = Column(Vector(384), comment="文档嵌入向量")  # 使用pgvector扩展的Vector类型
+    embedding = Column(EmbeddingType(EMBEDDING_DIM), comment="文档嵌入向量")  # pgvector 的 vector / halfvec 类型
     doc_metadata = Column(String, comment="文档元数据")  # 重命名避免与SQLAlchemy的metadata冲突
     filename = Column(String, comment="文件名")
     created_at = Column(String, default=lambda: str(datetime.now()), comment="创建时间")
@@ -29,6 +51,14 @@ class Document(Base):
     domain_tags = Column(JSONB, default=dict, nullable=False, comment="领域标签(JSON)")
     domain_confidence = Column(Float, default=0.0, nullable=False, comment="领域分类置信度")
 
+    # 变更追踪字段 (add_incremental_update_tables.sql 添加), 默认不随文档加载
+    file_size = deferred(Column(BigInteger, default=0, comment="文件大小(字节)"), group="tracking")
+    file_modified_at = deferred(Column(DateTime, comment="文件修改时间"), group="tracking")
+    content_hash = deferred(Column(String(64), index=True, comment="内容MD5哈希"), group="tracking")
+    last_indexed_at = deferred(Column(DateTime, comment="最后索引时间"), group="tracking")
+    index_status = deferred(Column(String(20), default='pending', comment="索引状态"), group="tracking")
+    source_path = deferred(Column(String(1024), comment="源文件路径 (目录监听入库的文档)"), group="tracking")
+
 class DocumentChunk(Base):
     """
     文档块模型类
@@ -40,10 +70,11 @@ class DocumentChunk(Base):
     document_id = Column(Integer, comment="文档ID")
     content = Column(Text, comment="文档块内容")
     chunk_index = Column(Integer, comment="块索引")
-    embedding = Column(Vector(384), comment="文档块嵌入向量")  # 使用pgvector扩展的Vector类型
+    embedding = Column(EmbeddingType(EMBEDDING_DIM), comment="文档块嵌入向量")  # pgvector 的 vector / halfvec 类型
     chunk_metadata = Column(String, comment="元数据信息")  # 重命名避免与SQLAlchemy保留字冲突
     filename = Column(String, comment="文件名")  # 添加filename字段
     created_at = Column(String, default=lambda: str(datetime.now()), comment="创建时间")
+    content_hash = Column(String(64), index=True, comment="块内容哈希(SHA-256), 用于增量索引复用向量")
 
     # 多领域支持字段
     namespace = Column(String(100), nullable=False, default='default', index=True, comment="领域命名空间")
@@ -0,0 +1,43 @@
+"""
+嵌入模型在线迁移记录模型
+记录影子向量列的回填进度 (断点) 和已切换读取的命名空间
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime
+# 使用 document.py 中的 Base,确保模型在同一个元数据中
+from app.models.document import Base
+
+
+class EmbeddingMigration(Base):
+    """
+    嵌入模型迁移表
+    同一时刻最多一条未结束 (backfilling/indexing/ready) 的迁移
+    """
+    __tablename__ = 'embedding_migrations'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    backend = Column(String(50), nullable=False, comment='新模型的嵌入后端')
+    model_name = Column(String(200), nullable=False, comment='新模型名')
+    dimension = Column(Integer, nullable=False, comment='新模型向量维度')
+    storage = Column(String(20), nullable=False, default='vector', comment='影子列存储类型: vector/halfvec')
+    column_name = Column(String(63), nullable=False, comment='影子向量列名')
+    state = Column(String(20), nullable=False, default='backfilling', index=True,
+                   comment='状态: backfilling, indexing, ready, completed, aborted')
+    checkpoint_id = Column(BigInteger, default=0, comment='回填断点: 已处理到的最大分块ID')
+    sweeps = Column(Integer, default=0, comment='已完成的回填轮数 (第二轮补齐双写失败的行)')
+    rows_total = Column(BigInteger, default=0, comment='开始时需要回填的分块数')
+    rows_done = Column(BigInteger, default=0, comment='已回填的分块数')
+    read_namespaces = Column(JSONB, default=list, comment='已切换到新模型读取的命名空间')
+    error_message = Column(Text, comment='错误信息')
+    created_at = Column(DateTime, default=datetime.now, comment='创建时间')
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
+    completed_at = Column(DateTime, comment='完成时间')
+
+    @property
+    def model_key(self) -> str:
+        """模型标识 (后端:模型名), 与 EmbeddingService.model_key 一致"""
+        return f"{self.backend}:{self.model_name}"
+
+    def __repr__(self):
+        return f"<EmbeddingMigration(id={self.id}, model={self.model_key}, state={self.state})>"
@@ -0,0 +1,29 @@
+"""
+嵌入向量存储模型
+按 (模型标识, 规范化文本哈希) 内容寻址, 跨文档复用相同分块的向量
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from pgvector.sqlalchemy import Vector
+from datetime import datetime
+# 使用 document.py 中的 Base,确保模型在同一个元数据中
+from app.models.document import Base
+
+
+class EmbeddingStoreEntry(Base):
+    """
+    嵌入向量存储表
+    同一模型下相同文本 (规范化后) 只调用一次模型
+    """
+    __tablename__ = 'embedding_store'
+
+    model_name = Column(String(200), primary_key=True, comment='模型标识 (后端:模型名)')
+    text_hash = Column(String(64), primary_key=True, comment='规范化文本SHA-256哈希')
+    # 不限定维度, 以兼容不同后端 (HuggingFace 384 维 / OpenAI 1536 维)
+    embedding = Column(Vector(), nullable=False, comment='嵌入向量')
+    text_length = Column(Integer, default=0, comment='文本长度')
+    hit_count = Column(Integer, default=0, comment='命中次数')
+    created_at = Column(DateTime, default=datetime.now, comment='创建时间')
+    last_used_at = Column(DateTime, default=datetime.now, index=True, comment='最近使用时间')
+
+    def __repr__(self):
+        return f"<EmbeddingStoreEntry(model={self.model_name}, hash={self.text_hash[:12]}, hits={self.hit_count})>"
@@ -18,6 +18,10 @@ from app.monitoring.metrics import (
     retrieval_results_count,
     rerank_latency,
 
+    # 流水线阶段指标
+    rag_stage_latency,
+    record_stage_latency,
+
     # 领域统计指标
     domain_document_count,
     domain_chunk_count,
@@ -26,6 +30,40 @@ from app.monitoring.metrics import (
     cache_hit_rate,
     cache_size,
 
+    # 嵌入去重指标
+    embedding_store_lookups_total,
+    embedding_dedup_ratio,
+    record_embedding_dedup,
+
+    # 文本提取指标
+    extraction_duration_seconds,
+    extraction_pages_total,
+    extraction_pages_per_second,
+    record_extraction,
+
+    # 变更检测指标
+    change_scan_documents_total,
+    change_scan_docs_per_second,
+    record_change_scan,
+
+    # 目录监听指标
+    watch_events_total,
+    watch_enqueue_latency_seconds,
+    record_watch_batch,
+
+    # 向量索引指标
+    vector_index_search_seconds,
+    record_vector_index_search,
+
+    # 索引队列指标
+    index_queue_wait_seconds,
+    index_tasks_submitted_total,
+    record_index_task_submitted,
+    record_index_queue_wait,
+
+    # 内存指标
+    memory_component_bytes,
+
     # 数据库指标
     db_connection_pool_usage,
     db_query_latency,
@@ -46,10 +84,32 @@ __all__ = [
     'domain_classification_latency',
     'retrieval_results_count',
     'rerank_latency',
+    'rag_stage_latency',
+    'record_stage_latency',
     'domain_document_count',
     'domain_chunk_count',
     'cache_hit_rate',
     'cache_size',
+    'embedding_store_lookups_total',
+    'embedding_dedup_ratio',
+    'record_embedding_dedup',
+    'extraction_duration_seconds',
+    'extraction_pages_total',
+    'extraction_pages_per_second',
+    'record_extraction',
+    'change_scan_documents_total',
+    'change_scan_docs_per_second',
+    'record_change_scan',
+    'watch_events_total',
+    'watch_enqueue_latency_seconds',
+    'record_watch_batch',
+    'vector_index_search_seconds',
+    'record_vector_index_search',
+    'index_queue_wait_seconds',
+    'index_tasks_submitted_total',
+    'record_index_task_submitted',
+    'record_index_queue_wait',
+    'memory_component_bytes',
     'db_connection_pool_usage',
     'db_query_latency',
     'active_sessions_count',
@@ -0,0 +1,332 @@
+"""
+进程内存统计
+
+为进程内的大型结构 (嵌入缓存、BM25 语料、模型、单次请求解析出的向量等)
+提供按组件的内存估算:
+
+- 组件通过 memory_registry 注册 sizeof 提供者, 或注册对象 (弱引用) 由通用估算器计算
+- 通用估算器按类型分派, 可通过 register_sizeof 扩展 (如 NumPy 数组、torch 模块)
+- 大容器按抽样估算, 避免统计本身遍历百万级元素
+- 支持按需开启 tracemalloc 并输出 Top-N 分配位置
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config.logging_config import get_app_logger
+
+logger = get_app_logger()
+
+# 大容器抽样估算时的样本数
+SAMPLE_SIZE = 32
+
+# 类型 -> sizeof 函数, 按注册顺序匹配 isinstance
+_sizeof_providers: List[Tuple[type, Callable[[Any], int]]] = []
+
+
+def register_sizeof(obj_type: type, func: Callable[[Any], int]):
+    """
+    注册某种类型的 sizeof 提供者
+
+    Args:
+        obj_type: 对象类型
+        func: 返回该对象估算字节数的函数
+    """
+    _sizeof_providers.insert(0, (obj_type, func))
+
+
+def deep_sizeof(obj: Any, max_depth: int = 6, _seen: Optional[set] = None) -> int:
+    """
+    估算对象及其引用内容的字节数
+
+    长度超过 SAMPLE_SIZE 的容器只抽样计算前若干个元素, 再按长度外推。
+    """
+    if _seen is None:
+        _seen = set()
+
+    obj_id = id(obj)
+    if obj_id in _seen:
+        return 0
+    _seen.add(obj_id)
+
+    for obj_type, func in _sizeof_providers:
+        if isinstance(obj, obj_type):
+            return func(obj)
+
+    size = sys.getsizeof(obj, 0)
+    if max_depth <= 0 or isinstance(obj, (str, bytes, bytearray, int, float, bool)):
+        return size
+
+    if isinstance(obj, dict):
+        items = obj.items()
+        count = len(obj)
+        sampled = 0
+        sample_total = 0
+        for key, value in items:
+            sample_total += deep_sizeof(key, max_depth - 1, _seen)
+            sample_total += deep_sizeof(value, max_depth - 1, _seen)
+            sampled += 1
+            if sampled >= SAMPLE_SIZE:
+                break
+        if sampled:
+            size += int(sample_total / sampled * count)
+        return size
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        count = len(obj)
+        sampled = 0
+        sample_total = 0
+        for item in obj:
+            sample_total += deep_sizeof(item, max_depth - 1, _seen)
+            sampled += 1
+            if sampled >= SAMPLE_SIZE:
+                break
+        if sampled:
+            size += int(sample_total / sampled * count)
+        return size
+
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), max_depth - 1, _seen)
+
+    return size
+
+
+def _register_default_providers():
+    try:
+        import numpy as np
+
+        def _ndarray_bytes(arr) -> int:
+            # 视图与原数组共享缓冲区, 只计对象头
+            if arr.base is not None:
+                return sys.getsizeof(arr, 0)
+            return int(arr.nbytes) + sys.getsizeof(arr, 0)
+
+        register_sizeof(np.ndarray, _ndarray_bytes)
+    except ImportError:
+        pass
+
+    try:
+        import torch
+
+        def _module_bytes(module) -> int:
+            total = 0
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                total += tensor.numel() * tensor.element_size()
+            return total
+
+        register_sizeof(torch.nn.Module, _module_bytes)
+    except ImportError:
+        pass
+
+
+_register_default_providers()
+
+
+class MemoryRegistry:
+    """内存组件注册表"""
+
+    def __init__(self):
+        self._providers: Dict[str, Tuple[str, Callable[[], int]]] = {}
+        self._objects: Dict[str, Tuple[str, List[weakref.ref], Optional[Callable[[Any], int]]]] = {}
+        self._transient: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, provider: Callable[[], int], category: str = "cache"):
+        """
+        注册一个组件的 sizeof 提供者
+
+        Args:
+            name: 组件名 (如 embedding.cache)
+            provider: 无参函数, 返回估算字节数
+            category: 分类 (cache/index/model/request)
+        """
+        with self._lock:
+            self._providers[name] = (category, provider)
+
+    def register_object(
+        self,
+        name: str,
+        obj: Any,
+        category: str = "cache",
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        以弱引用方式注册对象, 同名组件的多个实例合并统计
+
+        对象被回收后自动从统计中消失, 适合按请求创建的服务实例。
+
+        Args:
+            name: 组件名
+            obj: 被统计的对象
+            category: 分类
+            sizeof: 对象的 sizeof 函数, 默认使用 deep_sizeof
+        """
+        with self._lock:
+            entry = self._objects.get(name)
+            if entry is None:
+                entry = (category, [], sizeof)
+                self._objects[name] = entry
+            refs = entry[1]
+            refs[:] = [ref for ref in refs if ref() is not None]
+            refs.append(weakref.ref(obj))
+
+    def record_transient(self, name: str, nbytes: int, category: str = "request"):
+        """
+        记录临时结构的大小 (如单次检索解析出的向量列表), 保留最近值和峰值
+        """
+        with self._lock:
+            entry = self._transient.setdefault(name, {"category": category, "last": 0, "peak": 0})
+            entry["last"] = nbytes
+            entry["peak"] = max(entry["peak"], nbytes)
+            entry["updated_at"] = time.time()
+
+    def unregister(self, name: str):
+        """移除组件"""
+        with self._lock:
+            self._providers.pop(name, None)
+            self._objects.pop(name, None)
+            self._transient.pop(name, None)
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """
+        计算所有组件的估算字节数
+
+        Returns:
+            List[Dict]: 组件统计, 按字节数降序
+        """
+        with self._lock:
+            providers = list(self._providers.items())
+            objects = [(name, category, list(refs), sizeof) for name, (category, refs, sizeof) in self._objects.items()]
+            transient = [(name, dict(entry)) for name, entry in self._transient.items()]
+
+        components = []
+
+        for name, (category, provider) in providers:
+            start = time.perf_counter()
+            try:
+                nbytes = int(provider())
+                error = None
+            except Exception as e:
+                nbytes = 0
+                error = str(e)
+            components.append({
+                "name": name,
+                "category": category,
+                "bytes": nbytes,
+                "instances": 1,
+                "estimate_ms": round((time.perf_counter() - start) * 1000, 3),
+                "error": error
+            })
+
+        for name, category, refs, sizeof in objects:
+            start = time.perf_counter()
+            live = [obj for obj in (ref() for ref in refs) if obj is not None]
+            nbytes = 0
+            error = None
+            for obj in live:
+                try:
+                    nbytes += int(sizeof(obj) if sizeof else deep_sizeof(obj))
+                except Exception as e:
+                    error = str(e)
+            components.append({
+                "name": name,
+                "category": category,
+                "bytes": nbytes,
+                "instances": len(live),
+                "estimate_ms": round((time.perf_counter() - start) * 1000, 3),
+                "error": error
+            })
+
+        for name, entry in transient:
+            components.append({
+                "name": name,
+                "category": entry["category"],
+                "bytes": entry["last"],
+                "peak_bytes": entry["peak"],
+                "instances": 1,
+                "estimate_ms": 0.0,
+                "error": None
+            })
+
+        components.sort(key=lambda c: c["bytes"], reverse=True)
+        return components
+
+
+memory_registry = MemoryRegistry()
+
+
+def get_process_memory() -> Dict[str, int]:
+    """获取进程常驻内存 (RSS) 等信息"""
+    info = {"rss_bytes": 0}
+    try:
+        # /proc/self/statm: size resident shared ... (单位为页)
+        with open("/proc/self/statm") as f:
+            fields = f.read().split()
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        info["vms_bytes"] = int(fields[0]) * page_size
+        info["rss_bytes"] = int(fields[1]) * page_size
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            # Linux 下 ru_maxrss 单位为 KB
+            info["rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except Exception:
+            pass
+    return info
+
+
+def start_tracemalloc(frames: int = 10) -> bool:
+    """开启 tracemalloc, 已开启时返回 False"""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    logger.info(f"tracemalloc 已开启 (frames={frames})")
+    return True
+
+
+def stop_tracemalloc() -> bool:
+    """关闭 tracemalloc, 未开启时返回 False"""
+    if not tracemalloc.is_tracing():
+        return False
+    tracemalloc.stop()
+    logger.info("tracemalloc 已关闭")
+    return True
+
+
+def tracemalloc_top(limit: int = 20, key_type: str = "lineno") -> Dict[str, Any]:
+    """
+    获取 tracemalloc 快照的 Top-N 分配位置
+
+    Args:
+        limit: 返回数量
+        key_type: 分组方式 (lineno/filename/traceback)
+    """
+    if not tracemalloc.is_tracing():
+        return {"tracing": False, "top": []}
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+
+    top = []
+    for stat in snapshot.statistics(key_type)[:limit]:
+        frame = stat.traceback[0]
+        top.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count
+        })
+
+    return {
+        "tracing": True,
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": top
+    }
@@ -7,18 +7,14 @@
 import asyncio
 import logging
 from typing import Optional
-from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 from app.database import get_db
 from app.models.knowledge_domain import KnowledgeDomain
-from app.models.document import Document, DocumentChunk
-from app.models.database import User
-from app.models.chat import ChatSession
+from app.services.domain_stats import get_domain_stats_provider
 
 from app.monitoring.metrics import (
     domain_document_count,
@@ -30,7 +26,9 @@ from app.monitoring.metrics import (
     cache_size,
     db_connection_pool_usage,
     db_connection_pool_size,
+    memory_component_bytes,
 )
+from app.monitoring.memory import memory_registry
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +39,7 @@ class MetricUpdater:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
         self._running = False
+        self._memory_labels = set()
 
     def start(self):
         """启动定时任务"""
@@ -77,6 +76,15 @@ class MetricUpdater:
             replace_existing=True
         )
 
+        # 每 2 分钟更新内存组件指标
+        self.scheduler.add_job(
+            self.update_memory_stats,
+            trigger=IntervalTrigger(minutes=2),
+            id='update_memory_stats',
+            name='更新内存组件指标',
+            replace_existing=True
+        )
+
         # 每 30 秒更新数据库连接池指标
         self.scheduler.add_job(
             self.update_db_pool_stats,
@@ -117,33 +125,21 @@ class MetricUpdater:
                     KnowledgeDomain.is_active == True
                 ).all()
 
+                # 一次分组查询得到所有命名空间的统计
+                snapshot = get_domain_stats_provider().get_snapshot(db, force_refresh=True)
+
                 for domain in domains:
                     namespace = domain.namespace
+                    stats = snapshot.get(namespace)
 
-                    # 文档数量
-                    doc_count = db.query(Document).filter(
-                        Document.namespace == namespace
-                    ).count()
-                    domain_document_count.labels(namespace=namespace).set(doc_count)
-
-                    # 分块数量
-                    chunk_count = db.query(DocumentChunk).filter(
-                        DocumentChunk.namespace == namespace
-                    ).count()
-                    domain_chunk_count.labels(namespace=namespace).set(chunk_count)
-
-                    # 平均置信度
-                    avg_conf_result = db.query(
-                        func.avg(Document.domain_confidence)
-                    ).filter(
-                        Document.namespace == namespace,
-                        Document.domain_confidence > 0
-                    ).scalar()
+                    domain_document_count.labels(namespace=namespace).set(stats.document_count)
+                    domain_chunk_count.labels(namespace=namespace).set(stats.chunk_count)
+                    domain_avg_confidence.labels(namespace=namespace).set(stats.avg_confidence)
 
-                    avg_conf = float(avg_conf_result) if avg_conf_result else 0.0
-                    domain_avg_confidence.labels(namespace=namespace).set(avg_conf)
-
-                logger.debug(f"更新了 {len(domains)} 个领域的统计指标")
+                logger.debug(
+                    f"更新了 {len(domains)} 个领域的统计指标, "
+                    f"耗时 {snapshot.refresh_duration * 1000:.1f}ms"
+                )
 
             finally:
                 db.close()
@@ -160,19 +156,16 @@ class MetricUpdater:
             db: Session = next(db_gen)
 
             try:
+                # 30 分钟 / 24 小时两个窗口合并为一次查询
+                stats = get_domain_stats_provider().get_session_stats(db)
+
                 # 活跃会话数 (最近 30 分钟有活动)
-                thirty_min_ago = datetime.utcnow() - timedelta(minutes=30)
-                active_sessions = db.query(ChatSession).filter(
-                    ChatSession.updated_at >= thirty_min_ago.isoformat()
-                ).count()
+                active_sessions = stats.active_sessions_30m
                 active_sessions_count.set(active_sessions)
 
                 # 活跃用户数 (最近 24 小时有活动的会话数作为代理指标)
                 # TODO: 当添加用户认证后,改为统计真实用户数
-                one_day_ago = datetime.utcnow() - timedelta(days=1)
-                active_sessions_24h = db.query(ChatSession).filter(
-                    ChatSession.updated_at >= one_day_ago.isoformat()
-                ).count()
+                active_sessions_24h = stats.active_sessions_24h
                 active_users_count.set(active_sessions_24h)
 
                 logger.debug(
@@ -219,6 +212,34 @@ class MetricUpdater:
         except Exception as e:
             logger.error(f"更新缓存指标失败: {e}", exc_info=True)
 
+    async def update_memory_stats(self):
+        """更新内存组件指标"""
+        try:
+            logger.debug("开始更新内存组件指标...")
+
+            # 估算可能遍历较大结构, 放到线程池执行
+            loop = asyncio.get_event_loop()
+            components = await loop.run_in_executor(None, memory_registry.collect)
+
+            labels = set()
+            for component in components:
+                label = (component["name"], component["category"])
+                labels.add(label)
+                memory_component_bytes.labels(
+                    component=component["name"],
+                    category=component["category"]
+                ).set(component["bytes"])
+
+            # 移除已消失组件的标签
+            for label in self._memory_labels - labels:
+                memory_component_bytes.remove(*label)
+            self._memory_labels = labels
+
+            logger.debug(f"更新了 {len(components)} 个内存组件指标")
+
+        except Exception as e:
+            logger.error(f"更新内存组件指标失败: {e}", exc_info=True)
+
     async def update_db_pool_stats(self):
         """更新数据库连接池指标"""
         try:
@@ -70,6 +70,15 @@ rerank_total = Counter(
     ['namespace', 'status']
 )
 
+# ==================== 流水线阶段指标 ====================
+
+rag_stage_latency = Histogram(
+    'rag_stage_latency_seconds',
+    'RAG pipeline per-stage latency in seconds',
+    ['stage'],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
 # ==================== 领域统计指标 ====================
 
 domain_document_count = Gauge(
@@ -110,6 +119,130 @@ cache_operations_total = Counter(
     ['cache_type', 'operation']
 )
 
+# ==================== 嵌入去重指标 ====================
+
+embedding_store_lookups_total = Counter(
+    'embedding_store_lookups_total',
+    'Embedding requests by dedup result (store_hit/batch_duplicate/model_call)',
+    ['result']
+)
+
+embedding_dedup_ratio = Histogram(
+    'embedding_dedup_ratio',
+    'Fraction of embeddings per batch served without a model call',
+    buckets=[0.0, 0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9, 1.0]
+)
+
+# ==================== 嵌入模型迁移指标 ====================
+
+embedding_migration_rows_total = Counter(
+    'embedding_migration_rows_total',
+    'Chunks written to the shadow embedding column by source (backfill/dual_write)',
+    ['source']
+)
+
+embedding_migration_rows_per_second = Gauge(
+    'embedding_migration_rows_per_second',
+    'Shadow embedding backfill throughput of the current run (rows/sec, including throttling)'
+)
+
+embedding_migration_progress_ratio = Gauge(
+    'embedding_migration_progress_ratio',
+    'Fraction of chunks backfilled into the shadow embedding column'
+)
+
+embedding_migration_eta_seconds = Gauge(
+    'embedding_migration_eta_seconds',
+    'Estimated seconds until the shadow embedding backfill completes'
+)
+
+embedding_migration_shadow_overlap = Histogram(
+    'embedding_migration_shadow_overlap',
+    'Top-k overlap between current-model and shadow-model results on sampled live queries',
+    ['namespace'],
+    buckets=[0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+)
+
+# ==================== 文本提取指标 ====================
+
+extraction_duration_seconds = Histogram(
+    'extraction_duration_seconds',
+    'Text extraction time per file in seconds',
+    ['file_type'],
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+)
+
+extraction_pages_total = Counter(
+    'extraction_pages_total',
+    'Total number of PDF pages extracted',
+    ['file_type']
+)
+
+extraction_pages_per_second = Gauge(
+    'extraction_pages_per_second',
+    'PDF extraction throughput of the most recent file (pages/sec)',
+    ['file_type']
+)
+
+# ==================== 索引队列指标 ====================
+
+index_queue_wait_seconds = Histogram(
+    'index_queue_wait_seconds',
+    'Time an indexing task waited in the queue before a worker started it',
+    ['priority_class'],
+    buckets=[0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0]
+)
+
+index_tasks_submitted_total = Counter(
+    'index_tasks_submitted_total',
+    'Total number of indexing tasks submitted per priority class',
+    ['priority_class']
+)
+
+# ==================== 变更检测指标 ====================
+
+change_scan_documents_total = Counter(
+    'change_scan_documents_total',
+    'Documents classified by the change detector per tier',
+    ['tier']
+)
+
+change_scan_docs_per_second = Gauge(
+    'change_scan_docs_per_second',
+    'Change detection scan rate of the most recent scan (documents/sec)'
+)
+
+# ==================== 目录监听指标 ====================
+
+watch_events_total = Counter(
+    'watch_events_total',
+    'File events handled by the directory watcher',
+    ['namespace', 'action']
+)
+
+watch_enqueue_latency_seconds = Histogram(
+    'watch_enqueue_latency_seconds',
+    'Time from the first file event of a batch to enqueueing its index task',
+    buckets=[0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0]
+)
+
+# ==================== 向量索引指标 ====================
+
+vector_index_search_seconds = Histogram(
+    'vector_index_search_seconds',
+    'In-process vector index search latency',
+    ['backend'],
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+)
+
+# ==================== 内存指标 ====================
+
+memory_component_bytes = Gauge(
+    'memory_component_bytes',
+    'Estimated memory usage of in-process caches, indexes and models in bytes',
+    ['component', 'category']
+)
+
 # ==================== 数据库指标 ====================
 
 db_connection_pool_usage = Gauge(
@@ -306,3 +439,134 @@ def record_api_request(
         method=method,
         endpoint=endpoint
     ).observe(latency)
+
+
+def record_stage_latency(stage: str, latency: float):
+    """记录流水线阶段耗时
+
+    Args:
+        stage: 阶段名 (rewrite/classify/embed/vector_sql/row_parse/bm25_build/...)
+        latency: 延迟时间(秒)
+    """
+    rag_stage_latency.labels(stage=stage).observe(latency)
+
+
+def record_embedding_dedup(store_hits: int, batch_duplicates: int, model_calls: int):
+    """记录一批嵌入请求的去重结果
+
+    Args:
+        store_hits: 命中嵌入存储的数量
+        batch_duplicates: 批内重复文本的数量
+        model_calls: 实际调用模型的数量
+    """
+    total = store_hits + batch_duplicates + model_calls
+    if total == 0:
+        return
+    embedding_store_lookups_total.labels(result='store_hit').inc(store_hits)
+    embedding_store_lookups_total.labels(result='batch_duplicate').inc(batch_duplicates)
+    embedding_store_lookups_total.labels(result='model_call').inc(model_calls)
+    embedding_dedup_ratio.observe((total - model_calls) / total)
+
+
+def record_embedding_backfill(rows: int, rows_per_second: float, progress: float, eta_seconds: float):
+    """记录一批影子向量回填
+
+    Args:
+        rows: 本批写入影子列的分块数
+        rows_per_second: 本次回填运行的平均吞吐 (含限速等待)
+        progress: 已回填比例 (0-1)
+        eta_seconds: 按当前吞吐估算的剩余时间(秒)
+    """
+    if rows:
+        embedding_migration_rows_total.labels(source='backfill').inc(rows)
+    embedding_migration_rows_per_second.set(rows_per_second)
+    embedding_migration_progress_ratio.set(progress)
+    embedding_migration_eta_seconds.set(eta_seconds)
+
+
+def record_embedding_dual_write(rows: int):
+    """记录入库时双写到影子列的分块数"""
+    if rows:
+        embedding_migration_rows_total.labels(source='dual_write').inc(rows)
+
+
+def record_embedding_shadow_overlap(namespace: str, overlap: float):
+    """记录一次影子对比的 top-k 重合率
+
+    Args:
+        namespace: 查询的命名空间 (未指定时为 all)
+        overlap: 两个模型结果的分块ID重合比例 (0-1)
+    """
+    embedding_migration_shadow_overlap.labels(namespace=namespace).observe(overlap)
+
+
+def record_extraction(file_type: str, pages: int, duration: float):
+    """记录单个文件的文本提取
+
+    Args:
+        file_type: 文件类型 (pdf/docx/txt)
+        pages: 提取的页数 (非 PDF 为 0)
+        duration: 耗时(秒)
+    """
+    extraction_duration_seconds.labels(file_type=file_type).observe(duration)
+    if pages:
+        extraction_pages_total.labels(file_type=file_type).inc(pages)
+        if duration > 0:
+            extraction_pages_per_second.labels(file_type=file_type).set(pages / duration)
+
+
+def record_index_task_submitted(priority_class: str):
+    """记录提交到索引队列的任务
+
+    Args:
+        priority_class: 优先级类别 (interactive/bulk)
+    """
+    index_tasks_submitted_total.labels(priority_class=priority_class).inc()
+
+
+def record_index_queue_wait(priority_class: str, wait_seconds: float):
+    """记录索引任务的排队时间
+
+    Args:
+        priority_class: 优先级类别 (interactive/bulk)
+        wait_seconds: 从提交到 worker 开始执行的时间(秒)
+    """
+    index_queue_wait_seconds.labels(priority_class=priority_class).observe(max(wait_seconds, 0.0))
+
+
+def record_change_scan(tier_counts: dict, duration: float):
+    """记录一次变更检测扫描
+
+    Args:
+        tier_counts: 各层判定的文档数 (new/stat/hash/modified/rehashed...)
+        duration: 扫描耗时(秒)
+    """
+    for tier, count in tier_counts.items():
+        if count:
+            change_scan_documents_total.labels(tier=tier).inc(count)
+    total = sum(tier_counts.values())
+    if duration > 0:
+        change_scan_docs_per_second.set(total / duration)
+
+
+def record_watch_batch(actions: dict, latency: float):
+    """记录目录监听处理的一批文件事件
+
+    Args:
+        actions: (命名空间, 动作) -> 文件数, 动作为 indexed/unchanged/deleted/failed
+        latency: 批次首个事件到提交索引任务的时间(秒)
+    """
+    for (namespace, action), count in actions.items():
+        if count:
+            watch_events_total.labels(namespace=namespace, action=action).inc(count)
+    watch_enqueue_latency_seconds.observe(max(latency, 0.0))
+
+
+def record_vector_index_search(backend: str, duration: float):
+    """记录一次进程内向量索引检索
+
+    Args:
+        backend: 索引后端 (exact/int8/...)
+        duration: 检索耗时(秒), 不含与数据库的同步
+    """
+    vector_index_search_seconds.labels(backend=backend).observe(duration)
@@ -0,0 +1,146 @@
+"""
+慢请求采样分析器
+
+按配置的采样率 (或请求携带 X-Debug-Profile 头) 在请求期间启动一个栈采样线程,
+周期性读取 sys._current_frames() 并累计折叠栈 (collapsed stack)。
+请求结束后若耗时超过阈值, 将结果写入日志目录的 profile 子目录,
+文件名以请求ID索引, 可直接用 flamegraph.pl / speedscope 渲染,
+并通过 /api/logs 接口列出和读取。
+
+说明: asyncio 事件循环线程上并发的其他请求也会被采到,
+慢请求通常占据大部分样本, 结果应结合 span 追踪一起看。
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from app.config.settings import (
+    LOG_DIR,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_INTERVAL,
+    PROFILE_MAX_DEPTH,
+    PROFILE_ALL_THREADS,
+)
+from app.config.logging_config import get_app_logger
+
+logger = get_app_logger()
+
+PROFILE_DIR = Path(LOG_DIR) / "profile"
+PROFILE_SUFFIX = ".folded.txt"
+
+
+class StackSampler:
+    """栈采样线程, 把采样结果累计为折叠栈计数"""
+
+    def __init__(
+        self,
+        target_thread_id: int,
+        interval: float = PROFILE_INTERVAL,
+        max_depth: int = PROFILE_MAX_DEPTH,
+        all_threads: bool = PROFILE_ALL_THREADS
+    ):
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.all_threads = all_threads
+
+        self.stacks: Counter = Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            if self.all_threads:
+                if len(thread_names) != threading.active_count():
+                    thread_names = {t.ident: t.name for t in threading.enumerate()}
+                targets = [(tid, f) for tid, f in frames.items() if tid != own_id]
+            else:
+                frame = frames.get(self.target_thread_id)
+                targets = [(self.target_thread_id, frame)] if frame is not None else []
+
+            for thread_id, frame in targets:
+                stack = self._collapse(frame)
+                if self.all_threads:
+                    stack = f"{thread_names.get(thread_id, thread_id)};{stack}"
+                self.stacks[stack] += 1
+
+            self.sample_count += 1
+
+    def _collapse(self, frame) -> str:
+        parts = []
+        depth = 0
+        while frame is not None and depth < self.max_depth:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "?")
+            parts.append(f"{module}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+            depth += 1
+        parts.reverse()
+        return ";".join(parts)
+
+    def to_collapsed(self) -> str:
+        """输出 flamegraph.pl 兼容的折叠栈文本"""
+        return "".join(
+            f"{stack} {count}\n"
+            for stack, count in self.stacks.most_common()
+        )
+
+
+def should_profile(forced: bool) -> bool:
+    """是否对当前请求开启采样"""
+    if forced:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profiler() -> StackSampler:
+    """为当前线程 (事件循环线程) 启动采样器"""
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    return sampler
+
+
+def save_profile(sampler: StackSampler, request_id: str, method: str, path: str, duration: float) -> Optional[Path]:
+    """
+    保存采样结果到日志目录
+
+    Returns:
+        Optional[Path]: 写入的文件路径, 没有样本时为 None
+    """
+    if not sampler.stacks:
+        return None
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    # 请求ID可能来自客户端 X-Request-ID 头, 只保留安全字符
+    safe_id = "".join(c for c in request_id if c.isalnum() or c in "-_") or "unknown"
+    file_path = PROFILE_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}_{safe_id}{PROFILE_SUFFIX}"
+
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    tmp_path.write_text(sampler.to_collapsed(), encoding="utf-8")
+    os.replace(tmp_path, file_path)
+
+    logger.info(
+        f"[{request_id}] 已保存慢请求采样 - {method} {path} "
+        f"耗时: {duration:.3f}s 样本数: {sampler.sample_count} 文件: {file_path.name}"
+    )
+    return file_path
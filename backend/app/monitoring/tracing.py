@@ -0,0 +1,209 @@
+"""
+轻量级请求链路追踪
+
+基于 contextvars 记录 RAG 流水线各阶段耗时 (改写、分类、向量化、向量 SQL、
+行解析、BM25、融合、重排、LLM 首字/总耗时), 不依赖外部采集器:
+
+- 每个 span 结束时写入 Prometheus 分阶段直方图 (始终生效)
+- 请求携带 X-Debug-Trace 头时, 额外保留完整 span 树,
+  通过 Server-Timing 响应头返回, 并可经 /api/performance/trace/{request_id} 查询
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from app.monitoring.metrics import record_stage_latency
+
+
+class Span:
+    """单个追踪区间"""
+
+    __slots__ = ("name", "start", "end", "attributes", "children")
+
+    def __init__(self, name: str, start: float, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "finished": self.end is not None,
+            "attributes": self.attributes,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class Trace:
+    """一次请求的 span 树"""
+
+    def __init__(self, request_id: str, method: str = "", path: str = ""):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.created_at = time.time()
+        self.root = Span("request", time.perf_counter(), {"method": method, "path": path})
+
+    def finish(self, status_code: Optional[int] = None):
+        self.root.end = time.perf_counter()
+        if status_code is not None:
+            self.root.attributes["status_code"] = status_code
+
+    def stage_totals(self) -> Dict[str, float]:
+        """按阶段名汇总耗时 (毫秒)"""
+        totals: Dict[str, float] = {}
+        stack = list(self.root.children)
+        while stack:
+            span = stack.pop()
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+            stack.extend(span.children)
+        return totals
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头"""
+        return ", ".join(
+            f"{name};dur={duration:.1f}"
+            for name, duration in self.stage_totals().items()
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "created_at": self.created_at,
+            "total_ms": round(self.root.duration_ms, 3),
+            "stages_ms": {k: round(v, 3) for k, v in self.stage_totals().items()},
+            "spans": self.root.to_dict(self.root.start),
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class TraceStore:
+    """最近完成的追踪记录 (LRU, 容量有限)"""
+
+    def __init__(self, max_traces: int = 200):
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.request_id] = trace
+            self._traces.move_to_end(trace.request_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(request_id)
+
+    def list_recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        return [
+            {
+                "request_id": t.request_id,
+                "method": t.method,
+                "path": t.path,
+                "created_at": t.created_at,
+                "total_ms": round(t.root.duration_ms, 3),
+            }
+            for t in reversed(traces)
+        ]
+
+
+trace_store = TraceStore()
+
+
+def start_trace(request_id: str, method: str = "", path: str = ""):
+    """
+    开始记录一次请求的完整 span 树
+
+    Returns:
+        (trace, token): token 用于 end_trace 恢复上下文
+    """
+    trace = Trace(request_id, method, path)
+    token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    trace_store.put(trace)
+    return trace, (token, span_token)
+
+
+def end_trace(trace: Trace, tokens, status_code: Optional[int] = None):
+    """结束追踪并恢复上下文"""
+    trace.finish(status_code)
+    token, span_token = tokens
+    _current_span.reset(span_token)
+    _current_trace.reset(token)
+
+
+def get_current_trace() -> Optional[Trace]:
+    """获取当前请求的追踪 (未开启时为 None)"""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_span(stage: str, **attributes):
+    """
+    记录一个阶段的耗时
+
+    始终写入 Prometheus 分阶段直方图; 只有在开启追踪的请求中才挂到 span 树上。
+
+    用法:
+        with trace_span("vector_sql", namespace=namespace):
+            rows = db.execute(...)
+    """
+    start = time.perf_counter()
+    parent = _current_span.get()
+
+    if parent is None:
+        try:
+            yield None
+        finally:
+            record_stage_latency(stage, time.perf_counter() - start)
+        return
+
+    span = Span(stage, start, attributes)
+    parent.children.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        span.end = time.perf_counter()
+        _current_span.reset(token)
+        record_stage_latency(stage, span.end - start)
+
+
+def record_span(stage: str, duration: float, **attributes):
+    """
+    记录一个已测得耗时的阶段 (如流式响应的首字延迟)
+
+    Args:
+        stage: 阶段名
+        duration: 耗时 (秒)
+    """
+    record_stage_latency(stage, duration)
+
+    parent = _current_span.get()
+    if parent is not None:
+        end = time.perf_counter()
+        span = Span(stage, end - duration, attributes)
+        span.end = end
+        parent.children.append(span)
@@ -11,12 +11,12 @@ from datetime import datetime
 from app.database.connection import get_db
 from app.services.change_detector import create_change_detector
 from app.services.incremental_indexer import create_incremental_indexer
+from app.services.index_scheduler import default_priority, get_index_scheduler
 from app.models.index_record import IndexTask as IndexTaskModel, DocumentIndexRecord, IndexChangeHistory
 from app.models.database import Document
 from app.middleware.auth import get_current_active_user
 from app.config.settings import CELERY_ENABLED
 import logging
-import uuid
 
 router = APIRouter(prefix="/index", tags=["文档索引"])
 logger = logging.getLogger(__name__)
@@ -28,7 +28,8 @@ class IndexRequest(BaseModel):
     """索引请求"""
     doc_ids: List[int]
     force: bool = False
-    priority: int = 5
+    # 不指定时按文档数决定: 少量文档走交互式队列, 大批量走批量队列
+    priority: Optional[int] = None
 
 
 class ChangeDetectionRequest(BaseModel):
@@ -99,24 +100,19 @@ async def index_documents(
             # 使用Celery异步处理
             from app.tasks.index_tasks import batch_index_task
 
-            # 创建任务记录
-            task_id = str(uuid.uuid4())
-            task_record = IndexTaskModel(
-                task_id=task_id,
-                task_type='batch',
-                status='pending',
-                priority=request.priority,
-                task_metadata={'doc_ids': request.doc_ids, 'user_id': current_user.id if current_user else None}
-            )
-            db.add(task_record)
-            db.commit()
-
-            # 提交Celery任务
-            celery_task = batch_index_task.apply_async(
+            # 按优先级类别与命名空间公平调度提交
+            submitted = get_index_scheduler(db).submit(
+                batch_index_task,
                 args=[request.doc_ids, current_user.id if current_user else None],
-                task_id=task_id,
-                priority=request.priority
+                task_type='batch',
+                doc_ids=request.doc_ids,
+                priority=(
+                    request.priority if request.priority is not None
+                    else default_priority(len(request.doc_ids))
+                ),
+                user_id=current_user.id if current_user else None
             )
+            task_id = submitted['task_id']
 
             logger.info(f"已提交Celery任务: task_id={task_id}, doc_count={len(request.doc_ids)}")
 
@@ -127,7 +123,9 @@ async def index_documents(
                     'task_id': task_id,
                     'doc_ids': request.doc_ids,
                     'status': 'queued',
-                    'mode': 'celery'
+                    'mode': 'celery',
+                    'priority_class': submitted['priority_class'],
+                    'queue': submitted['queue']
                 }
             )
         else:
@@ -385,6 +383,31 @@ async def get_task_list(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/queues", response_model=IndexResponse)
+async def get_queue_stats(
+    window_minutes: int = 60,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    获取索引队列状态
+
+    按优先级类别 (interactive/bulk) 返回队列深度、排队/处理中任务数和等待时间,
+    以及各命名空间尚未处理完的文档数 (公平调度依据)
+    """
+    try:
+        stats = get_index_scheduler(db).queue_stats(window_minutes=window_minutes)
+        return IndexResponse(
+            success=True,
+            message="获取队列状态成功",
+            data=stats
+        )
+
+    except Exception as e:
+        logger.error(f"获取队列状态失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/stats", response_model=IndexResponse)
 async def get_index_stats(
     namespace: Optional[str] = None,
@@ -2,90 +2,51 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
 from sqlalchemy.orm import Session
 from app.database.connection import get_db
-from app.services.embedding import embedding_service
 from app.models.document import DocumentChunk
 from app.models.database import Document, UserDocument, User
 from app.models.schemas import DocumentResponse
 from app.middleware.auth import get_current_active_user, require_document_upload, require_document_delete, require_document_read
 from app.services.change_detector import ChangeDetector
 from app.services.incremental_indexer import IncrementalIndexer
-import PyPDF2
-from docx import Document as DocxDocument
+from app.services.document_deletion import delete_documents
+from app.services.text_chunker import chunk_texts
+from app.services.document_extractor import (
+    SUPPORTED_EXTENSIONS,
+    ExtractionError,
+    iter_docx_text,
+    iter_pdf_text,
+    iter_txt_text,
+)
+from app.services.ingestion_pipeline import StreamingIngestionPipeline
+from app.services.extraction_pool import iter_document_text_parallel, get_worker_count
+from app.database.connection import get_session_local
+from app.config.settings import UPLOAD_MAX_FILES
+from app.models.index_record import IndexTask
+import asyncio
 import json
-import re
+import os
+import tempfile
+import time
 import hashlib
 from datetime import datetime
 import logging
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 # 创建路由器实例
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-  # 推荐配置 1: 保守策略 (适合混合中英文)
-#   MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-#   MAX_CHUNK_SIZE = 1000  # 约 500-750 tokens (中文), 750-1000 tokens (英文)
-#   CHUNK_OVERLAP = 200    # 20% 重叠
-
-#   # 推荐配置 2: 激进策略 (充分利用 ada-002 的能力)
-#   MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB  
-#   MAX_CHUNK_SIZE = 2000  # 约 1000-1500 tokens (中文), 1500-2000 tokens (英文)
-#   CHUNK_OVERLAP = 400    # 20% 重叠
-
-#   # 推荐配置 3: 技术文档优化
-#   MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-#   MAX_CHUNK_SIZE = 1500  # 约 750-1125 tokens (中文)
-#   CHUNK_OVERLAP = 300    # 20% 重叠
-
-
-
 # 配置常量
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
-# 文档块切割参数
-# 基于 text-embedding-ada-002 (8191 tokens) 优化
-# 1500 字符 ≈ 750-1125 tokens (中文), 适合技术文档
-MAX_CHUNK_SIZE = 1500  # 每个块的最大字符数
-CHUNK_OVERLAP = 300    # 块之间的重叠字符数 (20% 重叠)
-
-def clean_text_content(text: str) -> str:
-    """
-    清理文本内容,移除PostgreSQL不支持的字符
-
-    Args:
-        text: 原始文本
-
-    Returns:
-        清理后的文本
-    """
-    if not text:
-        return text
-
-    # 移除 NUL 字符 (\x00) - PostgreSQL 不允许
-    text = text.replace('\x00', '')
-
-    # 移除 Unicode 替换字符 (无效UTF-8编码的占位符)
-    text = text.replace('\ufffd', '')
-
-    # 移除其他控制字符(保留换行、制表符等常用字符)
-    # 控制字符范围: \x00-\x1f (除了 \t \n \r)
-    text = re.sub(r'[\x01-\x08\x0b\x0c\x0e-\x1f]', '', text)
-
-    return text
+# 文档块切割参数见 settings.py 的分块配置 (CHUNK_*), 所有入库路径共用同一分块器
 
 def extract_text_from_pdf(file_path: str) -> str:
     """从PDF文件中提取文本内容"""
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-
-        # 清理提取的文本
-        text = clean_text_content(text)
-        return text
+        # 逐页提取后一次性拼接, 避免 text += ... 的二次复杂度
+        return "".join(text for text, _, _ in iter_pdf_text(file_path))
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}")
         raise HTTPException(status_code=400, detail="Failed to extract text from PDF")
@@ -93,36 +54,15 @@ def extract_text_from_pdf(file_path: str) -> str:
 def extract_text_from_txt(file_path: str) -> str:
     """从文本文件中读取内容"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            text = file.read()
-
-        # 清理读取的文本
-        text = clean_text_content(text)
-        return text
+        return "".join(text for text, _, _ in iter_txt_text(file_path))
     except Exception as e:
         logger.error(f"Error reading text file: {e}")
         raise HTTPException(status_code=400, detail="Failed to read text file")
 
 def extract_text_from_docx(file_path: str) -> str:
-    """从DOCX文件中提取文本内容"""
+    """从DOCX文件中提取文本内容 (段落在前, 表格在后)"""
     try:
-        doc = DocxDocument(file_path)
-        text = ""
-
-        # 提取所有段落的文本
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-
-        # 提取表格中的文本
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    text += cell.text + " "
-                text += "\n"
-
-        # 清理提取的文本
-        text = clean_text_content(text)
-        return text
+        return "".join(text for text, _, _ in iter_docx_text(file_path))
     except Exception as e:
         logger.error(f"Error extracting text from DOCX: {e}")
         raise HTTPException(status_code=400, detail="Failed to extract text from DOCX")
@@ -131,122 +71,86 @@ def calculate_content_hash(content: str) -> str:
     """计算文档内容的MD5哈希值"""
     return hashlib.md5(content.encode('utf-8')).hexdigest()
 
-def split_text_into_chunks(text: str, chunk_size: int = MAX_CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+def split_text_into_chunks(text: str, chunk_size: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
     """
-    将文本分割成多个块
+    将文本分割成多个块 (使用统一的内容定义边界分块器)
 
     Args:
         text (str): 要分割的文本
-        chunk_size (int): 每个块的大小
-        overlap (int): 块之间的重叠字符数
+        chunk_size (int): 每个块的大小, 默认取 CHUNK_MAX_SIZE
+        overlap (int): 块之间的重叠大小, 默认取 CHUNK_OVERLAP
 
     Returns:
         List[str]: 分割后的文本块列表
     """
-    if len(text) <= chunk_size:
-        return [text]
-
-    chunks = []
-    start = 0
-
-    while start < len(text):
-        # 确定当前块的结束位置
-        end = start + chunk_size
-
-        # 如果不是最后一块，尝试在句号、问号、感叹号处分割
-        if end < len(text):
-            # 查找最后一个句号、问号、感叹号
-            last_sentence_end = text.rfind('。', start, end)
-            if last_sentence_end == -1:
-                last_sentence_end = text.rfind('？', start, end)
-            if last_sentence_end == -1:
-                last_sentence_end = text.rfind('！', start, end)
-            if last_sentence_end == -1:
-                last_sentence_end = text.rfind('.', start, end)
-            if last_sentence_end == -1:
-                last_sentence_end = text.rfind('?', start, end)
-            if last_sentence_end == -1:
-                last_sentence_end = text.rfind('!', start, end)
-
-            # 如果找到句号，在句号后分割
-            if last_sentence_end != -1 and last_sentence_end > start + chunk_size // 2:
-                end = last_sentence_end + 1
-
-        # 提取当前块
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        # 计算下一个块的起始位置（考虑重叠）
-        start = end - overlap
-        if start >= len(text):
-            break
-
-    return chunks
+    return chunk_texts(text, chunk_size, overlap)
 
-@router.post("/upload")
-async def upload_document(
-    file: UploadFile = File(...),
-    namespace: str = Form('default'),  # 新增领域参数,从表单接收
-    enable_change_detection: bool = Form(True),  # 是否启用变更检测
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_document_upload)
-):
-    """处理文档上传请求,支持PDF, TXT, DOCX格式,并可选启用变更检测"""
-    try:
-        # 验证文件类型
-        if not file.filename.endswith(('.pdf', '.txt', '.docx', '.doc')):
-            raise HTTPException(
-                status_code=400,
-                detail="Only PDF, TXT, DOC and DOCX files are supported"
-            )
-
-        # 读取文件内容
-        file_content = await file.read()
+# 上传文件按块写入临时文件, 不整体读入内存
+UPLOAD_READ_CHUNK = 1024 * 1024
 
-        # 验证文件大小
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum size allowed: {MAX_FILE_SIZE // (1024*1024)}MB"
-            )
-
-        file_path = f"/tmp/{file.filename}"
-
-        # 保存临时文件
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-
-        # 根据文件类型提取文本
-        if file.filename.endswith('.pdf'):
-            text_content = extract_text_from_pdf(file_path)
-        elif file.filename.endswith(('.docx', '.doc')):
-            text_content = extract_text_from_docx(file_path)
-        else:
-            text_content = extract_text_from_txt(file_path)
-
-        # 验证文本内容(文本已在提取时清理过)
-        if not text_content.strip():
-            raise HTTPException(status_code=400, detail="No text content found in file")
+async def _save_upload_to_temp(file: UploadFile) -> Tuple[str, int]:
+    """把上传文件流式写入临时文件, 返回 (路径, 字节数); 超过 MAX_FILE_SIZE 时抛出 413"""
+    suffix = os.path.splitext(file.filename)[1]
+    fd, file_path = tempfile.mkstemp(suffix=suffix, prefix="upload_")
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                block = await file.read(UPLOAD_READ_CHUNK)
+                if not block:
+                    break
+                size += len(block)
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum size allowed: {MAX_FILE_SIZE // (1024*1024)}MB"
+                    )
+                f.write(block)
+    except BaseException:
+        os.remove(file_path)
+        raise
+    return file_path, size
+
+async def _send_upload_progress(task_id: Optional[str], progress: int, message: str, details: dict = None):
+    """通过任务 WebSocket 推送上传进度 (未提供 task_id 时忽略)"""
+    if not task_id:
+        return
+    from app.routers.websocket import task_progress_manager
+    await task_progress_manager.send_progress_update(
+        task_id, progress, 'processing', message=message, details=details
+    )
 
-        # 将文本分割成块
-        text_chunks = split_text_into_chunks(text_content)
-        logger.info(f"Document split into {len(text_chunks)} chunks")
+async def _ingest_uploaded_file(
+    db: Session,
+    current_user: User,
+    filename: str,
+    file_path: str,
+    file_size: int,
+    namespace: str,
+    enable_change_detection: bool,
+    task_id: Optional[str] = None
+) -> dict:
+    """
+    单个已落盘文件的入库: 创建主文档 -> 进程池提取 + 流式分块/向量化/写库 -> 变更检测
 
-        # 第一步：创建主文档记录
+    失败时清理已写入的文档并标记上传任务失败, 以 HTTPException 抛出
+    """
+    upload_task = None
+    document_id = None
+    completed = False
+    try:
+        # 第一步：创建主文档记录, 全文在分块入库完成后写入
         main_document = Document(
-            content=text_content,  # 完整文档内容
+            content="",
             embedding=None,  # 主文档暂时不需要嵌入向量（如果需要可以为完整文档生成）
             doc_metadata=json.dumps({
-                "filename": file.filename,
-                "size": len(file_content),
-                "type": file.filename.split('.')[-1],
-                "total_chunks": len(text_chunks),
-                "total_size": len(text_content),
+                "filename": filename,
+                "size": file_size,
+                "type": filename.split('.')[-1],
                 "user_id": current_user.id,
                 "namespace": namespace  # 添加领域信息到元数据
             }),
-            filename=file.filename,
+            filename=filename,
             created_at=str(datetime.now()),
             namespace=namespace  # 设置领域
         )
@@ -254,6 +158,7 @@ async def upload_document(
         db.add(main_document)
         db.commit()
         db.refresh(main_document)
+        document_id = main_document.id
 
         # 创建用户文档关联
         user_document = UserDocument(
@@ -263,50 +168,70 @@ async def upload_document(
         )
         db.add(user_document)
 
-        # 第二步：为每个块创建文档块记录
-        document_chunk_ids = []
-        for i, chunk in enumerate(text_chunks):
-            try:
-                # 生成向量嵌入
-                embedding = await embedding_service.create_embedding(chunk)
-
-                # 创建文档块记录，关联到主文档
-                document_chunk = DocumentChunk(
-                    document_id=main_document.id,  # ✅ 关联到主文档
-                    content=chunk,
-                    embedding=embedding,  # 直接使用向量列表（PostgreSQL ARRAY类型）
-                    chunk_metadata=json.dumps({
-                        "chunk_index": i,
-                        "total_chunks": len(text_chunks),
-                        "chunk_size": len(chunk)
-                    }),
-                    chunk_index=i,
-                    filename=f"{file.filename}_chunk_{i+1}",
-                    created_at=str(datetime.now()),
-                    namespace=namespace  # 设置文档块的领域
-                )
+        # 登记上传任务, 使 /ws/task/{task_id} 可以订阅进度
+        if task_id:
+            upload_task = IndexTask(
+                task_id=task_id,
+                doc_id=main_document.id,
+                task_type='upload',
+                status='processing',
+                started_at=datetime.now(),
+                task_metadata={"filename": filename, "namespace": namespace}
+            )
+            db.add(upload_task)
+        db.commit()
 
-                # 保存到数据库
-                db.add(document_chunk)
-                db.flush()  # flush 会分配 ID 但不会提交事务
-                # 获取ID后立即追加，避免使用 refresh 读取 vector 字段
-                document_chunk_ids.append(document_chunk.id)
-                db.commit()  # 提交事务
+        async def on_progress(info: dict):
+            # 提取进度占 0-95%, 剩余留给收尾
+            await _send_upload_progress(
+                task_id,
+                min(95, info["percent"]),
+                f"已写入 {info['chunks']} 个分块",
+                details=info
+            )
 
-            except Exception as chunk_error:
-                logger.error(f"Error processing chunk {i+1}: {chunk_error}")
-                # 继续处理其他块，不中断整个上传过程
-                continue
+        # 第二步：流式提取 -> 分块 -> 向量化 (先查嵌入存储) -> 分批写库
+        pipeline = StreamingIngestionPipeline(db)
+        try:
+            ingestion = await pipeline.run(
+                main_document,
+                iter_document_text_parallel(file_path, filename),
+                progress=on_progress
+            )
+        except ExtractionError as e:
+            logger.error(f"Error extracting text from {filename}: {e}")
+            raise HTTPException(status_code=400, detail=f"Failed to extract text from {filename}")
+
+        # 验证文本内容(文本已在提取时清理过)
+        if not ingestion.content.strip() or not ingestion.chunk_ids:
+            raise HTTPException(status_code=400, detail="No text content found in file")
 
-        if not document_chunk_ids:
-            raise HTTPException(status_code=500, detail="Failed to process any chunks")
+        logger.info(f"Document streamed into {len(ingestion.chunk_ids)} chunks")
+
+        # 第三步：回填主文档全文、统计与变更追踪字段
+        modified_at = datetime.now()
+        main_document.content = ingestion.content
+        main_document.content_hash = ingestion.content_hash
+        main_document.file_size = file_size
+        main_document.file_modified_at = modified_at
+        main_document.doc_metadata = json.dumps({
+            "filename": filename,
+            "size": file_size,
+            "type": filename.split('.')[-1],
+            "total_chunks": len(ingestion.chunk_ids),
+            "total_size": ingestion.text_length,
+            "user_id": current_user.id,
+            "namespace": namespace
+        })
+        db.commit()
+        document_chunk_ids = ingestion.chunk_ids
 
         # 集成变更检测功能
         change_detection_result = None
         if enable_change_detection:
             try:
-                # 计算文档内容哈希
-                content_hash = calculate_content_hash(text_content)
+                # 文档内容哈希已在流式提取时增量计算
+                content_hash = ingestion.content_hash
 
                 # 创建或更新索引记录
                 from app.models.index_record import DocumentIndexRecord
@@ -316,7 +241,8 @@ async def upload_document(
                     DocumentIndexRecord.doc_id == main_document.id
                 ).first()
 
-                now = datetime.now()
+                # 与主文档的变更追踪字段一致, 分层变更检测可按 (大小, 修改时间) 直接判定未变更
+                now = modified_at
 
                 if existing_record:
                     # 更新现有记录
@@ -325,7 +251,7 @@ async def upload_document(
                     existing_record.chunk_count = len(document_chunk_ids)
                     existing_record.vector_count = len(document_chunk_ids)
                     existing_record.indexed_at = now
-                    existing_record.file_size = len(file_content)
+                    existing_record.file_size = file_size
                     existing_record.file_modified_at = now
                     existing_record.index_version += 1
 
@@ -343,7 +269,7 @@ async def upload_document(
                         chunk_count=len(document_chunk_ids),
                         vector_count=len(document_chunk_ids),
                         indexed_at=now,
-                        file_size=len(file_content),
+                        file_size=file_size,
                         file_modified_at=now,
                         index_version=1,
                         namespace=namespace
@@ -371,21 +297,182 @@ async def upload_document(
             "message": "Document uploaded successfully",
             "document_id": main_document.id,  # 主文档ID
             "document_chunk_ids": document_chunk_ids,  # 所有分块ID
-            "filename": file.filename,
+            "filename": filename,
             "chunks_created": len(document_chunk_ids),
-            "total_chunks": len(text_chunks)
+            "total_chunks": len(document_chunk_ids),
+            "embedding_dedup": ingestion.embedding.to_dict(),
+            "duration_seconds": round(ingestion.duration_seconds, 3)
         }
 
         if change_detection_result:
             response["change_detection"] = change_detection_result
 
+        completed = True
+        if upload_task:
+            upload_task.status = 'completed'
+            upload_task.progress = 100
+            upload_task.completed_at = datetime.now()
+            db.commit()
+            from app.routers.websocket import task_progress_manager
+            await task_progress_manager.send_task_complete(
+                task_id, True, f"文档 {filename} 上传完成",
+                result={"document_id": main_document.id, "chunks_created": len(document_chunk_ids)}
+            )
+
         return response
 
+    except HTTPException as e:
+        if not completed:
+            _discard_upload(db, document_id)
+            await _fail_upload_task(db, upload_task, e.detail)
+        raise
+    except Exception as e:
+        logger.error(f"Error uploading document {filename}: {e}")
+        if not completed:
+            _discard_upload(db, document_id)
+            await _fail_upload_task(db, upload_task, str(e))
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@router.post("/upload")
+async def upload_document(
+    file: UploadFile = File(...),
+    namespace: str = Form('default'),  # 新增领域参数,从表单接收
+    enable_change_detection: bool = Form(True),  # 是否启用变更检测
+    task_id: Optional[str] = Form(None),  # 可选: 进度推送任务ID, 通过 /ws/task/{task_id} 订阅
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_document_upload)
+):
+    """
+    处理文档上传请求,支持PDF, TXT, DOCX格式,并可选启用变更检测
+
+    文本在进程池中提取 (大 PDF 按页并行), 分块、向量化、写库全程流式进行,
+    峰值内存与文件大小无关; 提供 task_id 时, 每批分块写入后通过任务 WebSocket 推送进度。
+    """
+    file_path = None
+    try:
+        # 验证文件类型
+        if not file.filename.endswith(SUPPORTED_EXTENSIONS):
+            raise HTTPException(
+                status_code=400,
+                detail="Only PDF, TXT, DOC and DOCX files are supported"
+            )
+
+        # 保存临时文件 (同时校验大小)
+        file_path, file_size = await _save_upload_to_temp(file)
+
+        return await _ingest_uploaded_file(
+            db, current_user, file.filename, file_path, file_size,
+            namespace, enable_change_detection, task_id
+        )
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    finally:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+@router.post("/upload/batch")
+async def upload_multiple_documents(
+    files: List[UploadFile] = File(...),
+    namespace: str = Form('default'),
+    enable_change_detection: bool = Form(True),
+    current_user: User = Depends(require_document_upload)
+):
+    """
+    多文件上传
+
+    各文件并发入库 (每个文件使用独立的数据库会话), 文本提取在进程池中跨核并行;
+    单个文件失败不影响其他文件, 结果按上传顺序返回。
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    if len(files) > UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum allowed: {UPLOAD_MAX_FILES}")
+
+    start_time = time.perf_counter()
+    saved = []  # (filename, file_path, file_size) 或 (filename, None, error)
+    try:
+        for file in files:
+            if not file.filename.endswith(SUPPORTED_EXTENSIONS):
+                saved.append((file.filename, None, "Only PDF, TXT, DOC and DOCX files are supported"))
+                continue
+            try:
+                file_path, file_size = await _save_upload_to_temp(file)
+                saved.append((file.filename, file_path, file_size))
+            except HTTPException as e:
+                saved.append((file.filename, None, e.detail))
+
+        # 并发数与提取进程数一致, 避免同时打开过多数据库会话
+        semaphore = asyncio.Semaphore(get_worker_count())
+        session_factory = get_session_local()
+
+        async def ingest(filename: str, file_path: Optional[str], size_or_error):
+            if file_path is None:
+                return {"filename": filename, "success": False, "error": size_or_error}
+            async with semaphore:
+                file_db = session_factory()
+                try:
+                    data = await _ingest_uploaded_file(
+                        file_db, current_user, filename, file_path, size_or_error,
+                        namespace, enable_change_detection
+                    )
+                    return {"filename": filename, "success": True, **data}
+                except HTTPException as e:
+                    return {"filename": filename, "success": False, "error": e.detail}
+                finally:
+                    file_db.close()
+
+        results = await asyncio.gather(*(ingest(*item) for item in saved))
+
+    finally:
+        for _, file_path, _ in saved:
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+
+    succeeded = sum(1 for r in results if r["success"])
+    logger.info(f"多文件上传完成: 总数={len(files)}, 成功={succeeded}, "
+               f"耗时={time.perf_counter() - start_time:.2f}s")
+
+    return {
+        "message": f"Uploaded {succeeded} of {len(files)} documents",
+        "total": len(files),
+        "succeeded": succeeded,
+        "failed": len(files) - succeeded,
+        "duration_seconds": round(time.perf_counter() - start_time, 3),
+        "results": results
+    }
+
+def _discard_upload(db: Session, document_id: Optional[int]):
+    """上传失败时清理已写入的主文档、分块和用户关联"""
+    if document_id is None:
+        return
+    try:
+        db.rollback()
+        db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete(synchronize_session=False)
+        db.query(UserDocument).filter(UserDocument.document_id == document_id).delete(synchronize_session=False)
+        db.query(Document).filter(Document.id == document_id).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"清理失败上传的文档 {document_id} 出错: {e}")
+
+async def _fail_upload_task(db: Session, upload_task: Optional[IndexTask], error: str):
+    """标记上传任务失败并推送错误"""
+    if upload_task is None:
+        return
+    try:
+        db.rollback()
+        upload_task.status = 'failed'
+        upload_task.error_message = str(error)
+        upload_task.completed_at = datetime.now()
+        db.commit()
+        from app.routers.websocket import task_progress_manager
+        await task_progress_manager.send_task_error(upload_task.task_id, str(error))
+    except Exception as e:
+        logger.error(f"更新上传任务状态失败: {e}")
 
 def _get_user_documents(db: Session, current_user: User, search_query: str = None):
     """
@@ -451,46 +538,6 @@ def _format_document_response(doc: Document) -> DocumentResponse:
     )
 
 
-def _cascade_delete_document(db: Session, document_id: int) -> dict:
-    """
-    级联删除文档及其相关数据(内部辅助函数)
-
-    Args:
-        db: 数据库会话
-        document_id: 文档ID
-
-    Returns:
-        删除统计信息字典
-    """
-    # 1. 删除所有文档块 (document_chunks)
-    document_chunks = db.query(DocumentChunk).filter(
-        DocumentChunk.document_id == document_id
-    ).all()
-    chunks_count = len(document_chunks)
-    for chunk in document_chunks:
-        db.delete(chunk)
-
-    # 2. 删除所有用户文档关联 (user_documents)
-    user_documents = db.query(UserDocument).filter(
-        UserDocument.document_id == document_id
-    ).all()
-    associations_count = len(user_documents)
-    for ud in user_documents:
-        db.delete(ud)
-
-    # 3. 删除主文档 (documents)
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if document:
-        db.delete(document)
-
-    logger.info(f"文档 {document_id}: 删除了 {chunks_count} 个文档块, {associations_count} 个用户关联")
-
-    return {
-        "deleted_chunks": chunks_count,
-        "deleted_user_associations": associations_count
-    }
-
-
 @router.get("/documents", response_model=list[DocumentResponse])
 async def list_documents(
     db: Session = Depends(get_db),
@@ -606,12 +653,12 @@ async def delete_document(
             raise HTTPException(status_code=404, detail="Document not found")
 
         # 执行级联删除
-        delete_stats = _cascade_delete_document(db, document_id)
-        db.commit()
+        delete_stats = delete_documents(db, [document_id])
 
         return {
             "message": "Document deleted successfully",
-            **delete_stats
+            "deleted_chunks": delete_stats["deleted_chunks"],
+            "deleted_user_associations": delete_stats["deleted_user_associations"]
         }
     except HTTPException:
         raise
@@ -636,44 +683,34 @@ async def delete_multiple_documents(
         from app.services.auth import auth_service
         is_admin = auth_service.has_permission(db, current_user, "user_management")
 
-        # 统计变量
-        total_deleted = 0
-        total_chunks = 0
-        total_associations = 0
-        failed_ids = []
+        ids = list(dict.fromkeys(ids))
 
-        for doc_id in ids:
-            try:
-                # 权限检查(非管理员只能删除自己的文档)
-                if not is_admin:
-                    user_document = db.query(UserDocument).filter(
-                        UserDocument.user_id == current_user.id,
-                        UserDocument.document_id == doc_id
-                    ).first()
-                    if not user_document:
-                        logger.warning(f"用户 {current_user.id} 无权删除文档 {doc_id}")
-                        failed_ids.append(doc_id)
-                        continue
-
-                # 检查文档是否存在
-                document = db.query(Document).filter(Document.id == doc_id).first()
-                if not document:
-                    logger.warning(f"文档 {doc_id} 不存在")
-                    failed_ids.append(doc_id)
-                    continue
-
-                # 执行级联删除
-                delete_stats = _cascade_delete_document(db, doc_id)
-                total_deleted += 1
-                total_chunks += delete_stats["deleted_chunks"]
-                total_associations += delete_stats["deleted_user_associations"]
-
-            except Exception as e:
-                logger.error(f"删除文档 {doc_id} 失败: {e}")
-                failed_ids.append(doc_id)
-                continue
-
-        db.commit()
+        # 存在性与权限检查各一次查询(非管理员只能删除自己的文档)
+        allowed = {
+            row.id for row in db.query(Document.id).filter(Document.id.in_(ids))
+        }
+        missing = [doc_id for doc_id in ids if doc_id not in allowed]
+        if missing:
+            logger.warning(f"文档不存在: {missing}")
+        if not is_admin:
+            owned = {
+                row.document_id for row in db.query(UserDocument.document_id).filter(
+                    UserDocument.user_id == current_user.id,
+                    UserDocument.document_id.in_(allowed)
+                )
+            }
+            denied = [doc_id for doc_id in ids if doc_id in allowed and doc_id not in owned]
+            if denied:
+                logger.warning(f"用户 {current_user.id} 无权删除文档 {denied}")
+            allowed &= owned
+
+        # 执行级联删除: 每张表一条语句
+        delete_stats = delete_documents(db, [doc_id for doc_id in ids if doc_id in allowed])
+        total_deleted = len(delete_stats["deleted_documents"])
+        total_chunks = delete_stats["deleted_chunks"]
+        total_associations = delete_stats["deleted_user_associations"]
+        deleted = set(delete_stats["deleted_documents"])
+        failed_ids = [doc_id for doc_id in ids if doc_id not in deleted]
 
         result = {
             "message": f"Successfully deleted {total_deleted} documents",
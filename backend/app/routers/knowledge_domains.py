@@ -296,20 +296,29 @@ async def delete_domain(
 @router.get("/knowledge-domains/{namespace}/stats", response_model=KnowledgeDomainStatsResponse)
 async def get_domain_stats(
     namespace: str,
+    refresh: bool = QueryParam(False, description="是否忽略统计缓存强制刷新"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     获取知识领域统计信息
 
+    统计数据来自共享的领域统计提供者, 默认带短 TTL 缓存;
+    vector_index 为该领域部分向量索引的实时状态 (构建阶段、进度、大小)
+
     Args:
         namespace: 领域命名空间
+        refresh: 是否忽略缓存强制刷新
 
     Returns:
         KnowledgeDomainStatsResponse: 统计信息
     """
     try:
-        stats = domain_service.get_domain_stats(db=db, namespace=namespace)
+        stats = domain_service.get_domain_stats(
+            db=db,
+            namespace=namespace,
+            force_refresh=refresh
+        )
         return stats
 
     except DomainNotFoundError as e:
@@ -107,6 +107,41 @@ async def search_logs(
         logger.error(f"搜索日志失败: {e}")
         raise HTTPException(status_code=500, detail=f"搜索日志失败: {str(e)}")
 
+@router.get("/logs/profiles")
+async def get_profiles():
+    """获取慢请求采样文件列表"""
+    try:
+        profiles = log_manager.get_profiles()
+        return [
+            {
+                "request_id": profile["request_id"],
+                "name": profile["name"],
+                "path": profile["path"],
+                "size": profile["size"],
+                "modified": profile["modified"].isoformat()
+            }
+            for profile in profiles
+        ]
+    except Exception as e:
+        logger.error(f"获取采样文件列表失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取采样文件列表失败: {str(e)}")
+
+@router.get("/logs/profiles/{request_id}")
+async def read_profile(
+    request_id: str,
+    top: int = Query(50, description="返回样本数最多的前N条栈，0表示全部")
+):
+    """读取指定请求的折叠栈采样"""
+    try:
+        profile = log_manager.read_profile(request_id, top)
+    except Exception as e:
+        logger.error(f"读取采样文件失败: {e}")
+        raise HTTPException(status_code=500, detail=f"读取采样文件失败: {str(e)}")
+    
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"未找到请求 {request_id} 的采样文件")
+    return profile
+
 @router.get("/logs/statistics", response_model=LogStatistics)
 async def get_log_statistics():
     """获取日志统计信息"""
@@ -12,8 +12,16 @@ from sqlalchemy.orm import Session
 
 from app.database.connection import get_db
 from app.models.database import User
-from app.middleware.auth import require_query_ask
+from app.middleware.auth import require_query_ask, require_admin
 from app.services.query_performance import get_query_performance_analyzer
+from app.monitoring.tracing import trace_store
+from app.monitoring.memory import (
+    memory_registry,
+    get_process_memory,
+    start_tracemalloc,
+    stop_tracemalloc,
+    tracemalloc_top,
+)
 from app.config.logging_config import get_app_logger
 
 router = APIRouter()
@@ -173,6 +181,70 @@ async def get_system_health(
         )
 
 
+@router.get("/performance/memory")
+async def get_memory_usage(
+    tracemalloc_limit: int = Query(default=0, ge=0, le=100, description="tracemalloc Top-N 数量, 0 表示不返回"),
+    current_user: User = Depends(require_admin)
+):
+    """
+    获取进程内缓存、索引和模型的内存估算
+    """
+    try:
+        import asyncio
+
+        # 估算可能遍历较大结构, 放到线程池执行
+        loop = asyncio.get_event_loop()
+        components = await loop.run_in_executor(None, memory_registry.collect)
+        process = get_process_memory()
+
+        by_category: Dict[str, int] = {}
+        for component in components:
+            by_category[component["category"]] = by_category.get(component["category"], 0) + component["bytes"]
+
+        tracked_bytes = sum(by_category.values())
+        data = {
+            "process": process,
+            "tracked_bytes": tracked_bytes,
+            "untracked_bytes": max(0, process.get("rss_bytes", 0) - tracked_bytes),
+            "by_category": by_category,
+            "components": components
+        }
+
+        if tracemalloc_limit > 0:
+            data["tracemalloc"] = tracemalloc_top(limit=tracemalloc_limit)
+
+        return {
+            "success": True,
+            "data": data
+        }
+
+    except Exception as e:
+        logger.error(f"获取内存统计失败: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取内存统计失败: {str(e)}"
+        )
+
+
+@router.post("/performance/memory/tracemalloc")
+async def toggle_tracemalloc(
+    enable: bool = Query(..., description="开启或关闭 tracemalloc"),
+    frames: int = Query(default=10, ge=1, le=50, description="记录的调用栈深度"),
+    current_user: User = Depends(require_admin)
+):
+    """
+    开启或关闭 tracemalloc (开启后有明显的内存与性能开销, 排查完毕应及时关闭)
+    """
+    changed = start_tracemalloc(frames) if enable else stop_tracemalloc()
+    return {
+        "success": True,
+        "data": {
+            "tracing": enable,
+            "changed": changed
+        }
+    }
+
+
 @router.post("/performance/cleanup-logs")
 async def cleanup_logs(
     days: int = Query(default=30, description="保留天数"),
@@ -249,4 +321,43 @@ async def get_log_retention(
         raise HTTPException(
             status_code=500,
             detail=f"获取日志保留信息失败: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/performance/traces")
+async def list_traces(
+    limit: int = Query(default=50, ge=1, le=200, description="返回数量限制"),
+    current_user: User = Depends(require_query_ask)
+):
+    """
+    获取最近记录的请求追踪列表
+
+    只有携带 X-Debug-Trace 请求头的请求才会被记录
+    """
+    return {
+        "success": True,
+        "data": {
+            "traces": trace_store.list_recent(limit=limit)
+        }
+    }
+
+
+@router.get("/performance/trace/{request_id}")
+async def get_trace(
+    request_id: str,
+    current_user: User = Depends(require_query_ask)
+):
+    """
+    获取指定请求的完整 span 树
+    """
+    trace = trace_store.get(request_id)
+    if trace is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"未找到请求 {request_id} 的追踪记录 (请求需携带 X-Debug-Trace 头)"
+        )
+
+    return {
+        "success": True,
+        "data": trace.to_dict()
+    }
@@ -130,7 +130,8 @@ async def query_documents_v2(
                 method=request.retrieval_method,
                 alpha=request.alpha,
                 similarity_threshold=request.similarity_threshold,
-                db=db
+                db=db,
+                search_params=request.search_params()
             )
 
             # 转换为ChunkResult格式
@@ -149,7 +150,8 @@ async def query_documents_v2(
                 namespaces=request.namespaces,
                 top_k=request.top_k,
                 alpha=request.alpha,
-                db=db
+                db=db,
+                search_params=request.search_params()
             )
 
             # 转换为ChunkResult并获取分组结果
@@ -312,7 +314,8 @@ async def _cross_domain_retrieval(
     namespaces: Optional[List[str]],
     top_k: int,
     alpha: float,
-    db: Session
+    db: Session,
+    search_params: Optional[Dict[str, Any]] = None
 ) -> List[Tuple[Dict[str, Any], str, float]]:
     """
     跨领域检索
@@ -324,6 +327,7 @@ async def _cross_domain_retrieval(
         top_k: 返回结果数
         alpha: 混合检索权重
         db: 数据库会话
+        search_params: 进程内向量索引的检索参数(nprobe / ef_search)
 
     Returns:
         (chunk, namespace, score) 元组列表
@@ -337,7 +341,8 @@ async def _cross_domain_retrieval(
             classification_result=classification_result,
             top_k=top_k,
             alpha=alpha,
-            include_all_domains=(namespaces is None)
+            include_all_domains=(namespaces is None),
+            search_params=search_params
         )
         logger.info(f"使用分类权重: {weights}")
     else:
@@ -346,7 +351,8 @@ async def _cross_domain_retrieval(
             query=query,
             namespaces=namespaces,
             top_k=top_k,
-            alpha=alpha
+            alpha=alpha,
+            search_params=search_params
         )
 
     return results
@@ -359,7 +365,8 @@ async def _single_domain_retrieval(
     method: str,
     alpha: float,
     similarity_threshold: float,
-    db: Session
+    db: Session,
+    search_params: Optional[Dict[str, Any]] = None
 ) -> List[Dict[str, Any]]:
     """
     单领域检索
@@ -372,6 +379,7 @@ async def _single_domain_retrieval(
         alpha: 混合检索权重
         similarity_threshold: 相似度阈值
         db: 数据库会话
+        search_params: 进程内向量索引的检索参数(nprobe / ef_search)
 
     Returns:
         检索结果列表
@@ -383,7 +391,8 @@ async def _single_domain_retrieval(
             query_text=query,
             namespace=namespace,
             top_k=top_k,
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            search_params=search_params
         )
 
     elif method == 'bm25':
@@ -404,7 +413,8 @@ async def _single_domain_retrieval(
             query=query,
             namespace=namespace,
             top_k=top_k,
-            alpha=alpha
+            alpha=alpha,
+            search_params=search_params
         )
 
     else:
@@ -77,6 +77,20 @@ class KnowledgeDomainListResponse(BaseModel):
     total: int = Field(..., description="总数")
 
 
+class NamespaceVectorIndexStatusResponse(BaseModel):
+    """领域部分向量索引状态"""
+    index_name: str = Field(..., description="索引名")
+    state: str = Field(..., description="状态: disabled/missing/queued/building/ready/invalid/failed")
+    size_bytes: int = Field(0, description="索引大小(字节)")
+    phase: Optional[str] = Field(None, description="构建阶段 (pg_stat_progress_create_index.phase)")
+    progress: Optional[float] = Field(None, description="当前阶段完成比例 (0-1)")
+    blocks_done: Optional[int] = None
+    blocks_total: Optional[int] = None
+    tuples_done: Optional[int] = None
+    tuples_total: Optional[int] = None
+    error: Optional[str] = Field(None, description="构建失败原因")
+
+
 class KnowledgeDomainStatsResponse(BaseModel):
     """知识领域统计信息"""
     namespace: str
@@ -84,6 +98,7 @@ class KnowledgeDomainStatsResponse(BaseModel):
     chunk_count: int = Field(0, description="分块数量")
     avg_confidence: float = Field(0.0, description="平均分类置信度")
     recent_uploads: int = Field(0, description="最近7天上传数")
+    vector_index: Optional[NamespaceVectorIndexStatusResponse] = Field(None, description="部分向量索引状态")
 
 
 # ==================== 领域路由规则 Schemas ====================
@@ -39,8 +39,25 @@ class QueryRequestV2(BaseModel):
         None,
         description="额外过滤条件"
     )
+    nprobe: Optional[int] = Field(
+        None,
+        description="IVF 向量索引扫描的列表数(越大召回率越高、越慢, None=使用服务端默认值)",
+        ge=1,
+        le=4096
+    )
+    ef_search: Optional[int] = Field(
+        None,
+        description="HNSW 向量索引的检索候选集大小(None=使用服务端默认值)",
+        ge=1,
+        le=4096
+    )
     session_id: Optional[str] = Field(None, description="会话ID")
 
+    def search_params(self) -> Dict[str, Any]:
+        """进程内向量索引的检索参数 (只包含请求中指定的项)"""
+        params = {'nprobe': self.nprobe, 'ef_search': self.ef_search}
+        return {key: value for key, value in params.items() if value is not None}
+
     class Config:
         json_schema_extra = {
             "example": {
@@ -8,6 +8,8 @@ from sqlalchemy.orm import Session
 from app.services.embedding import embedding_service
 from app.models.database import Document
 from app.config.logging_config import get_app_logger
+from app.services.text_chunker import chunk_texts
+from app.services.vector_index import parse_embedding
 import numpy as np
 import re
 from typing import List, Dict, Tuple
@@ -54,18 +56,11 @@ class AdvancedRetrievalService:
             document_embeddings = []
             
             for row in result:
-                # 处理 embedding 字段 - 可能是字符串格式
-                embedding = row.embedding
-                if isinstance(embedding, str):
-                    try:
-                        import json
-                        embedding = json.loads(embedding)
-                    except:
-                        try:
-                            embedding = eval(embedding)
-                        except:
-                            logger.warning(f"无法解析文档 {row.id} 的 embedding")
-                            embedding = None
+                # 全局类型转换器已解码为 float32 ndarray; 旧表的数组/文本格式同样解析
+                embedding = parse_embedding(row.embedding)
+                if embedding is None:
+                    logger.warning(f"无法解析文档 {row.id} 的 embedding")
+                    continue
 
                 documents.append({
                     "id": row.id,
@@ -75,8 +70,7 @@ class AdvancedRetrievalService:
                     "created_at": row.created_at,
                     "embedding": embedding
                 })
-                if embedding is not None:
-                    document_embeddings.append(embedding)
+                document_embeddings.append(embedding)
             
             if not documents:
                 logger.info("没有找到任何文档")
@@ -96,6 +90,7 @@ class AdvancedRetrievalService:
             result_documents = []
             for i, (doc_idx, similarity) in enumerate(similarities[:top_k]):
                 doc = documents[doc_idx].copy()
+                doc['embedding'] = doc['embedding'].tolist()  # 结果会序列化到查询历史
                 doc['similarity'] = similarity
                 result_documents.append(doc)
             
@@ -112,40 +107,13 @@ class AdvancedRetrievalService:
         
         Args:
             content: 文档内容
-            chunk_size: 分块大小
+            chunk_size: 分块大小, 默认使用统一分块器的配置 (CHUNK_MAX_SIZE)
             overlap: 重叠大小
             
         Returns:
             List[str]: 文档块列表
         """
-        chunk_size = chunk_size or self.chunk_size
-        overlap = overlap or self.overlap_size
-        
-        if len(content) <= chunk_size:
-            return [content]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(content):
-            end = start + chunk_size
-            
-            # 如果不是最后一块，尝试在句号或换行处分割
-            if end < len(content):
-                # 寻找最近的句号或换行
-                for i in range(end, max(start + chunk_size // 2, end - 100), -1):
-                    if content[i] in ['。', '\n', '！', '？']:
-                        end = i + 1
-                        break
-            
-            chunk = content[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            # 下一块的开始位置，考虑重叠
-            start = max(start + 1, end - overlap)
-        
-        return chunks
+        return chunk_texts(content, chunk_size, overlap)
     
     async def retrieve_relevant_chunks(self, db: Session, query_text: str, top_k: int = None) -> List[Dict]:
         """
@@ -178,18 +146,11 @@ class AdvancedRetrievalService:
             chunks_with_embeddings = []
 
             for row in result:
-                # 处理 embedding 字段 - 可能是字符串格式
-                embedding = row.embedding
-                if isinstance(embedding, str):
-                    try:
-                        import json
-                        embedding = json.loads(embedding)
-                    except:
-                        try:
-                            embedding = eval(embedding)
-                        except:
-                            logger.warning(f"无法解析文档块 {row.id} 的 embedding")
-                            continue  # 跳过无法解析的块
+                # 全局类型转换器已解码为 float32 ndarray; 旧表的数组/文本格式同样解析
+                embedding = parse_embedding(row.embedding)
+                if embedding is None:
+                    logger.warning(f"无法解析文档块 {row.id} 的 embedding")
+                    continue  # 跳过无法解析的块
 
                 chunks_with_embeddings.append({
                     "id": row.id,
@@ -243,6 +204,7 @@ class AdvancedRetrievalService:
             result_chunks = []
             for i, (chunk_idx, similarity) in enumerate(similarity_pairs[:top_k]):
                 chunk = chunks_with_embeddings[chunk_idx].copy()
+                chunk['embedding'] = chunk['embedding'].tolist()  # 结果会序列化到查询历史
                 chunk['similarity'] = similarity
                 result_chunks.append(chunk)
 
@@ -5,13 +5,23 @@ BM25 关键词检索服务
 使用 jieba 进行中文分词
 """
 import time
-from typing import List, Dict, Tuple, Optional, Any
+import weakref
+from typing import List, Dict, Tuple, Optional, Any, Iterable
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.config.logging_config import get_app_logger
+from app.monitoring.tracing import trace_span
+from app.monitoring.memory import memory_registry, deep_sizeof
+from app.services.index_invalidation import register_index_invalidation_hook
 
 logger = get_app_logger()
 
+# 已删除块占语料的比例超过该值时丢弃缓存, 下次检索重建 (IDF 等统计随之更新)
+REBUILD_DELETED_RATIO = 0.2
+
+# 持有缓存索引的实例, 用于删除文档后立即剔除被删除的块
+_live_instances: "weakref.WeakSet[BM25Retrieval]" = weakref.WeakSet()
+
 
 class BM25Retrieval:
     """BM25 关键词检索"""
@@ -22,7 +32,15 @@ class BM25Retrieval:
         self._corpus = {}
         self._bm25 = {}
         self._last_update = {}
+        self._deleted: Dict[str, set] = {}
         self.cache_ttl = 300  # 5分钟缓存
+        _live_instances.add(self)
+
+        # 每个实例各自持有语料和索引, 按弱引用合并统计
+        memory_registry.register_object(
+            "bm25.corpus", self, category="index",
+            sizeof=lambda inst: deep_sizeof(inst._bm25) + deep_sizeof(inst._corpus)
+        )
 
     def _tokenize(self, text: str) -> List[str]:
         """
@@ -99,6 +117,7 @@ class BM25Retrieval:
                 self._corpus[namespace] = chunk_ids
                 self._bm25[namespace] = BM25Okapi(corpus)
                 self._last_update[namespace] = now
+                self._deleted.pop(namespace, None)
 
                 logger.info(f"BM25索引构建完成: {namespace}, 文档数: {len(chunk_ids)}")
 
@@ -131,7 +150,8 @@ class BM25Retrieval:
         try:
             # 1. 确保索引已初始化
             if namespace not in self._bm25:
-                await self.initialize_for_namespace(namespace)
+                with trace_span("bm25_build", namespace=namespace):
+                    await self.initialize_for_namespace(namespace)
 
             if namespace not in self._bm25 or self._bm25[namespace] is None:
                 logger.warning(f"BM25索引不可用: {namespace}")
@@ -140,17 +160,22 @@ class BM25Retrieval:
             if len(self._corpus[namespace]) == 0:
                 return []
 
-            # 2. 分词查询
-            query_tokens = self._tokenize(query)
-            logger.info(f"查询分词: {query_tokens}")
+            with trace_span("bm25_score", namespace=namespace):
+                # 2. 分词查询
+                query_tokens = self._tokenize(query)
+                logger.info(f"查询分词: {query_tokens}")
 
-            # 3. BM25 评分
-            scores = self._bm25[namespace].get_scores(query_tokens)
+                # 3. BM25 评分
+                scores = self._bm25[namespace].get_scores(query_tokens)
 
-            # 4. 排序并获取 Top-K
-            chunk_ids = self._corpus[namespace]
-            scored_chunks = list(zip(chunk_ids, scores))
-            scored_chunks.sort(key=lambda x: x[1], reverse=True)
+                # 4. 排序并获取 Top-K (跳过已删除的块)
+                chunk_ids = self._corpus[namespace]
+                deleted = self._deleted.get(namespace)
+                scored_chunks = [
+                    (chunk_id, score) for chunk_id, score in zip(chunk_ids, scores)
+                    if not deleted or chunk_id not in deleted
+                ]
+                scored_chunks.sort(key=lambda x: x[1], reverse=True)
 
             top_chunk_ids = [chunk_id for chunk_id, score in scored_chunks[:top_k]]
 
@@ -204,16 +229,45 @@ class BM25Retrieval:
             namespace: 指定领域(None=清除所有)
         """
         if namespace:
-            self._corpus.pop(namespace, None)
-            self._bm25.pop(namespace, None)
-            self._last_update.pop(namespace, None)
+            self._drop_namespace(namespace)
             logger.info(f"已清除领域 '{namespace}' 的BM25缓存")
         else:
             self._corpus.clear()
             self._bm25.clear()
             self._last_update.clear()
+            self._deleted.clear()
             logger.info("已清除所有BM25缓存")
 
+    def _drop_namespace(self, namespace: str):
+        self._corpus.pop(namespace, None)
+        self._bm25.pop(namespace, None)
+        self._last_update.pop(namespace, None)
+        self._deleted.pop(namespace, None)
+
+    def remove_chunks(self, namespace: str, chunk_ids: Iterable[int]):
+        """
+        从缓存的索引中剔除已删除的块
+
+        BM25Okapi 不支持增量删除, 被删除的块在检索时跳过;
+        已删除比例超过 REBUILD_DELETED_RATIO 时丢弃缓存, 下次检索重建
+        """
+        corpus = self._corpus.get(namespace)
+        if not corpus:
+            return
+        deleted = self._deleted.setdefault(namespace, set())
+        deleted.update(chunk_ids)
+        if len(deleted) > len(corpus) * REBUILD_DELETED_RATIO:
+            self._drop_namespace(namespace)
+            logger.info(f"领域 '{namespace}' 已删除块过多, BM25缓存将在下次检索时重建")
+
+
+@register_index_invalidation_hook
+def invalidate_bm25_chunks(doc_ids: List[int], chunk_ids_by_namespace: Dict[str, List[int]]):
+    """索引失效回调: 从所有实例的缓存中剔除已删除的块"""
+    for instance in list(_live_instances):
+        for namespace, chunk_ids in chunk_ids_by_namespace.items():
+            instance.remove_chunks(namespace, chunk_ids)
+
 
 # 全局实例
 bm25_retrieval_service = None
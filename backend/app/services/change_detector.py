@@ -1,20 +1,92 @@
 """
 文档变更检测服务
 用于识别需要增量更新的文档
+
+分层检测 (scan_changes), 全文不离开数据库:
+1. (大小, 修改时间) 与索引记录一致的文档直接判为未变更
+2. 其余文档比较 documents.content_hash 与 document_index_records.content_hash
+3. 尚无内容哈希的文档在数据库中分批补算 md5 并写回, 再比较
+前两层与分类统计在一条 SQL 中完成。
 """
 import hashlib
 import os
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, text
 import logging
 
+from app.config.settings import CHANGE_HASH_BATCH, CHANGE_HASH_READ_SIZE
 from app.models.database import Document
 from app.models.index_record import DocumentIndexRecord
+from app.monitoring.metrics import record_change_scan
 
 logger = logging.getLogger(__name__)
 
+# 第 1/2 层: 一次连接查询完成分类, 只返回需要进一步处理的文档ID
+_TIER_SQL = text("""
+    WITH classified AS (
+        SELECT d.id,
+               CASE
+                   WHEN r.doc_id IS NULL THEN 'new'
+                   WHEN d.file_modified_at IS NOT NULL
+                        AND d.file_size = r.file_size
+                        AND d.file_modified_at = r.file_modified_at THEN 'stat'
+                   WHEN d.content_hash IS NULL THEN 'unhashed'
+                   WHEN d.content_hash = r.content_hash THEN 'hash'
+                   ELSE 'modified'
+               END AS tier
+        FROM documents d
+        LEFT JOIN document_index_records r ON r.doc_id = d.id
+        WHERE CAST(:namespace AS VARCHAR) IS NULL OR d.namespace = :namespace
+    )
+    SELECT tier,
+           COUNT(*) AS count,
+           ARRAY_AGG(id ORDER BY id) FILTER (WHERE tier IN ('new', 'modified', 'unhashed')) AS ids
+    FROM classified
+    GROUP BY tier
+""")
+
+# 第 3 层: 在数据库中补算内容哈希 (与 compute_content_hash 一致: 空内容为空串) 并与索引记录比较
+_REHASH_SQL = text("""
+    UPDATE documents d
+    SET content_hash = CASE WHEN d.content IS NULL OR d.content = '' THEN '' ELSE md5(d.content) END
+    FROM document_index_records r
+    WHERE r.doc_id = d.id AND d.id = ANY(:ids)
+    RETURNING d.id, d.content_hash = r.content_hash AS unchanged
+""")
+
+
+@dataclass
+class ChangeScan:
+    """一次分层变更检测的结果"""
+    new_doc_ids: List[int] = field(default_factory=list)
+    modified_doc_ids: List[int] = field(default_factory=list)
+    tiers: Dict[str, int] = field(default_factory=dict)
+    duration_seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.tiers.values())
+
+    @property
+    def unchanged(self) -> int:
+        return self.total - len(self.new_doc_ids) - len(self.modified_doc_ids)
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.total / self.duration_seconds if self.duration_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'documents': self.total,
+            'tiers': dict(self.tiers),
+            'duration_seconds': round(self.duration_seconds, 3),
+            'docs_per_second': round(self.docs_per_second, 1)
+        }
+
 
 class ChangeDetector:
     """文档变更检测器"""
@@ -38,12 +110,13 @@ class ChangeDetector:
         return hashlib.md5(content.encode('utf-8')).hexdigest()
 
     @staticmethod
-    def compute_file_hash(file_path: str) -> str:
+    def compute_file_hash(file_path: str, read_size: int = CHANGE_HASH_READ_SIZE) -> str:
         """
         计算文件的MD5哈希值
 
         Args:
             file_path: 文件路径
+            read_size: 每次读取的字节数
 
         Returns:
             MD5哈希值（十六进制字符串）
@@ -53,9 +126,15 @@ class ChangeDetector:
 
         hash_md5 = hashlib.md5()
         try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
+            # 复用同一块缓冲区, 大块读取减少系统调用
+            buffer = bytearray(read_size)
+            view = memoryview(buffer)
+            with open(file_path, "rb", buffering=0) as f:
+                while True:
+                    size = f.readinto(buffer)
+                    if not size:
+                        break
+                    hash_md5.update(view[:size])
             return hash_md5.hexdigest()
         except Exception as e:
             logger.error(f"计算文件哈希失败 {file_path}: {e}")
@@ -140,24 +219,28 @@ class ChangeDetector:
         modified_docs = []
         unchanged_docs = []
 
+        # 一次查询取出全部索引记录的哈希
+        indexed_hashes = dict(self.db.query(
+            DocumentIndexRecord.doc_id,
+            DocumentIndexRecord.content_hash
+        ).filter(
+            DocumentIndexRecord.doc_id.in_([doc.id for doc in documents])
+        ).all()) if documents else {}
+
         for doc in documents:
             # 计算当前内容哈希
             current_hash = self.compute_content_hash(doc.content or "")
+            indexed_hash = indexed_hashes.get(doc.id)
 
-            # 查询索引记录
-            index_record = self.db.query(DocumentIndexRecord).filter(
-                DocumentIndexRecord.doc_id == doc.id
-            ).first()
-
-            if not index_record:
+            if indexed_hash is None:
                 # 没有索引记录，视为新文档
                 new_docs.append(doc)
                 logger.debug(f"新文档: {doc.filename} (ID:{doc.id})")
-            elif index_record.content_hash != current_hash:
+            elif indexed_hash != current_hash:
                 # 哈希值不匹配，内容已变更
                 modified_docs.append(doc)
                 logger.debug(f"修改文档: {doc.filename} (ID:{doc.id}) "
-                           f"旧哈希:{index_record.content_hash[:8]}... "
+                           f"旧哈希:{indexed_hash[:8]}... "
                            f"新哈希:{current_hash[:8]}...")
             else:
                 # 哈希值匹配，内容未变更
@@ -168,6 +251,54 @@ class ChangeDetector:
 
         return new_docs, modified_docs, unchanged_docs
 
+    def scan_changes(self, namespace: Optional[str] = None) -> ChangeScan:
+        """
+        分层检测变更 (全文不离开数据库)
+
+        Args:
+            namespace: 领域命名空间筛选
+
+        Returns:
+            ChangeScan: 新增/修改的文档ID、各层判定数量与扫描速率
+        """
+        start = time.perf_counter()
+        scan = ChangeScan()
+        unhashed: List[int] = []
+
+        for row in self.db.execute(_TIER_SQL, {'namespace': namespace}):
+            scan.tiers[row.tier] = row.count
+            ids = list(row.ids or [])
+            if row.tier == 'new':
+                scan.new_doc_ids = ids
+            elif row.tier == 'modified':
+                scan.modified_doc_ids = ids
+            elif row.tier == 'unhashed':
+                unhashed = ids
+
+        # 第 3 层: 只为幸存的无哈希文档补算哈希
+        if unhashed:
+            rehashed_unchanged = 0
+            for i in range(0, len(unhashed), CHANGE_HASH_BATCH):
+                rows = self.db.execute(_REHASH_SQL, {'ids': unhashed[i:i + CHANGE_HASH_BATCH]}).all()
+                for row in rows:
+                    if row.unchanged:
+                        rehashed_unchanged += 1
+                    else:
+                        scan.modified_doc_ids.append(row.id)
+            self.db.commit()
+            scan.tiers.pop('unhashed', None)
+            scan.tiers['rehashed'] = len(unhashed)
+            scan.modified_doc_ids.sort()
+            logger.info(f"补算内容哈希: {len(unhashed)} 个文档, 未变更={rehashed_unchanged}")
+
+        scan.duration_seconds = time.perf_counter() - start
+        record_change_scan(scan.tiers, scan.duration_seconds)
+
+        logger.info(f"分层变更检测: 文档={scan.total}, 新增={len(scan.new_doc_ids)}, "
+                   f"修改={len(scan.modified_doc_ids)}, 分层={scan.tiers}, "
+                   f"耗时={scan.duration_seconds:.3f}s, 速率={scan.docs_per_second:.0f} docs/s")
+        return scan
+
     def detect_deleted_documents(self, namespace: Optional[str] = None) -> List[int]:
         """
         检测已删除的文档（有索引记录但文档不存在）
@@ -178,22 +309,15 @@ class ChangeDetector:
         Returns:
             已删除文档的ID列表
         """
-        # 查询所有索引记录
-        query = self.db.query(DocumentIndexRecord.doc_id)
+        # 反连接: 有索引记录但文档已不存在
+        query = self.db.query(DocumentIndexRecord.doc_id).outerjoin(
+            Document,
+            Document.id == DocumentIndexRecord.doc_id
+        ).filter(Document.id.is_(None))
         if namespace:
             query = query.filter(DocumentIndexRecord.namespace == namespace)
 
-        indexed_doc_ids = {record.doc_id for record in query.all()}
-
-        # 查询实际存在的文档
-        doc_query = self.db.query(Document.id)
-        if namespace:
-            doc_query = doc_query.filter(Document.namespace == namespace)
-
-        existing_doc_ids = {doc.id for doc in doc_query.all()}
-
-        # 找出差异
-        deleted_doc_ids = list(indexed_doc_ids - existing_doc_ids)
+        deleted_doc_ids = [row.doc_id for row in query.all()]
 
         if deleted_doc_ids:
             logger.info(f"检测到 {len(deleted_doc_ids)} 个已删除的文档")
@@ -251,29 +375,24 @@ class ChangeDetector:
         Returns:
             变更摘要字典
         """
-        # 先基于时间戳快速筛选
-        candidates = self.detect_changes_by_timestamp(namespace=namespace)
-
-        # 再基于哈希精确检测
-        new_docs, modified_docs, unchanged_docs = self.detect_changes_by_hash(
-            documents=candidates,
-            namespace=namespace
-        )
+        # 分层检测: (大小, 修改时间) -> 内容哈希 -> 补算哈希
+        scan = self.scan_changes(namespace=namespace)
 
         # 检测已删除的文档
         deleted_doc_ids = self.detect_deleted_documents(namespace=namespace)
 
         summary = {
-            'total_candidates': len(candidates),
-            'new_documents': len(new_docs),
-            'modified_documents': len(modified_docs),
-            'unchanged_documents': len(unchanged_docs),
+            'total_candidates': scan.total,
+            'new_documents': len(scan.new_doc_ids),
+            'modified_documents': len(scan.modified_doc_ids),
+            'unchanged_documents': scan.unchanged,
             'deleted_documents': len(deleted_doc_ids),
-            'needs_update': len(new_docs) + len(modified_docs),
+            'needs_update': len(scan.new_doc_ids) + len(scan.modified_doc_ids),
             'needs_delete': len(deleted_doc_ids),
-            'new_doc_ids': [doc.id for doc in new_docs],
-            'modified_doc_ids': [doc.id for doc in modified_docs],
+            'new_doc_ids': scan.new_doc_ids,
+            'modified_doc_ids': scan.modified_doc_ids,
             'deleted_doc_ids': deleted_doc_ids,
+            'scan': scan.to_dict(),
             'namespace': namespace or 'all',
             'detected_at': datetime.now().isoformat()
         }
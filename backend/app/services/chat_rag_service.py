@@ -15,6 +15,7 @@ from app.services.bm25_retrieval import BM25Retrieval
 from app.services.llm_service import LLMService
 from app.services.query_performance import QueryPerformanceLogger
 from app.services.query_rewriter import QueryRewriter
+from app.monitoring.tracing import trace_span
 
 logger = logging.getLogger(__name__)
 
@@ -123,11 +124,12 @@ class ChatRAGService:
             if enable_query_rewrite and chat_history and len(chat_history) > 0:
                 rewrite_start = time.time()
                 try:
-                    rewritten_query, query_was_rewritten = await self.query_rewriter.rewrite_with_context(
-                        current_query=query,
-                        chat_history=chat_history,
-                        max_history=5  # 最多使用5轮历史
-                    )
+                    with trace_span("rewrite"):
+                        rewritten_query, query_was_rewritten = await self.query_rewriter.rewrite_with_context(
+                            current_query=query,
+                            chat_history=chat_history,
+                            max_history=5  # 最多使用5轮历史
+                        )
                     rewrite_latency = (time.time() - rewrite_start) * 1000
                     performance_data['rewrite_latency_ms'] = rewrite_latency
                     performance_data['query_rewritten'] = query_was_rewritten
@@ -157,10 +159,11 @@ class ChatRAGService:
             else:
                 # 执行自动领域分类(使用重写后的查询)
                 classification_start = time.time()
-                classification_result = await self._classify_query(
-                    query=rewritten_query,  # 使用重写后的查询
-                    previous_domain=previous_domain  # 传递上一轮领域
-                )
+                with trace_span("classify"):
+                    classification_result = await self._classify_query(
+                        query=rewritten_query,  # 使用重写后的查询
+                        previous_domain=previous_domain  # 传递上一轮领域
+                    )
                 classification_latency = (time.time() - classification_start) * 1000
                 performance_data['classification_latency_ms'] = classification_latency
 
@@ -189,21 +192,22 @@ class ChatRAGService:
             # Step 2: 执行检索(使用重写后的查询)
             retrieval_start = time.time()
 
-            if retrieval_mode == 'single':
-                # 单领域检索
-                results, error = await self._single_domain_search(
-                    query=rewritten_query,  # 使用重写后的查询
-                    namespace=target_namespace,
-                    top_k=top_k,
-                    alpha=alpha  # 传递alpha参数
-                )
-            else:
-                # 跨领域检索
-                results, error = await self._cross_domain_search(
-                    query=rewritten_query,  # 使用重写后的查询
-                    top_k=top_k,
-                    alpha=alpha  # 传递alpha参数
-                )
+            with trace_span("retrieval", mode=retrieval_mode):
+                if retrieval_mode == 'single':
+                    # 单领域检索
+                    results, error = await self._single_domain_search(
+                        query=rewritten_query,  # 使用重写后的查询
+                        namespace=target_namespace,
+                        top_k=top_k,
+                        alpha=alpha  # 传递alpha参数
+                    )
+                else:
+                    # 跨领域检索
+                    results, error = await self._cross_domain_search(
+                        query=rewritten_query,  # 使用重写后的查询
+                        top_k=top_k,
+                        alpha=alpha  # 传递alpha参数
+                    )
 
             retrieval_latency = (time.time() - retrieval_start) * 1000
             performance_data['retrieval_latency_ms'] = retrieval_latency
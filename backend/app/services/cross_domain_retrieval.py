@@ -29,7 +29,8 @@ class CrossDomainRetrieval:
         namespaces: Optional[List[str]] = None,
         top_k: int = 10,
         domain_weights: Optional[Dict[str, float]] = None,
-        alpha: float = 0.5
+        alpha: float = 0.5,
+        search_params: Optional[Dict[str, Any]] = None
     ) -> List[Tuple[Dict[str, Any], str, float]]:
         """
         跨领域检索
@@ -40,6 +41,7 @@ class CrossDomainRetrieval:
             top_k: 总返回结果数
             domain_weights: 领域权重字典
             alpha: 混合检索权重
+            search_params: 进程内向量索引的检索参数
 
         Returns:
             List[Tuple[chunk, namespace, score]]: 文档块、领域、得分的元组列表
@@ -66,7 +68,8 @@ class CrossDomainRetrieval:
                     query=query,
                     namespace=namespace,
                     top_k=top_k * 2,  # 每个领域获取更多结果用于融合
-                    alpha=alpha
+                    alpha=alpha,
+                    search_params=search_params
                 )
                 tasks.append(task)
 
@@ -140,7 +143,8 @@ class CrossDomainRetrieval:
         query: str,
         namespace: str,
         top_k: int,
-        alpha: float
+        alpha: float,
+        search_params: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         单领域检索(内部方法)
@@ -150,6 +154,7 @@ class CrossDomainRetrieval:
             namespace: 领域命名空间
             top_k: 返回结果数
             alpha: 混合检索权重
+            search_params: 进程内向量索引的检索参数
 
         Returns:
             文档块列表
@@ -159,7 +164,8 @@ class CrossDomainRetrieval:
                 query=query,
                 namespace=namespace,
                 top_k=top_k,
-                alpha=alpha
+                alpha=alpha,
+                search_params=search_params
             )
         except Exception as e:
             logger.error(f"领域 {namespace} 检索失败: {e}")
@@ -227,7 +233,8 @@ class CrossDomainRetrieval:
         classification_result: DomainClassificationResult,
         top_k: int = 10,
         alpha: float = 0.5,
-        include_all_domains: bool = False
+        include_all_domains: bool = False,
+        search_params: Optional[Dict[str, Any]] = None
     ) -> Tuple[List[Tuple[Dict, str, float]], Dict[str, float]]:
         """
         基于分类结果进行跨领域检索
@@ -238,6 +245,7 @@ class CrossDomainRetrieval:
             top_k: 返回结果数
             alpha: 混合检索权重
             include_all_domains: 是否包含所有活跃领域
+            search_params: 进程内向量索引的检索参数
 
         Returns:
             (检索结果, 使用的权重)
@@ -263,7 +271,8 @@ class CrossDomainRetrieval:
             namespaces=namespaces,
             top_k=top_k,
             domain_weights=weights,
-            alpha=alpha
+            alpha=alpha,
+            search_params=search_params
         )
 
         return results, weights
@@ -0,0 +1,646 @@
+"""
+目录监听服务 (持续增量索引)
+
+监听 WATCH_DIRECTORIES 中按命名空间配置的源目录, 文件新增/修改/删除后几秒内入库并提交索引:
+
+1. 事件源: Linux 上使用 inotify (ctypes 直接调用, 无额外依赖), 其他平台或 inotify 不可用时
+   退化为按 (大小, 修改时间) 的轮询
+2. 防抖: 同一批事件在静默 WATCH_DEBOUNCE_SECONDS 后提交, 持续有事件时最多等待
+   WATCH_MAX_DELAY_SECONDS, 同一文件的多次事件只处理最后一次
+3. 入库: (大小, 修改时间) 与文档记录一致的文件直接跳过; 其余在提取进程池中提取文本,
+   内容哈希未变时只更新文件元数据
+4. 提交: 变更文档合并为一个 batch_index_task, 已在待执行任务中的文档不重复提交
+
+启动时与 inotify 队列溢出时做一次全量对账, 之后不再周期性全量扫描。
+
+用法:
+    python -m app.services.directory_watcher
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import signal
+import struct
+import sys
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session, undefer_group
+
+from app.config.logging_config import get_app_logger
+from app.config.settings import (
+    CELERY_ENABLED,
+    EXTRACT_TIMEOUT,
+    WATCH_BACKEND,
+    WATCH_DEBOUNCE_SECONDS,
+    WATCH_DIRECTORIES,
+    WATCH_MAX_BATCH,
+    WATCH_MAX_DELAY_SECONDS,
+    WATCH_OWNER_USER_ID,
+    WATCH_POLL_INTERVAL,
+    WATCH_PRIORITY,
+)
+from app.models.database import Document, UserDocument
+from app.monitoring.metrics import record_watch_batch
+from app.services.change_detector import ChangeDetector
+from app.services.document_deletion import delete_documents
+from app.services.document_extractor import SUPPORTED_EXTENSIONS, extract_file_text
+
+logger = get_app_logger()
+
+# 事件类型
+CHANGED = 'changed'
+DELETED = 'deleted'
+RESCAN = 'rescan'
+
+FileEvent = Tuple[str, str]  # (事件类型, 路径)
+
+
+def parse_watch_directories(value: str = WATCH_DIRECTORIES) -> Dict[str, str]:
+    """
+    解析 "命名空间:目录,命名空间:目录" 配置
+
+    Returns:
+        规范化的绝对目录 -> 命名空间
+    """
+    roots: Dict[str, str] = {}
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        namespace, sep, directory = item.partition(':')
+        if not sep:
+            namespace, directory = 'default', item
+        roots[os.path.realpath(os.path.expanduser(directory.strip()))] = namespace.strip() or 'default'
+    return roots
+
+
+def is_watched_file(path: str) -> bool:
+    """是否为需要入库的文件 (支持的扩展名, 排除隐藏文件与编辑器临时文件)"""
+    name = os.path.basename(path)
+    if name.startswith(('.', '~$')) or name.endswith(('~', '.swp', '.tmp', '.part')):
+        return False
+    return name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def iter_files(root: str) -> Iterable[str]:
+    """遍历目录下需要入库的文件"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if is_watched_file(path):
+                yield path
+
+
+def file_stat(path: str) -> Optional[Tuple[int, datetime]]:
+    """文件 (大小, 修改时间), 文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, datetime.fromtimestamp(st.st_mtime)
+
+
+class EventDebouncer:
+    """
+    文件事件防抖与合并
+
+    - 同一路径只保留最后一次事件
+    - 距最后一个事件超过 debounce 秒, 或距第一个事件超过 max_delay 秒,
+      或累计文件数达到 max_batch 时, 批次就绪
+    """
+
+    def __init__(
+        self,
+        debounce: float = WATCH_DEBOUNCE_SECONDS,
+        max_delay: float = WATCH_MAX_DELAY_SECONDS,
+        max_batch: int = WATCH_MAX_BATCH
+    ):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.pending: Dict[str, str] = {}
+        self.rescan = False
+        self.first_event_at: Optional[float] = None
+        self.last_event_at: Optional[float] = None
+
+    def add(self, events: Iterable[FileEvent], now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        for kind, path in events:
+            if kind == RESCAN:
+                self.rescan = True
+            else:
+                self.pending[path] = kind
+            if self.first_event_at is None:
+                self.first_event_at = now
+            self.last_event_at = now
+
+    def ready(self, now: Optional[float] = None) -> bool:
+        if self.first_event_at is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return (
+            now - self.last_event_at >= self.debounce
+            or now - self.first_event_at >= self.max_delay
+            or len(self.pending) >= self.max_batch
+        )
+
+    def timeout(self, now: Optional[float] = None) -> float:
+        """距下一次可能就绪的秒数 (用于事件源的等待超时)"""
+        if self.first_event_at is None:
+            return self.debounce
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(
+            self.last_event_at + self.debounce - now,
+            self.first_event_at + self.max_delay - now
+        ))
+
+    def drain(self) -> Tuple[Dict[str, str], bool, float]:
+        """
+        取出当前批次
+
+        Returns:
+            (路径 -> 事件类型, 是否需要全量对账, 批次首个事件的 monotonic 时间)
+        """
+        batch, rescan, first = self.pending, self.rescan, self.first_event_at
+        self.pending = {}
+        self.rescan = False
+        self.first_event_at = None
+        self.last_event_at = None
+        return batch, rescan, first
+
+
+class PollingSource:
+    """轮询事件源: 定期按 (大小, 修改时间纳秒) 比对目录快照"""
+
+    name = 'polling'
+
+    def __init__(self, roots: Iterable[str], interval: float = WATCH_POLL_INTERVAL):
+        self.roots = list(roots)
+        self.interval = interval
+        self.snapshot = self._scan()
+        self.next_scan = time.monotonic() + interval
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for root in self.roots:
+            for path in iter_files(root):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout: float) -> List[FileEvent]:
+        wait = self.next_scan - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if time.monotonic() < self.next_scan:
+                return []
+
+        current = self._scan()
+        self.next_scan = time.monotonic() + self.interval
+        events = [(CHANGED, path) for path, sig in current.items() if self.snapshot.get(path) != sig]
+        events += [(DELETED, path) for path in self.snapshot if path not in current]
+        self.snapshot = current
+        return events
+
+    def close(self):
+        pass
+
+
+class InotifySource:
+    """
+    inotify 事件源 (Linux)
+
+    递归为每个子目录添加 watch; 只关心写完成 (IN_CLOSE_WRITE)、移入/移出、创建与删除,
+    不处理写入过程中的 IN_MODIFY。新建目录中在 watch 生效前写入的文件通过遍历补发事件。
+    """
+
+    name = 'inotify'
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+                  | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    _HEADER = struct.Struct('iIII')
+
+    def __init__(self, roots: Iterable[str]):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify 仅支持 Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.watches: Dict[int, str] = {}
+        for root in roots:
+            self._watch_tree(root)
+
+    def _watch_dir(self, path: str):
+        wd = self._add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            # 目录数超过 max_user_watches 时无法继续监听, 交给调用方退化为轮询
+            raise OSError(errno, f"inotify_add_watch 失败: {path}")
+        self.watches[wd] = path
+
+    def _watch_tree(self, root: str):
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            self._watch_dir(dirpath)
+
+    def poll(self, timeout: float) -> List[FileEvent]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events: List[FileEvent] = []
+        offset = 0
+        while offset + self._HEADER.size <= len(data):
+            wd, mask, _cookie, length = self._HEADER.unpack_from(data, offset)
+            offset += self._HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                events.append((RESCAN, ''))
+                continue
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            base = self.watches.get(wd)
+            if base is None:
+                continue
+            path = os.path.join(base, name) if name else base
+
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    try:
+                        self._watch_tree(path)
+                    except OSError as e:
+                        logger.warning(f"监听新目录失败, 触发全量对账: {e}")
+                        events.append((RESCAN, ''))
+                    events.extend((CHANGED, file_path) for file_path in iter_files(path))
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    # 目录整体移除: 按路径前缀删除其下文档
+                    events.append((DELETED, path + os.sep))
+            elif mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                events.append((DELETED, path + os.sep))
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                if is_watched_file(path):
+                    events.append((CHANGED, path))
+            elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                if is_watched_file(path):
+                    events.append((DELETED, path))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_event_source(roots: Iterable[str], backend: str = WATCH_BACKEND):
+    """按配置创建事件源, inotify 不可用时退化为轮询"""
+    roots = list(roots)
+    if backend in ('auto', 'inotify'):
+        try:
+            return InotifySource(roots)
+        except (OSError, AttributeError) as e:
+            if backend == 'inotify':
+                raise
+            logger.warning(f"inotify 不可用, 使用轮询监听: {e}")
+    return PollingSource(roots)
+
+
+class DirectoryWatcher:
+    """目录监听器: 防抖合并文件事件, 同步文档并提交批量索引"""
+
+    def __init__(self, roots: Dict[str, str], session_factory, source=None):
+        """
+        Args:
+            roots: 绝对目录 -> 命名空间
+            session_factory: 返回数据库会话的工厂函数
+            source: 事件源 (默认按 WATCH_BACKEND 创建)
+        """
+        self.roots = roots
+        self.session_factory = session_factory
+        self.source = source or create_event_source(roots)
+        self.debouncer = EventDebouncer()
+        self.running = False
+
+    def namespace_for(self, path: str) -> Optional[str]:
+        """路径所属的命名空间 (最长目录前缀匹配)"""
+        best = None
+        for root, namespace in self.roots.items():
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                if best is None or len(root) > len(best[0]):
+                    best = (root, namespace)
+        return best[1] if best else None
+
+    def run(self):
+        """事件循环, 直到 stop() 或收到 SIGTERM/SIGINT"""
+        self.running = True
+        logger.info(f"目录监听已启动: 事件源={self.source.name}, 目录={self.roots}")
+        self.debouncer.add([(RESCAN, '')])
+        try:
+            while self.running:
+                self.debouncer.add(self.source.poll(self.debouncer.timeout()))
+                if self.debouncer.ready():
+                    batch, rescan, first_event_at = self.debouncer.drain()
+                    try:
+                        self.process(batch, rescan, first_event_at)
+                    except Exception as e:
+                        logger.error(f"处理文件事件失败: {e}", exc_info=True)
+        finally:
+            self.source.close()
+            logger.info("目录监听已停止")
+
+    def stop(self, *_):
+        self.running = False
+
+    def process(self, batch: Dict[str, str], rescan: bool, first_event_at: Optional[float] = None) -> Dict:
+        """
+        处理一批文件事件
+
+        Returns:
+            处理结果: 各动作的文件数与提交的任务
+        """
+        db: Session = self.session_factory()
+        try:
+            if rescan:
+                batch = {**self._reconcile(db), **batch}
+            if not batch:
+                return {}
+
+            changed = sorted(path for path, kind in batch.items() if kind == CHANGED)
+            deleted = [path for path, kind in batch.items() if kind == DELETED]
+
+            actions: Dict[Tuple[str, str], int] = {}
+            doc_ids, failed = self._sync_files(db, changed, actions)
+            self._delete_paths(db, deleted, actions)
+
+            task = self._enqueue(db, doc_ids) if doc_ids else None
+            latency = time.monotonic() - first_event_at if first_event_at else 0.0
+            record_watch_batch(actions, latency)
+
+            logger.info(
+                f"目录监听批次: 变更文件={len(changed)}, 删除={len(deleted)}, "
+                f"入库文档={len(doc_ids)}, 失败={failed}, 提交任务={task}, 事件到提交={latency:.2f}s"
+            )
+            return {
+                'actions': {f"{namespace}:{action}": count for (namespace, action), count in actions.items()},
+                'doc_ids': doc_ids,
+                'task': task
+            }
+        finally:
+            db.close()
+
+    def _reconcile(self, db: Session) -> Dict[str, str]:
+        """全量对账: 比较磁盘文件与文档记录的 (大小, 修改时间)"""
+        known = {
+            row.source_path: (row.file_size, row.file_modified_at)
+            for row in db.query(
+                Document.source_path, Document.file_size, Document.file_modified_at
+            ).filter(Document.source_path.isnot(None))
+            if self.namespace_for(row.source_path)
+        }
+
+        events: Dict[str, str] = {}
+        seen: Set[str] = set()
+        for root in self.roots:
+            for path in iter_files(root):
+                seen.add(path)
+                if known.get(path) != file_stat(path):
+                    events[path] = CHANGED
+        for path in known:
+            if path not in seen:
+                events[path] = DELETED
+
+        logger.info(f"目录对账: 磁盘文件={len(seen)}, 已入库={len(known)}, 需处理={len(events)}")
+        return events
+
+    def _sync_files(
+        self,
+        db: Session,
+        paths: List[str],
+        actions: Dict[Tuple[str, str], int]
+    ) -> Tuple[List[int], int]:
+        """
+        把变更文件同步为文档 (提取进程池并行提取)
+
+        Returns:
+            (内容有变化需要索引的文档ID, 失败文件数)
+        """
+        def count(path: str, action: str):
+            key = (self.namespace_for(path) or 'default', action)
+            actions[key] = actions.get(key, 0) + 1
+
+        docs = {
+            doc.source_path: doc
+            for doc in db.query(Document).options(undefer_group('tracking')).filter(
+                Document.source_path.in_(paths)
+            )
+        } if paths else {}
+
+        # 元数据未变的文件 (如 touch 前后一致、重复事件) 直接跳过
+        stats = {path: file_stat(path) for path in paths}
+        todo = []
+        for path in paths:
+            stat = stats[path]
+            doc = docs.get(path)
+            if stat is None:
+                continue
+            if doc is not None and (doc.file_size, doc.file_modified_at) == stat:
+                count(path, 'unchanged')
+                continue
+            todo.append(path)
+
+        from app.services.extraction_pool import discard_extraction_pool, submit_extraction
+        futures = {path: submit_extraction(extract_file_text, path, os.path.basename(path)) for path in todo}
+
+        doc_ids: List[int] = []
+        failed = 0
+        new_docs: List[Document] = []
+        for path in todo:
+            pool, future = futures[path]
+            try:
+                content, _ = future.result(timeout=EXTRACT_TIMEOUT)
+            except Exception as e:
+                if isinstance(e, (BrokenProcessPool, FuturesTimeoutError)):
+                    # worker 异常退出或被卡住: 换新进程池, 否则之后的同步全部失败
+                    discard_extraction_pool(pool, f"{type(e).__name__}: {path}")
+                logger.warning(f"提取文件失败, 跳过: {path}: {e}")
+                count(path, 'failed')
+                failed += 1
+                continue
+
+            if not content.strip():
+                logger.warning(f"文件没有文本内容, 跳过: {path}")
+                count(path, 'failed')
+                failed += 1
+                continue
+
+            file_size, modified_at = stats[path]
+            content_hash = ChangeDetector.compute_content_hash(content)
+            doc = docs.get(path)
+            if doc is None:
+                doc = Document(
+                    content=content,
+                    doc_metadata=json.dumps({
+                        "filename": os.path.basename(path),
+                        "size": file_size,
+                        "type": path.rsplit('.', 1)[-1].lower(),
+                        "source_path": path,
+                        "namespace": self.namespace_for(path)
+                    }),
+                    filename=os.path.basename(path),
+                    created_at=str(datetime.now()),
+                    namespace=self.namespace_for(path) or 'default',
+                    source_path=path,
+                    content_hash=content_hash,
+                    file_size=file_size,
+                    file_modified_at=modified_at
+                )
+                db.add(doc)
+                new_docs.append(doc)
+                count(path, 'indexed')
+                continue
+
+            doc.file_size = file_size
+            doc.file_modified_at = modified_at
+            if doc.content_hash == content_hash:
+                count(path, 'unchanged')
+                continue
+            doc.content = content
+            doc.content_hash = content_hash
+            doc_ids.append(doc.id)
+            count(path, 'indexed')
+
+        db.flush()
+        doc_ids.extend(doc.id for doc in new_docs)
+        if WATCH_OWNER_USER_ID:
+            db.add_all([
+                UserDocument(user_id=WATCH_OWNER_USER_ID, document_id=doc.id, permission_level="write")
+                for doc in new_docs
+            ])
+        db.commit()
+        return doc_ids, failed
+
+    def _delete_paths(self, db: Session, paths: List[str], actions: Dict[Tuple[str, str], int]):
+        """删除源文件已不存在的文档 (路径以分隔符结尾表示整个目录)"""
+        if not paths:
+            return
+        query = db.query(Document.id, Document.source_path)
+        exact = [path for path in paths if not path.endswith(os.sep)]
+        prefixes = [path for path in paths if path.endswith(os.sep)]
+        rows = query.filter(Document.source_path.in_(exact)).all() if exact else []
+        for prefix in prefixes:
+            rows += query.filter(Document.source_path.startswith(prefix, autoescape=True)).all()
+
+        # 事件与处理之间文件可能被重新创建
+        rows = [row for row in rows if file_stat(row.source_path) is None]
+        doc_ids = list({row.id for row in rows})
+        if not doc_ids:
+            return
+
+        delete_documents(db, doc_ids)
+
+        for row in rows:
+            key = (self.namespace_for(row.source_path) or 'default', 'deleted')
+            actions[key] = actions.get(key, 0) + 1
+        logger.info(f"源文件已删除, 移除 {len(doc_ids)} 个文档")
+
+    def _enqueue(self, db: Session, doc_ids: List[int]) -> Optional[str]:
+        """
+        提交批量索引 (去重: 已在待执行任务中的文档不重复提交)
+
+        待执行 (pending) 的任务运行时会读取最新内容, 处理中的任务可能已读取旧内容, 不参与去重
+        """
+        queued = {
+            row[0] for row in db.execute(text("""
+                SELECT DISTINCT (jsonb_array_elements_text(metadata->'doc_ids'))::int
+                FROM index_tasks
+                WHERE status = 'pending'
+                  AND task_type = 'batch'
+                  AND jsonb_typeof(metadata->'doc_ids') = 'array'
+            """))
+        }
+        doc_ids = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id not in queued]
+        if not doc_ids:
+            logger.info("变更文档均已在待执行任务中, 不重复提交")
+            return None
+
+        if not CELERY_ENABLED:
+            from app.services.incremental_indexer import create_incremental_indexer
+            create_incremental_indexer(db).batch_index_documents(doc_ids)
+            return 'sync'
+
+        from app.services.index_scheduler import get_index_scheduler
+        from app.tasks.index_tasks import batch_index_task
+        submitted = get_index_scheduler(db).submit(
+            batch_index_task,
+            args=[doc_ids, WATCH_OWNER_USER_ID or None],
+            task_type='batch',
+            doc_ids=doc_ids,
+            priority=WATCH_PRIORITY,
+            user_id=WATCH_OWNER_USER_ID or None
+        )
+        return submitted['task_id']
+
+
+def main():
+    roots = parse_watch_directories()
+    if not roots:
+        logger.error("未配置 WATCH_DIRECTORIES, 目录监听未启动")
+        return 1
+    missing = [root for root in roots if not os.path.isdir(root)]
+    if missing:
+        logger.error(f"监听目录不存在: {missing}")
+        return 1
+
+    from app.database.connection import get_session_local
+    from app.services.extraction_pool import shutdown_extraction_pool
+
+    watcher = DirectoryWatcher(roots, get_session_local())
+    signal.signal(signal.SIGTERM, watcher.stop)
+    signal.signal(signal.SIGINT, watcher.stop)
+    try:
+        watcher.run()
+    finally:
+        shutdown_extraction_pool()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+文档批量级联删除
+
+按集合删除 (WHERE document_id = ANY(:ids)), 无论删除多少文档, 每张表只执行一条语句:
+
+1. document_chunks: RETURNING 被删除块的 ID 与命名空间, 用于索引失效
+2. user_documents
+3. documents: 索引记录、变更历史等由外键 ON DELETE CASCADE / SET NULL 处理
+
+所有语句在同一事务中执行, 提交后通过 invalidate_index 通知进程内检索结构剔除被删除的块。
+"""
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config.logging_config import get_app_logger
+from app.services.index_invalidation import invalidate_index
+
+logger = get_app_logger()
+
+
+def _unique_ids(doc_ids: Iterable[int]) -> List[int]:
+    return list(dict.fromkeys(int(doc_id) for doc_id in doc_ids))
+
+
+def _group_by_namespace(rows) -> Dict[str, List[int]]:
+    chunks: Dict[str, List[int]] = {}
+    for row in rows:
+        chunks.setdefault(row.namespace or 'default', []).append(row.id)
+    return chunks
+
+
+def delete_chunks(db: Session, doc_ids: Iterable[int]) -> Dict[str, List[int]]:
+    """
+    删除文档的所有块 (不提交事务)
+
+    Returns:
+        命名空间 -> 被删除的块ID
+    """
+    ids = _unique_ids(doc_ids)
+    if not ids:
+        return {}
+    rows = db.execute(
+        text("DELETE FROM document_chunks WHERE document_id = ANY(:ids) RETURNING id, namespace"),
+        {"ids": ids}
+    ).all()
+    return _group_by_namespace(rows)
+
+
+def delete_documents(db: Session, doc_ids: Iterable[int], commit: bool = True) -> Dict:
+    """
+    级联删除文档及其块、用户关联
+
+    Args:
+        db: 数据库会话
+        doc_ids: 文档ID
+        commit: 是否提交事务并触发索引失效 (False 时由调用方提交后自行调用 invalidate_index)
+
+    Returns:
+        删除统计: deleted_documents (实际删除的文档ID)、deleted_chunks、
+        deleted_user_associations、chunk_ids_by_namespace
+    """
+    ids = _unique_ids(doc_ids)
+    if not ids:
+        return {
+            "deleted_documents": [],
+            "deleted_chunks": 0,
+            "deleted_user_associations": 0,
+            "chunk_ids_by_namespace": {}
+        }
+
+    chunks = delete_chunks(db, ids)
+    associations = db.execute(
+        text("DELETE FROM user_documents WHERE document_id = ANY(:ids)"),
+        {"ids": ids}
+    ).rowcount
+    deleted = [
+        row.id for row in db.execute(
+            text("DELETE FROM documents WHERE id = ANY(:ids) RETURNING id"),
+            {"ids": ids}
+        )
+    ]
+    chunk_count = sum(len(chunk_ids) for chunk_ids in chunks.values())
+
+    if commit:
+        db.commit()
+        invalidate_index(deleted, chunks)
+
+    logger.info(f"批量删除文档: {len(deleted)} 个文档, {chunk_count} 个文档块, {associations} 个用户关联")
+    return {
+        "deleted_documents": deleted,
+        "deleted_chunks": chunk_count,
+        "deleted_user_associations": associations,
+        "chunk_ids_by_namespace": chunks
+    }
@@ -0,0 +1,149 @@
+"""
+文档文本提取服务
+
+以生成器方式逐页 (PDF) / 逐段 (DOCX) / 逐块 (TXT) 产出文本,
+调用方可以边提取边分块, 不必先拼出整篇文档。
+每个片段附带进度 (已处理单元数, 总单元数), 用于上传进度推送。
+
+本模块只依赖 PyPDF2 / python-docx, 也作为提取进程池的 worker 入口
+(count_pdf_pages / extract_pdf_pages / extract_file_text)。
+"""
+
+import re
+from typing import Iterator, List, Tuple
+
+import PyPDF2
+from docx import Document as DocxDocument
+
+# (文本片段, 已处理单元数, 总单元数)
+TextPiece = Tuple[str, int, int]
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.docx', '.doc')
+
+# TXT 文件按行读取, 每累积约这么多字符产出一次
+TXT_BLOCK_CHARS = 64 * 1024
+
+_CONTROL_CHARS = re.compile(r'[\x01-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class ExtractionError(Exception):
+    """文本提取失败"""
+    pass
+
+
+def clean_text_content(text: str) -> str:
+    """
+    清理文本内容,移除PostgreSQL不支持的字符
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        清理后的文本
+    """
+    if not text:
+        return text
+
+    # 移除 NUL 字符 (\x00) - PostgreSQL 不允许
+    text = text.replace('\x00', '')
+
+    # 移除 Unicode 替换字符 (无效UTF-8编码的占位符)
+    text = text.replace('\ufffd', '')
+
+    # 移除其他控制字符(保留换行、制表符等常用字符)
+    # 控制字符范围: \x00-\x1f (除了 \t \n \r)
+    text = _CONTROL_CHARS.sub('', text)
+
+    return text
+
+
+def iter_pdf_text(file_path: str) -> Iterator[TextPiece]:
+    """逐页提取PDF文本"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        total = len(pdf_reader.pages)
+        for i, page in enumerate(pdf_reader.pages, 1):
+            yield clean_text_content(page.extract_text() or ""), i, total
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """获取PDF页数 (进程池 worker)"""
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """提取PDF第 [start, end) 页的文本 (进程池 worker)"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [
+            clean_text_content(pdf_reader.pages[i].extract_text() or "")
+            for i in range(start, min(end, len(pdf_reader.pages)))
+        ]
+
+
+def iter_docx_text(file_path: str) -> Iterator[TextPiece]:
+    """逐段提取DOCX文本 (先段落, 后表格, 与原整篇提取的顺序一致)"""
+    doc = DocxDocument(file_path)
+    paragraphs = doc.paragraphs
+    tables = doc.tables
+    total = len(paragraphs) + len(tables)
+
+    for i, paragraph in enumerate(paragraphs, 1):
+        yield clean_text_content(paragraph.text + "\n"), i, total
+
+    for i, table in enumerate(tables, len(paragraphs) + 1):
+        for row in table.rows:
+            row_text = "".join(cell.text + " " for cell in row.cells) + "\n"
+            yield clean_text_content(row_text), i, total
+
+
+def iter_txt_text(file_path: str) -> Iterator[TextPiece]:
+    """按块读取文本文件, 进度以字节计"""
+    with open(file_path, 'rb') as raw:
+        raw.seek(0, 2)
+        total = raw.tell()
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        lines = []
+        size = 0
+        for line in file:
+            lines.append(line)
+            size += len(line)
+            if size >= TXT_BLOCK_CHARS:
+                yield clean_text_content("".join(lines)), file.buffer.tell(), total
+                lines = []
+                size = 0
+        if lines:
+            yield clean_text_content("".join(lines)), total, total
+
+
+def iter_document_text(file_path: str, filename: str) -> Iterator[TextPiece]:
+    """
+    按文件类型选择提取器
+
+    Raises:
+        ValueError: 不支持的文件类型
+    """
+    if filename.endswith('.pdf'):
+        return iter_pdf_text(file_path)
+    if filename.endswith(('.docx', '.doc')):
+        return iter_docx_text(file_path)
+    if filename.endswith('.txt'):
+        return iter_txt_text(file_path)
+    raise ValueError(f"不支持的文件类型: {filename}")
+
+
+def extract_file_text(file_path: str, filename: str) -> Tuple[str, int]:
+    """提取完整文本并返回 (文本, 单元数) (进程池 worker)"""
+    parts = []
+    units = 0
+    for text, _, total in iter_document_text(file_path, filename):
+        parts.append(text)
+        units = total
+    return "".join(parts), units
+
+
+def extract_text(file_path: str, filename: str) -> str:
+    """提取完整文本 (一次性拼接, 线性时间)"""
+    return "".join(piece for piece, _, _ in iter_document_text(file_path, filename))
@@ -4,20 +4,27 @@
 提供知识领域的 CRUD 操作和统计功能
 用于支持多领域知识库管理
 """
+from dataclasses import asdict
 from typing import List, Optional
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, or_
 
 from app.models.knowledge_domain import KnowledgeDomain
-from app.models.document import Document, DocumentChunk
+from app.models.document import Document
+from app.services.domain_stats import get_domain_stats_provider
+from app.services.namespace_vector_index import get_namespace_index_manager
+from app.config.logging_config import get_app_logger
 from app.schemas.knowledge_domain import (
     KnowledgeDomainCreate,
     KnowledgeDomainUpdate,
     KnowledgeDomainResponse,
-    KnowledgeDomainStatsResponse
+    KnowledgeDomainStatsResponse,
+    NamespaceVectorIndexStatusResponse
 )
 
+logger = get_app_logger()
+
 
 class DomainServiceError(Exception):
     """领域服务异常基类"""
@@ -115,6 +122,8 @@ class DomainService:
         """
         创建新的知识领域
 
+        提交后在后台为该命名空间 CONCURRENTLY 构建部分 HNSW 向量索引
+
         Args:
             db: 数据库会话
             domain_data: 领域创建数据
@@ -150,6 +159,8 @@ class DomainService:
         db.add(db_domain)
         db.commit()
         db.refresh(db_domain)
+        get_domain_stats_provider().invalidate()
+        get_namespace_index_manager().create(db_domain.namespace)
 
         return db_domain
 
@@ -203,6 +214,8 @@ class DomainService:
         """
         删除知识领域
 
+        同时取消正在进行的部分向量索引构建, 并在后台删除该索引
+
         Args:
             db: 数据库会话
             namespace: 领域命名空间
@@ -234,20 +247,24 @@ class DomainService:
         # 执行删除
         db.delete(db_domain)
         db.commit()
+        get_domain_stats_provider().invalidate()
+        get_namespace_index_manager().drop(namespace)
 
         return True
 
     def get_domain_stats(
         self,
         db: Session,
-        namespace: str
+        namespace: str,
+        force_refresh: bool = False
     ) -> KnowledgeDomainStatsResponse:
         """
-        获取领域统计信息
+        获取领域统计信息 (含部分向量索引的状态、构建进度和大小)
 
         Args:
             db: 数据库会话
             namespace: 领域命名空间
+            force_refresh: 是否忽略统计缓存强制刷新
 
         Returns:
             KnowledgeDomainStatsResponse: 统计信息
@@ -260,43 +277,26 @@ class DomainService:
         if not domain:
             raise DomainNotFoundError(f"领域 '{namespace}' 不存在")
 
-        # 文档数量
-        document_count = db.query(Document).filter(
-            Document.namespace == namespace
-        ).count()
-
-        # 分块数量
-        chunk_count = db.query(DocumentChunk).filter(
-            DocumentChunk.namespace == namespace
-        ).count()
-
-        # 平均置信度
-        avg_confidence_result = db.query(
-            func.avg(Document.domain_confidence)
-        ).filter(
-            Document.namespace == namespace,
-            Document.domain_confidence > 0  # 只统计有置信度的文档
-        ).scalar()
-
-        avg_confidence = float(avg_confidence_result) if avg_confidence_result else 0.0
-
-        # 最近7天上传数
-        seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
-        # 注意: Document.created_at 是字符串类型,需要转换为字符串进行比较
-        seven_days_ago_str = seven_days_ago.isoformat()
-        recent_uploads = db.query(Document).filter(
-            and_(
-                Document.namespace == namespace,
-                Document.created_at >= seven_days_ago_str
-            )
-        ).count()
+        # 所有命名空间的统计由一次分组查询得到, 短 TTL 内共享
+        snapshot = get_domain_stats_provider().get_snapshot(db, force_refresh=force_refresh)
+        stats = snapshot.get(namespace)
+
+        # 索引状态来自系统视图, 不缓存, 便于轮询构建进度
+        vector_index = None
+        try:
+            index_status = asdict(get_namespace_index_manager().status(db, namespace))
+            index_status.pop('namespace')
+            vector_index = NamespaceVectorIndexStatusResponse(**index_status)
+        except Exception as e:
+            logger.warning(f"查询领域 '{namespace}' 的部分向量索引状态失败: {e}")
 
         return KnowledgeDomainStatsResponse(
             namespace=namespace,
-            document_count=document_count,
-            chunk_count=chunk_count,
-            avg_confidence=round(avg_confidence, 3),
-            recent_uploads=recent_uploads
+            document_count=stats.document_count,
+            chunk_count=stats.chunk_count,
+            avg_confidence=round(stats.avg_confidence, 3),
+            recent_uploads=stats.recent_uploads,
+            vector_index=vector_index
         )
 
     def get_all_domains_with_stats(
@@ -316,16 +316,12 @@ class DomainService:
         """
         domains = self.get_all_domains(db, include_inactive=include_inactive)
 
+        snapshot = get_domain_stats_provider().get_snapshot(db)
+
         results = []
         for domain in domains:
             # 获取文档和分块数量
-            document_count = db.query(Document).filter(
-                Document.namespace == domain.namespace
-            ).count()
-
-            chunk_count = db.query(DocumentChunk).filter(
-                DocumentChunk.namespace == domain.namespace
-            ).count()
+            stats = snapshot.get(domain.namespace)
 
             # 转换为响应模型
             domain_dict = {
@@ -343,8 +339,8 @@ class DomainService:
                 "metadata": domain.metadata_,
                 "created_at": domain.created_at,
                 "updated_at": domain.updated_at,
-                "document_count": document_count,
-                "chunk_count": chunk_count
+                "document_count": stats.document_count,
+                "chunk_count": stats.chunk_count
             }
 
             results.append(KnowledgeDomainResponse(**domain_dict))
@@ -0,0 +1,311 @@
+"""
+领域统计提供者 (Domain Stats Provider)
+
+一次分组查询计算所有命名空间的文档数、分块数、平均置信度和近期上传数,
+并以短 TTL 缓存结果, 供 MetricUpdater、DomainService 和 knowledge_domains 路由共享。
+
+对于超大表 (document_chunks 动辄数百万行), 可切换为估算模式:
+总行数取自 pg_class.reltuples, 各命名空间占比通过 TABLESAMPLE 抽样得到。
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config.settings import (
+    DOMAIN_STATS_TTL,
+    DOMAIN_STATS_COUNT_MODE,
+    DOMAIN_STATS_ESTIMATE_THRESHOLD,
+    DOMAIN_STATS_SAMPLE_PERCENT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class NamespaceStats:
+    """单个命名空间的统计信息"""
+    namespace: str
+    document_count: int = 0
+    chunk_count: int = 0
+    avg_confidence: float = 0.0
+    recent_uploads: int = 0
+
+
+@dataclass
+class DomainStatsSnapshot:
+    """某一时刻所有命名空间的统计快照"""
+    namespaces: Dict[str, NamespaceStats] = field(default_factory=dict)
+    chunk_count_estimated: bool = False
+    refreshed_at: float = 0.0
+    refresh_duration: float = 0.0
+
+    def get(self, namespace: str) -> NamespaceStats:
+        """获取命名空间统计, 不存在时返回全零统计"""
+        return self.namespaces.get(namespace) or NamespaceStats(namespace=namespace)
+
+
+@dataclass
+class SessionStats:
+    """活跃会话统计"""
+    active_sessions_30m: int = 0
+    active_sessions_24h: int = 0
+    refreshed_at: float = 0.0
+
+
+# 文档与分块统计合并为一条语句: 两个按 namespace 分组的子查询做 FULL OUTER JOIN
+_EXACT_STATS_SQL = text("""
+    WITH doc_stats AS (
+        SELECT namespace,
+               COUNT(*) AS document_count,
+               AVG(domain_confidence) FILTER (WHERE domain_confidence > 0) AS avg_confidence,
+               COUNT(*) FILTER (WHERE created_at >= :recent_since) AS recent_uploads
+        FROM documents
+        GROUP BY namespace
+    ),
+    chunk_stats AS (
+        SELECT namespace, COUNT(*) AS chunk_count
+        FROM document_chunks
+        GROUP BY namespace
+    )
+    SELECT COALESCE(d.namespace, c.namespace) AS namespace,
+           COALESCE(d.document_count, 0) AS document_count,
+           COALESCE(c.chunk_count, 0) AS chunk_count,
+           COALESCE(d.avg_confidence, 0) AS avg_confidence,
+           COALESCE(d.recent_uploads, 0) AS recent_uploads
+    FROM doc_stats d
+    FULL OUTER JOIN chunk_stats c ON d.namespace = c.namespace
+""")
+
+_DOC_STATS_SQL = text("""
+    SELECT namespace,
+           COUNT(*) AS document_count,
+           COALESCE(AVG(domain_confidence) FILTER (WHERE domain_confidence > 0), 0) AS avg_confidence,
+           COUNT(*) FILTER (WHERE created_at >= :recent_since) AS recent_uploads
+    FROM documents
+    GROUP BY namespace
+""")
+
+_RELTUPLES_SQL = text("""
+    SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)
+""")
+
+_SESSION_STATS_SQL = text("""
+    SELECT COUNT(*) FILTER (WHERE updated_at >= :since_30m) AS active_30m,
+           COUNT(*) AS active_24h
+    FROM chat_sessions
+    WHERE updated_at >= :since_24h
+""")
+
+
+def scale_sampled_counts(sampled: Dict[str, int], total_estimate: int) -> Dict[str, int]:
+    """
+    将抽样得到的分组计数按比例放大到估算总行数
+
+    Args:
+        sampled: 抽样中各命名空间的行数
+        total_estimate: 表的估算总行数 (pg_class.reltuples)
+
+    Returns:
+        Dict[str, int]: 各命名空间的估算行数
+    """
+    sample_total = sum(sampled.values())
+    if sample_total <= 0 or total_estimate <= 0:
+        return {ns: 0 for ns in sampled}
+
+    ratio = total_estimate / sample_total
+    return {ns: int(round(count * ratio)) for ns, count in sampled.items()}
+
+
+class DomainStatsProvider:
+    """
+    共享的领域统计提供者
+
+    - exact: 精确 COUNT(*), 一条分组语句覆盖所有命名空间
+    - estimate: 分块数使用 reltuples + TABLESAMPLE 估算
+    - auto: reltuples 超过阈值时自动切换到估算
+    """
+
+    def __init__(
+        self,
+        ttl: float = DOMAIN_STATS_TTL,
+        count_mode: str = DOMAIN_STATS_COUNT_MODE,
+        estimate_threshold: int = DOMAIN_STATS_ESTIMATE_THRESHOLD,
+        sample_percent: float = DOMAIN_STATS_SAMPLE_PERCENT
+    ):
+        self.ttl = ttl
+        self.count_mode = count_mode
+        self.estimate_threshold = estimate_threshold
+        self.sample_percent = sample_percent
+
+        self._snapshot: Optional[DomainStatsSnapshot] = None
+        self._session_stats: Optional[SessionStats] = None
+        self._lock = threading.Lock()
+
+    def get_snapshot(self, db: Session, force_refresh: bool = False) -> DomainStatsSnapshot:
+        """
+        获取统计快照, TTL 内直接返回缓存
+
+        Args:
+            db: 数据库会话
+            force_refresh: 是否忽略缓存强制刷新
+
+        Returns:
+            DomainStatsSnapshot: 统计快照
+        """
+        snapshot = self._snapshot
+        if not force_refresh and self._is_fresh(snapshot):
+            return snapshot
+
+        with self._lock:
+            # 双重检查: 等锁期间可能已被其他线程刷新
+            snapshot = self._snapshot
+            if not force_refresh and self._is_fresh(snapshot):
+                return snapshot
+
+            snapshot = self._refresh(db)
+            self._snapshot = snapshot
+            return snapshot
+
+    def get_session_stats(self, db: Session) -> SessionStats:
+        """
+        获取活跃会话统计 (30 分钟 / 24 小时两个窗口合并为一次查询)
+
+        会话统计查询代价低, 与领域快照分开缓存, 避免每分钟的会话任务触发大表分组统计
+        """
+        stats = self._session_stats
+        if self._is_fresh(stats):
+            return stats
+
+        active_30m, active_24h = self._query_sessions(db)
+        stats = SessionStats(
+            active_sessions_30m=active_30m,
+            active_sessions_24h=active_24h,
+            refreshed_at=time.monotonic()
+        )
+        self._session_stats = stats
+        return stats
+
+    def get_namespace_stats(self, db: Session, namespace: str) -> NamespaceStats:
+        """获取单个命名空间的统计"""
+        return self.get_snapshot(db).get(namespace)
+
+    def invalidate(self):
+        """使缓存失效, 下次访问时重新计算"""
+        self._snapshot = None
+        self._session_stats = None
+
+    def _is_fresh(self, cached) -> bool:
+        return cached is not None and (time.monotonic() - cached.refreshed_at) < self.ttl
+
+    def _refresh(self, db: Session) -> DomainStatsSnapshot:
+        start = time.monotonic()
+
+        # Document.created_at 是字符串类型, 与现有逻辑一致使用 isoformat 比较
+        recent_since = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+
+        use_estimate = self._should_estimate(db)
+        if use_estimate:
+            namespaces = self._query_estimated(db, recent_since)
+        else:
+            namespaces = self._query_exact(db, recent_since)
+
+        duration = time.monotonic() - start
+        logger.debug(
+            f"领域统计刷新完成: {len(namespaces)} 个命名空间, "
+            f"估算={use_estimate}, 耗时 {duration * 1000:.1f}ms"
+        )
+
+        return DomainStatsSnapshot(
+            namespaces=namespaces,
+            chunk_count_estimated=use_estimate,
+            refreshed_at=time.monotonic(),
+            refresh_duration=duration
+        )
+
+    def _should_estimate(self, db: Session) -> bool:
+        if self.count_mode == "exact":
+            return False
+        if self.count_mode == "estimate":
+            return True
+        return self._reltuples(db, "document_chunks") >= self.estimate_threshold
+
+    def _reltuples(self, db: Session, table_name: str) -> int:
+        value = db.execute(_RELTUPLES_SQL, {"table_name": table_name}).scalar()
+        # 从未 ANALYZE 的表 reltuples 为 -1 (PG14+) 或 0
+        return max(int(value or 0), 0)
+
+    def _query_exact(self, db: Session, recent_since: str) -> Dict[str, NamespaceStats]:
+        rows = db.execute(_EXACT_STATS_SQL, {"recent_since": recent_since}).fetchall()
+        return {
+            row.namespace: NamespaceStats(
+                namespace=row.namespace,
+                document_count=int(row.document_count),
+                chunk_count=int(row.chunk_count),
+                avg_confidence=float(row.avg_confidence or 0.0),
+                recent_uploads=int(row.recent_uploads)
+            )
+            for row in rows
+            if row.namespace is not None
+        }
+
+    def _query_estimated(self, db: Session, recent_since: str) -> Dict[str, NamespaceStats]:
+        # documents 表通常远小于 document_chunks, 仍做精确分组统计
+        doc_rows = db.execute(_DOC_STATS_SQL, {"recent_since": recent_since}).fetchall()
+        namespaces = {
+            row.namespace: NamespaceStats(
+                namespace=row.namespace,
+                document_count=int(row.document_count),
+                avg_confidence=float(row.avg_confidence or 0.0),
+                recent_uploads=int(row.recent_uploads)
+            )
+            for row in doc_rows
+            if row.namespace is not None
+        }
+
+        # TABLESAMPLE 的百分比不能作为绑定参数, 这里已在构造时转为 float
+        sample_sql = text(
+            "SELECT namespace, COUNT(*) AS sampled "
+            f"FROM document_chunks TABLESAMPLE SYSTEM ({float(self.sample_percent)}) "
+            "GROUP BY namespace"
+        )
+        sampled = {
+            row.namespace: int(row.sampled)
+            for row in db.execute(sample_sql).fetchall()
+            if row.namespace is not None
+        }
+        estimated = scale_sampled_counts(sampled, self._reltuples(db, "document_chunks"))
+
+        for namespace, chunk_count in estimated.items():
+            stats = namespaces.setdefault(namespace, NamespaceStats(namespace=namespace))
+            stats.chunk_count = chunk_count
+
+        return namespaces
+
+    def _query_sessions(self, db: Session):
+        now = datetime.utcnow()
+        row = db.execute(_SESSION_STATS_SQL, {
+            "since_30m": now - timedelta(minutes=30),
+            "since_24h": now - timedelta(days=1)
+        }).one()
+        return int(row.active_30m), int(row.active_24h)
+
+
+# 全局实例
+_domain_stats_provider: Optional[DomainStatsProvider] = None
+
+
+def get_domain_stats_provider() -> DomainStatsProvider:
+    """获取全局领域统计提供者"""
+    global _domain_stats_provider
+
+    if _domain_stats_provider is None:
+        _domain_stats_provider = DomainStatsProvider()
+
+    return _domain_stats_provider
@@ -2,8 +2,11 @@ import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain.embeddings.base import Embeddings
-from app.config.settings import OPENAI_API_KEY, EMBEDDING_MODEL, OPENAI_API_URL
+from app.config.settings import OPENAI_API_KEY, EMBEDDING_MODEL, OPENAI_API_URL, HUGGINGFACE_MODEL
 from app.config.logging_config import get_app_logger
+from app.monitoring.tracing import trace_span
+from app.monitoring.memory import memory_registry, deep_sizeof
+from app.services.vector_index import parallel_scores, parse_embedding
 from typing import List, Optional, Union
 import asyncio
 from functools import lru_cache
@@ -42,10 +45,21 @@ class EmbeddingService:
             self._init_huggingface_embeddings(model_name, device)
         else:
             raise ValueError(f"不支持的嵌入后端: {backend}")
+        
+        # 注册内存统计 (弱引用, 不影响实例回收)
+        memory_registry.register_object(
+            "embedding.cache", self, category="cache",
+            sizeof=lambda svc: deep_sizeof(svc._embedding_cache)
+        )
+        memory_registry.register_object(
+            "embedding.model", self, category="model",
+            sizeof=lambda svc: deep_sizeof(getattr(svc.embeddings, "client", None))
+        )
     
     def _init_openai_embeddings(self, model_name: Optional[str]):
         """初始化OpenAI嵌入模型"""
         model = model_name or EMBEDDING_MODEL
+        self.model_name = model
         self.embeddings = OpenAIEmbeddings(
             openai_api_key=OPENAI_API_KEY,
             openai_api_base=OPENAI_API_URL,
@@ -55,7 +69,8 @@ class EmbeddingService:
     
     def _init_huggingface_embeddings(self, model_name: Optional[str], device: str):
         """初始化HuggingFace嵌入模型"""
-        model = model_name or "sentence-transformers/all-MiniLM-L6-v2"
+        model = model_name or HUGGINGFACE_MODEL
+        self.model_name = model
         
         # 自动检测设备
         if device == "auto":
@@ -69,6 +84,30 @@ class EmbeddingService:
         )
         logger.info(f"已初始化HuggingFace嵌入模型: {model} (设备: {device})")
     
+    @property
+    def model_key(self) -> str:
+        """
+        模型标识 (后端:模型名)
+
+        用作嵌入向量存储的键前缀, 切换后端或模型后不会复用旧模型的向量
+        """
+        return f"{self.backend}:{self.model_name}"
+
+    def embed_documents_sync(self, texts: List[str]) -> List[List[float]]:
+        """
+        同步批量生成嵌入向量 (Celery worker / 同步接口使用)
+
+        Args:
+            texts (List[str]): 文本列表
+
+        Returns:
+            List[List[float]]: 嵌入向量列表
+        """
+        if not texts:
+            return []
+        with trace_span("embed", backend=self.backend, batch=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
     def _get_cache_key(self, text: str) -> str:
         """生成缓存键"""
         import hashlib
@@ -105,11 +144,12 @@ class EmbeddingService:
             
             # 在线程池中执行嵌入计算（避免阻塞事件循环）
             loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                None, 
-                self.embeddings.embed_query, 
-                text
-            )
+            with trace_span("embed", backend=self.backend):
+                embedding = await loop.run_in_executor(
+                    None, 
+                    self.embeddings.embed_query, 
+                    text
+                )
             
             # 缓存结果
             self._manage_cache(cache_key, embedding)
@@ -197,8 +237,8 @@ class EmbeddingService:
                   1表示完全相似，0表示无关，-1表示完全相反
         """
         try:
-            vec1 = np.array(vec1).tolist()
-            vec2 = np.array(vec2).tolist()
+            vec1 = np.asarray(vec1, dtype=np.float32)
+            vec2 = np.asarray(vec2, dtype=np.float32)
 
             # 计算余弦相似度
             dot_product = np.dot(vec1, vec2)
@@ -228,50 +268,25 @@ class EmbeddingService:
         """
         try:
             # 转换查询向量
-            query_vec = np.array(query_vec, dtype=float).tolist()
+            query_vec = np.asarray(query_vec, dtype=np.float32)
 
-            # 处理候选向量 - 可能是字符串格式
-            processed_candidates = []
-            for vec in candidate_vectors:
-                if isinstance(vec, str):
-                    # 如果是字符串,尝试解析为列表
-                    try:
-                        import json
-                        vec = json.loads(vec)
-                    except:
-                        # 如果JSON解析失败,尝试eval
-                        try:
-                            vec = eval(vec)
-                        except:
-                            logger.warning(f"无法解析向量字符串: {vec[:100]}...")
-                            continue
-                processed_candidates.append(vec)
-
-            if not processed_candidates:
+            # 处理候选向量 (ndarray / 列表 / 向量文本), 无法解析的按零向量计 (相似度为 0, 与输入保持对齐)
+            processed_candidates = [parse_embedding(vec) for vec in candidate_vectors]
+            dim = next((len(vec) for vec in processed_candidates if vec is not None), 0)
+            if not dim:
                 return []
+            for i, vec in enumerate(processed_candidates):
+                if vec is None:
+                    logger.warning(f"无法解析第 {i} 个候选向量")
+                    processed_candidates[i] = np.zeros(dim, dtype=np.float32)
 
-            candidates = np.array(processed_candidates, dtype=float)
+            candidates = np.asarray(processed_candidates, dtype=np.float32)
 
             if len(candidates) == 0:
                 return []
 
-            # 计算查询向量的范数
-            query_norm = np.linalg.norm(query_vec)
-            if query_norm == 0:
-                return [0.0] * len(candidates)
-
-            # 批量计算所有候选向量的范数
-            candidate_norms = np.linalg.norm(candidates, axis=1)
-
-            # 避免除零错误
-            valid_mask = candidate_norms != 0
-            similarities = np.zeros(len(candidates))
-
-            if np.any(valid_mask):
-                # 批量计算点积
-                dot_products = np.dot(candidates[valid_mask], query_vec)
-                # 计算相似度
-                similarities[valid_mask] = dot_products / (candidate_norms[valid_mask] * query_norm)
+            # float32 分块并行计算 (零向量的相似度为 0)
+            similarities = parallel_scores(candidates, query_vec, cosine=True)
 
             return similarities.tolist()
 
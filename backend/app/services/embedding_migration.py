@@ -0,0 +1,703 @@
+"""
+嵌入模型在线迁移 (Online Re-embedding)
+
+切换嵌入模型不再停机整表重写, 而是在影子向量列上逐步完成:
+
+1. start: document_chunks 新增影子列 embedding_next (新模型维度), 记录一条迁移
+2. 双写: 迁移期间新入库的分块同时用新模型写入影子列, 与分块在同一事务 (savepoint) 内
+3. 回填: 按分块ID分批、限速为已有分块生成新向量; 每批向量与断点在同一事务提交, 中断后从断点继续。
+   第一轮结束后从头再扫一轮, 补齐双写失败的行, 然后 CONCURRENTLY 构建影子列的 HNSW 索引
+4. 影子对比 (可选): 按 EMBEDDING_MIGRATION_SHADOW_COMPARE_RATE 抽样线上查询,
+   后台用新模型在影子列上检索, 记录与当前结果的 top-k 重合率
+5. 切换: 按命名空间切换读取 (迁移记录上一条 UPDATE), 该命名空间的检索改用新模型 + 影子列,
+   各进程在 EMBEDDING_MIGRATION_STATE_TTL 内生效, 可随时切回
+6. finalize: 全部命名空间切换后短暂锁表交换列名 (embedding -> embedding_prev, embedding_next -> embedding),
+   并丢弃进程内向量索引 (含持久化文件与分片进程上的内容),
+   随后把 EMBEDDING_BACKEND / EMBEDDING_MODEL (或 HUGGINGFACE_MODEL) / EMBEDDING_DIM 配置为新模型并重启服务;
+   重启前仍按旧配置运行的进程会用新模型检索, 并用新模型覆盖自己刚写入的向量
+
+只迁移 document_chunks; documents 表的文档级向量仍由旧流程维护。
+回填吞吐、进度和预计剩余时间通过 Prometheus 指标暴露。
+"""
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config.logging_config import get_app_logger
+from app.config.settings import (
+    EMBEDDING_MIGRATION_BATCH_SIZE,
+    EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND,
+    EMBEDDING_MIGRATION_SHADOW_COMPARE_RATE,
+    EMBEDDING_MIGRATION_STATE_TTL,
+    EMBEDDING_STORAGE,
+    NAMESPACE_VECTOR_INDEX_EF_CONSTRUCTION,
+    NAMESPACE_VECTOR_INDEX_EF_SEARCH,
+    NAMESPACE_VECTOR_INDEX_M,
+    NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM,
+)
+from app.models.embedding_migration import EmbeddingMigration
+from app.monitoring.metrics import (
+    record_embedding_backfill,
+    record_embedding_dual_write,
+    record_embedding_shadow_overlap,
+)
+from app.services.embedding import EmbeddingService, create_embedding_service, embedding_service
+from app.services.embedding_store import get_embedding_store
+from app.services.vector_index import get_vector_index_manager
+
+logger = get_app_logger()
+
+SHADOW_COLUMN = 'embedding_next'
+PREVIOUS_COLUMN = 'embedding_prev'
+SHADOW_INDEX = 'idx_chunks_embedding_next_hnsw'
+PRIMARY_INDEX = 'idx_chunks_embedding_hnsw'
+
+STATE_BACKFILLING = 'backfilling'
+STATE_INDEXING = 'indexing'
+STATE_READY = 'ready'
+STATE_COMPLETED = 'completed'
+STATE_ABORTED = 'aborted'
+ACTIVE_STATES = (STATE_BACKFILLING, STATE_INDEXING, STATE_READY)
+
+
+class EmbeddingMigrationError(Exception):
+    """嵌入模型迁移异常"""
+    pass
+
+
+@dataclass(frozen=True)
+class MigrationState:
+    """各进程缓存的迁移状态快照"""
+    id: int
+    backend: str
+    model_name: str
+    dimension: int
+    storage: str
+    column_name: str
+    state: str
+    read_namespaces: FrozenSet[str]
+
+    @property
+    def model_key(self) -> str:
+        return f"{self.backend}:{self.model_name}"
+
+
+@dataclass
+class ReadPlan:
+    """检索时使用的向量列与查询向量模型"""
+    column: str
+    storage: str
+    service: EmbeddingService
+
+
+def vector_literal(vector) -> str:
+    """向量转为 pgvector 文本格式"""
+    return '[' + ','.join(map(str, np.asarray(vector, dtype=np.float32).tolist())) + ']'
+
+
+def result_overlap(primary_ids: Sequence[int], shadow_ids: Sequence[int]) -> float:
+    """两组 top-k 结果的分块ID重合比例 (以较长的一组为分母, 两组都为空时为 1)"""
+    size = max(len(primary_ids), len(shadow_ids))
+    if size == 0:
+        return 1.0
+    return len(set(primary_ids) & set(shadow_ids)) / size
+
+
+def backfill_eta(remaining: int, rows_per_second: float) -> float:
+    """按当前吞吐估算剩余时间(秒), 吞吐未知时返回 -1"""
+    if remaining <= 0:
+        return 0.0
+    if rows_per_second <= 0:
+        return -1.0
+    return remaining / rows_per_second
+
+
+def throttle_delay(rows: int, elapsed: float, max_rows_per_second: float) -> float:
+    """限速: 本次运行已处理 rows 行、耗时 elapsed 秒时还需等待的秒数"""
+    if max_rows_per_second <= 0:
+        return 0.0
+    return max(0.0, rows / max_rows_per_second - elapsed)
+
+
+def ann_search(
+    db: Session,
+    column: str,
+    storage: str,
+    query_vector,
+    limit: int,
+    namespace: Optional[str] = None,
+    document_ids: Optional[List[int]] = None,
+    filename_filter: Optional[str] = None,
+    ef_search: int = NAMESPACE_VECTOR_INDEX_EF_SEARCH
+):
+    """
+    在指定向量列上按余弦距离检索 top-k 分块 (可走该列的 HNSW 索引)
+
+    Returns:
+        行列表, 含分块字段和 similarity
+    """
+    conditions = [f"{column} IS NOT NULL"]
+    params = {"query": vector_literal(query_vector), "limit": limit}
+    if namespace:
+        conditions.append("namespace = :namespace")
+        params["namespace"] = namespace
+    if document_ids:
+        conditions.append("document_id = ANY(:document_ids)")
+        params["document_ids"] = document_ids
+    if filename_filter:
+        conditions.append("filename ILIKE :filename_filter")
+        params["filename_filter"] = f"%{filename_filter}%"
+
+    # is_local=true: 只在当前事务内生效
+    db.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"), {"ef_search": str(max(ef_search, limit))})
+    return db.execute(text(f"""
+        SELECT id, document_id, chunk_index, content, filename,
+               chunk_metadata, created_at, namespace,
+               1 - ({column} <=> CAST(:query AS {storage})) AS similarity
+        FROM document_chunks
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {column} <=> CAST(:query AS {storage})
+        LIMIT :limit
+    """), params).fetchall()
+
+
+class EmbeddingMigrationService:
+    """嵌入模型在线迁移服务"""
+
+    def __init__(
+        self,
+        state_ttl: float = EMBEDDING_MIGRATION_STATE_TTL,
+        shadow_compare_rate: float = EMBEDDING_MIGRATION_SHADOW_COMPARE_RATE
+    ):
+        self.state_ttl = state_ttl
+        self.shadow_compare_rate = shadow_compare_rate
+        self._state: Optional[MigrationState] = None
+        self._state_at = float('-inf')
+        self._services: Dict[str, EmbeddingService] = {}
+        self._lock = threading.Lock()
+        self._tasks = set()
+
+    # ==================== 状态 ====================
+
+    def current(self, db: Session, refresh: bool = False) -> Optional[MigrationState]:
+        """
+        最近一条未中止的迁移状态 (缓存 state_ttl 秒)
+
+        查询失败 (如迁移表尚未创建) 时视为没有迁移; 入库途中也会调用,
+        因此查询放在 savepoint 内, 失败只回滚 savepoint, 不影响调用方已写入的分块
+        """
+        now = time.monotonic()
+        if not refresh and now - self._state_at <= self.state_ttl:
+            return self._state
+        try:
+            with db.begin_nested():
+                migration = db.query(EmbeddingMigration).filter(
+                    EmbeddingMigration.state != STATE_ABORTED
+                ).order_by(EmbeddingMigration.id.desc()).first()
+        except Exception as e:
+            logger.debug(f"查询嵌入模型迁移状态失败: {e}")
+            migration = None
+        state = self._snapshot(migration) if migration is not None else None
+        self._state, self._state_at = state, now
+        return state
+
+    def invalidate(self):
+        """使缓存的迁移状态失效"""
+        self._state_at = float('-inf')
+
+    @staticmethod
+    def _snapshot(migration: EmbeddingMigration) -> MigrationState:
+        return MigrationState(
+            id=migration.id,
+            backend=migration.backend,
+            model_name=migration.model_name,
+            dimension=migration.dimension,
+            storage=migration.storage,
+            column_name=migration.column_name,
+            state=migration.state,
+            read_namespaces=frozenset(migration.read_namespaces or [])
+        )
+
+    def target_service(self, state: MigrationState) -> EmbeddingService:
+        """新模型的嵌入服务 (按模型标识缓存, 与当前模型相同时直接复用)"""
+        if state.model_key == embedding_service.model_key:
+            return embedding_service
+        with self._lock:
+            service = self._services.get(state.model_key)
+            if service is None:
+                service = create_embedding_service(backend=state.backend, model_name=state.model_name)
+                self._services[state.model_key] = service
+            return service
+
+    @staticmethod
+    def _active(db: Session, for_update: bool = False) -> EmbeddingMigration:
+        query = db.query(EmbeddingMigration).filter(EmbeddingMigration.state.in_(ACTIVE_STATES))
+        if for_update:
+            query = query.with_for_update()
+        migration = query.order_by(EmbeddingMigration.id.desc()).first()
+        if migration is None:
+            raise EmbeddingMigrationError("没有进行中的嵌入模型迁移")
+        return migration
+
+    # ==================== 生命周期 ====================
+
+    def start(
+        self,
+        db: Session,
+        backend: str,
+        model_name: str,
+        dimension: int,
+        storage: str = EMBEDDING_STORAGE
+    ) -> EmbeddingMigration:
+        """
+        开始迁移: 新增影子向量列并记录迁移
+
+        ADD COLUMN (可空、无默认值) 只修改元数据, lock_timeout 避免排在长查询后面阻塞读写
+        """
+        if storage not in ('vector', 'halfvec'):
+            raise EmbeddingMigrationError(f"不支持的存储类型: {storage}")
+        existing = db.query(EmbeddingMigration).filter(EmbeddingMigration.state.in_(ACTIVE_STATES)).first()
+        if existing is not None:
+            raise EmbeddingMigrationError(f"已有进行中的迁移: {existing.model_key} ({existing.state})")
+        if f"{backend}:{model_name}" == embedding_service.model_key:
+            raise EmbeddingMigrationError(f"目标模型与当前模型相同: {embedding_service.model_key}")
+
+        db.execute(text("SET LOCAL lock_timeout = '5s'"))
+        # 中止的迁移可能留下旧的影子列
+        db.execute(text(f"ALTER TABLE document_chunks DROP COLUMN IF EXISTS {SHADOW_COLUMN}"))
+        db.execute(text(f"ALTER TABLE document_chunks ADD COLUMN {SHADOW_COLUMN} {storage}({int(dimension)})"))
+        rows_total = db.execute(text("SELECT COUNT(*) FROM document_chunks WHERE embedding IS NOT NULL")).scalar()
+
+        migration = EmbeddingMigration(
+            backend=backend,
+            model_name=model_name,
+            dimension=dimension,
+            storage=storage,
+            column_name=SHADOW_COLUMN,
+            state=STATE_BACKFILLING,
+            rows_total=rows_total or 0,
+            read_namespaces=[]
+        )
+        db.add(migration)
+        db.commit()
+        self.invalidate()
+        logger.info(f"开始嵌入模型迁移: {migration.model_key} ({storage}({dimension})), 需要回填 {rows_total} 个分块")
+        return migration
+
+    def abort(self, db: Session):
+        """中止迁移: 删除影子列 (及其索引), 读取回到当前模型"""
+        migration = self._active(db, for_update=True)
+        db.execute(text("SET LOCAL lock_timeout = '5s'"))
+        db.execute(text(f"ALTER TABLE document_chunks DROP COLUMN IF EXISTS {migration.column_name}"))
+        migration.state = STATE_ABORTED
+        db.commit()
+        self.invalidate()
+        logger.info(f"已中止嵌入模型迁移: {migration.model_key}")
+
+    # ==================== 双写 ====================
+
+    @staticmethod
+    def _write_column(state: Optional[MigrationState]) -> Optional[str]:
+        """新分块的新模型向量应写入的列"""
+        if state is None:
+            return None
+        if state.state in ACTIVE_STATES:
+            return state.column_name
+        if state.state == STATE_COMPLETED and state.model_key != embedding_service.model_key:
+            # 已交换列但本进程仍按旧配置运行: 用新模型覆盖刚写入的主列
+            return 'embedding'
+        return None
+
+    @staticmethod
+    def _write_vectors(db: Session, column: str, storage: str, chunk_ids: Sequence[int], vectors: Sequence):
+        db.execute(text(f"""
+            UPDATE document_chunks AS c
+            SET {column} = CAST(v.embedding AS {storage})
+            FROM unnest(CAST(:ids AS bigint[]), CAST(:vectors AS text[])) AS v(id, embedding)
+            WHERE c.id = v.id
+        """), {"ids": list(chunk_ids), "vectors": [vector_literal(vector) for vector in vectors]})
+
+    def dual_write(self, db: Session, chunk_ids: Sequence[int], texts: Sequence[str]):
+        """
+        迁移期间为新写入的分块生成新模型向量 (同步入库路径)
+
+        在 savepoint 内执行, 失败只记录日志, 不影响分块入库; 缺失的行由回填补齐
+        """
+        if not chunk_ids:
+            return
+        state = self.current(db)
+        column = self._write_column(state)
+        if column is None:
+            return
+        try:
+            with db.begin_nested():
+                vectors, _ = get_embedding_store().get_or_embed(
+                    db, list(texts), state.model_key, self.target_service(state).embed_documents_sync
+                )
+                self._write_vectors(db, column, state.storage, chunk_ids, vectors)
+            record_embedding_dual_write(len(chunk_ids))
+        except Exception as e:
+            logger.warning(f"新模型双写失败 ({len(chunk_ids)} 个分块, 等待回填补齐): {e}")
+
+    async def adual_write(self, db: Session, chunk_ids: Sequence[int], texts: Sequence[str]):
+        """dual_write 的异步版本 (流式入库流水线使用)"""
+        if not chunk_ids:
+            return
+        state = self.current(db)
+        column = self._write_column(state)
+        if column is None:
+            return
+        try:
+            with db.begin_nested():
+                vectors, _ = await get_embedding_store().aget_or_embed(
+                    db, list(texts), state.model_key, self.target_service(state).create_batch_embeddings
+                )
+                self._write_vectors(db, column, state.storage, chunk_ids, vectors)
+            record_embedding_dual_write(len(chunk_ids))
+        except Exception as e:
+            logger.warning(f"新模型双写失败 ({len(chunk_ids)} 个分块, 等待回填补齐): {e}")
+
+    # ==================== 回填 ====================
+
+    def backfill(
+        self,
+        db: Session,
+        batch_size: int = EMBEDDING_MIGRATION_BATCH_SIZE,
+        max_rows_per_second: float = EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND,
+        max_batches: Optional[int] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Dict:
+        """
+        分批限速回填影子列, 完成后构建影子列索引
+
+        进入建索引/就绪状态后再次运行时, 从头补齐双写失败的行 (不移动断点)
+
+        Args:
+            db: 数据库会话
+            batch_size: 每批分块数
+            max_rows_per_second: 限速, 0 表示不限
+            max_batches: 本次最多处理的批数 (None 表示直到完成)
+            should_stop: 每批之后调用, 返回 True 时保存断点退出
+
+        Returns:
+            Dict: 迁移状态 (见 status)
+        """
+        migration = self._active(db)
+        state = self._snapshot(migration)
+        service = self.target_service(state)
+
+        if migration.state == STATE_BACKFILLING:
+            finished = self._run_pass(db, migration, service, batch_size, max_rows_per_second, max_batches, should_stop)
+            if not finished:
+                return self.status(db)
+            migration.state = STATE_INDEXING
+            db.commit()
+            self.invalidate()
+        else:
+            self._run_pass(db, migration, service, batch_size, max_rows_per_second, None, should_stop, resumable=False)
+
+        if migration.state == STATE_INDEXING:
+            self._build_shadow_index(migration)
+            migration.state = STATE_READY
+            db.commit()
+            self.invalidate()
+            logger.info(f"嵌入模型迁移回填完成, 影子列索引已就绪: {migration.model_key}")
+        return self.status(db)
+
+    def _run_pass(
+        self,
+        db: Session,
+        migration: EmbeddingMigration,
+        service: EmbeddingService,
+        batch_size: int,
+        max_rows_per_second: float,
+        max_batches: Optional[int],
+        should_stop: Optional[Callable[[], bool]],
+        resumable: bool = True
+    ) -> bool:
+        """按分块ID顺序回填影子列为空的行, 返回是否扫描完成"""
+        column, store = migration.column_name, get_embedding_store()
+        after_id = (migration.checkpoint_id or 0) if resumable else 0
+        start, run_rows, batches = time.perf_counter(), 0, 0
+
+        while True:
+            rows = db.execute(text(f"""
+                SELECT id, content FROM document_chunks
+                WHERE id > :after_id AND embedding IS NOT NULL AND {column} IS NULL
+                ORDER BY id
+                LIMIT :limit
+            """), {"after_id": after_id, "limit": batch_size}).fetchall()
+
+            if not rows:
+                if resumable and not migration.sweeps:
+                    # 第一轮结束, 从头再扫一轮补齐双写失败和断点之前新增的行
+                    migration.sweeps, migration.checkpoint_id, after_id = 1, 0, 0
+                    db.commit()
+                    continue
+                if resumable:
+                    migration.sweeps += 1
+                    db.commit()
+                return True
+
+            vectors, _ = store.get_or_embed(
+                db, [row.content or '' for row in rows], migration.model_key, service.embed_documents_sync
+            )
+            self._write_vectors(db, column, migration.storage, [row.id for row in rows], vectors)
+            after_id = rows[-1].id
+            if resumable:
+                migration.checkpoint_id = after_id
+            migration.rows_done = (migration.rows_done or 0) + len(rows)
+            # 向量与断点在同一事务提交, 中断后不会重复或遗漏
+            db.commit()
+
+            run_rows += len(rows)
+            batches += 1
+            elapsed = time.perf_counter() - start
+            rate = run_rows / elapsed if elapsed > 0 else 0.0
+            remaining = max((migration.rows_total or 0) - migration.rows_done, 0)
+            progress = min(1.0, migration.rows_done / migration.rows_total) if migration.rows_total else 1.0
+            eta = backfill_eta(remaining, rate)
+            record_embedding_backfill(len(rows), rate, progress, eta)
+            logger.info(
+                f"回填 {migration.model_key}: 分块ID<={after_id}, 已完成 {migration.rows_done}/{migration.rows_total} "
+                f"({progress:.1%}), {rate:.1f} 行/秒, 预计剩余 {eta:.0f}s"
+            )
+
+            if (max_batches and batches >= max_batches) or (should_stop and should_stop()):
+                return False
+            delay = throttle_delay(run_rows, elapsed, max_rows_per_second)
+            if delay:
+                time.sleep(delay)
+
+    @staticmethod
+    def _build_shadow_index(migration: EmbeddingMigration):
+        """CONCURRENTLY 构建影子列的 HNSW 索引 (回填完成后一次构建, 比边写边维护快)"""
+        from app.database import get_engine
+
+        with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            valid = conn.execute(text("""
+                SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:index_name)
+            """), {"index_name": SHADOW_INDEX}).scalar()
+            if valid is False:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {SHADOW_INDEX}"))
+            if NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM:
+                conn.execute(
+                    text("SELECT set_config('maintenance_work_mem', :value, false)"),
+                    {"value": NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM}
+                )
+            logger.info(f"构建影子列索引: {SHADOW_INDEX}")
+            conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {SHADOW_INDEX} ON document_chunks "
+                f"USING hnsw ({migration.column_name} {migration.storage}_cosine_ops) "
+                f"WITH (m = {NAMESPACE_VECTOR_INDEX_M}, ef_construction = {NAMESPACE_VECTOR_INDEX_EF_CONSTRUCTION})"
+            ))
+
+    # ==================== 切换 ====================
+
+    def missing_by_namespace(self, db: Session) -> Dict[str, int]:
+        """各命名空间尚缺新模型向量的分块数"""
+        migration = self._active(db)
+        rows = db.execute(text(f"""
+            SELECT namespace, COUNT(*) AS missing FROM document_chunks
+            WHERE embedding IS NOT NULL AND {migration.column_name} IS NULL
+            GROUP BY namespace
+        """)).fetchall()
+        return {row.namespace: row.missing for row in rows}
+
+    def flip(self, db: Session, namespace: str) -> List[str]:
+        """
+        把命名空间的读取切换到新模型
+
+        要求回填与影子索引已完成, 且该命名空间没有缺少新向量的分块;
+        切换是迁移记录上的一次提交, 各进程在状态缓存过期后一起生效
+
+        Returns:
+            List[str]: 已切换的命名空间
+        """
+        migration = self._active(db, for_update=True)
+        if migration.state != STATE_READY:
+            raise EmbeddingMigrationError(f"迁移尚未就绪 (当前状态: {migration.state}), 请先完成回填")
+        missing = db.execute(text(f"""
+            SELECT COUNT(*) FROM document_chunks
+            WHERE namespace = :namespace AND embedding IS NOT NULL AND {migration.column_name} IS NULL
+        """), {"namespace": namespace}).scalar()
+        if missing:
+            raise EmbeddingMigrationError(f"命名空间 '{namespace}' 还有 {missing} 个分块缺少新向量, 请先运行回填")
+
+        migration.read_namespaces = sorted(set(migration.read_namespaces or []) | {namespace})
+        db.commit()
+        self.invalidate()
+        logger.info(f"命名空间 '{namespace}' 已切换到新模型读取: {migration.model_key}")
+        return migration.read_namespaces
+
+    def unflip(self, db: Session, namespace: str) -> List[str]:
+        """把命名空间的读取切回当前模型"""
+        migration = self._active(db, for_update=True)
+        migration.read_namespaces = sorted(set(migration.read_namespaces or []) - {namespace})
+        db.commit()
+        self.invalidate()
+        logger.info(f"命名空间 '{namespace}' 已切回当前模型读取")
+        return migration.read_namespaces
+
+    def finalize(self, db: Session):
+        """
+        完成迁移: 锁表交换列名, 新模型向量成为主列 embedding, 旧向量保留在 embedding_prev
+
+        旧列上的向量索引 (含按命名空间的部分索引) 一并删除, 影子列索引改名为主列索引;
+        之后需按新模型重建部分索引 (scripts/reembed_chunks.py finalize 会自动执行)。
+        交换后块ID不变, 进程内向量索引的核对发现不了向量已换, 因此同时丢弃进程内索引、
+        删除其持久化文件并清空分片进程上的内容
+        """
+        migration = self._active(db, for_update=True)
+        if migration.state != STATE_READY:
+            raise EmbeddingMigrationError(f"迁移尚未就绪 (当前状态: {migration.state})")
+        namespaces = {row.namespace for row in db.execute(text(
+            "SELECT DISTINCT namespace FROM document_chunks WHERE embedding IS NOT NULL"
+        ))}
+        pending = sorted(ns for ns in namespaces if ns not in set(migration.read_namespaces or []))
+        if pending:
+            raise EmbeddingMigrationError(f"以下命名空间尚未切换读取: {', '.join(map(str, pending))}")
+
+        db.execute(text("SET LOCAL lock_timeout = '10s'"))
+        db.execute(text("LOCK TABLE document_chunks IN ACCESS EXCLUSIVE MODE"))
+        missing = db.execute(text(
+            f"SELECT COUNT(*) FROM document_chunks WHERE embedding IS NOT NULL AND {migration.column_name} IS NULL"
+        )).scalar()
+        if missing:
+            db.rollback()
+            raise EmbeddingMigrationError(f"还有 {missing} 个分块缺少新向量, 请先运行回填")
+
+        old_indexes = [row.indexname for row in db.execute(text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'document_chunks' AND indexdef ~ '\\(embedding\\M'
+        """))]
+        for index_name in old_indexes:
+            db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        db.execute(text(f"ALTER TABLE document_chunks DROP COLUMN IF EXISTS {PREVIOUS_COLUMN}"))
+        db.execute(text(f"ALTER TABLE document_chunks RENAME COLUMN embedding TO {PREVIOUS_COLUMN}"))
+        db.execute(text(f"ALTER TABLE document_chunks RENAME COLUMN {migration.column_name} TO embedding"))
+        db.execute(text(f"ALTER INDEX IF EXISTS {SHADOW_INDEX} RENAME TO {PRIMARY_INDEX}"))
+        db.execute(text("COMMENT ON COLUMN document_chunks.embedding IS '文档块嵌入向量'"))
+
+        migration.state = STATE_COMPLETED
+        migration.completed_at = datetime.now()
+        db.commit()
+        self.invalidate()
+        try:
+            get_vector_index_manager().reset(namespaces)
+        except Exception as e:
+            logger.warning(f"丢弃进程内向量索引失败, 请手动删除 VECTOR_INDEX_PERSIST_DIR 并重启向量分片: {e}")
+        logger.info(
+            f"嵌入模型迁移完成: {migration.model_key}, 删除旧列索引 {len(old_indexes)} 个; "
+            f"请把嵌入模型配置为新模型 (EMBEDDING_DIM={migration.dimension}) 后重启服务"
+        )
+
+    # ==================== 读取 ====================
+
+    def read_plan(self, db: Session, namespace: Optional[str]) -> Optional[ReadPlan]:
+        """
+        检索应使用的向量列与模型, 不需要改变时返回 None
+
+        - 迁移就绪且命名空间已切换: 影子列 + 新模型
+        - 迁移已完成但本进程仍按旧配置运行: 主列 + 新模型
+        """
+        state = self.current(db)
+        if state is None:
+            return None
+        if state.state == STATE_READY and namespace and namespace in state.read_namespaces:
+            return ReadPlan(column=state.column_name, storage=state.storage, service=self.target_service(state))
+        if state.state == STATE_COMPLETED and state.model_key != embedding_service.model_key:
+            return ReadPlan(column='embedding', storage=state.storage, service=self.target_service(state))
+        return None
+
+    def should_shadow_compare(self, db: Session, namespace: Optional[str]) -> bool:
+        """是否对本次查询做影子对比 (迁移就绪、命名空间未切换、按比例抽样)"""
+        if self.shadow_compare_rate <= 0 or random.random() >= self.shadow_compare_rate:
+            return False
+        state = self.current(db)
+        return state is not None and state.state == STATE_READY and namespace not in state.read_namespaces
+
+    def schedule_shadow_compare(
+        self,
+        query_text: str,
+        namespace: Optional[str],
+        top_k: int,
+        primary_ids: List[int]
+    ):
+        """后台执行影子对比, 不增加查询延迟"""
+        task = asyncio.get_running_loop().create_task(
+            self._shadow_compare(query_text, namespace, top_k, primary_ids)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _shadow_compare(self, query_text: str, namespace: Optional[str], top_k: int, primary_ids: List[int]):
+        state = self._state
+        if state is None:
+            return
+        try:
+            query_vector = await self.target_service(state).create_embedding(query_text)
+
+            def search():
+                from app.database import get_session_local
+                db = get_session_local()()
+                try:
+                    rows = ann_search(db, state.column_name, state.storage, query_vector, top_k, namespace=namespace)
+                    return [row.id for row in rows]
+                finally:
+                    db.close()
+
+            shadow_ids = await asyncio.to_thread(search)
+            overlap = result_overlap(primary_ids[:top_k], shadow_ids)
+            record_embedding_shadow_overlap(namespace or 'all', overlap)
+            logger.debug(f"影子对比 [{namespace or 'all'}]: top-{top_k} 重合率 {overlap:.2f}")
+        except Exception as e:
+            logger.warning(f"影子对比失败: {e}")
+
+    # ==================== 进度 ====================
+
+    def status(self, db: Session) -> Dict:
+        """最近一条迁移的状态与回填进度"""
+        migration = db.query(EmbeddingMigration).order_by(EmbeddingMigration.id.desc()).first()
+        if migration is None:
+            return {"state": None}
+        elapsed = ((migration.updated_at or migration.created_at) - migration.created_at).total_seconds()
+        rate = (migration.rows_done or 0) / elapsed if elapsed > 0 else 0.0
+        remaining = max((migration.rows_total or 0) - (migration.rows_done or 0), 0)
+        return {
+            "id": migration.id,
+            "model": migration.model_key,
+            "dimension": migration.dimension,
+            "storage": migration.storage,
+            "state": migration.state,
+            "checkpoint_id": migration.checkpoint_id,
+            "sweeps": migration.sweeps,
+            "rows_done": migration.rows_done,
+            "rows_total": migration.rows_total,
+            "progress": min(1.0, migration.rows_done / migration.rows_total) if migration.rows_total else 1.0,
+            "avg_rows_per_second": round(rate, 1),
+            "eta_seconds": round(backfill_eta(remaining, rate), 1) if migration.state == STATE_BACKFILLING else 0.0,
+            "read_namespaces": migration.read_namespaces or [],
+            "created_at": migration.created_at.isoformat() if migration.created_at else None,
+            "completed_at": migration.completed_at.isoformat() if migration.completed_at else None
+        }
+
+
+_embedding_migration_service: Optional[EmbeddingMigrationService] = None
+
+
+def get_embedding_migration_service() -> EmbeddingMigrationService:
+    """获取全局嵌入模型迁移服务"""
+    global _embedding_migration_service
+    if _embedding_migration_service is None:
+        _embedding_migration_service = EmbeddingMigrationService()
+    return _embedding_migration_service
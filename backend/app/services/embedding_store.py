@@ -0,0 +1,272 @@
+"""
+内容寻址嵌入向量存储
+
+上传的文档常包含大量重复内容 (页眉、免责声明、重复附件),
+每个副本都会重新调用一次嵌入模型。本服务按 (模型标识, 规范化文本哈希)
+缓存向量, 上传和增量索引在调用模型前先查询:
+
+1. 批内去重: 同一批中规范化后相同的文本只保留一个
+2. 存储命中: 已存储的哈希直接复用向量
+3. 其余文本批量调用模型, 结果写回存储
+
+模型标识取自 EmbeddingService.model_key (后端:模型名),
+HuggingFace 与 OpenAI 后端的向量互不混用。
+"""
+
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config.logging_config import get_app_logger
+from app.config.settings import EMBEDDING_STORE_ENABLED, EMBEDDING_STORE_LOOKUP_BATCH
+from app.models.embedding_store import EmbeddingStoreEntry
+from app.monitoring.metrics import record_embedding_dedup
+from app.monitoring.tracing import trace_span
+from app.services.vector_index import parse_embedding
+
+logger = get_app_logger()
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化文本: NFKC (全角/半角统一) + 折叠空白 + 去首尾空白
+
+    不改变大小写, 避免对大小写敏感的模型复用错误的向量
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+def compute_text_hash(text: str) -> str:
+    """计算规范化文本的 SHA-256 哈希"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class EmbeddingBatchStats:
+    """一批嵌入请求的去重统计"""
+    total: int = 0
+    unique: int = 0
+    store_hits: int = 0
+    model_calls: int = 0
+
+    @property
+    def batch_duplicates(self) -> int:
+        return self.total - self.unique
+
+    @property
+    def model_calls_saved(self) -> int:
+        return self.total - self.model_calls
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.model_calls_saved / self.total if self.total else 0.0
+
+    def merge(self, other: "EmbeddingBatchStats"):
+        self.total += other.total
+        self.unique += other.unique
+        self.store_hits += other.store_hits
+        self.model_calls += other.model_calls
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["batch_duplicates"] = self.batch_duplicates
+        data["model_calls_saved"] = self.model_calls_saved
+        data["dedup_ratio"] = round(self.dedup_ratio, 4)
+        return data
+
+
+def plan_batch(texts: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    计算每个文本的哈希, 并按首次出现顺序收集去重后的文本
+
+    Returns:
+        (hashes, unique): hashes 与 texts 一一对应; unique 为 哈希 -> 代表文本
+    """
+    hashes = []
+    unique: Dict[str, str] = {}
+    for text in texts:
+        text_hash = compute_text_hash(text)
+        hashes.append(text_hash)
+        unique.setdefault(text_hash, text)
+    return hashes, unique
+
+
+def _to_list(value) -> List[float]:
+    """数据库返回的向量 (ndarray / 字符串) 转为列表"""
+    return parse_embedding(value).tolist()
+
+
+class EmbeddingStore:
+    """内容寻址嵌入向量存储"""
+
+    def __init__(self, enabled: bool = EMBEDDING_STORE_ENABLED, lookup_batch: int = EMBEDDING_STORE_LOOKUP_BATCH):
+        self.enabled = enabled
+        self.lookup_batch = lookup_batch
+
+    def lookup(self, db: Session, model_key: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        批量查询已存储的向量, 并更新命中计数
+
+        Returns:
+            Dict[str, List[float]]: 哈希 -> 向量
+        """
+        found: Dict[str, List[float]] = {}
+        for i in range(0, len(hashes), self.lookup_batch):
+            batch = hashes[i:i + self.lookup_batch]
+            rows = db.query(
+                EmbeddingStoreEntry.text_hash,
+                EmbeddingStoreEntry.embedding
+            ).filter(
+                EmbeddingStoreEntry.model_name == model_key,
+                EmbeddingStoreEntry.text_hash.in_(batch)
+            ).all()
+            for row in rows:
+                found[row.text_hash] = _to_list(row.embedding)
+
+        if found:
+            db.query(EmbeddingStoreEntry).filter(
+                EmbeddingStoreEntry.model_name == model_key,
+                EmbeddingStoreEntry.text_hash.in_(list(found))
+            ).update({
+                EmbeddingStoreEntry.hit_count: EmbeddingStoreEntry.hit_count + 1,
+                EmbeddingStoreEntry.last_used_at: datetime.now()
+            }, synchronize_session=False)
+
+        return found
+
+    def save(self, db: Session, model_key: str, items: Dict[str, Tuple[str, List[float]]]):
+        """
+        写入新生成的向量, 并发写入同一哈希时保留先到者
+
+        Args:
+            items: 哈希 -> (文本, 向量)
+        """
+        if not items:
+            return
+        now = datetime.now()
+        db.execute(
+            insert(EmbeddingStoreEntry).values([
+                {
+                    "model_name": model_key,
+                    "text_hash": text_hash,
+                    "embedding": list(embedding),
+                    "text_length": len(text),
+                    "hit_count": 0,
+                    "created_at": now,
+                    "last_used_at": now
+                }
+                for text_hash, (text, embedding) in items.items()
+            ]).on_conflict_do_nothing(index_elements=["model_name", "text_hash"])
+        )
+
+    def _prepare(self, db: Session, model_key: str, texts: List[str]):
+        """批内去重并查询存储, 返回 (hashes, unique, found, missing)"""
+        hashes, unique = plan_batch(texts)
+        found: Dict[str, List[float]] = {}
+        if self.enabled:
+            try:
+                # 使用 SAVEPOINT, 存储异常不影响调用方事务
+                with db.begin_nested():
+                    with trace_span("embedding_store_lookup", count=len(unique)):
+                        found = self.lookup(db, model_key, list(unique))
+            except Exception as e:
+                logger.warning(f"嵌入存储查询失败, 直接调用模型: {e}")
+                found = {}
+        missing = [text_hash for text_hash in unique if text_hash not in found]
+        return hashes, unique, found, missing
+
+    def _finish(
+        self,
+        db: Session,
+        model_key: str,
+        hashes: List[str],
+        unique: Dict[str, str],
+        found: Dict[str, List[float]],
+        missing: List[str],
+        new_embeddings: List[List[float]]
+    ) -> Tuple[List[List[float]], EmbeddingBatchStats]:
+        """写回新向量, 按原始顺序组装结果并记录统计"""
+        generated = dict(zip(missing, new_embeddings))
+
+        if self.enabled and generated:
+            try:
+                with db.begin_nested():
+                    self.save(db, model_key, {
+                        text_hash: (unique[text_hash], embedding)
+                        for text_hash, embedding in generated.items()
+                    })
+            except Exception as e:
+                logger.warning(f"嵌入存储写入失败: {e}")
+
+        vectors = {**found, **generated}
+        embeddings = [vectors[text_hash] for text_hash in hashes]
+
+        stats = EmbeddingBatchStats(
+            total=len(hashes),
+            unique=len(unique),
+            store_hits=len(found),
+            model_calls=len(missing)
+        )
+        record_embedding_dedup(stats.store_hits, stats.batch_duplicates, stats.model_calls)
+        if stats.total:
+            logger.info(
+                f"嵌入去重 [{model_key}]: 总数={stats.total}, 批内重复={stats.batch_duplicates}, "
+                f"存储命中={stats.store_hits}, 模型调用={stats.model_calls}, "
+                f"节省={stats.model_calls_saved}, 去重率={stats.dedup_ratio:.1%}"
+            )
+        return embeddings, stats
+
+    def get_or_embed(
+        self,
+        db: Session,
+        texts: List[str],
+        model_key: str,
+        embed_fn: Callable[[List[str]], List[List[float]]]
+    ) -> Tuple[List[List[float]], EmbeddingBatchStats]:
+        """
+        同步获取向量: 先查存储, 未命中的文本调用 embed_fn 批量生成
+
+        Args:
+            db: 数据库会话 (新向量随调用方事务提交)
+            texts: 文本列表
+            model_key: 模型标识
+            embed_fn: 批量嵌入函数
+
+        Returns:
+            (embeddings, stats): 与 texts 一一对应的向量列表及去重统计
+        """
+        hashes, unique, found, missing = self._prepare(db, model_key, texts)
+        new_embeddings = embed_fn([unique[h] for h in missing]) if missing else []
+        return self._finish(db, model_key, hashes, unique, found, missing, new_embeddings)
+
+    async def aget_or_embed(
+        self,
+        db: Session,
+        texts: List[str],
+        model_key: str,
+        embed_fn
+    ) -> Tuple[List[List[float]], EmbeddingBatchStats]:
+        """异步版本, embed_fn 为返回向量列表的协程函数"""
+        hashes, unique, found, missing = self._prepare(db, model_key, texts)
+        new_embeddings = await embed_fn([unique[h] for h in missing]) if missing else []
+        return self._finish(db, model_key, hashes, unique, found, missing, new_embeddings)
+
+
+# 全局实例
+_embedding_store: Optional[EmbeddingStore] = None
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """获取嵌入向量存储实例"""
+    global _embedding_store
+    if _embedding_store is None:
+        _embedding_store = EmbeddingStore()
+    return _embedding_store
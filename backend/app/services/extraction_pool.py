@@ -0,0 +1,172 @@
+"""
+文本提取进程池
+
+PyPDF2 / python-docx 的解析是纯 Python 的 CPU 密集操作,
+放在进程池中执行, 既不阻塞事件循环, 也能利用多核:
+
+- 大 PDF 按页区间拆分为多个任务并行提取, 按页序产出 (有界在途窗口)
+- DOCX / TXT 整个文件作为一个任务
+- 单文件提取超时 (EXTRACT_TIMEOUT) 后取消未开始的任务并抛出 ExtractionError
+- worker 异常退出 (如大 PDF 被 OOM kill) 或提取超时后丢弃进程池, 下次调用重建
+- 记录提取耗时与 PDF 页/秒吞吐量
+
+说明: 已在 worker 中运行的任务无法被中断, 超时只保证调用方及时返回;
+丢弃进程池让后续提取使用新的 worker, 不被卡住的任务长期占满。
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, Optional, Tuple
+
+from app.config.logging_config import get_app_logger
+from app.config.settings import (
+    EXTRACT_WORKERS,
+    EXTRACT_TIMEOUT,
+    EXTRACT_PDF_PAGES_PER_TASK,
+    EXTRACT_PDF_FANOUT_MIN_PAGES,
+    EXTRACT_START_METHOD,
+)
+from app.monitoring.metrics import record_extraction
+from app.services.document_extractor import (
+    ExtractionError,
+    TextPiece,
+    count_pdf_pages,
+    extract_file_text,
+    extract_pdf_pages,
+)
+
+logger = get_app_logger()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_count() -> int:
+    """进程池大小 (EXTRACT_WORKERS=0 时取 CPU 核数)"""
+    return EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """获取提取进程池 (懒加载)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # 默认 spawn: 避免在已加载模型/线程的进程中 fork
+                _pool = ProcessPoolExecutor(
+                    max_workers=get_worker_count(),
+                    mp_context=multiprocessing.get_context(EXTRACT_START_METHOD)
+                )
+                logger.info(f"文本提取进程池已启动: workers={get_worker_count()}, start_method={EXTRACT_START_METHOD}")
+    return _pool
+
+
+def discard_extraction_pool(pool: ProcessPoolExecutor, reason: str):
+    """
+    丢弃不可用的进程池 (worker 异常退出或任务超时), 下次 get_extraction_pool 重建
+
+    只在 pool 仍是当前进程池时丢弃, 不会误关其他线程刚重建的新进程池。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    logger.warning(f"文本提取进程池已丢弃, 下次提取时重建: {reason}")
+
+
+def submit_extraction(fn, *args) -> Tuple[ProcessPoolExecutor, Future]:
+    """
+    向提取进程池提交任务; 进程池已损坏 (之前有 worker 异常退出) 时丢弃并在新进程池上重试一次
+
+    Returns:
+        (进程池, future): 等待结果出错时用该进程池调用 discard_extraction_pool
+    """
+    pool = get_extraction_pool()
+    try:
+        return pool, pool.submit(fn, *args)
+    except BrokenProcessPool as e:
+        discard_extraction_pool(pool, str(e))
+        pool = get_extraction_pool()
+        return pool, pool.submit(fn, *args)
+
+
+def shutdown_extraction_pool():
+    """关闭提取进程池 (应用关闭时调用)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            logger.info("文本提取进程池已关闭")
+
+
+def iter_document_text_parallel(
+    file_path: str,
+    filename: str,
+    timeout: float = EXTRACT_TIMEOUT
+) -> Iterator[TextPiece]:
+    """
+    在进程池中提取文本, 产出格式与 iter_document_text 相同
+
+    同步生成器, 供流式入库流水线的生产者线程消费。
+
+    Raises:
+        ExtractionError: 提取失败或超时
+    """
+    pool = None
+    deadline = time.monotonic() + timeout
+    start = time.perf_counter()
+    file_type = filename.rsplit('.', 1)[-1].lower()
+    in_flight = deque()
+
+    def remaining() -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    try:
+        if file_type != 'pdf':
+            pool, future = submit_extraction(extract_file_text, file_path, filename)
+            text, units = future.result(timeout=remaining())
+            yield text, units, units
+            record_extraction(file_type, 0, time.perf_counter() - start)
+            return
+
+        pool, future = submit_extraction(count_pdf_pages, file_path)
+        total = future.result(timeout=remaining())
+        step = EXTRACT_PDF_PAGES_PER_TASK if total >= EXTRACT_PDF_FANOUT_MIN_PAGES else max(total, 1)
+        ranges = deque((i, min(i + step, total)) for i in range(0, total, step))
+        # 在途任务数有上限, 已提取但未消费的页不会无限堆积
+        window = get_worker_count() * 2
+
+        done = 0
+        while ranges or in_flight:
+            while ranges and len(in_flight) < window:
+                page_start, page_end = ranges.popleft()
+                in_flight.append(pool.submit(extract_pdf_pages, file_path, page_start, page_end))
+
+            for text in in_flight.popleft().result(timeout=remaining()):
+                done += 1
+                yield text, done, total
+
+        record_extraction(file_type, total, time.perf_counter() - start)
+
+    except FuturesTimeoutError:
+        # 超时的任务仍占着 worker, 换新进程池避免后续提取排在它们后面
+        discard_extraction_pool(pool, f"提取超时: {filename}")
+        raise ExtractionError(f"提取超时 ({timeout:.0f}s): {filename}")
+    except BrokenProcessPool as e:
+        discard_extraction_pool(pool, str(e))
+        raise ExtractionError(f"提取进程异常退出: {filename}: {e}") from e
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise ExtractionError(f"提取失败: {filename}: {e}") from e
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -12,6 +12,7 @@ from app.services.bm25_retrieval import get_bm25_service
 from app.services.reranker_service import get_reranker
 from app.models.document import DocumentChunk
 from app.config.logging_config import get_app_logger
+from app.monitoring.tracing import trace_span
 
 logger = get_app_logger()
 
@@ -34,7 +35,8 @@ class HybridRetrieval:
         top_k: int = 10,
         alpha: float = 0.5,  # 向量检索权重
         use_rrf: bool = True,
-        use_rerank: Optional[bool] = None  # None=使用默认设置
+        use_rerank: Optional[bool] = None,  # None=使用默认设置
+        search_params: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         在指定领域内进行混合检索
@@ -47,6 +49,7 @@ class HybridRetrieval:
                    0.0 = 纯BM25, 1.0 = 纯向量, 0.5 = 均衡
             use_rrf: 是否使用RRF融合算法(否则使用加权平均)
             use_rerank: 是否使用 Rerank 精排 (None=使用默认设置)
+            search_params: 进程内向量索引的检索参数 (如 nprobe / ef_search)
 
         Returns:
             List[Dict]: 混合检索结果
@@ -68,7 +71,8 @@ class HybridRetrieval:
                 db=self.db,
                 query_text=query,
                 namespace=namespace,
-                top_k=candidate_k  # 获取更多结果用于融合和重排
+                top_k=candidate_k,  # 获取更多结果用于融合和重排
+                search_params=search_params
             )
 
             bm25_task = self.bm25_retrieval.search_by_namespace(
@@ -107,30 +111,32 @@ class HybridRetrieval:
                 initial_results = vector_results[:candidate_k]
             else:
                 # 4. 融合两种检索结果
-                if use_rrf:
-                    initial_results = self._rrf_fusion(
-                        vector_results, bm25_results, alpha, candidate_k
-                    )
-                else:
-                    initial_results = self._weighted_fusion(
-                        vector_results, bm25_results, alpha, candidate_k
-                    )
+                with trace_span("fusion", method="rrf" if use_rrf else "weighted"):
+                    if use_rrf:
+                        initial_results = self._rrf_fusion(
+                            vector_results, bm25_results, alpha, candidate_k
+                        )
+                    else:
+                        initial_results = self._weighted_fusion(
+                            vector_results, bm25_results, alpha, candidate_k
+                        )
 
             # 5. Rerank 精排
             if should_rerank and self.reranker and len(initial_results) > 1:
                 try:
                     logger.info(f"开始 Rerank,候选数: {len(initial_results)}")
 
-                    # 将 Dict 转换为 DocumentChunk 对象
-                    chunks = self._convert_to_chunks(initial_results)
-
-                    # Rerank
-                    reranked_chunks = await self.reranker.rerank(
-                        query=query,
-                        chunks=chunks,
-                        top_k=top_k,
-                        return_scores=False
-                    )
+                    with trace_span("rerank", candidates=len(initial_results)):
+                        # 将 Dict 转换为 DocumentChunk 对象
+                        chunks = self._convert_to_chunks(initial_results)
+
+                        # Rerank
+                        reranked_chunks = await self.reranker.rerank(
+                            query=query,
+                            chunks=chunks,
+                            top_k=top_k,
+                            return_scores=False
+                        )
 
                     # 转换回 Dict 格式
                     final_results = self._convert_from_chunks(reranked_chunks)
@@ -2,17 +2,25 @@
 增量索引服务
 负责文档的增量更新、删除和重建
 """
+import heapq
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, undefer_group
+from sqlalchemy import and_, func
+
+from app.config.settings import INDEX_EMBED_BATCH_SIZE, INDEX_SUBBATCH_MAX_CHARS, INDEX_SUBBATCH_MAX_DOCS
 
 from app.models.database import Document
 from app.models.document import DocumentChunk
 from app.models.index_record import DocumentIndexRecord, IndexChangeHistory
 from app.services.change_detector import ChangeDetector
+from app.services.document_deletion import delete_chunks
 from app.services.embedding import embedding_service
+from app.services.embedding_migration import get_embedding_migration_service
+from app.services.embedding_store import EmbeddingBatchStats, get_embedding_store
+from app.services.index_invalidation import invalidate_index, notify_chunks_added
+from app.services.text_chunker import TextChunk, text_chunker, compute_chunk_hash
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +37,9 @@ class IncrementalIndexer:
         self,
         doc: Document,
         user_id: Optional[int] = None,
-        force: bool = False
+        force: bool = False,
+        chunks: Optional[List[TextChunk]] = None,
+        prefetched: Optional[Dict[str, List[float]]] = None
     ) -> Dict:
         """
         索引单个文档（增量模式）
@@ -38,6 +48,8 @@ class IncrementalIndexer:
             doc: 文档对象
             user_id: 操作用户ID
             force: 是否强制重新索引
+            chunks: 已计算的分块 (批量索引时预先分块)
+            prefetched: 分块哈希 -> 已生成的向量 (批量索引时跨文档合并生成)
 
         Returns:
             索引结果字典
@@ -50,6 +62,7 @@ class IncrementalIndexer:
             'action': None,  # 'created', 'updated', 'skipped'
             'chunks_added': 0,
             'chunks_removed': 0,
+            'chunks_reused': 0,
             'error': None
         }
 
@@ -72,43 +85,24 @@ class IncrementalIndexer:
             old_hash = index_record.content_hash if index_record else None
             old_chunk_count = index_record.chunk_count if index_record else 0
 
-            # 删除旧的文档块
-            if index_record:
-                deleted_count = self.db.query(DocumentChunk).filter(
-                    DocumentChunk.document_id == doc.id
-                ).delete()
-                result['chunks_removed'] = deleted_count
-                logger.debug(f"删除文档 {doc.id} 的 {deleted_count} 个旧块")
-
-            # 重新分块和嵌入
-            # 注意：这里复用现有的分块逻辑，需要从documents router中提取
-            chunks = self._chunk_document(doc)
-            result['chunks_added'] = len(chunks)
-
-            # 批量生成嵌入向量
-            embeddings = self._generate_embeddings_batch([chunk['content'] for chunk in chunks])
-
-            # 保存文档块
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                doc_chunk = DocumentChunk(
-                    document_id=doc.id,
-                    content=chunk['content'],
-                    chunk_index=i,
-                    embedding=embedding,
-                    chunk_metadata=chunk.get('metadata', ''),
-                    filename=doc.filename,
-                    namespace=doc.namespace,
-                    domain_tags=doc.domain_tags
-                )
-                self.db.add(doc_chunk)
+            # 分块级比对: 按内容哈希复用未变更分块的向量, 只对新增分块生成向量
+            if chunks is None:
+                chunks = self._chunk_document(doc)
+            chunk_stats = self._sync_chunks(doc, chunks, prefetched)
+            result['chunks_added'] = chunk_stats['added']
+            result['chunks_removed'] = chunk_stats['removed']
+            result['chunks_reused'] = chunk_stats['reused']
+            result['embedding_dedup'] = chunk_stats['embedding'].to_dict()
 
             # 更新或创建索引记录
             if index_record:
                 # 更新现有记录
                 index_record.content_hash = content_hash
                 index_record.chunk_count = len(chunks)
-                index_record.vector_count = len(embeddings)
+                index_record.vector_count = len(chunks)
                 index_record.indexed_at = datetime.now()
+                index_record.file_size = doc.file_size or len(doc.content or "")
+                index_record.file_modified_at = doc.file_modified_at
                 index_record.index_version += 1
                 result['action'] = 'updated'
             else:
@@ -117,9 +111,9 @@ class IncrementalIndexer:
                     doc_id=doc.id,
                     content_hash=content_hash,
                     chunk_count=len(chunks),
-                    vector_count=len(embeddings),
+                    vector_count=len(chunks),
                     indexed_at=datetime.now(),
-                    file_size=len(doc.content or ""),
+                    file_size=doc.file_size or len(doc.content or ""),
                     file_modified_at=doc.file_modified_at,
                     namespace=doc.namespace
                 )
@@ -139,17 +133,27 @@ class IncrementalIndexer:
                 new_hash=content_hash,
                 old_chunk_count=old_chunk_count,
                 new_chunk_count=len(chunks),
-                user_id=user_id
+                user_id=user_id,
+                chunk_stats=chunk_stats
             )
 
             # 提交事务
+            namespace = doc.namespace
             self.db.commit()
 
+            # 通知进程内检索结构: 剔除删除的块, 加入新写入的块
+            if chunk_stats['removed_ids']:
+                invalidate_index([], {namespace: chunk_stats['removed_ids']})
+            if chunk_stats['added_ids']:
+                notify_chunks_added({namespace: (chunk_stats['added_ids'], chunk_stats['added_vectors'])})
+
             duration = (datetime.now() - start_time).total_seconds()
             result['duration_seconds'] = duration
 
             logger.info(f"文档 {doc.id} 索引完成: {result['action']}, "
-                       f"块数={len(chunks)}, 耗时={duration:.2f}s")
+                       f"块数={len(chunks)}, 复用={chunk_stats['reused']}, "
+                       f"新增={chunk_stats['added']}, 删除={chunk_stats['removed']}, "
+                       f"耗时={duration:.2f}s")
 
         except Exception as e:
             self.db.rollback()
@@ -196,9 +200,8 @@ class IncrementalIndexer:
             old_chunk_count = index_record.chunk_count
 
             # 删除文档块
-            deleted_count = self.db.query(DocumentChunk).filter(
-                DocumentChunk.document_id == doc_id
-            ).delete()
+            deleted_chunks = delete_chunks(self.db, [doc_id])
+            deleted_count = sum(len(chunk_ids) for chunk_ids in deleted_chunks.values())
             result['chunks_deleted'] = deleted_count
 
             # 删除索引记录
@@ -216,6 +219,7 @@ class IncrementalIndexer:
             )
 
             self.db.commit()
+            invalidate_index([doc_id], deleted_chunks)
             logger.info(f"文档 {doc_id} 索引已删除，删除 {deleted_count} 个块")
 
         except Exception as e:
@@ -251,97 +255,295 @@ class IncrementalIndexer:
             'skipped': 0,
             'details': []
         }
+        embedding_stats = EmbeddingBatchStats()
+
+        # 一次查询加载全部文档, 按请求顺序处理
+        docs = {
+            doc.id: doc
+            for doc in self.db.query(Document).options(
+                undefer_group('tracking')
+            ).filter(Document.id.in_(doc_ids)).all()
+        } if doc_ids else {}
+
+        # 预先分块, 并把所有文档的新增分块合并成大批次生成向量
+        plans, prefetched, prefetch_stats = self._prefetch_embeddings(
+            [docs[doc_id] for doc_id in doc_ids if doc_id in docs]
+        )
+        embedding_stats.merge(prefetch_stats)
 
         for i, doc_id in enumerate(doc_ids, 1):
-            # 获取文档
-            doc = self.db.query(Document).filter(Document.id == doc_id).first()
+            doc = docs.get(doc_id)
             if not doc:
-                results['failed'] += 1
-                results['details'].append({
+                result = {
                     'doc_id': doc_id,
                     'status': 'not_found',
                     'error': '文档不存在'
-                })
-                continue
-
-            # 索引文档
-            result = self.index_document(doc, user_id=user_id)
-            results['details'].append(result)
-
-            # 统计
-            if result['status'] == 'success':
-                if result['action'] == 'skipped':
-                    results['skipped'] += 1
-                else:
-                    results['success'] += 1
-            else:
+                }
                 results['failed'] += 1
+                results['details'].append(result)
+            else:
+                # 索引文档 (逐个提交, 单个文档失败不影响其余文档)
+                if doc_id in plans:
+                    result = self.index_document(
+                        doc,
+                        user_id=user_id,
+                        force=True,
+                        chunks=plans[doc_id],
+                        prefetched=prefetched
+                    )
+                else:
+                    result = self.index_document(doc, user_id=user_id)
+                results['details'].append(result)
+
+                # 统计
+                if result.get('embedding_dedup'):
+                    dedup = result['embedding_dedup']
+                    embedding_stats.merge(EmbeddingBatchStats(
+                        total=dedup['total'],
+                        unique=dedup['unique'],
+                        store_hits=dedup['store_hits'],
+                        model_calls=dedup['model_calls']
+                    ))
+                if result['status'] == 'success':
+                    if result['action'] == 'skipped':
+                        results['skipped'] += 1
+                    else:
+                        results['success'] += 1
+                else:
+                    results['failed'] += 1
 
             # 进度回调
             if progress_callback:
                 progress_callback(i, total, doc_id, result)
 
-            # 定期提交（每10个文档）
-            if i % 10 == 0:
-                self.db.commit()
-                logger.debug(f"批量索引进度: {i}/{total}")
-
-        # 最终提交
-        self.db.commit()
+        results['embedding_dedup'] = embedding_stats.to_dict()
 
         logger.info(f"批量索引完成: 总数={total}, 成功={results['success']}, "
-                   f"跳过={results['skipped']}, 失败={results['failed']}")
+                   f"跳过={results['skipped']}, 失败={results['failed']}, "
+                   f"节省模型调用={embedding_stats.model_calls_saved}, "
+                   f"去重率={embedding_stats.dedup_ratio:.1%}")
 
         return results
 
-    def _chunk_document(self, doc: Document) -> List[Dict]:
+    def _prefetch_embeddings(
+        self,
+        docs: List[Document]
+    ) -> Tuple[Dict[int, List[TextChunk]], Dict[str, List[float]], EmbeddingBatchStats]:
+        """
+        为一批文档预先分块, 并跨文档合并新增分块批量生成向量
+
+        - 内容哈希与索引记录一致的文档 (将被跳过) 不分块
+        - 存在旧版本无哈希分块的文档走逐个索引路径 (需要按内容回填哈希)
+
+        Returns:
+            (plans, vectors, stats): 文档ID -> 分块; 分块哈希 -> 向量; 去重统计
+        """
+        stats = EmbeddingBatchStats()
+        if not docs:
+            return {}, {}, stats
+
+        doc_ids = [doc.id for doc in docs]
+        indexed_hashes = dict(self.db.query(
+            DocumentIndexRecord.doc_id,
+            DocumentIndexRecord.content_hash
+        ).filter(DocumentIndexRecord.doc_id.in_(doc_ids)).all())
+
+        existing: Dict[int, set] = {}
+        legacy = set()
+        for row in self.db.query(
+            DocumentChunk.document_id,
+            DocumentChunk.content_hash
+        ).filter(DocumentChunk.document_id.in_(doc_ids)):
+            if row.content_hash:
+                existing.setdefault(row.document_id, set()).add(row.content_hash)
+            else:
+                legacy.add(row.document_id)
+
+        plans: Dict[int, List[TextChunk]] = {}
+        pending: Dict[str, str] = {}  # 分块哈希 -> 内容
+        for doc in docs:
+            if doc.id in legacy:
+                continue
+            if indexed_hashes.get(doc.id) == self.change_detector.compute_content_hash(doc.content or ""):
+                continue
+            chunks = self._chunk_document(doc)
+            plans[doc.id] = chunks
+            known = existing.get(doc.id, set())
+            for chunk in chunks:
+                if chunk.content_hash not in known:
+                    pending.setdefault(chunk.content_hash, chunk.content)
+
+        vectors: Dict[str, List[float]] = {}
+        hashes = list(pending)
+        for i in range(0, len(hashes), INDEX_EMBED_BATCH_SIZE):
+            batch = hashes[i:i + INDEX_EMBED_BATCH_SIZE]
+            embeddings, batch_stats = self._generate_embeddings_batch([pending[h] for h in batch])
+            vectors.update(zip(batch, embeddings))
+            stats.merge(batch_stats)
+
+        logger.info(f"批量预生成向量: 文档={len(plans)}, 新增分块={len(hashes)}, "
+                   f"模型调用={stats.model_calls}")
+        return plans, vectors, stats
+
+    def get_content_sizes(self, doc_ids: List[int]) -> Dict[int, int]:
+        """查询文档内容长度 (字符数), 用于切分子批次"""
+        if not doc_ids:
+            return {}
+        return dict(self.db.query(
+            Document.id,
+            func.coalesce(func.length(Document.content), 0)
+        ).filter(Document.id.in_(doc_ids)).all())
+
+    def _chunk_document(self, doc: Document) -> List[TextChunk]:
         """
         分块文档内容
 
+        使用内容定义边界的分块器, 未修改区域的分块边界与内容保持稳定
+
         Args:
             doc: 文档对象
 
         Returns:
-            块列表，每个块为字典 {'content': str, 'metadata': str}
+            分块列表
         """
-        # TODO: 从现有的分块逻辑中提取
-        # 这里简化实现，实际应复用documents router中的逻辑
-        content = doc.content or ""
-        max_chunk_size = 1500
-        overlap = 300
-
-        chunks = []
-        start = 0
-        while start < len(content):
-            end = min(start + max_chunk_size, len(content))
-            chunk_content = content[start:end]
-
-            chunks.append({
-                'content': chunk_content,
-                'metadata': f'{{"start": {start}, "end": {end}}}'
-            })
+        return text_chunker.split(doc.content or "")
+
+    def _sync_chunks(
+        self,
+        doc: Document,
+        chunks: List[TextChunk],
+        prefetched: Optional[Dict[str, List[float]]] = None
+    ) -> Dict:
+        """
+        将新分块与数据库中已有分块按内容哈希比对并同步
+
+        - 哈希相同的分块原地保留 (复用向量), 仅更新序号和偏移
+        - 新出现的哈希优先使用预生成的向量, 否则查嵌入存储, 未命中才调用模型, 然后插入
+        - 消失的哈希对应的分块删除
+
+        Args:
+            doc: 文档对象
+            chunks: 新的分块列表
+            prefetched: 分块哈希 -> 已生成的向量
 
-            start = end - overlap if end < len(content) else end
+        Returns:
+            {'reused': int, 'added': int, 'removed': int, 'embedding': EmbeddingBatchStats,
+             'added_ids': 新块ID, 'added_vectors': 新块向量, 'removed_ids': 删除的块ID}
+        """
+        existing = self.db.query(
+            DocumentChunk.id,
+            DocumentChunk.content_hash
+        ).filter(
+            DocumentChunk.document_id == doc.id
+        ).all()
+
+        # 旧版本写入的分块没有哈希, 按内容回填
+        missing_hash_ids = [row.id for row in existing if not row.content_hash]
+        backfilled = {}
+        if missing_hash_ids:
+            for row in self.db.query(DocumentChunk.id, DocumentChunk.content).filter(
+                DocumentChunk.id.in_(missing_hash_ids)
+            ):
+                backfilled[row.id] = compute_chunk_hash((row.content or "").strip())
+
+        # 哈希 -> 可复用的分块ID列表 (同一文档内可能有重复内容)
+        reusable: Dict[str, List[int]] = {}
+        for row in existing:
+            chunk_hash = row.content_hash or backfilled.get(row.id)
+            reusable.setdefault(chunk_hash, []).append(row.id)
+
+        kept = []  # (chunk_id, TextChunk)
+        new_chunks: List[TextChunk] = []
+        for chunk in chunks:
+            candidates = reusable.get(chunk.content_hash)
+            if candidates:
+                kept.append((candidates.pop(), chunk))
+            else:
+                new_chunks.append(chunk)
+
+        removed_ids = [chunk_id for ids in reusable.values() for chunk_id in ids]
+        if removed_ids:
+            self.db.query(DocumentChunk).filter(
+                DocumentChunk.id.in_(removed_ids)
+            ).delete(synchronize_session=False)
+
+        # 保留的分块只更新位置信息, 不触碰 embedding 列
+        if kept:
+            self.db.bulk_update_mappings(DocumentChunk, [
+                {
+                    'id': chunk_id,
+                    'chunk_index': chunk.index,
+                    'chunk_metadata': chunk.metadata,
+                    'content_hash': chunk.content_hash,
+                    'filename': doc.filename,
+                    'namespace': doc.namespace,
+                    'domain_tags': doc.domain_tags
+                }
+                for chunk_id, chunk in kept
+            ])
+
+        embedding_stats = EmbeddingBatchStats()
+        added_rows = []  # (DocumentChunk, embedding)
+        if new_chunks:
+            prefetched = prefetched or {}
+            missing = [chunk for chunk in new_chunks if chunk.content_hash not in prefetched]
+            vectors = {chunk.content_hash: prefetched[chunk.content_hash]
+                       for chunk in new_chunks if chunk.content_hash in prefetched}
+            if missing:
+                embeddings, embedding_stats = self._generate_embeddings_batch([chunk.content for chunk in missing])
+                vectors.update((chunk.content_hash, embedding) for chunk, embedding in zip(missing, embeddings))
+            for chunk in new_chunks:
+                embedding = vectors[chunk.content_hash]
+                row = DocumentChunk(
+                    document_id=doc.id,
+                    content=chunk.content,
+                    chunk_index=chunk.index,
+                    embedding=embedding,
+                    chunk_metadata=chunk.metadata,
+                    content_hash=chunk.content_hash,
+                    filename=doc.filename,
+                    namespace=doc.namespace,
+                    domain_tags=doc.domain_tags
+                )
+                self.db.add(row)
+                added_rows.append((row, embedding))
+            # 取得自增ID (提交后访问会逐行刷新)
+            self.db.flush()
+            # 嵌入模型迁移期间同时写入新模型向量 (与分块同一事务)
+            get_embedding_migration_service().dual_write(
+                self.db, [row.id for row, _ in added_rows], [row.content for row, _ in added_rows]
+            )
 
-        return chunks
+        return {
+            'reused': len(kept),
+            'added': len(new_chunks),
+            'removed': len(removed_ids),
+            'embedding': embedding_stats,
+            'added_ids': [row.id for row, _ in added_rows],
+            'added_vectors': [embedding for _, embedding in added_rows],
+            'removed_ids': removed_ids
+        }
 
-    def _generate_embeddings_batch(self, texts: List[str]) -> List:
+    def _generate_embeddings_batch(self, texts: List[str]) -> Tuple[List, EmbeddingBatchStats]:
         """
         批量生成嵌入向量
 
+        先查内容寻址嵌入存储, 只对未命中的文本调用模型
+
         Args:
             texts: 文本列表
 
         Returns:
-            嵌入向量列表
+            (嵌入向量列表, 去重统计)
         """
         try:
-            # 使用embedding service批量生成
-            embeddings = []
-            for text in texts:
-                embedding = self.embedding_service.get_embedding(text)
-                embeddings.append(embedding)
-            return embeddings
+            # 索引器运行在同步上下文 (Celery worker / 同步接口), 使用模型的同步批量接口
+            return get_embedding_store().get_or_embed(
+                self.db,
+                texts,
+                self.embedding_service.model_key,
+                self.embedding_service.embed_documents_sync
+            )
         except Exception as e:
             logger.error(f"批量生成嵌入失败: {e}")
             raise
@@ -354,9 +556,23 @@ class IncrementalIndexer:
         new_hash: Optional[str],
         old_chunk_count: int,
         new_chunk_count: int,
-        user_id: Optional[int] = None
+        user_id: Optional[int] = None,
+        chunk_stats: Optional[Dict] = None
     ):
         """记录变更历史"""
+        change_details = {
+            'hash_changed': old_hash != new_hash if old_hash and new_hash else True,
+            'chunk_count_delta': new_chunk_count - old_chunk_count
+        }
+        if chunk_stats:
+            change_details.update({
+                'chunks_reused': chunk_stats['reused'],
+                'chunks_added': chunk_stats['added'],
+                'chunks_removed': chunk_stats['removed']
+            })
+            if chunk_stats.get('embedding'):
+                change_details['embedding_model_calls_saved'] = chunk_stats['embedding'].model_calls_saved
+
         history = IndexChangeHistory(
             doc_id=doc_id,
             change_type=change_type,
@@ -366,14 +582,53 @@ class IncrementalIndexer:
             new_chunk_count=new_chunk_count,
             user_id=user_id,
             changed_at=datetime.now(),
-            change_details={
-                'hash_changed': old_hash != new_hash if old_hash and new_hash else True,
-                'chunk_count_delta': new_chunk_count - old_chunk_count
-            }
+            change_details=change_details
         )
         self.db.add(history)
 
 
+def plan_index_batches(
+    sizes: Dict[int, int],
+    max_chars: int = INDEX_SUBBATCH_MAX_CHARS,
+    max_docs: int = INDEX_SUBBATCH_MAX_DOCS
+) -> List[List[int]]:
+    """
+    按内容长度把文档切分为负载均衡的子批次
+
+    子批次数取 (总字符数 / max_chars, 文档数 / max_docs) 的较大者,
+    文档按长度降序依次放入当前最轻且未满的子批次 (LPT 贪心)。
+    单个超过 max_chars 的文档独占一个子批次的负载, 不会被拆分。
+
+    Args:
+        sizes: 文档ID -> 内容字符数 (保持请求顺序)
+
+    Returns:
+        子批次列表, 每个子批次内保持原始顺序
+    """
+    if not sizes:
+        return []
+
+    total_chars = sum(sizes.values())
+    count = max(
+        -(-total_chars // max(max_chars, 1)),
+        -(-len(sizes) // max(max_docs, 1)),
+        1
+    )
+    count = min(count, len(sizes))
+
+    order = {doc_id: i for i, doc_id in enumerate(sizes)}
+    batches: List[List[int]] = [[] for _ in range(count)]
+    heap = [(0, i) for i in range(count)]
+    for doc_id in sorted(sizes, key=lambda d: -sizes[d]):
+        load, i = heapq.heappop(heap)
+        batches[i].append(doc_id)
+        # 已满的子批次不再放回
+        if len(batches[i]) < max_docs:
+            heapq.heappush(heap, (load + sizes[doc_id], i))
+
+    return [sorted(batch, key=order.get) for batch in batches if batch]
+
+
 def create_incremental_indexer(db: Session) -> IncrementalIndexer:
     """工厂函数：创建增量索引器实例"""
     return IncrementalIndexer(db)
@@ -0,0 +1,82 @@
+"""
+索引失效通知
+
+删除文档/文档块后, 进程内缓存的检索结构 (BM25 语料、内存向量索引等) 需要立即剔除
+被删除的块, 而不是等缓存过期。各检索结构在模块加载时注册失效回调:
+
+    register_index_invalidation_hook(hook)
+
+hook(doc_ids, chunk_ids_by_namespace) 在删除事务提交后被调用, 单个回调失败不影响其他回调。
+
+索引器写入新块后同样通知注册了更新回调的结构 (如内存向量索引), 使其无需等待下次
+与数据库核对即可检索到新块:
+
+    register_index_update_hook(hook)
+
+hook(chunks_by_namespace) 在写入事务提交后被调用。
+
+说明: 回调只作用于当前进程; 其他进程 (Celery Worker、目录监听) 删除的块由各检索结构
+在取回块详情时按数据库结果过滤, 新增的块由各检索结构定期核对时加载。
+"""
+
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from app.config.logging_config import get_app_logger
+
+logger = get_app_logger()
+
+InvalidationHook = Callable[[List[int], Dict[str, List[int]]], None]
+
+# 命名空间 -> (块ID列表, 向量列表)
+ChunkVectors = Dict[str, Tuple[List[int], Sequence]]
+UpdateHook = Callable[[ChunkVectors], None]
+
+_hooks: List[InvalidationHook] = []
+_update_hooks: List[UpdateHook] = []
+
+
+def register_index_invalidation_hook(hook: InvalidationHook) -> InvalidationHook:
+    """注册失效回调 (重复注册只保留一个), 可用作装饰器"""
+    if hook not in _hooks:
+        _hooks.append(hook)
+    return hook
+
+
+def register_index_update_hook(hook: UpdateHook) -> UpdateHook:
+    """注册新增块回调 (重复注册只保留一个), 可用作装饰器"""
+    if hook not in _update_hooks:
+        _update_hooks.append(hook)
+    return hook
+
+
+def invalidate_index(doc_ids: List[int], chunk_ids_by_namespace: Dict[str, List[int]]):
+    """
+    通知所有检索结构剔除已删除的文档块
+
+    Args:
+        doc_ids: 已删除的文档ID
+        chunk_ids_by_namespace: 命名空间 -> 已删除的块ID
+    """
+    if not doc_ids and not any(chunk_ids_by_namespace.values()):
+        return
+    for hook in list(_hooks):
+        try:
+            hook(doc_ids, chunk_ids_by_namespace)
+        except Exception as e:
+            logger.warning(f"索引失效回调 {getattr(hook, '__qualname__', hook)} 执行失败: {e}")
+
+
+def notify_chunks_added(chunks_by_namespace: ChunkVectors):
+    """
+    通知检索结构加入新写入的文档块
+
+    Args:
+        chunks_by_namespace: 命名空间 -> (新块ID列表, 与之对齐的向量列表)
+    """
+    if not any(ids for ids, _ in chunks_by_namespace.values()):
+        return
+    for hook in list(_update_hooks):
+        try:
+            hook(chunks_by_namespace)
+        except Exception as e:
+            logger.warning(f"索引更新回调 {getattr(hook, '__qualname__', hook)} 执行失败: {e}")
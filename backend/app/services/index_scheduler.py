@@ -0,0 +1,276 @@
+"""
+索引任务调度服务
+
+按 IndexTask.priority (1-10, 10 最高) 把索引任务分到两个 Celery 队列:
+- interactive: priority >= INDEX_INTERACTIVE_MIN_PRIORITY, 单个上传/用户触发的小批量
+- bulk: 其余任务, 如全量重建、自动更新
+
+队列内再按 Celery 优先级 (Redis 子队列, 0 最高) 排序; 为了在命名空间之间公平分配,
+某命名空间已排队的文档越多, 它新提交任务的 Celery 优先级越低, 其他命名空间的任务可以插队。
+"""
+
+import math
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.config.celery_config import (
+    INDEX_INTERACTIVE_MAX_DOCS,
+    INDEX_INTERACTIVE_MIN_PRIORITY,
+    INDEX_QUEUE_BULK,
+    INDEX_QUEUE_INTERACTIVE,
+)
+from app.config.logging_config import get_app_logger
+from app.config.settings import INDEX_FAIR_SHARE_DOCS, INDEX_FAIR_SHARE_MAX_PENALTY
+from app.models.database import Document
+from app.models.index_record import IndexTask
+from app.monitoring.metrics import record_index_task_submitted
+
+logger = get_app_logger()
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BULK = 'bulk'
+
+QUEUES = {
+    PRIORITY_INTERACTIVE: INDEX_QUEUE_INTERACTIVE,
+    PRIORITY_BULK: INDEX_QUEUE_BULK,
+}
+
+# 尚未完成的任务状态
+_ACTIVE_STATUSES = ('pending', 'processing')
+
+
+def clamp_priority(priority: Optional[int]) -> int:
+    """把优先级限制在 1-10, 缺省为 5"""
+    return min(10, max(1, priority if priority is not None else 5))
+
+
+def priority_class(priority: Optional[int]) -> str:
+    """优先级类别: interactive 或 bulk"""
+    return PRIORITY_INTERACTIVE if clamp_priority(priority) >= INDEX_INTERACTIVE_MIN_PRIORITY else PRIORITY_BULK
+
+
+def default_priority(doc_count: int) -> int:
+    """
+    未指定优先级时按文档数取默认优先级
+
+    单个/少量文档 (<= INDEX_INTERACTIVE_MAX_DOCS) 是用户在等结果的请求, 进入交互式队列; 大批量按缺省 5 进入批量队列
+    """
+    return INDEX_INTERACTIVE_MIN_PRIORITY if 0 < doc_count <= INDEX_INTERACTIVE_MAX_DOCS else clamp_priority(None)
+
+
+def fair_share_penalty(backlog_docs: int) -> int:
+    """
+    命名空间排队文档数对应的降级级数
+
+    backlog 每达到 INDEX_FAIR_SHARE_DOCS 的 1, 3, 7, 15... 倍降一级, 上限 INDEX_FAIR_SHARE_MAX_PENALTY
+    """
+    if backlog_docs <= 0 or INDEX_FAIR_SHARE_DOCS <= 0:
+        return 0
+    return min(INDEX_FAIR_SHARE_MAX_PENALTY, int(math.log2(1 + backlog_docs / INDEX_FAIR_SHARE_DOCS)))
+
+
+def to_celery_priority(priority: Optional[int], penalty: int = 0) -> int:
+    """
+    IndexTask 优先级 (10 最高) 转为 Redis 传输的 Celery 优先级 (0 最高, 9 最低)
+    """
+    return min(9, 10 - clamp_priority(priority) + max(penalty, 0))
+
+
+class IndexScheduler:
+    """索引任务调度器"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def dominant_namespace(self, doc_ids: List[int]) -> str:
+        """文档数最多的命名空间 (一个任务按其主命名空间参与公平调度)"""
+        if not doc_ids:
+            return 'default'
+        row = self.db.query(
+            Document.namespace,
+            func.count(Document.id).label('count')
+        ).filter(
+            Document.id.in_(doc_ids)
+        ).group_by(Document.namespace).order_by(func.count(Document.id).desc()).first()
+        return (row.namespace if row else None) or 'default'
+
+    def namespace_backlog(self) -> Dict[str, int]:
+        """各命名空间尚未处理完的文档数 (排队中 + 处理中任务的剩余文档)"""
+        rows = self.db.execute(text("""
+            SELECT COALESCE(metadata->>'namespace', 'default') AS namespace,
+                   SUM(GREATEST(
+                       COALESCE(jsonb_array_length(metadata->'doc_ids'), 1)
+                       - COALESCE((metadata->>'completed_docs')::int, 0),
+                       0
+                   )) AS docs
+            FROM index_tasks
+            WHERE status IN ('pending', 'processing')
+              AND jsonb_typeof(COALESCE(metadata->'doc_ids', '[]'::jsonb)) = 'array'
+            GROUP BY 1
+        """)).all()
+        return {row.namespace: int(row.docs or 0) for row in rows}
+
+    def submit(
+        self,
+        task,
+        args: list,
+        task_type: str,
+        doc_ids: List[int],
+        priority: Optional[int] = None,
+        user_id: Optional[int] = None,
+        namespace: Optional[str] = None
+    ) -> Dict:
+        """
+        创建 IndexTask 记录并按优先级类别与公平调度提交 Celery 任务
+
+        Args:
+            task: Celery 任务
+            args: 任务参数
+            task_type: 任务类型 (index/batch/...)
+            doc_ids: 涉及的文档ID
+            priority: 优先级 (1-10)
+            user_id: 提交用户
+            namespace: 命名空间 (缺省取文档数最多的命名空间)
+
+        Returns:
+            任务ID与路由信息
+        """
+        priority = clamp_priority(priority)
+        namespace = namespace or self.dominant_namespace(doc_ids)
+        backlog = self.namespace_backlog().get(namespace, 0)
+        penalty = fair_share_penalty(backlog)
+        klass = priority_class(priority)
+        routing = {
+            'priority_class': klass,
+            'queue': QUEUES[klass],
+            'celery_priority': to_celery_priority(priority, penalty),
+            'namespace': namespace,
+            'namespace_backlog': backlog,
+            'fair_share_penalty': penalty,
+        }
+
+        task_id = str(uuid.uuid4())
+        self.db.add(IndexTask(
+            task_id=task_id,
+            doc_id=doc_ids[0] if len(doc_ids) == 1 else None,
+            task_type=task_type,
+            status='pending',
+            priority=priority,
+            task_metadata={'doc_ids': doc_ids, 'user_id': user_id, **routing}
+        ))
+        self.db.commit()
+
+        task.apply_async(
+            args=args,
+            task_id=task_id,
+            queue=routing['queue'],
+            priority=routing['celery_priority']
+        )
+        record_index_task_submitted(klass)
+
+        logger.info(
+            f"索引任务已提交: task_id={task_id}, 类别={klass}, 队列={routing['queue']}, "
+            f"celery优先级={routing['celery_priority']}, 命名空间={namespace}, 排队文档={backlog}"
+        )
+        return {'task_id': task_id, **routing}
+
+    def queue_stats(self, window_minutes: int = 60) -> Dict:
+        """
+        各优先级类别的队列深度与等待时间
+
+        - broker_depth: Broker 中尚未被 worker 取走的消息数
+        - pending / processing: IndexTask 记录中排队/处理中的任务数
+        - oldest_wait_seconds: 最早的排队任务已等待的时间
+        - avg_wait_seconds / max_wait_seconds: 最近 window_minutes 内开始执行的任务的排队时间
+        """
+        now = datetime.now()
+        since = now - timedelta(minutes=window_minutes)
+        broker_depth = self._broker_depth()
+
+        classes = {
+            klass: {
+                'queue': queue,
+                'broker_depth': broker_depth.get(queue),
+                'pending': 0,
+                'processing': 0,
+                'oldest_wait_seconds': 0.0,
+                'avg_wait_seconds': None,
+                'max_wait_seconds': None,
+                'started_in_window': 0,
+            }
+            for klass, queue in QUEUES.items()
+        }
+
+        active = self.db.query(
+            IndexTask.priority,
+            IndexTask.status,
+            func.count(IndexTask.id).label('count'),
+            func.min(IndexTask.created_at).label('oldest')
+        ).filter(
+            IndexTask.status.in_(_ACTIVE_STATUSES),
+            IndexTask.task_type != 'upload'
+        ).group_by(IndexTask.priority, IndexTask.status).all()
+
+        for row in active:
+            stats = classes[priority_class(row.priority)]
+            stats[row.status] += row.count
+            if row.status == 'pending' and row.oldest:
+                stats['oldest_wait_seconds'] = max(stats['oldest_wait_seconds'], (now - row.oldest).total_seconds())
+
+        wait = func.extract('epoch', IndexTask.started_at - IndexTask.created_at)
+        started = self.db.query(
+            IndexTask.priority,
+            func.count(IndexTask.id).label('count'),
+            func.avg(wait).label('avg_wait'),
+            func.max(wait).label('max_wait')
+        ).filter(
+            IndexTask.started_at >= since,
+            IndexTask.task_type != 'upload'
+        ).group_by(IndexTask.priority).all()
+
+        totals: Dict[str, List[float]] = {}
+        for row in started:
+            klass = priority_class(row.priority)
+            stats = classes[klass]
+            stats['started_in_window'] += row.count
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'] or 0.0, float(row.max_wait or 0))
+            weighted = totals.setdefault(klass, [0.0, 0])
+            weighted[0] += float(row.avg_wait or 0) * row.count
+            weighted[1] += row.count
+        for klass, (wait_sum, count) in totals.items():
+            classes[klass]['avg_wait_seconds'] = round(wait_sum / count, 3) if count else None
+
+        return {
+            'classes': classes,
+            'namespace_backlog': self.namespace_backlog(),
+            'interactive_min_priority': INDEX_INTERACTIVE_MIN_PRIORITY,
+            'window_minutes': window_minutes,
+        }
+
+    @staticmethod
+    def _broker_depth() -> Dict[str, Optional[int]]:
+        """查询 Broker 队列长度 (含 Redis 优先级子队列), Broker 不可用时为 None"""
+        depth: Dict[str, Optional[int]] = {queue: None for queue in QUEUES.values()}
+        try:
+            from app.celery_app import celery_app
+
+            with celery_app.connection_or_acquire() as conn:
+                channel = conn.default_channel
+                for queue in depth:
+                    try:
+                        depth[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+                    except Exception:
+                        # 队列尚未创建 (从未有消息)
+                        depth[queue] = 0
+        except Exception as e:
+            logger.warning(f"查询Broker队列长度失败: {e}")
+        return depth
+
+
+def get_index_scheduler(db: Session) -> IndexScheduler:
+    """工厂函数：创建索引任务调度器实例"""
+    return IndexScheduler(db)
@@ -0,0 +1,233 @@
+"""
+流式文档入库流水线
+
+提取 -> 分块 -> 向量化 -> 写库 全程流式, 大文件的峰值内存与文件大小无关:
+
+1. 生产者线程逐页/逐段提取文本, 送入流式分块器 (split_stream)
+2. 分块按 batch_size 打包放入有界队列, 队列满时生产者阻塞 (背压)
+3. 消费者 (事件循环) 逐批查嵌入存储/调用模型, 写入 document_chunks 并提交
+4. 每批完成后回调进度 (用于任务 WebSocket 推送)
+
+documents.content 列需要保存全文, 提取的文本先写入临时溢写文件,
+全部分块入库后再一次性读出, 不与分块列表、向量同时驻留内存。
+"""
+
+import asyncio
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.logging_config import get_app_logger
+from app.config.settings import INGEST_EMBED_BATCH_SIZE, INGEST_QUEUE_SIZE, INGEST_SPOOL_MAX_MEMORY
+from app.models.database import Document
+from app.models.document import DocumentChunk
+from app.monitoring.tracing import trace_span
+from app.services.document_extractor import ExtractionError, TextPiece
+from app.services.embedding import embedding_service
+from app.services.embedding_migration import get_embedding_migration_service
+from app.services.embedding_store import EmbeddingBatchStats, get_embedding_store
+from app.services.text_chunker import ContentDefinedChunker, TextChunk, text_chunker
+
+logger = get_app_logger()
+
+ProgressCallback = Callable[[Dict], Awaitable[None]]
+
+_END = object()
+
+
+@dataclass
+class _ChunkBatch:
+    chunks: List[TextChunk]
+    units_done: int
+    units_total: int
+
+
+@dataclass
+class IngestionResult:
+    """入库结果"""
+    chunk_ids: List[int] = field(default_factory=list)
+    content: str = ""
+    content_hash: str = ""
+    text_length: int = 0
+    units_total: int = 0
+    batches: int = 0
+    duration_seconds: float = 0.0
+    embedding: EmbeddingBatchStats = field(default_factory=EmbeddingBatchStats)
+
+
+class StreamingIngestionPipeline:
+    """流式文档入库流水线"""
+
+    def __init__(
+        self,
+        db: Session,
+        batch_size: int = INGEST_EMBED_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        chunker: ContentDefinedChunker = text_chunker
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.chunker = chunker
+
+    async def run(
+        self,
+        document: Document,
+        pieces: Iterator[TextPiece],
+        progress: Optional[ProgressCallback] = None
+    ) -> IngestionResult:
+        """
+        流式处理文本片段并写入文档块
+
+        Args:
+            document: 已创建的主文档记录 (分块关联到该文档)
+            pieces: 提取器产出的 (文本, 已处理单元, 总单元) 迭代器
+            progress: 每批写入后的异步进度回调
+
+        Returns:
+            IngestionResult: 分块ID、全文、内容哈希和去重统计
+
+        Raises:
+            ExtractionError: 提取或分块失败
+        """
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        cancelled = threading.Event()
+        result = IngestionResult()
+
+        spool = tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_MAX_MEMORY, mode="w+", encoding="utf-8")
+        md5 = hashlib.md5()
+
+        def put(item):
+            # 队列满时阻塞生产者线程, 形成背压
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce():
+            position = {"done": 0, "total": 0}
+
+            def texts():
+                for text, done, total in pieces:
+                    if cancelled.is_set():
+                        return
+                    position["done"], position["total"] = done, total
+                    if text:
+                        spool.write(text)
+                        md5.update(text.encode("utf-8"))
+                        result.text_length += len(text)
+                        yield text
+
+            try:
+                batch: List[TextChunk] = []
+                for chunk in self.chunker.split_stream(texts()):
+                    batch.append(chunk)
+                    if len(batch) >= self.batch_size:
+                        put(_ChunkBatch(batch, position["done"], position["total"]))
+                        batch = []
+                    if cancelled.is_set():
+                        return
+                if batch:
+                    put(_ChunkBatch(batch, position["done"], position["total"]))
+                result.units_total = position["total"]
+            except Exception as e:
+                if not cancelled.is_set():
+                    put(ExtractionError(str(e)))
+                return
+            put(_END)
+
+        producer = loop.run_in_executor(None, produce)
+        embedding_stats = EmbeddingBatchStats()
+        store = get_embedding_store()
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                texts = [chunk.content for chunk in item.chunks]
+                embeddings, stats = await store.aget_or_embed(
+                    self.db,
+                    texts,
+                    embedding_service.model_key,
+                    embedding_service.create_batch_embeddings
+                )
+                embedding_stats.merge(stats)
+
+                with trace_span("ingest_write", chunks=len(item.chunks)):
+                    rows = [
+                        self._build_chunk(document, chunk, embedding)
+                        for chunk, embedding in zip(item.chunks, embeddings)
+                    ]
+                    self.db.add_all(rows)
+                    self.db.flush()
+                    # flush 后读取ID, 避免 refresh 读取 vector 字段
+                    chunk_ids = [row.id for row in rows]
+                    result.chunk_ids.extend(chunk_ids)
+                    # 嵌入模型迁移期间同时写入新模型向量
+                    await get_embedding_migration_service().adual_write(self.db, chunk_ids, texts)
+                    self.db.commit()
+                result.batches += 1
+
+                if progress:
+                    await progress({
+                        "chunks": len(result.chunk_ids),
+                        "units_done": item.units_done,
+                        "units_total": item.units_total,
+                        "percent": int(item.units_done * 100 / item.units_total) if item.units_total else 0,
+                        "model_calls_saved": embedding_stats.model_calls_saved
+                    })
+
+            await producer
+        except BaseException:
+            cancelled.set()
+            # 清空队列, 让阻塞在 put 上的生产者退出
+            while not producer.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+            spool.close()
+            raise
+
+        spool.seek(0)
+        result.content = spool.read()
+        spool.close()
+        result.content_hash = md5.hexdigest()
+        result.embedding = embedding_stats
+        result.duration_seconds = time.perf_counter() - start_time
+
+        logger.info(
+            f"文档 {document.id} 流式入库完成: 分块={len(result.chunk_ids)}, 批次={result.batches}, "
+            f"字符数={result.text_length}, 节省模型调用={embedding_stats.model_calls_saved}, "
+            f"耗时={result.duration_seconds:.2f}s"
+        )
+        return result
+
+    @staticmethod
+    def _build_chunk(document: Document, chunk: TextChunk, embedding) -> DocumentChunk:
+        return DocumentChunk(
+            document_id=document.id,
+            content=chunk.content,
+            embedding=embedding,
+            chunk_metadata=json.dumps({
+                "chunk_index": chunk.index,
+                "chunk_size": len(chunk.content),
+                "start": chunk.start,
+                "end": chunk.end
+            }),
+            chunk_index=chunk.index,
+            content_hash=chunk.content_hash,
+            filename=f"{document.filename}_chunk_{chunk.index + 1}",
+            created_at=str(datetime.now()),
+            namespace=document.namespace
+        )
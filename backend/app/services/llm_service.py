@@ -4,6 +4,7 @@ LLM服务 - 处理与大语言模型的交互
 """
 import os
 import json
+import time
 import asyncio
 from typing import List, Dict, Any, AsyncGenerator, Optional
 from openai import AsyncOpenAI
@@ -13,6 +14,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from app.config.settings import get_settings
+from app.monitoring.tracing import record_span
 from app.models.chat import ChatMessage
 from app.models.llm_models import LLMModel
 
@@ -146,6 +148,10 @@ class LLMService:
         """
         流式生成LLM响应
         """
+        # 流式生成器跨越多次 send 调用, 这里手动计时而不是持有 span 上下文
+        llm_start = time.perf_counter()
+        first_token_recorded = False
+
         try:
             # 获取模型对应的客户端
             model_name = model or self.default_model
@@ -189,10 +195,15 @@ class LLMService:
                         content = chunk.choices[0].delta.content
                         full_response += content
                         # 发送SSE格式的数据
+                        if not first_token_recorded:
+                            record_span("llm_ttft", time.perf_counter() - llm_start, model=model_name)
+                            first_token_recorded = True
                         yield f"data: {json.dumps({'content': content, 'type': 'content'})}\n\n"
 
 
             elif provider.lower() == "anthropic":
+                # Anthropic 当前为非流式调用, 首字延迟即完整响应时间
+                record_span("llm_ttft", time.perf_counter() - llm_start, model=model_name)
                 for block in message.content:
                     if block.type == "thinking":
                         full_response += block.thinking
@@ -207,8 +218,13 @@ class LLMService:
                         content = chunk.choices[0].delta.content
                         full_response += content
                         # 发送SSE格式的数据
+                        if not first_token_recorded:
+                            record_span("llm_ttft", time.perf_counter() - llm_start, model=model_name)
+                            first_token_recorded = True
                         yield f"data: {json.dumps({'content': content, 'type': 'content'})}\n\n"
 
+            record_span("llm_total", time.perf_counter() - llm_start, model=model_name)
+
             # 保存完整响应到数据库
             if session_id and db:
                 assistant_message = ChatMessage(
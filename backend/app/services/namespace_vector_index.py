@@ -0,0 +1,367 @@
+"""
+按命名空间的部分向量索引 (Namespace Partial Vector Index)
+
+多领域检索总是按 namespace 过滤, 一个全局 ANN 索引加过滤条件要么扫描过多候选,
+要么过滤后结果不足 (召回下降)。这里为每个领域在 document_chunks 上维护一个部分 HNSW 索引:
+
+    CREATE INDEX CONCURRENTLY idx_chunks_hnsw_ns_<ns>_<hash> ON document_chunks
+    USING hnsw (embedding vector_cosine_ops) WHERE namespace = '<ns>'
+
+- 创建领域时在后台线程中建索引 (CONCURRENTLY, 不阻塞写入), 多个索引依次构建
+- 删除领域时取消正在进行的构建并删除索引
+- 构建进度来自 pg_stat_progress_create_index, 索引大小来自 pg_relation_size
+- 检索时 WHERE namespace = '<ns>' 蕴含索引谓词, 规划器即可选用对应的部分索引
+"""
+
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config.logging_config import get_app_logger
+from app.config.settings import (
+    EMBEDDING_STORAGE,
+    NAMESPACE_VECTOR_INDEX_CACHE_TTL,
+    NAMESPACE_VECTOR_INDEX_EF_CONSTRUCTION,
+    NAMESPACE_VECTOR_INDEX_ENABLED,
+    NAMESPACE_VECTOR_INDEX_M,
+    NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM,
+)
+
+logger = get_app_logger()
+
+INDEX_TABLE = 'document_chunks'
+INDEX_PREFIX = 'idx_chunks_hnsw_ns_'
+
+# 索引状态
+STATE_DISABLED = 'disabled'
+STATE_MISSING = 'missing'
+STATE_QUEUED = 'queued'
+STATE_BUILDING = 'building'
+STATE_READY = 'ready'
+STATE_INVALID = 'invalid'
+STATE_FAILED = 'failed'
+
+_INDEX_SQL = text("""
+    SELECT i.indisvalid AS is_valid, pg_relation_size(i.indexrelid) AS size_bytes
+    FROM pg_index i
+    WHERE i.indexrelid = to_regclass(:index_name)
+""")
+
+_PROGRESS_SQL = text("""
+    SELECT pid, phase, blocks_done, blocks_total, tuples_done, tuples_total
+    FROM pg_stat_progress_create_index
+    WHERE index_relid = to_regclass(:index_name)
+""")
+
+_VALID_INDEXES_SQL = text("""
+    SELECT c.relname
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = to_regclass(:table_name)
+      AND i.indisvalid
+      AND starts_with(c.relname, :prefix)
+""")
+
+
+def partial_index_name(namespace: str) -> str:
+    """
+    命名空间对应的部分索引名
+
+    非 [a-z0-9_] 字符替换为下划线, 再附加命名空间的短哈希保证唯一 (如 a-b 与 a_b),
+    总长度不超过 PostgreSQL 标识符上限 63
+    """
+    slug = re.sub(r'[^a-z0-9_]', '_', namespace.lower())[:32]
+    digest = hashlib.md5(namespace.encode('utf-8')).hexdigest()[:8]
+    return f"{INDEX_PREFIX}{slug}_{digest}"
+
+
+def quote_literal(value: str) -> str:
+    """SQL 字符串字面量 (单引号转义); 索引谓词中不能使用绑定参数"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def create_index_sql(
+    namespace: str,
+    storage: str = EMBEDDING_STORAGE,
+    m: int = NAMESPACE_VECTOR_INDEX_M,
+    ef_construction: int = NAMESPACE_VECTOR_INDEX_EF_CONSTRUCTION
+) -> str:
+    """生成命名空间部分 HNSW 索引的建索引语句 (操作符类与 <=> 余弦距离一致)"""
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partial_index_name(namespace)} "
+        f"ON {INDEX_TABLE} USING hnsw (embedding {storage}_cosine_ops) "
+        f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)}) "
+        f"WHERE namespace = {quote_literal(namespace)}"
+    )
+
+
+def build_progress(
+    blocks_done: Optional[int],
+    blocks_total: Optional[int],
+    tuples_done: Optional[int],
+    tuples_total: Optional[int]
+) -> Optional[float]:
+    """
+    当前阶段的完成比例 (0-1)
+
+    HNSW 加载元组阶段报告 tuples_done/tuples_total, CONCURRENTLY 的扫描/校验阶段报告块数
+    """
+    if tuples_total:
+        return min(1.0, (tuples_done or 0) / tuples_total)
+    if blocks_total:
+        return min(1.0, (blocks_done or 0) / blocks_total)
+    return None
+
+
+@dataclass
+class NamespaceIndexStatus:
+    """命名空间部分索引的状态"""
+    namespace: str
+    index_name: str
+    state: str
+    size_bytes: int = 0
+    phase: Optional[str] = None
+    progress: Optional[float] = None
+    blocks_done: Optional[int] = None
+    blocks_total: Optional[int] = None
+    tuples_done: Optional[int] = None
+    tuples_total: Optional[int] = None
+    error: Optional[str] = None
+
+
+class NamespaceVectorIndexManager:
+    """
+    管理各命名空间的部分 HNSW 索引
+
+    建索引/删索引都在单线程执行器中依次进行: CONCURRENTLY 构建需要等待已有事务结束,
+    不能阻塞 API 请求; 多个 HNSW 构建同时进行也会争抢 CPU 与 maintenance_work_mem
+    """
+
+    def __init__(self, enabled: bool = NAMESPACE_VECTOR_INDEX_ENABLED, cache_ttl: float = NAMESPACE_VECTOR_INDEX_CACHE_TTL):
+        self.enabled = enabled
+        self.cache_ttl = cache_ttl
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 本进程提交的任务: namespace -> queued / building / failed
+        self._pending: Dict[str, str] = {}
+        self._errors: Dict[str, str] = {}
+        self._dropping: Set[str] = set()
+        self._ready: Set[str] = set()
+        self._ready_at = 0.0
+
+    def _submit(self, fn, namespace: str):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ns-vector-index')
+            return self._executor.submit(fn, namespace)
+
+    @staticmethod
+    def _autocommit_connection():
+        """CONCURRENTLY 不能在事务块内执行, 使用自动提交连接"""
+        from app.database import get_engine
+        return get_engine().connect().execution_options(isolation_level="AUTOCOMMIT")
+
+    def create(self, namespace: str, wait: bool = False):
+        """
+        为命名空间创建部分索引 (后台执行)
+
+        Args:
+            namespace: 领域命名空间
+            wait: 是否等待构建完成 (迁移脚本使用)
+
+        Returns:
+            Future, 未启用时返回 None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._pending[namespace] = STATE_QUEUED
+            self._errors.pop(namespace, None)
+            self._dropping.discard(namespace)
+        future = self._submit(self._build, namespace)
+        if wait:
+            future.result()
+        return future
+
+    def _build(self, namespace: str):
+        index_name = partial_index_name(namespace)
+        with self._lock:
+            if namespace in self._dropping:
+                return
+            self._pending[namespace] = STATE_BUILDING
+        start = time.perf_counter()
+        try:
+            with self._autocommit_connection() as conn:
+                existing = conn.execute(_INDEX_SQL, {"index_name": index_name}).first()
+                if existing is not None and existing.is_valid:
+                    logger.info(f"命名空间 '{namespace}' 的部分向量索引已存在: {index_name}")
+                elif existing is not None and conn.execute(_PROGRESS_SQL, {"index_name": index_name}).first():
+                    # 其他进程正在构建同一个索引
+                    logger.info(f"命名空间 '{namespace}' 的部分向量索引正由其他会话构建: {index_name}")
+                else:
+                    if existing is not None:
+                        # 之前中断的 CONCURRENTLY 构建会留下无效索引, IF NOT EXISTS 会跳过它
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+                    if NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM:
+                        conn.execute(
+                            text("SELECT set_config('maintenance_work_mem', :value, false)"),
+                            {"value": NAMESPACE_VECTOR_INDEX_MAINTENANCE_WORK_MEM}
+                        )
+                    logger.info(f"开始构建命名空间 '{namespace}' 的部分向量索引: {index_name}")
+                    conn.execute(text(create_index_sql(namespace)))
+                    logger.info(
+                        f"命名空间 '{namespace}' 的部分向量索引构建完成, 耗时 {time.perf_counter() - start:.1f}s"
+                    )
+            with self._lock:
+                self._pending.pop(namespace, None)
+                self._ready_at = 0.0
+        except Exception as e:
+            with self._lock:
+                if namespace in self._dropping:
+                    # 删除领域时取消了构建
+                    self._pending.pop(namespace, None)
+                    return
+                self._pending[namespace] = STATE_FAILED
+                self._errors[namespace] = str(e)
+            logger.error(f"构建命名空间 '{namespace}' 的部分向量索引失败: {e}")
+
+    def drop(self, namespace: str, wait: bool = False):
+        """
+        删除命名空间的部分索引: 先取消正在进行的构建, 再后台 DROP INDEX CONCURRENTLY
+
+        Args:
+            namespace: 领域命名空间
+            wait: 是否等待删除完成
+
+        Returns:
+            Future, 未启用时返回 None
+        """
+        if not self.enabled:
+            return None
+        index_name = partial_index_name(namespace)
+        with self._lock:
+            self._dropping.add(namespace)
+            self._ready.discard(index_name)
+        try:
+            with self._autocommit_connection() as conn:
+                conn.execute(text("""
+                    SELECT pg_cancel_backend(pid) FROM pg_stat_progress_create_index
+                    WHERE index_relid = to_regclass(:index_name)
+                """), {"index_name": index_name})
+        except Exception as e:
+            logger.warning(f"取消命名空间 '{namespace}' 的部分向量索引构建失败: {e}")
+        future = self._submit(self._drop, namespace)
+        if wait:
+            future.result()
+        return future
+
+    def _drop(self, namespace: str):
+        index_name = partial_index_name(namespace)
+        try:
+            with self._autocommit_connection() as conn:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+            logger.info(f"已删除命名空间 '{namespace}' 的部分向量索引: {index_name}")
+        except Exception as e:
+            logger.error(f"删除命名空间 '{namespace}' 的部分向量索引失败: {e}")
+        finally:
+            with self._lock:
+                self._dropping.discard(namespace)
+                self._pending.pop(namespace, None)
+                self._errors.pop(namespace, None)
+                self._ready_at = 0.0
+
+    def status(self, db: Session, namespace: str) -> NamespaceIndexStatus:
+        """
+        查询命名空间部分索引的状态、构建进度和大小
+
+        Args:
+            db: 数据库会话
+            namespace: 领域命名空间
+
+        Returns:
+            NamespaceIndexStatus: 索引状态
+        """
+        index_name = partial_index_name(namespace)
+        status = NamespaceIndexStatus(namespace=namespace, index_name=index_name, state=STATE_MISSING)
+        if not self.enabled:
+            status.state = STATE_DISABLED
+            return status
+
+        index = db.execute(_INDEX_SQL, {"index_name": index_name}).first()
+        progress = db.execute(_PROGRESS_SQL, {"index_name": index_name}).first() if index is not None else None
+        with self._lock:
+            pending = self._pending.get(namespace)
+            error = self._errors.get(namespace)
+
+        if index is not None:
+            status.size_bytes = int(index.size_bytes or 0)
+        if progress is not None:
+            status.state = STATE_BUILDING
+            status.phase = progress.phase
+            status.blocks_done = progress.blocks_done
+            status.blocks_total = progress.blocks_total
+            status.tuples_done = progress.tuples_done
+            status.tuples_total = progress.tuples_total
+            status.progress = build_progress(
+                progress.blocks_done, progress.blocks_total, progress.tuples_done, progress.tuples_total
+            )
+        elif index is not None:
+            status.state = STATE_READY if index.is_valid else STATE_INVALID
+        elif pending in (STATE_QUEUED, STATE_BUILDING):
+            status.state = STATE_QUEUED
+
+        if pending == STATE_FAILED and status.state != STATE_READY:
+            status.state = STATE_FAILED
+            status.error = error
+        return status
+
+    def has_index(self, db: Session, namespace: str) -> bool:
+        """
+        命名空间是否有可用 (已构建完成且有效) 的部分索引
+
+        可用索引列表一次查询得到, 缓存 cache_ttl 秒; 其他进程构建完成的索引在缓存过期后可见
+        """
+        if not self.enabled or not namespace:
+            return False
+        now = time.monotonic()
+        if now - self._ready_at > self.cache_ttl:
+            rows = db.execute(_VALID_INDEXES_SQL, {"table_name": INDEX_TABLE, "prefix": INDEX_PREFIX}).fetchall()
+            with self._lock:
+                self._ready = {row.relname for row in rows}
+                self._ready_at = now
+        return partial_index_name(namespace) in self._ready
+
+    def sync_all(self, db: Session, wait: bool = False) -> List[str]:
+        """
+        为所有已存在的领域补建缺失的部分索引
+
+        Returns:
+            List[str]: 提交了构建任务的命名空间
+        """
+        from app.models.knowledge_domain import KnowledgeDomain
+
+        submitted = []
+        for (namespace,) in db.query(KnowledgeDomain.namespace).all():
+            if self.status(db, namespace).state in (STATE_READY, STATE_BUILDING):
+                continue
+            self.create(namespace, wait=wait)
+            submitted.append(namespace)
+        return submitted
+
+
+_namespace_index_manager: Optional[NamespaceVectorIndexManager] = None
+
+
+def get_namespace_index_manager() -> NamespaceVectorIndexManager:
+    """获取全局命名空间部分索引管理器"""
+    global _namespace_index_manager
+    if _namespace_index_manager is None:
+        _namespace_index_manager = NamespaceVectorIndexManager()
+    return _namespace_index_manager
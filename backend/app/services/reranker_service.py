@@ -11,6 +11,7 @@ from sentence_transformers import CrossEncoder
 import numpy as np
 
 from app.models.document import DocumentChunk
+from app.monitoring.memory import memory_registry, deep_sizeof
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +46,12 @@ class RerankerService:
         self.model: Optional[CrossEncoder] = None
         self._initialized = False
 
+        # CrossEncoder.model 是底层 transformers 模型 (torch Module)
+        memory_registry.register_object(
+            "reranker.model", self, category="model",
+            sizeof=lambda svc: deep_sizeof(svc.model.model) if svc.model is not None else 0
+        )
+
     async def initialize(self):
         """加载 Reranker 模型"""
         if self._initialized:
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app.services.embedding import embedding_service
 from app.models.database import Document
 from app.config.logging_config import get_app_logger
+from app.services.vector_index import parse_embedding
 import numpy as np
 import re
 
@@ -42,15 +43,11 @@ class RetrievalService:
             document_embeddings = []
             
             for row in result:
-                # 解析JSON格式的embedding
-                embedding = None
-                if row.embedding:
-                    try:
-                        import json
-                        embedding = json.loads(row.embedding)
-                    except (json.JSONDecodeError, TypeError):
-                        logger.error(f"Failed to parse embedding for document {row.id}")
-                        continue
+                # 全局类型转换器已解码为 float32 ndarray; 旧表的数组/文本格式同样解析
+                embedding = parse_embedding(row.embedding)
+                if embedding is None:
+                    logger.error(f"Failed to parse embedding for document {row.id}")
+                    continue
 
                 documents.append({
                     "id": row.id,
@@ -60,8 +57,7 @@ class RetrievalService:
                     "created_at": row.created_at,
                     "embedding": embedding
                 })
-                if embedding:
-                    document_embeddings.append(embedding)
+                document_embeddings.append(embedding)
             
             if not documents:
                 logger.info("没有找到任何文档")
@@ -81,6 +77,7 @@ class RetrievalService:
             result_documents = []
             for i, (doc_idx, similarity) in enumerate(similarities[:top_k]):
                 doc = documents[doc_idx].copy()
+                doc['embedding'] = doc['embedding'].tolist()  # 结果会序列化到查询历史
                 doc['similarity'] = similarity
                 result_documents.append(doc)
             
@@ -0,0 +1,43 @@
+"""
+进程内向量索引
+
+供 VectorRetrievalService 在 VECTOR_INDEX_BACKEND 不为 sql 时使用。
+"""
+
+from app.services.vector_index.base import ExactIndex, VectorIndex, normalize, parse_embedding, top_k_indices
+from app.services.vector_index.binary import BinaryIndex, pack_signs
+from app.services.vector_index.hnsw import HNSWIndex
+from app.services.vector_index.ivf import IVFIndex
+from app.services.vector_index.int8 import Int8Index
+from app.services.vector_index.parallel import parallel_scores, parallel_top_k
+from app.services.vector_index.shards import ShardedIndex, shard_of, start_shard_workers
+from app.services.vector_index.manager import (
+    INDEX_BACKENDS,
+    SQL_BACKEND,
+    VectorIndexManager,
+    get_vector_index_manager,
+    save_vector_indexes,
+)
+
+__all__ = [
+    'VectorIndex',
+    'ExactIndex',
+    'Int8Index',
+    'BinaryIndex',
+    'HNSWIndex',
+    'IVFIndex',
+    'ShardedIndex',
+    'INDEX_BACKENDS',
+    'SQL_BACKEND',
+    'VectorIndexManager',
+    'get_vector_index_manager',
+    'save_vector_indexes',
+    'normalize',
+    'pack_signs',
+    'parallel_scores',
+    'parallel_top_k',
+    'parse_embedding',
+    'shard_of',
+    'start_shard_workers',
+    'top_k_indices',
+]
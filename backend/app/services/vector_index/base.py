@@ -0,0 +1,271 @@
+"""
+进程内向量索引基类
+
+索引只保存块ID与向量表示, 不保存块内容; 检索返回 (块ID数组, 相似度数组),
+由调用方按ID回表取块详情。向量在入索引前做 L2 归一化, 相似度即点积 (余弦相似度)。
+
+子类实现 _build / _add / _remove / _search 维护各自的存储结构。
+"""
+
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.vector_codec import parse_vector_text
+from app.services.vector_index.parallel import parallel_top_k
+
+
+def normalize(vectors) -> np.ndarray:
+    """
+    按行 L2 归一化为 float32 (零向量保持为零)
+
+    已经归一化的 float32 矩阵原样返回, 不复制 (大矩阵重复归一化会临时占用同样大小的内存)
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        norm = float(np.linalg.norm(matrix))
+        return matrix / norm if norm > 0 else matrix
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+    if np.all(np.abs(norms - 1.0) < 1e-4):
+        return matrix
+    norms[norms == 0] = 1.0
+    return matrix / norms[:, None]
+
+
+def parse_embedding(value) -> Optional[np.ndarray]:
+    """
+    解析数据库返回的向量 (ndarray / 列表 / "[0.1,0.2,...]" 文本 / pgvector 的 Vector、HalfVector 对象)
+
+    文本格式用 NumPy 的 C 解析器, 不经过 json / eval; vector 与 halfvec 列的文本格式相同,
+    halfvec 的 float16 值统一转为 float32 参与计算
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return parse_vector_text(value)
+    if hasattr(value, 'to_numpy'):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+# 回表取向量: 块ID数组 -> 与之对齐的向量矩阵 (缺失的块为零向量)
+FetchVectors = Callable[[np.ndarray], np.ndarray]
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """分数最高的 k 个下标, 按分数降序 (argpartition, O(n))"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind='stable')]
+
+
+class VectorIndex:
+    """向量索引基类"""
+
+    name = 'base'
+    # 是否支持 save / load 持久化 (构建代价高的索引)
+    persistent = False
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: Iterable[int], vectors) -> "VectorIndex":
+        """用全部向量重建索引"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids):
+            vectors = normalize(vectors).reshape(len(ids), -1)
+            self.dim = vectors.shape[1]
+        else:
+            vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+        self.ids = ids
+        self._build(vectors)
+        return self
+
+    def add(self, ids: Iterable[int], vectors):
+        """增量加入向量 (已存在的ID先删除再加入)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        if not len(self.ids):
+            self.build(ids, vectors)
+            return
+        self.remove(ids)
+        start = len(self.ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self._add(normalize(vectors).reshape(len(ids), -1), start)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """删除向量, 返回实际删除数"""
+        ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64)
+        if not len(ids) or not len(self.ids):
+            return 0
+        keep = ~np.isin(self.ids, ids)
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.ids = self.ids[keep]
+            self._remove(keep)
+        return removed
+
+    def search(self, query, top_k: int, **params) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索最相似的 top_k 个向量
+
+        Args:
+            query: 查询向量
+            top_k: 返回数量
+            params: 后端参数 (如 rescore / nprobe / ef_search), 未知参数忽略
+
+        Returns:
+            (块ID数组, 相似度数组), 按相似度降序
+        """
+        if not len(self.ids) or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return self._search(normalize(query), top_k, **params)
+
+    def search_batch(self, queries, top_k: int, **params) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        一批查询各自检索 top_k (queries 为 (q, dim) 矩阵), 返回每个查询的 (块ID数组, 相似度数组)
+
+        默认逐个调用 search; 精确检索按查询矩阵一次计算
+        """
+        return [self.search(query, top_k, **params) for query in np.atleast_2d(queries)]
+
+    def attach(self, namespace: str) -> Optional[dict]:
+        """
+        接入进程外已有的索引内容 (如分片进程), 返回元数据 (含水位线);
+        内容只在本进程内的索引返回 None
+        """
+        return None
+
+    def needs_rebuild(self) -> bool:
+        """是否需要用当前数据重新构建 (如 IVF 质心已过时), 由索引管理器在后台执行"""
+        return False
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """当前全部 (块ID, 向量) 的副本, 供后台重新构建"""
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """索引占用的内存 (字节)"""
+        return int(self.ids.nbytes)
+
+    def stats(self) -> dict:
+        return {
+            'backend': self.name,
+            'vectors': len(self),
+            'dim': self.dim,
+            'memory_bytes': self.memory_bytes()
+        }
+
+    # 子类实现
+    def _build(self, vectors: np.ndarray):
+        raise NotImplementedError
+
+    def _add(self, vectors: np.ndarray, start: int):
+        raise NotImplementedError
+
+    def _remove(self, keep: np.ndarray):
+        raise NotImplementedError
+
+    def _search(self, query: np.ndarray, top_k: int, **params) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+
+class ExactIndex(VectorIndex):
+    """常驻内存的 float32 精确检索 (按行分块在线程池上并行计算, 块内 argpartition 后堆合并)"""
+
+    name = 'exact'
+
+    def __init__(self, dim: Optional[int] = None):
+        super().__init__(dim)
+        self.vectors = np.empty((0, dim or 0), dtype=np.float32)
+
+    def _build(self, vectors: np.ndarray):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _add(self, vectors: np.ndarray, start: int):
+        self.vectors = np.concatenate([self.vectors, vectors])
+
+    def _remove(self, keep: np.ndarray):
+        self.vectors = self.vectors[keep]
+
+    def _search(self, query: np.ndarray, top_k: int, **params) -> Tuple[np.ndarray, np.ndarray]:
+        rows, scores = parallel_top_k(self.vectors, query, top_k)
+        return self.ids[rows], scores
+
+    def search_batch(self, queries, top_k: int, **params) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """一批查询共用一次矩阵-矩阵乘 (每块 (行数, dim) x (dim, q))"""
+        queries = normalize(np.atleast_2d(queries))
+        if not len(self.ids) or top_k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        return [(self.ids[rows], scores) for rows, scores in parallel_top_k(self.vectors, queries, top_k)]
+
+    def memory_bytes(self) -> int:
+        return super().memory_bytes() + int(self.vectors.nbytes)
+
+
+class RescoringIndex(VectorIndex):
+    """
+    粗排 + 精排索引基类
+
+    子类用压缩表示 (量化码) 选出 rescore 个候选, 再用 float32 向量精确计算相似度。
+    float32 向量来自内存副本 (keep_float=True) 或检索时回表 (fetch_vectors),
+    两者都没有时按粗排的近似分数返回。
+    """
+
+    def __init__(self, dim: Optional[int] = None, rescore: int = 200, keep_float: bool = False):
+        super().__init__(dim)
+        self.rescore = rescore
+        self.keep_float = keep_float
+        self.vectors: Optional[np.ndarray] = None
+
+    def _build_float(self, vectors: np.ndarray):
+        self.vectors = np.ascontiguousarray(vectors) if self.keep_float else None
+
+    def _add_float(self, vectors: np.ndarray):
+        if self.keep_float:
+            self.vectors = np.concatenate([self.vectors, vectors])
+
+    def _remove_float(self, keep: np.ndarray):
+        if self.keep_float:
+            self.vectors = self.vectors[keep]
+
+    def _rescore(
+        self,
+        query: np.ndarray,
+        candidates: np.ndarray,
+        approx: np.ndarray,
+        top_k: int,
+        rescore: int,
+        fetch_vectors: Optional[FetchVectors]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            candidates: 粗排候选下标 (按近似分数降序)
+            approx: 候选的近似分数
+            rescore: 精排候选数 (0 表示不精排)
+        """
+        if rescore > 0 and self.vectors is not None:
+            exact = self.vectors[candidates] @ query
+        elif rescore > 0 and fetch_vectors is not None:
+            exact = normalize(fetch_vectors(self.ids[candidates])) @ query
+        else:
+            candidates, approx = candidates[:top_k], approx[:top_k]
+            return self.ids[candidates], approx
+        order = top_k_indices(exact, top_k)
+        return self.ids[candidates[order]], exact[order]
+
+    def memory_bytes(self) -> int:
+        total = super().memory_bytes()
+        if self.vectors is not None:
+            total += int(self.vectors.nbytes)
+        return total
@@ -0,0 +1,408 @@
+"""
+HNSW 图向量索引 (纯 NumPy 实现)
+
+用于 PostgreSQL 未安装 pgvector HNSW 算子类、或 embedding 以文本存储的部署:
+
+- 结构: 分层可导航小世界图。第 0 层邻接表是 (容量, 2M) 的 int32 数组, 上层只有约 1/M 的
+  节点, 按节点保存 (层数, M) 的 int32 数组; 空位为 -1
+- 构建: 逐个插入, 每层用 ef_construction 的候选集搜索邻居, 按启发式 (优先保留方向分散的
+  邻居) 选 M 个并双向连接, 邻居的邻接表满时按同样的启发式裁剪
+- 检索: 上层贪心下降, 第 0 层以 ef_search 的候选集做最佳优先搜索; ef_search 可按请求覆盖
+- 删除: 标记删除 (节点仍参与导航, 不出现在结果中), 删除比例超过阈值后 needs_rebuild() 为真,
+  由索引管理器在后台用存活向量的快照重建
+- 持久化: save / load 读写单个 .npz 文件
+"""
+
+import heapq
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import (
+    VECTOR_HNSW_EF_CONSTRUCTION,
+    VECTOR_HNSW_EF_SEARCH,
+    VECTOR_HNSW_M,
+    VECTOR_HNSW_REBUILD_DELETED_RATIO,
+)
+from app.services.vector_index.base import VectorIndex, normalize
+
+# 搜索结果: [(相似度, 节点)]
+Candidates = List[Tuple[float, int]]
+
+# 单层搜索每轮同时展开的候选数
+EXPAND_WIDTH = 4
+
+
+class HNSWIndex(VectorIndex):
+    """HNSW 近似最近邻图索引 (内积相似度, 向量已归一化)"""
+
+    name = 'hnsw'
+    persistent = True
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        m: int = VECTOR_HNSW_M,
+        ef_construction: int = VECTOR_HNSW_EF_CONSTRUCTION,
+        ef_search: int = VECTOR_HNSW_EF_SEARCH,
+        rebuild_deleted_ratio: float = VECTOR_HNSW_REBUILD_DELETED_RATIO,
+        seed: int = 42
+    ):
+        """
+        Args:
+            m: 每个节点在上层的最大邻居数 (第 0 层为 2m)
+            ef_construction: 插入时的候选集大小
+            ef_search: 检索时的默认候选集大小
+            rebuild_deleted_ratio: 标记删除的节点超过该比例时需要重建
+        """
+        super().__init__(dim)
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.rebuild_deleted_ratio = rebuild_deleted_ratio
+        self.level_mult = 1 / math.log(max(m, 2))
+        self._rng = np.random.default_rng(seed)
+        self._reset(0)
+
+    def _reset(self, capacity: int):
+        dim = self.dim or 0
+        self.count = 0  # 已分配的节点数 (含标记删除)
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.node_ids = np.empty(capacity, dtype=np.int64)
+        self.levels = np.zeros(capacity, dtype=np.int8)
+        self.deleted = np.zeros(capacity, dtype=bool)
+        self.links0 = np.full((capacity, self.m0), -1, dtype=np.int32)
+        self.upper: Dict[int, np.ndarray] = {}  # 节点 -> (层数, m) 上层邻接表
+        self.entry_point = -1
+        self.max_level = -1
+        self.ids = np.empty(0, dtype=np.int64)
+        self._node_of: Dict[int, int] = {}
+        self._visited = np.zeros(capacity, dtype=np.uint32)
+        self._visit_tag = 0
+
+    def _grow(self, needed: int):
+        capacity = len(self.node_ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+
+        def resize(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            return grown
+
+        self.vectors = resize(self.vectors, 0)
+        self.node_ids = resize(self.node_ids, 0)
+        self.levels = resize(self.levels, 0)
+        self.deleted = resize(self.deleted, False)
+        self.links0 = resize(self.links0, -1)
+        self._visited = np.zeros(capacity, dtype=np.uint32)
+        self._visit_tag = 0
+
+    # ==================== 维护 ====================
+
+    def build(self, ids: Iterable[int], vectors) -> "HNSWIndex":
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids):
+            vectors = normalize(vectors).reshape(len(ids), -1)
+            self.dim = vectors.shape[1]
+        self._reset(len(ids))
+        self._insert_all(ids, vectors)
+        return self
+
+    def add(self, ids: Iterable[int], vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        vectors = normalize(vectors).reshape(len(ids), -1)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._reset(0)
+        self._mark_deleted(ids)
+        self._insert_all(ids, vectors)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64)
+        return self._mark_deleted(ids)
+
+    def needs_rebuild(self) -> bool:
+        """标记删除的节点超过 rebuild_deleted_ratio (图中无效节点过多, 检索变慢、内存浪费)"""
+        return self.count > 0 and self.count - len(self.ids) > self.rebuild_deleted_ratio * self.count
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """存活节点的 (块ID, 向量) 副本, 用于后台重建"""
+        live = ~self.deleted[:self.count]
+        return self.node_ids[:self.count][live], self.vectors[:self.count][live]
+
+    def _mark_deleted(self, ids: np.ndarray) -> int:
+        nodes = [self._node_of.pop(int(chunk_id)) for chunk_id in ids if int(chunk_id) in self._node_of]
+        if nodes:
+            self.deleted[nodes] = True
+            self.ids = self.ids[~np.isin(self.ids, ids)]
+        return len(nodes)
+
+    def _insert_all(self, ids: np.ndarray, vectors: np.ndarray):
+        self._grow(self.count + len(ids))
+        for chunk_id, vector in zip(ids.tolist(), vectors):
+            self._insert(chunk_id, vector)
+        self.ids = np.concatenate([self.ids, ids])
+
+    def _random_level(self) -> int:
+        return min(int(-math.log(1.0 - self._rng.random()) * self.level_mult), 15)
+
+    def _insert(self, chunk_id: int, vector: np.ndarray):
+        node = self.count
+        self.count += 1
+        level = self._random_level()
+        self.vectors[node] = vector
+        self.node_ids[node] = chunk_id
+        self.levels[node] = level
+        self.deleted[node] = False
+        self._node_of[chunk_id] = node
+        if level > 0:
+            self.upper[node] = np.full((level, self.m), -1, dtype=np.int32)
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        entry = self.entry_point
+        entry_sim = float(self.vectors[entry] @ vector)
+        for layer in range(self.max_level, level, -1):
+            entry, entry_sim = self._greedy(vector, entry, entry_sim, layer)
+
+        found = [(entry_sim, entry)]
+        for layer in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(vector, found, self.ef_construction, layer)
+            neighbors = self._select(found, self.m)
+            self._links(node, layer)[:len(neighbors)] = neighbors
+            for neighbor in neighbors:
+                self._connect(neighbor, node, layer)
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def _links(self, node: int, layer: int) -> np.ndarray:
+        """节点在某层的邻接表 (含 -1 空位, 可原地修改)"""
+        return self.links0[node] if layer == 0 else self.upper[node][layer - 1]
+
+    def _neighbors(self, node: int, layer: int) -> np.ndarray:
+        links = self._links(node, layer)
+        return links[links >= 0]
+
+    def _connect(self, node: int, new: int, layer: int):
+        """把 new 加入 node 的邻接表, 满时按启发式裁剪"""
+        links = self._links(node, layer)
+        free = np.flatnonzero(links < 0)
+        if len(free):
+            links[free[0]] = new
+            return
+        candidates = np.append(links, new)
+        sims = self.vectors[candidates] @ self.vectors[node]
+        kept = self._select(list(zip(sims.tolist(), candidates.tolist())), len(links))
+        links[:] = -1
+        links[:len(kept)] = kept
+
+    def _select(self, candidates: Candidates, m: int) -> List[int]:
+        """
+        启发式选邻居: 按相似度从高到低, 只保留与查询比与任一已选邻居更相似的候选,
+        使邻居分布在不同方向上 (簇内不会全部连向同一团节点)
+        """
+        candidates = sorted(candidates, reverse=True)
+        if len(candidates) <= m:
+            return [node for _, node in candidates]
+        nodes = np.fromiter((node for _, node in candidates), dtype=np.int64, count=len(candidates))
+        sims = np.fromiter((sim for sim, _ in candidates), dtype=np.float32, count=len(candidates))
+        vectors = self.vectors[nodes]
+        # 每个候选与已选邻居的最大相似度; 每选中一个只算一行, 循环次数为选中数而不是候选数
+        closest = np.full(len(nodes), -np.inf, dtype=np.float32)
+        selected: List[int] = []
+        i = 0
+        while len(selected) < m:
+            eligible = np.flatnonzero(closest[i:] < sims[i:])
+            if not len(eligible):
+                break
+            i += int(eligible[0])
+            selected.append(i)
+            np.maximum(closest, vectors @ vectors[i], out=closest)
+            i += 1
+        return nodes[selected].tolist()
+
+    # ==================== 检索 ====================
+
+    def _next_visit_tag(self) -> int:
+        self._visit_tag += 1
+        if self._visit_tag == np.iinfo(np.uint32).max:
+            self._visited[:] = 0
+            self._visit_tag = 1
+        return self._visit_tag
+
+    def _greedy(self, query: np.ndarray, entry: int, entry_sim: float, layer: int) -> Tuple[int, float]:
+        """在单层上贪心移动到与查询最相似的节点"""
+        changed = True
+        while changed:
+            changed = False
+            neighbors = self._neighbors(entry, layer)
+            if not len(neighbors):
+                break
+            sims = self.vectors[neighbors] @ query
+            best = int(np.argmax(sims))
+            if sims[best] > entry_sim:
+                entry, entry_sim = int(neighbors[best]), float(sims[best])
+                changed = True
+        return entry, entry_sim
+
+    def _search_layer(self, query: np.ndarray, entries: Candidates, ef: int, layer: int) -> Candidates:
+        """单层最佳优先搜索, 返回与查询最相似的至多 ef 个节点"""
+        tag = self._next_visit_tag()
+        visited = self._visited
+        for _, node in entries:
+            visited[node] = tag
+        candidates = [(-sim, node) for sim, node in entries]  # 最大堆: 待扩展
+        heapq.heapify(candidates)
+        results = list(entries)  # 最小堆: 当前最好的 ef 个
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            # 每轮展开最多 EXPAND_WIDTH 个候选, 合并成一次向量计算 (减少 Python 循环次数)
+            batch = []
+            while candidates and len(batch) < EXPAND_WIDTH:
+                if len(results) >= ef and -candidates[0][0] < results[0][0]:
+                    break
+                batch.append(heapq.heappop(candidates)[1])
+            if not batch:
+                break
+            if layer == 0:
+                neighbors = self.links0[batch].ravel()
+            else:
+                neighbors = np.concatenate([self.upper[node][layer - 1] for node in batch])
+            neighbors = neighbors[neighbors >= 0]
+            neighbors = np.unique(neighbors[visited[neighbors] != tag])
+            if not len(neighbors):
+                continue
+            visited[neighbors] = tag
+            sims = self.vectors[neighbors] @ query
+            if len(results) >= ef:
+                closer = sims > results[0][0]
+                neighbors, sims = neighbors[closer], sims[closer]
+            for sim, neighbor in zip(sims.tolist(), neighbors.tolist()):
+                if len(results) < ef:
+                    heapq.heappush(results, (sim, neighbor))
+                elif sim > results[0][0]:
+                    heapq.heapreplace(results, (sim, neighbor))
+                else:
+                    continue
+                heapq.heappush(candidates, (-sim, neighbor))
+        return results
+
+    def _search(self, query: np.ndarray, top_k: int, ef_search: Optional[int] = None, **params) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            ef_search: 覆盖默认候选集大小 (越大召回率越高、越慢, 至少为 top_k)
+        """
+        ef = max(ef_search or self.ef_search, top_k)
+        live_ratio = len(self.ids) / self.count if self.count else 1.0
+        if live_ratio < 1.0:
+            # 标记删除的节点会占用候选位置, 按存活比例放大候选集
+            ef = int(math.ceil(ef / max(live_ratio, 0.1)))
+
+        entry = self.entry_point
+        entry_sim = float(self.vectors[entry] @ query)
+        for layer in range(self.max_level, 0, -1):
+            entry, entry_sim = self._greedy(query, entry, entry_sim, layer)
+        found = self._search_layer(query, [(entry_sim, entry)], ef, 0)
+
+        found = [(sim, node) for sim, node in sorted(found, reverse=True) if not self.deleted[node]][:top_k]
+        nodes = np.fromiter((node for _, node in found), dtype=np.int64, count=len(found))
+        scores = np.fromiter((sim for sim, _ in found), dtype=np.float32, count=len(found))
+        return self.node_ids[nodes], scores
+
+    # ==================== 持久化 ====================
+
+    def save(self, path: str, meta: Optional[Dict] = None):
+        """写入 .npz 文件 (先写临时文件再替换, 读者不会读到半个文件)"""
+        upper_nodes = np.fromiter(sorted(self.upper), dtype=np.int64, count=len(self.upper))
+        upper_links = (
+            np.concatenate([self.upper[node] for node in upper_nodes.tolist()])
+            if len(upper_nodes) else np.empty((0, self.m), dtype=np.int32)
+        )
+        header = {
+            'dim': self.dim,
+            'm': self.m,
+            'ef_construction': self.ef_construction,
+            'ef_search': self.ef_search,
+            'entry_point': self.entry_point,
+            'max_level': self.max_level,
+            'meta': meta or {}
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                header=np.array(json.dumps(header)),
+                vectors=self.vectors[:self.count],
+                node_ids=self.node_ids[:self.count],
+                levels=self.levels[:self.count],
+                deleted=self.deleted[:self.count],
+                links0=self.links0[:self.count],
+                upper_nodes=upper_nodes,
+                upper_links=upper_links
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["HNSWIndex", Dict]:
+        """读取 save 写入的文件, 返回 (索引, 保存时的附加信息)"""
+        with np.load(path) as data:
+            header = json.loads(str(data['header']))
+            index = cls(
+                dim=header['dim'],
+                m=header['m'],
+                ef_construction=header['ef_construction'],
+                ef_search=header['ef_search']
+            )
+            count = len(data['node_ids'])
+            index._reset(count)
+            index.count = count
+            index.vectors[:] = data['vectors']
+            index.node_ids[:] = data['node_ids']
+            index.levels[:] = data['levels']
+            index.deleted[:] = data['deleted']
+            index.links0[:] = data['links0']
+            offset = 0
+            upper_links = data['upper_links']
+            for node in data['upper_nodes'].tolist():
+                level = int(index.levels[node])
+                index.upper[node] = upper_links[offset:offset + level].copy()
+                offset += level
+        index.entry_point = header['entry_point']
+        index.max_level = header['max_level']
+        live = ~index.deleted[:count]
+        index.ids = index.node_ids[:count][live].copy()
+        index._node_of = dict(zip(index.ids.tolist(), np.flatnonzero(live).tolist()))
+        return index, header['meta']
+
+    def memory_bytes(self) -> int:
+        upper = sum(links.nbytes for links in self.upper.values())
+        return int(
+            self.ids.nbytes + self.vectors.nbytes + self.node_ids.nbytes + self.levels.nbytes
+            + self.deleted.nbytes + self.links0.nbytes + self._visited.nbytes + upper
+        )
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            'nodes': self.count,
+            'deleted': int(self.count - len(self.ids)),
+            'max_level': self.max_level,
+            'm': self.m,
+            'ef_construction': self.ef_construction,
+            'ef_search': self.ef_search
+        }
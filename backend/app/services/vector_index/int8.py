@@ -0,0 +1,98 @@
+"""
+int8 标量量化向量索引
+
+- 存储: 每个维度按该维最大绝对值缩放到 [-127, 127] 的 int8 码, 内存为 float32 的 1/4
+- 粗排: 查询向量乘以各维缩放系数后与 int8 码做点积 (按行分块转换, 避免整表转 float)
+- 精排: 粗排前 rescore 个候选取 float32 向量 (内存副本或回表查询) 精确计算后返回 top_k
+
+缩放系数在全量构建时确定; 增量加入的向量超出范围的分量被截断, 重建时恢复精度。
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import VECTOR_INDEX_BLOCK_ROWS, VECTOR_INT8_RESCORE
+from app.services.vector_index.base import FetchVectors, RescoringIndex, top_k_indices
+
+
+class Int8Index(RescoringIndex):
+    """int8 标量量化索引 (粗排) + float32 精排"""
+
+    name = 'int8'
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        rescore: int = VECTOR_INT8_RESCORE,
+        block_rows: int = VECTOR_INDEX_BLOCK_ROWS,
+        keep_float: bool = False
+    ):
+        """
+        Args:
+            rescore: 精排候选数
+            block_rows: 粗排每块行数
+            keep_float: 是否在内存中保留 float32 副本用于精排 (否则检索时回表取向量)
+        """
+        super().__init__(dim, rescore=rescore, keep_float=keep_float)
+        self.block_rows = block_rows
+        self.codes = np.empty((0, dim or 0), dtype=np.int8)
+        self.scale = np.ones(dim or 0, dtype=np.float32)
+
+    def quantize(self, vectors: np.ndarray) -> np.ndarray:
+        """按行分块量化 (整表一次量化会临时占用数倍于 float32 原始数据的内存)"""
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), self.block_rows):
+            block = vectors[start:start + self.block_rows] / self.scale
+            np.rint(block, out=block)
+            np.clip(block, -127, 127, out=block)
+            codes[start:start + len(block)] = block
+        return codes
+
+    def _build(self, vectors: np.ndarray):
+        max_abs = np.abs(vectors).max(axis=0) if len(vectors) else np.zeros(self.dim or 0, dtype=np.float32)
+        self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        self.codes = self.quantize(vectors)
+        self._build_float(vectors)
+
+    def _add(self, vectors: np.ndarray, start: int):
+        self.codes = np.concatenate([self.codes, self.quantize(vectors)])
+        self._add_float(vectors)
+
+    def _remove(self, keep: np.ndarray):
+        self.codes = self.codes[keep]
+        self._remove_float(keep)
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """所有向量的 int8 近似相似度"""
+        scaled_query = (query * self.scale).astype(np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        # 复用同一块 float32 缓冲区, 每块转换不再分配内存
+        buffer = np.empty((min(self.block_rows, len(self.codes)), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.codes), self.block_rows):
+            block = self.codes[start:start + self.block_rows]
+            converted = buffer[:len(block)]
+            np.copyto(converted, block, casting='unsafe')
+            np.matmul(converted, scaled_query, out=scores[start:start + len(block)])
+        return scores
+
+    def _search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        rescore: Optional[int] = None,
+        fetch_vectors: Optional[FetchVectors] = None,
+        **params
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            rescore: 覆盖默认精排候选数 (0 表示不精排, 直接返回近似分数)
+            fetch_vectors: 回表取 float32 向量的函数 (keep_float=False 时使用)
+        """
+        approx = self.approximate_scores(query)
+        rescore = self.rescore if rescore is None else rescore
+        candidates = top_k_indices(approx, max(rescore, top_k))
+        return self._rescore(query, candidates, approx[candidates], top_k, rescore, fetch_vectors)
+
+    def memory_bytes(self) -> int:
+        return super().memory_bytes() + int(self.codes.nbytes) + int(self.scale.nbytes)
@@ -0,0 +1,200 @@
+"""
+IVF 倒排分区向量索引
+
+- 训练: 在命名空间的向量 (超过 train_sample 时随机采样) 上做球面 k-means, 得到 nlist 个质心
+- 存储: 向量按所属质心排序后连续存放, offsets[l]:offsets[l + 1] 即第 l 个倒排列表,
+  检索时每个列表是一段连续内存, 直接做矩阵-向量乘
+- 检索: 查询与质心打分, 只扫描最近的 nprobe 个列表; nprobe 可按请求覆盖
+- 增量: 新向量分配到最近的质心后先放入追加区, 追加区超过 merge_rows 时并入连续存储;
+  质心不随增量更新, 向量数增长到训练时的 retrain_growth 倍后 needs_rebuild() 为真,
+  由索引管理器在后台重新训练
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import (
+    VECTOR_IVF_KMEANS_ITERS,
+    VECTOR_IVF_MERGE_ROWS,
+    VECTOR_IVF_NLIST,
+    VECTOR_IVF_NPROBE,
+    VECTOR_IVF_RETRAIN_GROWTH,
+    VECTOR_IVF_TRAIN_SAMPLE,
+)
+from app.services.vector_index.base import VectorIndex, normalize, top_k_indices
+
+# 分配向量到质心时每块行数 (块 x nlist 的相似度矩阵)
+ASSIGN_BLOCK_ROWS = 16384
+
+
+def auto_nlist(n: int, sample: int) -> int:
+    """按向量数选择列表数: 约 4 * sqrt(n), 且训练样本中每个质心至少约 39 个向量"""
+    return max(1, min(int(4 * np.sqrt(n)), min(n, sample) // 39))
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """每个向量最相似的质心下标 (分块计算, 不生成 n x nlist 的整块矩阵)"""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+        lists[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int, sample: int, seed: int = 0) -> np.ndarray:
+    """球面 k-means (质心归一化, 按内积分配); 空簇用随机样本重新初始化"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iters):
+        lists = assign_lists(vectors, centroids)
+        order = np.argsort(lists, kind='stable')
+        counts = np.bincount(lists, minlength=nlist)
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums[~empty] = np.add.reduceat(vectors[order], starts[~empty])
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex(VectorIndex):
+    """倒排分区索引 (k-means 质心 + 连续存放的倒排列表)"""
+
+    name = 'ivf'
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        nlist: int = VECTOR_IVF_NLIST,
+        nprobe: int = VECTOR_IVF_NPROBE,
+        kmeans_iters: int = VECTOR_IVF_KMEANS_ITERS,
+        train_sample: int = VECTOR_IVF_TRAIN_SAMPLE,
+        merge_rows: int = VECTOR_IVF_MERGE_ROWS,
+        retrain_growth: float = VECTOR_IVF_RETRAIN_GROWTH
+    ):
+        """
+        Args:
+            nlist: 列表数 (0 表示按训练时的向量数自动选择)
+            nprobe: 检索时默认扫描的列表数
+            kmeans_iters: k-means 迭代次数
+            train_sample: 训练采样的向量数上限
+            merge_rows: 追加区行数超过该值时并入连续存储
+            retrain_growth: 向量数增长到训练时的该倍数后需要重新训练
+        """
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iters = kmeans_iters
+        self.train_sample = train_sample
+        self.merge_rows = merge_rows
+        self.retrain_growth = retrain_growth
+        self.trained_size = 0
+        self.centroids = np.empty((0, dim or 0), dtype=np.float32)
+        # 连续存储: 按列表排序的向量, offsets[l]:offsets[l + 1] 为第 l 个列表
+        self.vectors = np.empty((0, dim or 0), dtype=np.float32)
+        self.lists = np.empty(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        # 追加区: 训练后新增的向量 (ids 中排在连续存储之后)
+        self.pending_vectors = np.empty((0, dim or 0), dtype=np.float32)
+        self.pending_lists = np.empty(0, dtype=np.int32)
+
+    def _build(self, vectors: np.ndarray):
+        n = len(vectors)
+        nlist = min(self.nlist or auto_nlist(n, self.train_sample), n) if n else 0
+        self.centroids = (
+            train_centroids(vectors, nlist, self.kmeans_iters, self.train_sample)
+            if nlist else np.empty((0, self.dim or 0), dtype=np.float32)
+        )
+        self.trained_size = n
+        self._store(self.ids, vectors, assign_lists(vectors, self.centroids) if n else np.empty(0, dtype=np.int32))
+        self.pending_vectors = np.empty((0, vectors.shape[1]), dtype=np.float32)
+        self.pending_lists = np.empty(0, dtype=np.int32)
+
+    def _store(self, ids: np.ndarray, vectors: np.ndarray, lists: np.ndarray):
+        """按列表排序后写入连续存储"""
+        order = np.argsort(lists, kind='stable')
+        self.ids = ids[order]
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.lists = lists[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.lists, minlength=len(self.centroids)))])
+
+    def _add(self, vectors: np.ndarray, start: int):
+        self.pending_vectors = np.concatenate([self.pending_vectors, vectors])
+        self.pending_lists = np.concatenate([self.pending_lists, assign_lists(vectors, self.centroids)])
+        if len(self.pending_lists) > self.merge_rows:
+            self.merge()
+
+    def merge(self):
+        """把追加区并入连续存储 (不重新训练质心)"""
+        if not len(self.pending_lists):
+            return
+        self._store(
+            self.ids,
+            np.concatenate([self.vectors, self.pending_vectors]),
+            np.concatenate([self.lists, self.pending_lists])
+        )
+        self.pending_vectors = self.pending_vectors[:0]
+        self.pending_lists = self.pending_lists[:0]
+
+    def _remove(self, keep: np.ndarray):
+        main, pending = keep[:len(self.lists)], keep[len(self.lists):]
+        self.vectors = self.vectors[main]
+        self.lists = self.lists[main]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.lists, minlength=len(self.centroids)))])
+        self.pending_vectors = self.pending_vectors[pending]
+        self.pending_lists = self.pending_lists[pending]
+
+    def needs_rebuild(self) -> bool:
+        """向量数已增长到训练时的 retrain_growth 倍 (质心不再代表数据分布)"""
+        return len(self) > max(self.trained_size, 1) * self.retrain_growth
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """当前全部 (块ID, 向量) 的副本, 用于后台重新训练"""
+        return self.ids.copy(), np.concatenate([self.vectors, self.pending_vectors])
+
+    def _search(self, query: np.ndarray, top_k: int, nprobe: Optional[int] = None, **params) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            nprobe: 覆盖默认扫描的列表数 (越大召回率越高、越慢; 等于 nlist 时为精确检索)
+        """
+        probes = top_k_indices(self.centroids @ query, nprobe or self.nprobe)
+        rows = []
+        scores = []
+        for probe in probes.tolist():
+            start, end = self.offsets[probe], self.offsets[probe + 1]
+            if end > start:
+                rows.append(np.arange(start, end))
+                scores.append(self.vectors[start:end] @ query)
+        if len(self.pending_lists):
+            pending = np.flatnonzero(np.isin(self.pending_lists, probes))
+            if len(pending):
+                rows.append(pending + len(self.lists))
+                scores.append(self.pending_vectors[pending] @ query)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate(rows)
+        scores = np.concatenate(scores)
+        order = top_k_indices(scores, top_k)
+        return self.ids[rows[order]], scores[order]
+
+    def memory_bytes(self) -> int:
+        return super().memory_bytes() + int(
+            self.centroids.nbytes + self.vectors.nbytes + self.lists.nbytes + self.offsets.nbytes
+            + self.pending_vectors.nbytes + self.pending_lists.nbytes
+        )
+
+    def stats(self) -> dict:
+        sizes = np.diff(self.offsets)
+        return {
+            **super().stats(),
+            'nlist': len(self.centroids),
+            'nprobe': self.nprobe,
+            'trained_size': self.trained_size,
+            'pending': len(self.pending_lists),
+            'max_list_size': int(sizes.max()) if len(sizes) else 0
+        }
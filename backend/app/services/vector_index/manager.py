@@ -0,0 +1,524 @@
+"""
+向量索引管理
+
+按 (后端, 命名空间) 懒加载并缓存进程内向量索引, 检索前与数据库核对:
+
+- 块ID自增且向量不原地修改 (内容变化时插入新块、删除旧块), 因此只需
+  加载 id 大于水位线的新块
+- 块数与索引大小不一致时 (其他进程删除了块, 或块改了命名空间) 按ID集合比对补齐
+- 核对间隔为 VECTOR_INDEX_SYNC_INTERVAL; 本进程内的删除和索引器新写入的块通过
+  索引失效/更新回调立即生效
+- 支持持久化的索引 (hnsw) 落盘到 VECTOR_INDEX_PERSIST_DIR, 连同水位线一起保存;
+  进程重启后先加载文件, 再按上述规则只同步增量
+- 分片索引 (shard) 的向量在本机的分片进程中, 首次使用时拉取已有的块ID,
+  水位线取其中最大的ID, 同样只同步增量
+- 需要重建的索引 (ivf 向量数成倍增长后, hnsw 标记删除过多时) 在后台线程用快照重建, 期间旧索引照常服务,
+  替换后回退水位线并立即核对, 补上重建期间的新增与删除
+- 块ID不变时水位线与块数核对发现不了向量本身的变化 (嵌入模型迁移交换列), 因此持久化文件记录
+  向量空间 (模型标识:维度), 不一致时不加载; 迁移完成时调用 reset 丢弃所有索引、文件和分片内容
+"""
+
+import glob
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config.logging_config import get_app_logger
+from app.utils.vector_codec import copy_vectors, supports_copy_binary
+from app.config.settings import (
+    EMBEDDING_DIM,
+    VECTOR_INDEX_BACKEND,
+    VECTOR_INDEX_LOAD_BATCH,
+    VECTOR_INDEX_NAMESPACE_BACKENDS,
+    VECTOR_INDEX_PERSIST_DIR,
+    VECTOR_INDEX_SAVE_INTERVAL,
+    VECTOR_INDEX_SYNC_INTERVAL,
+)
+from app.monitoring.memory import memory_registry
+from app.monitoring.metrics import record_vector_index_search
+from app.services.index_invalidation import (
+    ChunkVectors,
+    register_index_invalidation_hook,
+    register_index_update_hook,
+)
+from app.services.vector_index.base import ExactIndex, VectorIndex, parse_embedding
+from app.services.vector_index.binary import BinaryIndex
+from app.services.vector_index.hnsw import HNSWIndex
+from app.services.vector_index.ivf import IVFIndex
+from app.services.vector_index.int8 import Int8Index
+from app.services.vector_index.shards import ShardedIndex
+
+logger = get_app_logger()
+
+# 数据库全量加载后精确计算 (不使用进程内索引)
+SQL_BACKEND = 'sql'
+
+INDEX_BACKENDS = {
+    ExactIndex.name: ExactIndex,
+    Int8Index.name: Int8Index,
+    BinaryIndex.name: BinaryIndex,
+    HNSWIndex.name: HNSWIndex,
+    IVFIndex.name: IVFIndex,
+    ShardedIndex.name: ShardedIndex,
+}
+
+# 不限命名空间的检索使用的索引键
+ALL_NAMESPACES = '*'
+
+
+def parse_namespace_backends(value: str = VECTOR_INDEX_NAMESPACE_BACKENDS) -> Dict[str, str]:
+    """解析 "命名空间:后端,命名空间:后端" 配置"""
+    backends = {}
+    for item in value.split(','):
+        namespace, sep, backend = item.strip().partition(':')
+        if sep and namespace.strip() and backend.strip():
+            backends[namespace.strip()] = backend.strip()
+    return backends
+
+
+def _namespace_filter(namespace: str) -> Tuple[str, Dict]:
+    if namespace == ALL_NAMESPACES:
+        return "embedding IS NOT NULL", {}
+    return "embedding IS NOT NULL AND namespace = :namespace", {"namespace": namespace}
+
+
+def load_vectors(db: Session, namespace: str, after_id: int = 0, ids: Optional[List[int]] = None):
+    """
+    从数据库分批加载块向量
+
+    Args:
+        namespace: 命名空间 (ALL_NAMESPACES 表示全部)
+        after_id: 只加载 id 大于该值的块
+        ids: 只加载指定的块
+
+    Returns:
+        (块ID数组, 向量矩阵)
+    """
+    where, params = _namespace_filter(namespace)
+    if ids is not None:
+        where += " AND id = ANY(:ids)"
+        params["ids"] = [int(chunk_id) for chunk_id in ids]
+    else:
+        where += " AND id > :after_id"
+        params["after_id"] = int(after_id)
+
+    if supports_copy_binary(db):
+        return _copy_vectors(db, where, params)
+
+    result = db.execute(
+        text(f"SELECT id, embedding FROM document_chunks WHERE {where} ORDER BY id").execution_options(
+            stream_results=True
+        ),
+        params
+    )
+    loaded_ids: List[int] = []
+    vectors: List[np.ndarray] = []
+    for rows in result.partitions(VECTOR_INDEX_LOAD_BATCH):
+        for row in rows:
+            vector = parse_embedding(row.embedding)
+            if vector is not None:
+                loaded_ids.append(row.id)
+                vectors.append(vector)
+    if not vectors:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    return np.asarray(loaded_ids, dtype=np.int64), np.vstack(vectors)
+
+
+def _copy_vectors(db: Session, where: str, params: Dict):
+    """按 id 分批用 COPY BINARY 加载 (每批 VECTOR_INDEX_LOAD_BATCH 行, 整批解码为 float32 矩阵)"""
+    where = re.sub(r'(?<!:):(\w+)', r'%(\1)s', where)
+    id_parts: List[np.ndarray] = []
+    vector_parts: List[np.ndarray] = []
+    cursor = 0
+    while True:
+        ids, vectors = copy_vectors(
+            db,
+            f"SELECT id, embedding FROM document_chunks WHERE {where} AND id > %(cursor)s "
+            f"ORDER BY id LIMIT {int(VECTOR_INDEX_LOAD_BATCH)}",
+            {**params, "cursor": cursor}
+        )
+        if len(ids):
+            id_parts.append(ids)
+            vector_parts.append(vectors)
+            cursor = int(ids[-1])
+        if len(ids) < VECTOR_INDEX_LOAD_BATCH:
+            break
+    if not id_parts:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(id_parts), np.vstack(vector_parts)
+
+
+def fetch_vectors(db: Session, ids: np.ndarray) -> np.ndarray:
+    """按块ID回表取向量, 与 ids 对齐 (已删除的块为零向量)"""
+    rows = db.execute(
+        text("SELECT id, embedding FROM document_chunks WHERE id = ANY(:ids)"),
+        {"ids": [int(chunk_id) for chunk_id in ids]}
+    ).all()
+    by_id = {row.id: parse_embedding(row.embedding) for row in rows}
+    dim = next((len(v) for v in by_id.values() if v is not None), 0)
+    matrix = np.zeros((len(ids), dim), dtype=np.float32)
+    for i, chunk_id in enumerate(ids):
+        vector = by_id.get(int(chunk_id))
+        if vector is not None:
+            matrix[i] = vector
+    return matrix
+
+
+@dataclass
+class _Entry:
+    index: VectorIndex
+    watermark: int = 0
+    synced_at: float = 0.0
+    built_at: float = field(default_factory=time.time)
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    restored: bool = False
+    dirty: bool = False
+    rebuilding: bool = False
+    saved_at: float = field(default_factory=time.monotonic)
+
+
+class VectorIndexManager:
+    """进程内向量索引管理器"""
+
+    def __init__(
+        self,
+        default_backend: str = VECTOR_INDEX_BACKEND,
+        sync_interval: float = VECTOR_INDEX_SYNC_INTERVAL,
+        persist_dir: str = VECTOR_INDEX_PERSIST_DIR,
+        save_interval: float = VECTOR_INDEX_SAVE_INTERVAL,
+        space: str = ''
+    ):
+        """
+        Args:
+            space: 向量空间标识 (嵌入模型标识:维度), 写入持久化文件, 加载时不一致则忽略文件
+        """
+        self.default_backend = default_backend
+        self.namespace_backends = parse_namespace_backends()
+        self.sync_interval = sync_interval
+        self.persist_dir = persist_dir
+        self.save_interval = save_interval
+        self.space = space
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+        memory_registry.register("vector_index", self.memory_bytes, category="index")
+
+    def backend_for(self, namespace: Optional[str]) -> str:
+        """命名空间使用的检索后端"""
+        return self.namespace_backends.get(namespace or ALL_NAMESPACES, self.default_backend)
+
+    def create_index(self, backend: str) -> VectorIndex:
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"未知的向量索引后端: {backend}")
+        return INDEX_BACKENDS[backend]()
+
+    def _entry(self, backend: str, namespace: str) -> _Entry:
+        key = (backend, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(index=self.create_index(backend))
+                self._entries[key] = entry
+            return entry
+
+    def get_index(self, db: Session, namespace: Optional[str], backend: Optional[str] = None) -> _Entry:
+        """获取 (必要时加载并与数据库核对) 命名空间的索引"""
+        namespace = namespace or ALL_NAMESPACES
+        backend = backend or self.backend_for(namespace)
+        entry = self._entry(backend, namespace)
+        with entry.lock:
+            if not entry.restored:
+                entry.restored = True
+                self._restore(entry, backend, namespace)
+            if time.monotonic() - entry.synced_at >= self.sync_interval:
+                self._sync(db, entry, namespace)
+                self._save(entry, backend, namespace)
+            if not entry.rebuilding and entry.index.needs_rebuild():
+                self._rebuild_in_background(entry, backend, namespace)
+        return entry
+
+    def _rebuild_in_background(self, entry: _Entry, backend: str, namespace: str):
+        """用当前数据的快照在后台线程重建索引 (调用方持有 entry.lock)"""
+        entry.rebuilding = True
+        ids, vectors = entry.index.snapshot()
+        watermark = entry.watermark
+
+        def run():
+            start = time.perf_counter()
+            try:
+                index = self.create_index(backend).build(ids, vectors)
+                with entry.lock:
+                    entry.index = index
+                    # 快照之后的新增/删除由下一次核对补齐
+                    entry.watermark = watermark
+                    entry.synced_at = 0.0
+                    entry.built_at = time.time()
+                    entry.dirty = True
+                logger.info(
+                    f"向量索引后台重建完成 [{backend}:{namespace}]: 总数={len(ids)}, "
+                    f"耗时={time.perf_counter() - start:.2f}s"
+                )
+            except Exception as e:
+                logger.error(f"向量索引后台重建失败 [{backend}:{namespace}]: {e}", exc_info=True)
+            finally:
+                entry.rebuilding = False
+
+        logger.info(f"向量索引开始后台重建 [{backend}:{namespace}]: 总数={len(ids)}")
+        threading.Thread(target=run, name=f"vector-index-rebuild-{backend}", daemon=True).start()
+
+    def index_path(self, backend: str, namespace: str) -> Optional[str]:
+        """持久化文件路径 (命名空间名中的特殊字符替换后加哈希后缀, 避免冲突)"""
+        if not self.persist_dir:
+            return None
+        safe = re.sub(r'[^\w.-]', '_', 'all' if namespace == ALL_NAMESPACES else namespace)
+        digest = hashlib.md5(namespace.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.persist_dir, f"{backend}_{safe}_{digest}.npz")
+
+    def _restore(self, entry: _Entry, backend: str, namespace: str):
+        """接入进程外的索引内容, 或加载持久化的索引 (文件损坏时忽略, 从数据库重建)"""
+        meta = entry.index.attach(namespace)
+        if meta is not None:
+            entry.watermark = int(meta.get('watermark', 0))
+            logger.info(f"接入向量索引 [{backend}:{namespace}]: 总数={len(entry.index)}, 水位线={entry.watermark}")
+            return
+        path = self.index_path(backend, namespace)
+        if not entry.index.persistent or not path or not os.path.exists(path):
+            return
+        start = time.perf_counter()
+        try:
+            index, meta = type(entry.index).load(path)
+        except Exception as e:
+            logger.warning(f"加载向量索引文件失败, 将从数据库重建: {path}: {e}")
+            return
+        if meta.get('space', '') != self.space:
+            logger.info(f"向量索引文件属于其他向量空间 ({meta.get('space') or '未知'}), 将从数据库重建: {path}")
+            return
+        entry.index = index
+        entry.watermark = int(meta.get('watermark', 0))
+        entry.built_at = float(meta.get('built_at', entry.built_at))
+        logger.info(
+            f"加载向量索引 [{backend}:{namespace}]: 总数={len(index)}, 水位线={entry.watermark}, "
+            f"耗时={time.perf_counter() - start:.2f}s"
+        )
+
+    def _save(self, entry: _Entry, backend: str, namespace: str, force: bool = False):
+        """有变化且距上次落盘超过 save_interval 时保存索引"""
+        path = self.index_path(backend, namespace)
+        if not entry.index.persistent or not path or not entry.dirty:
+            return
+        if not force and time.monotonic() - entry.saved_at < self.save_interval:
+            return
+        start = time.perf_counter()
+        try:
+            entry.index.save(
+                path, meta={'watermark': entry.watermark, 'built_at': entry.built_at, 'space': self.space}
+            )
+        except Exception as e:
+            logger.warning(f"保存向量索引文件失败: {path}: {e}")
+            return
+        entry.dirty = False
+        entry.saved_at = time.monotonic()
+        logger.info(f"保存向量索引 [{backend}:{namespace}]: {path}, 耗时={time.perf_counter() - start:.2f}s")
+
+    def save_all(self):
+        """立即保存所有有变化的可持久化索引 (进程退出前调用)"""
+        with self._lock:
+            entries = list(self._entries.items())
+        for (backend, namespace), entry in entries:
+            with entry.lock:
+                self._save(entry, backend, namespace, force=True)
+
+    def _sync(self, db: Session, entry: _Entry, namespace: str):
+        start = time.perf_counter()
+        where, params = _namespace_filter(namespace)
+        row = db.execute(
+            text(f"SELECT count(*) AS total, COALESCE(max(id), 0) AS max_id FROM document_chunks WHERE {where}"),
+            params
+        ).first()
+        index = entry.index
+        added = removed = 0
+
+        if row.max_id > entry.watermark:
+            ids, vectors = load_vectors(db, namespace, after_id=entry.watermark)
+            index.add(ids, vectors)
+            added = len(ids)
+            entry.watermark = int(row.max_id)
+
+        if row.total != len(index):
+            where_ids, params_ids = _namespace_filter(namespace)
+            db_ids = np.fromiter(
+                (r.id for r in db.execute(text(f"SELECT id FROM document_chunks WHERE {where_ids}"), params_ids)),
+                dtype=np.int64
+            )
+            stale = np.setdiff1d(index.ids, db_ids, assume_unique=True)
+            removed = index.remove(stale)
+            missing = np.setdiff1d(db_ids, index.ids, assume_unique=True)
+            if len(missing):
+                ids, vectors = load_vectors(db, namespace, ids=missing.tolist())
+                index.add(ids, vectors)
+                added += len(ids)
+
+        entry.synced_at = time.monotonic()
+        if added or removed:
+            entry.dirty = True
+            logger.info(
+                f"向量索引同步 [{index.name}:{namespace}]: 新增={added}, 删除={removed}, "
+                f"总数={len(index)}, 内存={index.memory_bytes() / 1024 / 1024:.1f}MB, "
+                f"耗时={time.perf_counter() - start:.2f}s"
+            )
+
+    def search(
+        self,
+        db: Session,
+        query_embedding,
+        namespace: Optional[str],
+        top_k: int,
+        backend: Optional[str] = None,
+        **params
+    ) -> List[Tuple[int, float]]:
+        """
+        在命名空间的进程内索引中检索
+
+        Returns:
+            [(块ID, 相似度)], 按相似度降序
+        """
+        entry = self.get_index(db, namespace, backend)
+        index = entry.index
+        start = time.perf_counter()
+        with entry.lock:
+            ids, scores = index.search(
+                np.asarray(query_embedding, dtype=np.float32),
+                top_k,
+                fetch_vectors=lambda chunk_ids: fetch_vectors(db, chunk_ids),
+                **params
+            )
+        record_vector_index_search(index.name, time.perf_counter() - start)
+        return [(int(chunk_id), float(score)) for chunk_id, score in zip(ids, scores)]
+
+    def remove_chunks(self, doc_ids: List[int], chunk_ids_by_namespace: Dict[str, List[int]]):
+        """索引失效回调: 立即从相关索引中删除块"""
+        all_ids = [chunk_id for ids in chunk_ids_by_namespace.values() for chunk_id in ids]
+        with self._lock:
+            entries = list(self._entries.items())
+        for (_, namespace), entry in entries:
+            ids = all_ids if namespace == ALL_NAMESPACES else chunk_ids_by_namespace.get(namespace)
+            if ids:
+                with entry.lock:
+                    if entry.index.remove(ids):
+                        entry.dirty = True
+
+    def add_chunks(self, chunks_by_namespace: ChunkVectors):
+        """
+        索引更新回调: 立即把索引器新写入的块加入相关索引
+
+        尚未加载的索引跳过 (首次检索时全量加载); 水位线推进到新块的最大ID,
+        期间其他进程写入的更小ID由块数核对补齐。
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        for (_, namespace), entry in entries:
+            if namespace == ALL_NAMESPACES:
+                pairs = list(chunks_by_namespace.values())
+            else:
+                pairs = [chunks_by_namespace[namespace]] if namespace in chunks_by_namespace else []
+            ids = [chunk_id for chunk_ids, _ in pairs for chunk_id in chunk_ids]
+            if not ids:
+                continue
+            vectors = [vector for _, chunk_vectors in pairs for vector in chunk_vectors]
+            with entry.lock:
+                if not entry.watermark:
+                    continue
+                entry.index.add(ids, np.asarray(vectors, dtype=np.float32))
+                entry.watermark = max(entry.watermark, max(ids))
+                entry.dirty = True
+
+    def drop(self, namespace: Optional[str] = None):
+        """丢弃索引 (下次检索时重新加载)"""
+        with self._lock:
+            for key in [key for key in self._entries if namespace is None or key[1] == namespace]:
+                del self._entries[key]
+
+    def reset(self, namespaces: Iterable[str] = ()):
+        """
+        丢弃所有索引, 并删除持久化文件、清空分片上的内容
+
+        嵌入模型迁移交换向量列后调用: 块ID不变, 水位线与块数核对无法发现旧向量已作废。
+        namespaces 为库中的命名空间, 用于清空本进程尚未加载过的分片索引。
+        """
+        with self._lock:
+            entries = dict(self._entries)
+            self._entries.clear()
+        keys = set(entries) | {
+            (self.backend_for(namespace), namespace or ALL_NAMESPACES)
+            for namespace in [*namespaces, ALL_NAMESPACES]
+        }
+        for backend, namespace in sorted(keys, key=str):
+            entry = entries.get((backend, namespace))
+            index = entry.index if entry is not None else None
+            if index is None and backend == ShardedIndex.name:
+                index = self.create_index(backend)
+            if isinstance(index, ShardedIndex):
+                try:
+                    index.drop_remote(namespace)
+                except Exception as e:
+                    logger.warning(f"清空向量分片失败 [{namespace}]: {e}")
+        removed = 0
+        if self.persist_dir:
+            for path in glob.glob(os.path.join(self.persist_dir, '*.npz')):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"删除向量索引文件失败: {path}: {e}")
+        logger.info(f"已丢弃全部进程内向量索引: 已加载={len(entries)}, 删除持久化文件={removed}")
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            entries = list(self._entries.values())
+        return sum(entry.index.memory_bytes() for entry in entries)
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            entries = list(self._entries.items())
+        return [
+            {
+                'namespace': namespace,
+                'watermark': entry.watermark,
+                'built_at': entry.built_at,
+                'rebuilding': entry.rebuilding,
+                **entry.index.stats()
+            }
+            for (_, namespace), entry in entries
+        ]
+
+
+# 全局实例
+_manager: Optional[VectorIndexManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_vector_index_manager() -> VectorIndexManager:
+    """获取向量索引管理器 (懒加载)"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                # 延迟导入: embedding 模块依赖本包
+                from app.services.embedding import embedding_service
+                _manager = VectorIndexManager(space=f"{embedding_service.model_key}:{EMBEDDING_DIM}")
+                register_index_invalidation_hook(_manager.remove_chunks)
+                register_index_update_hook(_manager.add_chunks)
+    return _manager
+
+
+def save_vector_indexes():
+    """保存已加载的可持久化索引 (未使用过进程内索引时什么也不做)"""
+    if _manager is not None:
+        _manager.save_all()
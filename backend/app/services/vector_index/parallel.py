@@ -0,0 +1,145 @@
+"""
+多线程分块精确检索
+
+向量矩阵按行切成 VECTOR_SEARCH_BLOCK_ROWS 行的块, 在线程池上并行计算
+(NumPy 的矩阵乘在 BLAS 内释放 GIL, 多个块可以同时占用多个核):
+
+- parallel_scores: 每块写入预先分配的结果数组的对应区间, 返回全部相似度
+- parallel_top_k: 每块只保留局部 top-k, 再用堆合并各块的有序结果
+
+查询可以是单个向量, 也可以是 (q, dim) 的查询矩阵 (一次矩阵-矩阵乘完成一批查询)。
+全程使用 float32, 不产生 float64 中间矩阵。
+"""
+
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import VECTOR_SEARCH_BLOCK_ROWS, VECTOR_SEARCH_THREADS
+
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def search_threads() -> int:
+    """检索线程数 (VECTOR_SEARCH_THREADS 为 0 时取 CPU 核数)"""
+    return VECTOR_SEARCH_THREADS or os.cpu_count() or 1
+
+
+def get_search_executor(threads: Optional[int] = None) -> ThreadPoolExecutor:
+    """按线程数复用线程池"""
+    threads = threads or search_threads()
+    with _executors_lock:
+        executor = _executors.get(threads)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="vector-search")
+            _executors[threads] = executor
+        return executor
+
+
+def _map_blocks(fn: Callable[[int, int], object], rows: int, block_rows: int, threads: Optional[int]) -> List:
+    """对每个行区间 [start, end) 调用 fn, 只有一块或单线程时在当前线程执行"""
+    ranges = [(start, min(start + block_rows, rows)) for start in range(0, rows, block_rows)]
+    threads = threads or search_threads()
+    if len(ranges) <= 1 or threads <= 1:
+        return [fn(start, end) for start, end in ranges]
+    return list(get_search_executor(threads).map(lambda r: fn(*r), ranges))
+
+
+def _prepare_queries(queries, cosine: bool) -> Tuple[np.ndarray, bool]:
+    """转为 float32 的 (q, dim) 矩阵; 余弦相似度时查询先归一化"""
+    matrix = np.asarray(queries, dtype=np.float32)
+    single = matrix.ndim == 1
+    matrix = np.atleast_2d(matrix)
+    if cosine:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+    return matrix, single
+
+
+def _block_scores(matrix: np.ndarray, queries: np.ndarray, start: int, end: int, cosine: bool) -> np.ndarray:
+    """块内相似度 (行数, q); 余弦相似度时除以块内各行范数 (零向量的相似度为 0)"""
+    block = matrix[start:end]
+    scores = block @ queries.T
+    if cosine:
+        norms = np.sqrt(np.einsum('ij,ij->i', block, block))
+        norms[norms == 0] = 1.0
+        scores /= norms[:, None]
+    return scores
+
+
+def parallel_scores(
+    matrix: np.ndarray,
+    queries,
+    cosine: bool = False,
+    block_rows: int = VECTOR_SEARCH_BLOCK_ROWS,
+    threads: Optional[int] = None
+) -> np.ndarray:
+    """
+    计算矩阵每行与查询的相似度
+
+    Args:
+        matrix: (n, dim) float32 向量矩阵
+        queries: 查询向量 (dim,) 或查询矩阵 (q, dim)
+        cosine: True 时计算余弦相似度, 否则为点积 (矩阵已归一化时两者相同)
+
+    Returns:
+        单个查询为 (n,), 查询矩阵为 (n, q)
+    """
+    queries, single = _prepare_queries(queries, cosine)
+    scores = np.empty((len(matrix), len(queries)), dtype=np.float32)
+
+    def score(start: int, end: int):
+        scores[start:end] = _block_scores(matrix, queries, start, end, cosine)
+
+    _map_blocks(score, len(matrix), block_rows, threads)
+    return scores[:, 0] if single else scores
+
+
+def parallel_top_k(
+    matrix: np.ndarray,
+    queries,
+    k: int,
+    cosine: bool = False,
+    block_rows: int = VECTOR_SEARCH_BLOCK_ROWS,
+    threads: Optional[int] = None
+):
+    """
+    每个查询相似度最高的 k 行
+
+    Returns:
+        单个查询为 (行下标数组, 相似度数组), 查询矩阵为每个查询一个这样的元组的列表;
+        均按相似度降序
+    """
+    queries, single = _prepare_queries(queries, cosine)
+    k = min(k, len(matrix))
+
+    def block_top_k(start: int, end: int):
+        scores = _block_scores(matrix, queries, start, end, cosine)
+        partial = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            if k < len(column_scores):
+                part = np.argpartition(-column_scores, k - 1)[:k]
+            else:
+                part = np.arange(len(column_scores))
+            part = part[np.argsort(-column_scores[part], kind='stable')]
+            partial.append(list(zip((-column_scores[part]).tolist(), (part + start).tolist())))
+        return partial
+
+    blocks = _map_blocks(block_top_k, len(matrix), block_rows, threads) if k > 0 else []
+    results = []
+    for column in range(len(queries)):
+        # 各块结果已按相似度降序 (键为负相似度升序), 堆合并后取前 k 个
+        merged = list(itertools.islice(heapq.merge(*(block[column] for block in blocks)), k))
+        results.append((
+            np.fromiter((row for _, row in merged), dtype=np.int64, count=len(merged)),
+            np.fromiter((-neg for neg, _ in merged), dtype=np.float32, count=len(merged))
+        ))
+    return results[0] if single else results
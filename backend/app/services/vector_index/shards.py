@@ -0,0 +1,483 @@
+"""
+本机向量分片进程 (scatter-gather 检索)
+
+大命名空间的向量不再由每个 uvicorn worker 各自持有一份, 而是按块ID哈希分到
+VECTOR_SHARD_COUNT 个分片进程 (scripts/run_vector_shards.py 启动), 各 worker 共用:
+
+- 分片进程: 监听 VECTOR_SHARD_SOCKET_DIR/shard-<i>.sock (Unix socket, authkey 认证),
+  按命名空间持有 VECTOR_SHARD_BACKEND 后端的索引, 处理 add / remove / search 等请求
+- 安全: VECTOR_SHARD_AUTHKEY 必须配置 (没有默认值); socket 目录必须归当前用户所有且权限为 0700,
+  否则其他本机用户可以替换 socket; 消息不使用 pickle, 而是固定格式
+  (struct 头 + JSON 元数据 + ndarray 原始字节), 收到的数据不会被当作代码执行
+- ShardedIndex: 索引管理器中的 shard 后端 (VECTOR_INDEX_NAMESPACE_BACKENDS 按命名空间启用),
+  本地只保存块ID (供管理器核对新增/删除), 写入按分片拆分, 检索时把查询向量并发发给
+  所有分片, 合并各分片的局部 top-k
+
+分片进程没有数据库连接: 向量由各 worker 的索引管理器同步写入, 重复写入同一块时
+分片内先删后加, 多个 worker 同时同步结果一致。分片进程重启后内容为空, 下次检索时
+发现实例标识变化, 重新拉取块ID, 由管理器的块数核对补齐缺失的块。
+"""
+
+import json
+import os
+import stat
+import struct
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.logging_config import get_app_logger
+from app.config.settings import (
+    VECTOR_SHARD_AUTHKEY,
+    VECTOR_SHARD_BACKEND,
+    VECTOR_SHARD_COUNT,
+    VECTOR_SHARD_SOCKET_DIR,
+    VECTOR_SHARD_TIMEOUT,
+)
+from app.services.vector_index.base import RescoringIndex, VectorIndex, top_k_indices
+
+logger = get_app_logger()
+
+_scatter_executor: Optional[ThreadPoolExecutor] = None
+_clients: Dict[str, "ShardClient"] = {}
+_clients_lock = threading.Lock()
+
+# 线路格式: 消息头 (JSON 长度, 数组个数), JSON 元数据, 每个数组一个头 (类型, 维数, 行, 列) 加原始字节
+_HEADER = struct.Struct('!II')
+_ARRAY_HEADER = struct.Struct('!BBQQ')
+_WIRE_DTYPES = (np.dtype('<i8'), np.dtype('<f4'))
+
+
+def shard_authkey(authkey: Optional[str] = None) -> bytes:
+    """分片连接的认证密钥, 未配置时拒绝启动 (公开的默认密钥等于没有认证)"""
+    authkey = VECTOR_SHARD_AUTHKEY if authkey is None else authkey
+    if not authkey:
+        raise ValueError(
+            "未配置 VECTOR_SHARD_AUTHKEY, 拒绝启动向量分片连接; "
+            "部署时生成随机密钥, 例如: python -c 'import secrets; print(secrets.token_hex(32))'"
+        )
+    return authkey.encode('utf-8')
+
+
+def ensure_private_dir(path: str, create: bool = False):
+    """
+    校验 socket 目录归当前用户所有且其他用户无权访问
+
+    目录可由其他用户预先创建或写入时, 对方可以把 shard-<i>.sock 换成自己的监听端。
+
+    Raises:
+        PermissionError: 目录属主或权限不符合要求
+    """
+    if create:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(
+            f"向量分片 socket 目录必须是当前用户 (uid={os.getuid()}) 所有、权限为 0700 的目录: "
+            f"{path} (uid={st.st_uid}, mode={oct(stat.S_IMODE(st.st_mode))})"
+        )
+
+
+def encode_shard_message(message: Any) -> bytes:
+    """编码分片消息: JSON 可表示的值, 其中的 ndarray 以原始字节附在后面 (整数为 int64, 浮点为 float32)"""
+    arrays: List[np.ndarray] = []
+
+    def pack(value):
+        if isinstance(value, np.ndarray):
+            arrays.append(value)
+            return {'__array__': len(arrays) - 1}
+        if isinstance(value, dict):
+            return {str(key): pack(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [pack(item) for item in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    meta = json.dumps(pack(message), ensure_ascii=False).encode('utf-8')
+    parts = [_HEADER.pack(len(meta), len(arrays)), meta]
+    for array in arrays:
+        if array.dtype.kind not in 'iuf' or array.ndim not in (1, 2):
+            raise ValueError(f"分片消息不支持的数组: dtype={array.dtype}, shape={array.shape}")
+        code = 1 if array.dtype.kind == 'f' else 0
+        array = np.ascontiguousarray(array, dtype=_WIRE_DTYPES[code])
+        rows, cols = array.shape if array.ndim == 2 else (array.shape[0], 0)
+        parts.append(_ARRAY_HEADER.pack(code, array.ndim, rows, cols))
+        parts.append(array.data)
+    return b''.join(parts)
+
+
+def decode_shard_message(data: bytes) -> Any:
+    """解码 encode_shard_message 的结果
+
+    Raises:
+        ValueError: 消息格式错误
+    """
+    view = memoryview(data)
+    try:
+        meta_size, count = _HEADER.unpack_from(view, 0)
+        offset = _HEADER.size + meta_size
+        meta = json.loads(bytes(view[_HEADER.size:offset]).decode('utf-8'))
+        arrays = []
+        for _ in range(count):
+            code, ndim, rows, cols = _ARRAY_HEADER.unpack_from(view, offset)
+            offset += _ARRAY_HEADER.size
+            if code >= len(_WIRE_DTYPES) or ndim not in (1, 2):
+                raise ValueError(f"数组头无效: dtype={code}, ndim={ndim}")
+            dtype = _WIRE_DTYPES[code]
+            size = rows * cols if ndim == 2 else rows
+            if offset + size * dtype.itemsize > len(view):
+                raise ValueError("数组数据不完整")
+            array = np.frombuffer(view, dtype=dtype, count=size, offset=offset)
+            arrays.append((array.reshape(rows, cols) if ndim == 2 else array).copy())
+            offset += size * dtype.itemsize
+        if offset != len(view):
+            raise ValueError("消息长度不一致")
+
+        def unpack(value):
+            if isinstance(value, dict):
+                if set(value) == {'__array__'}:
+                    position = value['__array__']
+                    if not isinstance(position, int) or not 0 <= position < len(arrays):
+                        raise ValueError(f"数组引用无效: {position}")
+                    return arrays[position]
+                return {key: unpack(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [unpack(item) for item in value]
+            return value
+
+        return unpack(meta)
+    except (struct.error, UnicodeDecodeError, IndexError, TypeError, ValueError) as e:
+        raise ValueError(f"无效的分片消息: {e}") from e
+
+
+def shard_socket_path(socket_dir: str, shard: int) -> str:
+    return os.path.join(socket_dir, f"shard-{shard}.sock")
+
+
+def shard_of(ids, shards: int) -> np.ndarray:
+    """块ID所属的分片 (乘法哈希取高位, 连续的块ID均匀分散到各分片)"""
+    mixed = np.asarray(ids, dtype=np.int64).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return ((mixed >> np.uint64(32)) % np.uint64(shards)).astype(np.int64)
+
+
+class ShardServer:
+    """分片进程: 按命名空间持有索引, 每个连接一个线程处理请求"""
+
+    def __init__(self, socket_path: str, backend: str = VECTOR_SHARD_BACKEND, authkey: Optional[str] = None):
+        self.socket_path = socket_path
+        self.backend = backend
+        self.authkey = shard_authkey(authkey)
+        # 进程实例标识, 客户端据此发现分片重启
+        self.instance = uuid.uuid4().hex
+        self.indexes: Dict[str, VectorIndex] = {}
+        self.locks: Dict[str, threading.RLock] = {}
+        self._lock = threading.Lock()
+
+    def create_index(self) -> VectorIndex:
+        from app.services.vector_index.manager import INDEX_BACKENDS
+
+        if self.backend == ShardedIndex.name or self.backend not in INDEX_BACKENDS:
+            raise ValueError(f"分片不支持的向量索引后端: {self.backend}")
+        cls = INDEX_BACKENDS[self.backend]
+        # 分片进程没有数据库连接, 量化索引在内存中保留 float32 副本用于精排
+        return cls(keep_float=True) if issubclass(cls, RescoringIndex) else cls()
+
+    def _namespace(self, namespace: str, create: bool = False) -> Tuple[Optional[VectorIndex], threading.RLock]:
+        with self._lock:
+            if namespace not in self.locks:
+                self.locks[namespace] = threading.RLock()
+            if create and namespace not in self.indexes:
+                self.indexes[namespace] = self.create_index()
+            return self.indexes.get(namespace), self.locks[namespace]
+
+    def handle(self, op: str, namespace: str, payload: Dict):
+        """执行一个请求, 返回结果"""
+        if op == 'ping':
+            return None
+        if op == 'build':
+            index = self.create_index().build(payload['ids'], payload['vectors'])
+            with self._namespace(namespace)[1]:
+                self.indexes[namespace] = index
+            return len(index)
+        if op == 'drop':
+            with self._namespace(namespace)[1]:
+                self.indexes.pop(namespace, None)
+            return None
+
+        index, lock = self._namespace(namespace, create=op == 'add')
+        with lock:
+            if op == 'add':
+                index.add(payload['ids'], payload['vectors'])
+                if index.needs_rebuild():
+                    ids, vectors = index.snapshot()
+                    self.indexes[namespace] = self.create_index().build(ids, vectors)
+                return len(self.indexes[namespace])
+            if index is None:
+                return self._empty(op)
+            if op == 'ids':
+                return index.ids.copy()
+            if op == 'remove':
+                return index.remove(payload['ids'])
+            if op == 'search':
+                return index.search(payload['query'], payload['top_k'], **payload.get('params', {}))
+            if op == 'stats':
+                return {**index.stats(), 'memory_bytes': index.memory_bytes()}
+        raise ValueError(f"未知的分片请求: {op}")
+
+    @staticmethod
+    def _empty(op: str):
+        if op == 'ids':
+            return np.empty(0, dtype=np.int64)
+        if op == 'remove':
+            return 0
+        if op == 'search':
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if op == 'stats':
+            return {'vectors': 0, 'memory_bytes': 0}
+        raise ValueError(f"未知的分片请求: {op}")
+
+    def _serve_connection(self, conn: Connection):
+        with conn:
+            while True:
+                try:
+                    data = conn.recv_bytes()
+                except (EOFError, OSError):
+                    return
+                try:
+                    request = decode_shard_message(data)
+                    op, namespace, payload = request['op'], request['namespace'], request['payload']
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"向量分片收到无效消息, 断开连接: {e}")
+                    return
+                try:
+                    reply = {'status': 'ok', 'instance': self.instance, 'result': self.handle(op, namespace, payload)}
+                except Exception as e:
+                    logger.error(f"向量分片请求失败 [{op}:{namespace}]: {e}", exc_info=True)
+                    reply = {'status': 'error', 'instance': self.instance, 'result': str(e)}
+                conn.send_bytes(encode_shard_message(reply))
+
+    def serve_forever(self):
+        ensure_private_dir(os.path.dirname(self.socket_path) or '.', create=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        with Listener(self.socket_path, family='AF_UNIX', authkey=self.authkey) as listener:
+            logger.info(f"向量分片进程已启动: {self.socket_path} (后端={self.backend}, pid={os.getpid()})")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.warning(f"向量分片拒绝连接: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+def serve_shard(socket_path: str, backend: str = VECTOR_SHARD_BACKEND, authkey: Optional[str] = None):
+    """分片进程入口"""
+    ShardServer(socket_path, backend, authkey).serve_forever()
+
+
+def start_shard_workers(
+    shards: int = VECTOR_SHARD_COUNT,
+    socket_dir: str = VECTOR_SHARD_SOCKET_DIR,
+    backend: str = VECTOR_SHARD_BACKEND,
+    authkey: Optional[str] = None
+) -> List[Process]:
+    """
+    启动分片进程 (调用方负责 join / terminate)
+
+    Raises:
+        ValueError: 未配置认证密钥
+        PermissionError: socket 目录不是当前用户私有的目录
+    """
+    authkey = shard_authkey(authkey).decode('utf-8')
+    ensure_private_dir(socket_dir, create=True)
+    workers = []
+    for shard in range(shards):
+        worker = Process(
+            target=serve_shard,
+            args=(shard_socket_path(socket_dir, shard), backend, authkey),
+            name=f"vector-shard-{shard}",
+            daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+    return workers
+
+
+class ShardClient:
+    """到一个分片进程的连接 (同一时刻一个请求; 连接断开时重连一次)"""
+
+    def __init__(self, socket_path: str, authkey: Optional[str] = None, timeout: float = VECTOR_SHARD_TIMEOUT):
+        self.socket_path = socket_path
+        self.authkey = shard_authkey(authkey)
+        self.timeout = timeout
+        self.instance: Optional[str] = None
+        self._conn: Optional[Connection] = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except OSError:
+                pass
+            self._conn = None
+
+    def request(self, op: str, namespace: Optional[str] = None, **payload):
+        message = encode_shard_message({'op': op, 'namespace': namespace, 'payload': payload})
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._conn is None:
+                        # 连接前确认 socket 所在目录未被他人控制
+                        ensure_private_dir(os.path.dirname(self.socket_path) or '.')
+                        self._conn = Client(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+                    self._conn.send_bytes(message)
+                    if not self._conn.poll(self.timeout):
+                        raise TimeoutError(f"{self.timeout}s 内无响应")
+                    reply = decode_shard_message(self._conn.recv_bytes())
+                    status, instance, result = reply['status'], reply['instance'], reply['result']
+                    break
+                except (OSError, EOFError, ValueError) as e:
+                    # 超时、断开或响应无法解码后连接上可能还有未读的数据, 不再复用
+                    self.close()
+                    if attempt:
+                        raise ConnectionError(f"向量分片不可用: {self.socket_path}: {e}") from e
+            self.instance = instance
+        if status != 'ok':
+            raise RuntimeError(f"向量分片执行 {op} 失败 ({self.socket_path}): {result}")
+        return result
+
+
+def get_shard_client(socket_path: str) -> ShardClient:
+    """按 socket 路径复用连接 (同一进程内各命名空间共用)"""
+    with _clients_lock:
+        client = _clients.get(socket_path)
+        if client is None:
+            client = ShardClient(socket_path)
+            _clients[socket_path] = client
+        return client
+
+
+def _scatter(clients: List[ShardClient], op: str, namespace: str, payloads: List[Dict]) -> List:
+    """并发向各分片发送请求, 按分片顺序返回结果 (任一分片失败则抛出异常)"""
+    global _scatter_executor
+    if len(clients) == 1:
+        return [clients[0].request(op, namespace, **payloads[0])]
+    if _scatter_executor is None:
+        with _clients_lock:
+            if _scatter_executor is None:
+                _scatter_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="vector-shard")
+    futures = [
+        _scatter_executor.submit(client.request, op, namespace, **payload)
+        for client, payload in zip(clients, payloads)
+    ]
+    return [future.result() for future in futures]
+
+
+class ShardedIndex(VectorIndex):
+    """
+    分片进程上的索引 (本地只保存块ID)
+
+    检索参数 (如 ef_search / nprobe) 原样转发给分片内的索引, 不可序列化的参数
+    (fetch_vectors 回表函数) 不转发。
+    """
+
+    name = 'shard'
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        shards: int = VECTOR_SHARD_COUNT,
+        socket_dir: str = VECTOR_SHARD_SOCKET_DIR
+    ):
+        super().__init__(dim)
+        self.namespace = '*'
+        self.clients = [get_shard_client(shard_socket_path(socket_dir, shard)) for shard in range(shards)]
+        self.instances: List[Optional[str]] = [None] * shards
+
+    def attach(self, namespace: str) -> Optional[Dict]:
+        """拉取分片上命名空间已有的块ID, 水位线取其中最大的ID"""
+        self.namespace = namespace
+        self._refresh_ids()
+        return {'watermark': int(self.ids.max()) if len(self.ids) else 0}
+
+    def _refresh_ids(self):
+        parts = _scatter(self.clients, 'ids', self.namespace, [{}] * len(self.clients))
+        self.instances = [client.instance for client in self.clients]
+        self.ids = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def _partition(self, ids: np.ndarray) -> List[np.ndarray]:
+        """每个分片对应的行下标"""
+        shards = shard_of(ids, len(self.clients))
+        return [np.flatnonzero(shards == shard) for shard in range(len(self.clients))]
+
+    def build(self, ids, vectors) -> "ShardedIndex":
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        rows = self._partition(ids)
+        _scatter(self.clients, 'build', self.namespace, [{'ids': ids[r], 'vectors': vectors[r]} for r in rows])
+        self.ids = np.sort(ids)
+        self.dim = vectors.shape[1] if len(ids) else self.dim
+        return self
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        targets = [(client, r) for client, r in zip(self.clients, self._partition(ids)) if len(r)]
+        _scatter(
+            [client for client, _ in targets], 'add', self.namespace,
+            [{'ids': ids[r], 'vectors': vectors[r]} for _, r in targets]
+        )
+        self.ids = np.union1d(self.ids, ids)
+        self.dim = vectors.shape[1]
+
+    def remove(self, ids) -> int:
+        ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64)
+        ids = ids[np.isin(ids, self.ids)]
+        if not len(ids):
+            return 0
+        targets = [(client, r) for client, r in zip(self.clients, self._partition(ids)) if len(r)]
+        _scatter([client for client, _ in targets], 'remove', self.namespace, [{'ids': ids[r]} for _, r in targets])
+        self.ids = np.setdiff1d(self.ids, ids, assume_unique=True)
+        return len(ids)
+
+    def _search(self, query: np.ndarray, top_k: int, **params) -> Tuple[np.ndarray, np.ndarray]:
+        params = {key: value for key, value in params.items() if not callable(value)}
+        payload = {'query': query, 'top_k': top_k, 'params': params}
+        parts = _scatter(self.clients, 'search', self.namespace, [payload] * len(self.clients))
+        if [client.instance for client in self.clients] != self.instances:
+            # 有分片重启过 (内容为空): 重新拉取块ID, 由管理器下次核对时补齐
+            logger.warning(f"向量分片实例已变化, 重新拉取块ID [{self.namespace}]")
+            self._refresh_ids()
+        ids = np.concatenate([part[0] for part in parts])
+        scores = np.concatenate([part[1] for part in parts])
+        order = top_k_indices(scores, top_k)
+        return ids[order], scores[order]
+
+    def drop_remote(self, namespace: Optional[str] = None):
+        """清空分片上的该命名空间 (未接入时可指定命名空间)"""
+        if namespace is not None:
+            self.namespace = namespace
+        _scatter(self.clients, 'drop', self.namespace, [{}] * len(self.clients))
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def stats(self) -> dict:
+        try:
+            shards = _scatter(self.clients, 'stats', self.namespace, [{}] * len(self.clients))
+        except Exception as e:
+            return {**super().stats(), 'shards': len(self.clients), 'error': str(e)}
+        return {
+            **super().stats(),
+            'shards': len(self.clients),
+            'shard_sizes': [shard.get('vectors', 0) for shard in shards],
+            'shard_memory_mb': round(sum(shard.get('memory_bytes', 0) for shard in shards) / 1024 / 1024, 2)
+        }
@@ -5,10 +5,17 @@
 """
 
 from typing import List, Dict, Optional, Any
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.services.embedding import embedding_service
 from app.config.logging_config import get_app_logger
+from app.monitoring.tracing import trace_span
+from app.monitoring.memory import memory_registry, deep_sizeof
+from app.services.vector_index import SQL_BACKEND, get_vector_index_manager, parallel_top_k, parse_embedding
+from app.services.embedding_migration import ReadPlan, ann_search, get_embedding_migration_service
+from app.services.namespace_vector_index import get_namespace_index_manager
+from app.config.settings import EMBEDDING_STORAGE, NAMESPACE_VECTOR_INDEX_EF_SEARCH
 
 logger = get_app_logger()
 
@@ -30,7 +37,8 @@ class VectorRetrievalService:
         similarity_threshold: float = 0.0,
         document_ids: Optional[List[int]] = None,
         filename_filter: Optional[str] = None,
-        namespace: Optional[str] = None
+        namespace: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         通用的文档块检索方法
@@ -43,15 +51,71 @@ class VectorRetrievalService:
             document_ids: 可选的文档ID过滤
             filename_filter: 可选的文件名过滤
             namespace: 可选的知识领域过滤
+            search_params: 向量索引的检索参数 (如 rescore / ef_search / nprobe);
+                ef_search 同时作用于领域部分 HNSW 索引的 hnsw.ef_search
 
         Returns:
             List[Dict]: 相关文档块列表，包含相似度分数
         """
+        # 嵌入模型迁移: 已切换读取的命名空间改用新模型 + 影子向量列
+        migration = get_embedding_migration_service()
+        try:
+            plan = migration.read_plan(db, namespace)
+            if plan is not None:
+                return await self._search_migrated(
+                    db, plan, query_text, top_k, similarity_threshold,
+                    document_ids, filename_filter, namespace, search_params or {}
+                )
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"新模型向量检索失败, 回退到当前模型: {e}")
+
+        results = await self._search_chunks(
+            db, query_text, top_k, similarity_threshold, document_ids, filename_filter, namespace, search_params
+        )
+        if not document_ids and not filename_filter and migration.should_shadow_compare(db, namespace):
+            migration.schedule_shadow_compare(query_text, namespace, top_k, [chunk["id"] for chunk in results])
+        return results
+
+    async def _search_chunks(
+        self,
+        db: Session,
+        query_text: str,
+        top_k: int,
+        similarity_threshold: float,
+        document_ids: Optional[List[int]],
+        filename_filter: Optional[str],
+        namespace: Optional[str],
+        search_params: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """用当前模型和主向量列检索 (参数同 search_chunks)"""
         try:
             # 1. 生成查询向量
             query_embedding = await embedding_service.create_embedding(query_text)
             logger.info(f"生成查询向量完成，维度: {len(query_embedding)}")
 
+            # 按文档/文件名过滤的检索范围小, 仍走数据库全量计算
+            manager = get_vector_index_manager()
+            backend = manager.backend_for(namespace)
+            if backend != SQL_BACKEND and not document_ids and not filename_filter:
+                try:
+                    return self._search_index(
+                        db, query_embedding, backend, namespace, top_k, similarity_threshold, search_params or {}
+                    )
+                except Exception as e:
+                    logger.warning(f"向量索引检索失败, 回退到数据库全量计算: {e}")
+
+            # 单个领域且该领域的部分 HNSW 索引已建好时, 由数据库做 ANN 检索
+            if namespace and not document_ids and not filename_filter:
+                try:
+                    if get_namespace_index_manager().has_index(db, namespace):
+                        return self._search_partial_index(
+                            db, query_embedding, namespace, top_k, similarity_threshold, search_params or {}
+                        )
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"部分向量索引检索失败, 回退到数据库全量计算: {e}")
+
             # 2. 构建SQL查询条件
             conditions = ["embedding IS NOT NULL"]
             params = {}
@@ -79,34 +143,26 @@ class VectorRetrievalService:
                 ORDER BY document_id, chunk_index
             """
 
-            result = db.execute(text(query_sql), params)
+            with trace_span("vector_sql", namespace=namespace):
+                rows = db.execute(text(query_sql), params).fetchall()
             chunks_with_embeddings = []
 
-            for row in result:
-                # 处理 embedding 字段 - 可能是字符串格式
-                embedding = row.embedding
-                if isinstance(embedding, str):
-                    try:
-                        import json
-                        embedding = json.loads(embedding)
-                    except:
-                        try:
-                            embedding = eval(embedding)
-                        except:
-                            logger.warning(f"无法解析文档块 {row.id} 的 embedding")
-                            embedding = None
-
-                chunks_with_embeddings.append({
-                    "id": row.id,
-                    "document_id": row.document_id,
-                    "chunk_index": row.chunk_index,
-                    "content": row.content,
-                    "filename": row.filename,
-                    "metadata": row.chunk_metadata,
-                    "created_at": row.created_at,
-                    "embedding": embedding,
-                    "namespace": row.namespace if hasattr(row, 'namespace') else 'default'
-                })
+            with trace_span("row_parse", rows=len(rows)):
+                for row in rows:
+                    # 全局类型转换器已解码为 float32 ndarray; 旧表的数组/文本格式同样解析
+                    embedding = parse_embedding(row.embedding)
+
+                    chunks_with_embeddings.append({
+                        "id": row.id,
+                        "document_id": row.document_id,
+                        "chunk_index": row.chunk_index,
+                        "content": row.content,
+                        "filename": row.filename,
+                        "metadata": row.chunk_metadata,
+                        "created_at": row.created_at,
+                        "embedding": embedding,
+                        "namespace": row.namespace if hasattr(row, 'namespace') else 'default'
+                    })
 
             if not chunks_with_embeddings:
                 logger.info("没有找到任何文档块")
@@ -130,27 +186,36 @@ class VectorRetrievalService:
                 logger.warning("没有有效的向量数据")
                 return []
 
-            # 批量计算所有相似度
-            similarities = embedding_service.batch_cosine_similarity(query_embedding, valid_embeddings)
+            memory_registry.record_transient(
+                "vector_retrieval.parsed_embeddings", deep_sizeof(valid_embeddings)
+            )
 
-            # 创建(索引, 相似度)元组列表
-            similarity_pairs = []
-            for i, (chunk_idx, chunk_data) in enumerate(valid_chunks):
-                similarity_pairs.append((chunk_idx, similarities[i]))
+            # 分块并行计算相似度, 每块只保留局部 top-k 后合并 (不对全部候选排序)
+            with trace_span("vector_score", vectors=len(valid_embeddings)):
+                rows, similarities = parallel_top_k(
+                    np.asarray(valid_embeddings, dtype=np.float32),
+                    np.asarray(query_embedding, dtype=np.float32),
+                    top_k * 2,  # 获取更多用于阈值过滤
+                    cosine=True
+                )
+
+            # 创建(索引, 相似度)元组列表, 已按相似度降序
+            similarity_pairs = [
+                (valid_chunks[row][0], similarity)
+                for row, similarity in zip(rows.tolist(), similarities.tolist())
+            ]
 
             if not similarity_pairs:
                 logger.warning("没有有效的相似度计算结果")
                 return []
 
-            # 按相似度降序排序
-            similarity_pairs.sort(key=lambda x: x[1], reverse=True)
-
             # 5. 应用相似度阈值并返回前top_k个最相似的文档块
             result_chunks = []
-            for i, (chunk_idx, similarity) in enumerate(similarity_pairs[:top_k * 2]):  # 获取更多用于阈值过滤
+            for chunk_idx, similarity in similarity_pairs:
                 logger.info(f"文档块 {chunk_idx} 的相似度: {similarity}")
                 if similarity >= similarity_threshold:
                     chunk = chunks_with_embeddings[chunk_idx].copy()
+                    chunk['embedding'] = chunk['embedding'].tolist()  # 结果可能序列化到查询历史
                     chunk['similarity'] = similarity
                     result_chunks.append(chunk)
 
@@ -164,7 +229,143 @@ class VectorRetrievalService:
             logger.error(f"向量检索失败: {e}")
             return []
 
-    
+    def _search_index(
+        self,
+        db: Session,
+        query_embedding: List[float],
+        backend: str,
+        namespace: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        search_params: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """在进程内向量索引中检索, 再按块ID回表取块详情"""
+        with trace_span("vector_index_search", backend=backend, namespace=namespace):
+            hits = get_vector_index_manager().search(
+                db, query_embedding, namespace, top_k, backend=backend, **search_params
+            )
+        hits = [(chunk_id, score) for chunk_id, score in hits if score >= similarity_threshold]
+        if not hits:
+            return []
+
+        rows = db.execute(text("""
+            SELECT id, document_id, chunk_index, content, filename,
+                   chunk_metadata, created_at, namespace
+            FROM document_chunks
+            WHERE id = ANY(:ids)
+        """), {"ids": [chunk_id for chunk_id, _ in hits]}).fetchall()
+        by_id = {row.id: row for row in rows}
+
+        results = []
+        for chunk_id, score in hits:
+            row = by_id.get(chunk_id)
+            if row is None:
+                continue
+            results.append({
+                "id": row.id,
+                "document_id": row.document_id,
+                "chunk_index": row.chunk_index,
+                "content": row.content,
+                "filename": row.filename,
+                "metadata": row.chunk_metadata,
+                "created_at": row.created_at,
+                "namespace": row.namespace or 'default',
+                "similarity": score
+            })
+
+        logger.info(f"向量索引检索完成 [{backend}]，返回 {len(results)} 个最相关的文档块")
+        return results
+
+    async def _search_migrated(
+        self,
+        db: Session,
+        plan: ReadPlan,
+        query_text: str,
+        top_k: int,
+        similarity_threshold: float,
+        document_ids: Optional[List[int]],
+        filename_filter: Optional[str],
+        namespace: Optional[str],
+        search_params: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """用迁移的新模型生成查询向量, 在对应向量列上检索"""
+        query_embedding = await plan.service.create_embedding(query_text)
+        with trace_span("vector_migrated", column=plan.column, namespace=namespace):
+            rows = ann_search(
+                db, plan.column, plan.storage, query_embedding, top_k,
+                namespace=namespace, document_ids=document_ids, filename_filter=filename_filter,
+                ef_search=int(search_params.get('ef_search') or NAMESPACE_VECTOR_INDEX_EF_SEARCH)
+            )
+
+        results = [
+            {
+                "id": row.id,
+                "document_id": row.document_id,
+                "chunk_index": row.chunk_index,
+                "content": row.content,
+                "filename": row.filename,
+                "metadata": row.chunk_metadata,
+                "created_at": row.created_at,
+                "namespace": row.namespace or 'default',
+                "similarity": float(row.similarity)
+            }
+            for row in rows
+            if row.similarity >= similarity_threshold
+        ]
+
+        logger.info(f"新模型向量检索完成 [{plan.column}]，返回 {len(results)} 个最相关的文档块")
+        return results
+
+    def _search_partial_index(
+        self,
+        db: Session,
+        query_embedding: List[float],
+        namespace: str,
+        top_k: int,
+        similarity_threshold: float,
+        search_params: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        用领域的部分 HNSW 索引 (WHERE namespace = '<ns>') 在数据库内做 ANN 检索
+
+        psycopg2 在客户端替换参数, namespace 以字面量出现在语句中, 规划器据此判定谓词蕴含索引条件;
+        排序表达式 embedding <=> 与索引的 *_cosine_ops 操作符类一致
+        """
+        ef_search = max(int(search_params.get('ef_search') or NAMESPACE_VECTOR_INDEX_EF_SEARCH), top_k)
+        query_vector = '[' + ','.join(map(str, np.asarray(query_embedding, dtype=np.float32).tolist())) + ']'
+
+        with trace_span("vector_partial_index", namespace=namespace):
+            # is_local=true: 只在当前事务内生效
+            db.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"), {"ef_search": str(ef_search)})
+            rows = db.execute(text(f"""
+                SELECT id, document_id, chunk_index, content, filename,
+                       chunk_metadata, created_at, namespace,
+                       1 - (embedding <=> CAST(:query AS {EMBEDDING_STORAGE})) AS similarity
+                FROM document_chunks
+                WHERE namespace = :namespace AND embedding IS NOT NULL
+                ORDER BY embedding <=> CAST(:query AS {EMBEDDING_STORAGE})
+                LIMIT :limit
+            """), {"query": query_vector, "namespace": namespace, "limit": top_k}).fetchall()
+
+        results = [
+            {
+                "id": row.id,
+                "document_id": row.document_id,
+                "chunk_index": row.chunk_index,
+                "content": row.content,
+                "filename": row.filename,
+                "metadata": row.chunk_metadata,
+                "created_at": row.created_at,
+                "namespace": row.namespace or 'default',
+                "similarity": float(row.similarity)
+            }
+            for row in rows
+            if row.similarity >= similarity_threshold
+        ]
+
+        logger.info(f"部分向量索引检索完成 [{namespace}]，返回 {len(results)} 个最相关的文档块")
+        return results
+
     async def search_documents(
         self,
         db: Session,
@@ -249,7 +450,8 @@ class VectorRetrievalService:
         query_text: str,
         namespace: str,
         top_k: int = 10,
-        similarity_threshold: float = 0.0
+        similarity_threshold: float = 0.0,
+        search_params: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         在指定领域内进行向量检索
@@ -260,6 +462,7 @@ class VectorRetrievalService:
             namespace: 领域命名空间
             top_k: 返回结果数量
             similarity_threshold: 相似度阈值
+            search_params: 进程内向量索引的检索参数
 
         Returns:
             List[Dict]: 排序后的文档块
@@ -271,7 +474,8 @@ class VectorRetrievalService:
             query_text=query_text,
             top_k=top_k,
             similarity_threshold=similarity_threshold,
-            namespace=namespace
+            namespace=namespace,
+            search_params=search_params
         )
 
         logger.info(f"领域 '{namespace}' 检索完成,返回 {len(results)} 个结果")
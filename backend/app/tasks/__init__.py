@@ -4,11 +4,15 @@ Celery任务模块
 from app.tasks.index_tasks import (
     index_document_task,
     batch_index_task,
+    index_sub_batch_task,
+    finalize_batch_index_task,
     delete_index_task
 )
 
 __all__ = [
     'index_document_task',
     'batch_index_task',
+    'index_sub_batch_task',
+    'finalize_batch_index_task',
     'delete_index_task'
 ]
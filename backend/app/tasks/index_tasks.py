@@ -2,21 +2,38 @@
 文档索引异步任务
 使用Celery进行异步处理
 """
-from celery import Task
+from celery import Task, chord, group
 from app.celery_app import celery_app
 from app.database.connection import get_db
-from app.services.incremental_indexer import create_incremental_indexer
+from app.services.embedding_store import EmbeddingBatchStats
+from app.services.incremental_indexer import create_incremental_indexer, plan_index_batches
+from app.services.index_scheduler import priority_class
+from app.monitoring.metrics import record_index_queue_wait
 from app.services.websocket_notifier import notifier as ws_notifier
 from app.models.database import Document
 from app.models.index_record import IndexTask as IndexTaskModel
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from datetime import datetime
 import logging
+import time
 import traceback
 
 logger = logging.getLogger(__name__)
 
 
+def _mark_started(db: Session, task_record: IndexTaskModel):
+    """任务记录置为处理中, 并记录排队时间"""
+    task_record.status = 'processing'
+    task_record.started_at = datetime.now()
+    db.commit()
+    if task_record.created_at:
+        record_index_queue_wait(
+            priority_class(task_record.priority),
+            (task_record.started_at - task_record.created_at).total_seconds()
+        )
+
+
 class DatabaseTask(Task):
     """
     自定义任务基类,提供数据库会话管理
@@ -66,9 +83,7 @@ def index_document_task(self, doc_id: int, user_id: int = None, force: bool = Fa
         ).first()
 
         if task_record:
-            task_record.status = 'processing'
-            task_record.started_at = datetime.now()
-            db.commit()
+            _mark_started(db, task_record)
 
         # 获取文档
         doc = db.query(Document).filter(Document.id == doc_id).first()
@@ -161,12 +176,15 @@ def batch_index_task(self, doc_ids: list, user_id: int = None):
     """
     异步批量索引文档
 
+    按内容长度切分为子批次, 超过一个子批次时以 chord 扇出到多个 worker 并行处理,
+    由 finalize_batch_index_task 汇总结果; 只有一个子批次时在当前 worker 内直接处理。
+
     Args:
         doc_ids: 文档ID列表
         user_id: 用户ID
 
     Returns:
-        批量索引结果
+        批量索引结果 (扇出时返回子批次信息)
     """
     task_record = None
 
@@ -179,17 +197,55 @@ def batch_index_task(self, doc_ids: list, user_id: int = None):
         ).first()
 
         if task_record:
-            task_record.status = 'processing'
-            task_record.started_at = datetime.now()
-            db.commit()
-
-        logger.info(f"开始批量索引: 共{len(doc_ids)}个文档")
+            _mark_started(db, task_record)
 
         # 创建索引器
         indexer = create_incremental_indexer(db)
 
+        # 按内容长度切分子批次
+        sizes = indexer.get_content_sizes(doc_ids)
+        batches = plan_index_batches({doc_id: sizes.get(doc_id, 0) for doc_id in dict.fromkeys(doc_ids)})
+
+        if len(batches) > 1:
+            logger.info(f"批量索引扇出: 共{len(doc_ids)}个文档, {len(batches)}个子批次")
+
+            if task_record:
+                task_record.task_metadata = {
+                    **(task_record.task_metadata or {}),
+                    'sub_batches': len(batches),
+                    'completed_docs': 0
+                }
+                db.commit()
+
+            # 子批次沿用父任务的队列与优先级
+            metadata = (task_record.task_metadata or {}) if task_record else {}
+            routing = {
+                key: metadata[source]
+                for key, source in (('queue', 'queue'), ('priority', 'celery_priority'))
+                if metadata.get(source) is not None
+            }
+
+            chord(
+                group(
+                    index_sub_batch_task.s(batch, user_id, self.request.id, len(doc_ids)).set(**routing)
+                    for batch in batches
+                )
+            )(finalize_batch_index_task.s(self.request.id, len(doc_ids), time.time()).set(**routing))
+
+            ws_notifier.send_progress_update(
+                task_id=self.request.id,
+                progress=0,
+                status='processing',
+                current=0,
+                total=len(doc_ids),
+                message=f'已分发 {len(batches)} 个子批次'
+            )
+            return {'status': 'dispatched', 'total': len(doc_ids), 'sub_batches': len(batches)}
+
+        logger.info(f"开始批量索引: 共{len(doc_ids)}个文档")
+
         # 批量索引with进度回调
-        def progress_callback(current, total):
+        def progress_callback(current, total, doc_id=None, result=None):
             progress = int((current / total) * 100)
             logger.info(f"批量索引进度: {current}/{total} ({progress}%)")
 
@@ -261,6 +317,168 @@ def batch_index_task(self, doc_ids: list, user_id: int = None):
         return {'status': 'error', 'error': str(e)}
 
 
+def _advance_batch_progress(db: Session, parent_task_id: str, completed: int, total: int) -> int:
+    """
+    原子累加父任务的已完成文档数并更新进度 (多个 worker 并发更新同一行)
+
+    Returns:
+        累加后的已完成文档数
+    """
+    row = db.execute(
+        text("""
+            UPDATE index_tasks
+            SET metadata = jsonb_set(
+                    COALESCE(metadata, '{}'::jsonb),
+                    '{completed_docs}',
+                    to_jsonb(COALESCE((metadata->>'completed_docs')::int, 0) + :completed)
+                ),
+                progress = LEAST(99, (COALESCE((metadata->>'completed_docs')::int, 0) + :completed) * 100 / :total),
+                updated_at = NOW()
+            WHERE task_id = :task_id
+            RETURNING (metadata->>'completed_docs')::int AS completed_docs
+        """),
+        {'completed': completed, 'total': max(total, 1), 'task_id': parent_task_id}
+    ).first()
+    db.commit()
+    return row.completed_docs if row else 0
+
+
+@celery_app.task(
+    name='app.tasks.index_tasks.index_sub_batch_task',
+    base=DatabaseTask,
+    bind=True
+)
+def index_sub_batch_task(self, doc_ids: list, user_id: int = None, parent_task_id: str = None, total: int = None):
+    """
+    索引一个子批次 (chord 的 header 任务)
+
+    子批次内的新增分块跨文档合并后批量生成向量。
+    异常时返回失败统计而不是抛出, 保证 chord 回调总能执行。
+
+    Args:
+        doc_ids: 子批次的文档ID列表
+        user_id: 用户ID
+        parent_task_id: 父任务ID (进度与结果汇总到该任务)
+        total: 父任务的文档总数 (用于计算进度)
+
+    Returns:
+        子批次索引结果
+    """
+    try:
+        db = self.db
+        indexer = create_incremental_indexer(db)
+
+        total = total or len(doc_ids)
+
+        def progress_callback(current, batch_total, doc_id=None, result=None):
+            completed = _advance_batch_progress(db, parent_task_id, 1, total)
+            ws_notifier.send_progress_update(
+                task_id=parent_task_id,
+                progress=min(99, int(completed * 100 / max(total, 1))),
+                status='processing',
+                current=completed,
+                total=total,
+                message=f'处理中 {completed}/{total}'
+            )
+
+        result = indexer.batch_index_documents(
+            doc_ids,
+            user_id=user_id,
+            progress_callback=progress_callback if parent_task_id else None
+        )
+        logger.info(f"子批次索引完成: 文档={len(doc_ids)}, 成功={result['success']}, "
+                    f"跳过={result['skipped']}, 失败={result['failed']}")
+        return result
+
+    except Exception as e:
+        logger.error(f"子批次索引失败: {str(e)}\n{traceback.format_exc()}")
+        return {
+            'total': len(doc_ids),
+            'success': 0,
+            'failed': len(doc_ids),
+            'skipped': 0,
+            'details': [{'doc_id': doc_id, 'status': 'failed', 'error': str(e)} for doc_id in doc_ids],
+            'error': str(e)
+        }
+
+
+@celery_app.task(
+    name='app.tasks.index_tasks.finalize_batch_index_task',
+    base=DatabaseTask,
+    bind=True
+)
+def finalize_batch_index_task(self, sub_results: list, parent_task_id: str, total: int, started_at: float):
+    """
+    汇总各子批次结果 (chord 回调), 更新父任务记录并推送完成通知
+
+    Args:
+        sub_results: 各子批次的 batch_index_documents 结果
+        parent_task_id: 父任务ID
+        total: 文档总数
+        started_at: 父任务分发时间戳
+
+    Returns:
+        与 batch_index_documents 格式一致的汇总结果
+    """
+    result = {
+        'total': total,
+        'success': 0,
+        'failed': 0,
+        'skipped': 0,
+        'details': [],
+        'sub_batches': len(sub_results)
+    }
+    embedding_stats = EmbeddingBatchStats()
+    errors = []
+
+    for sub_result in sub_results:
+        for key in ('success', 'failed', 'skipped'):
+            result[key] += sub_result.get(key, 0)
+        result['details'].extend(sub_result.get('details', []))
+        if sub_result.get('error'):
+            errors.append(sub_result['error'])
+        dedup = sub_result.get('embedding_dedup')
+        if dedup:
+            embedding_stats.merge(EmbeddingBatchStats(
+                total=dedup['total'],
+                unique=dedup['unique'],
+                store_hits=dedup['store_hits'],
+                model_calls=dedup['model_calls']
+            ))
+
+    duration = time.time() - started_at
+    result['embedding_dedup'] = embedding_stats.to_dict()
+    result['duration_seconds'] = duration
+    result['docs_per_second'] = round(total / duration, 2) if duration > 0 else None
+
+    db = self.db
+    task_record = db.query(IndexTaskModel).filter(
+        IndexTaskModel.task_id == parent_task_id
+    ).first()
+    if task_record:
+        task_record.status = 'failed' if errors and not result['success'] else 'completed'
+        task_record.progress = 100
+        task_record.completed_at = datetime.now()
+        task_record.error_message = '; '.join(errors) if errors else None
+        task_record.task_metadata = {
+            **(task_record.task_metadata or {}),
+            'completed_docs': total,
+            'summary': {key: value for key, value in result.items() if key != 'details'}
+        }
+        db.commit()
+
+    ws_notifier.send_task_complete(
+        task_id=parent_task_id,
+        success=not errors,
+        message='批量索引完成',
+        result=result
+    )
+
+    logger.info(f"批量索引汇总完成: 总数={total}, 成功={result['success']}, 跳过={result['skipped']}, "
+                f"失败={result['failed']}, 子批次={len(sub_results)}, 耗时={duration:.2f}s")
+    return result
+
+
 @celery_app.task(
     name='app.tasks.index_tasks.delete_index_task',
     base=DatabaseTask,
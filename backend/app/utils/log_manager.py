@@ -247,6 +247,61 @@ class LogManager:
         
         return stats
     
+    def get_profiles(self) -> List[Dict]:
+        """
+        获取慢请求采样文件列表
+        
+        Returns:
+            List[Dict]: 采样文件信息, 附带请求ID和样本总数
+        """
+        profiles = []
+        for log_file in self.get_log_files("profile"):
+            name = log_file["name"]
+            if not name.endswith(".folded.txt"):
+                continue
+            # 文件名格式: 20240101_120000_<request_id>.folded.txt
+            stem = name[:-len(".folded.txt")]
+            parts = stem.split("_", 2)
+            log_file["request_id"] = parts[2] if len(parts) == 3 else stem
+            profiles.append(log_file)
+        return profiles
+    
+    def read_profile(self, request_id: str, top: int = 0) -> Optional[Dict]:
+        """
+        读取指定请求的折叠栈采样
+        
+        Args:
+            request_id (str): 请求ID
+            top (int): 只返回样本数最多的前N条栈, 0表示全部
+            
+        Returns:
+            Optional[Dict]: 采样内容, 不存在时返回 None
+        """
+        for profile in self.get_profiles():
+            if profile["request_id"] != request_id:
+                continue
+            
+            stacks = []
+            total_samples = 0
+            with open(profile["path"], 'r', encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if not stack or not count.isdigit():
+                        continue
+                    total_samples += int(count)
+                    stacks.append({"stack": stack, "count": int(count)})
+            
+            stacks.sort(key=lambda x: x["count"], reverse=True)
+            return {
+                "request_id": request_id,
+                "file": profile["name"],
+                "path": profile["path"],
+                "total_samples": total_samples,
+                "stacks": stacks[:top] if top > 0 else stacks
+            }
+        
+        return None
+    
     def export_logs(self, 
                    output_file: str, 
                    log_type: str = None, 
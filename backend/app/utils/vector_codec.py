@@ -0,0 +1,146 @@
+"""
+pgvector 向量的解码
+
+- 文本格式 "[0.1,0.2,...]": psycopg2 只以文本协议返回查询结果, 全局类型转换器用 NumPy 的
+  C 解析器直接解码为 float32 ndarray, 不经过 json / eval
+- COPY BINARY: 批量加载 (块ID, 向量) 时用 COPY ... TO STDOUT WITH (FORMAT binary),
+  vector / halfvec 的二进制格式为 uint16 维度 + uint16 保留位 + 大端 float32 / float16,
+  每行定长时整块缓冲区按结构化 dtype 一次解码到预先分配的 float32 矩阵
+"""
+
+import io
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+
+
+def parse_vector_text(value: str) -> Optional[np.ndarray]:
+    """解码向量的文本格式 (vector 与 halfvec 相同), 空向量返回 None"""
+    parsed = np.fromstring(value.strip().strip('[]'), dtype=np.float32, sep=',')
+    return parsed if parsed.size else None
+
+
+def typecast_vector(value: Optional[str], cursor) -> Optional[np.ndarray]:
+    """psycopg2 类型转换器: vector / halfvec 列直接返回 float32 ndarray"""
+    if value is None:
+        return None
+    return parse_vector_text(value)
+
+
+def _row_dtype(id_size: int, dim: int, element_size: int) -> np.dtype:
+    """COPY BINARY 中 (id, embedding) 两列一行的定长布局"""
+    return np.dtype([
+        ('fields', '>i2'),
+        ('id_length', '>i4'),
+        ('id', '>i8' if id_size == 8 else '>i4'),
+        ('vector_length', '>i4'),
+        ('dim', '>u2'),
+        ('unused', '>u2'),
+        ('values', '>f4' if element_size == 4 else '>f2', (dim,)),
+    ])
+
+
+def decode_copy_binary(data, out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    解码 COPY (SELECT id, embedding ...) TO STDOUT WITH (FORMAT binary) 的输出
+
+    Args:
+        data: COPY 输出的字节
+        out: 可选的预分配 float32 矩阵 (行数不小于结果行数, 列数等于维度)
+
+    Returns:
+        (块ID数组, float32 向量矩阵); embedding 为 NULL 的行跳过
+    """
+    view = memoryview(data)
+    if bytes(view[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+        raise ValueError("不是 COPY BINARY 格式的数据")
+    extension = struct.unpack_from('>i', view, len(COPY_SIGNATURE) + 4)[0]
+    body = view[len(COPY_SIGNATURE) + 8 + extension:len(view) - 2]  # 末尾为 int16 -1
+    if not len(body):
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+    # 按第一行确定布局; 所有行定长时整块解码
+    id_size = struct.unpack_from('>i', body, 2)[0]
+    vector_length = struct.unpack_from('>i', body, 6 + id_size)[0]
+    if vector_length > 0:
+        dim = struct.unpack_from('>H', body, 10 + id_size)[0]
+        element_size = (vector_length - 4) // max(dim, 1)
+        row_dtype = _row_dtype(id_size, dim, element_size)
+        if len(body) % row_dtype.itemsize == 0:
+            rows = np.frombuffer(body, dtype=row_dtype)
+            if (rows['vector_length'] == vector_length).all() and (rows['fields'] == 2).all():
+                vectors = out[:len(rows)] if out is not None else np.empty((len(rows), dim), dtype=np.float32)
+                vectors[:] = rows['values']
+                return rows['id'].astype(np.int64), vectors
+
+    return _decode_rows(body)
+
+
+def _decode_rows(body: memoryview) -> Tuple[np.ndarray, np.ndarray]:
+    """逐行解码 (含 NULL 或维度不一的行)"""
+    ids = []
+    vectors = []
+    offset = 0
+    while offset < len(body):
+        offset += 2
+        id_size = struct.unpack_from('>i', body, offset)[0]
+        chunk_id = struct.unpack_from('>q' if id_size == 8 else '>i', body, offset + 4)[0]
+        offset += 4 + id_size
+        vector_length = struct.unpack_from('>i', body, offset)[0]
+        offset += 4
+        if vector_length < 0:
+            continue
+        dim = struct.unpack_from('>H', body, offset)[0]
+        element = '>f4' if vector_length - 4 == dim * 4 else '>f2'
+        ids.append(chunk_id)
+        vectors.append(np.frombuffer(body, dtype=element, count=dim, offset=offset + 4).astype(np.float32))
+        offset += vector_length
+    if not vectors:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    return np.asarray(ids, dtype=np.int64), np.vstack(vectors)
+
+
+def encode_copy_binary(ids, vectors, half: bool = False) -> bytes:
+    """生成 (id bigint, embedding vector/halfvec) 两列的 COPY BINARY 数据 (测试与基准测试用)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    dim = vectors.shape[1] if vectors.ndim == 2 else 0
+    rows = np.empty(len(ids), dtype=_row_dtype(8, dim, 2 if half else 4))
+    rows['fields'] = 2
+    rows['id_length'] = 8
+    rows['id'] = ids
+    rows['vector_length'] = 4 + dim * (2 if half else 4)
+    rows['dim'] = dim
+    rows['unused'] = 0
+    rows['values'] = vectors
+    header = COPY_SIGNATURE + struct.pack('>ii', 0, 0)
+    return header + rows.tobytes() + struct.pack('>h', -1)
+
+
+def copy_vectors(db, query: str, params: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    用 COPY BINARY 执行 SELECT id, embedding ... 并解码 (仅 PostgreSQL + psycopg2)
+
+    Args:
+        db: SQLAlchemy Session (在其当前事务内执行)
+        query: psycopg2 参数风格的查询, 如 "... WHERE id > %(after_id)s"
+    """
+    cursor = db.connection().connection.cursor()
+    try:
+        statement = cursor.mogrify(query, params or {}).decode('utf-8')
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT binary)", buffer)
+    finally:
+        cursor.close()
+    return decode_copy_binary(buffer.getbuffer())
+
+
+def supports_copy_binary(db) -> bool:
+    """会话是否连接到 PostgreSQL (psycopg2)"""
+    try:
+        bind = db.get_bind()
+        return bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2'
+    except Exception:
+        return False
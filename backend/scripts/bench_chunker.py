@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+分块器吞吐基准测试
+
+对比多 MB 中英混合文本上的分块吞吐 (MB/s), 并检查随文本大小线性扩展:
+- legacy: 改造前路由中的定长窗口 + rfind 回退分块
+- split:  统一分块器整篇分块 (按字符)
+- stream: 统一分块器流式分块 (按字符, 64KB 片段输入)
+- token:  统一分块器按 token 计长 (--tokenizer 指定分词模型, 否则使用估算)
+
+用法:
+    python scripts/bench_chunker.py --sizes 1 4 16
+    python scripts/bench_chunker.py --sizes 1 4 --tokenizer sentence-transformers/all-MiniLM-L6-v2
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.text_chunker import ContentDefinedChunker, TokenCounter, estimate_tokens
+
+PIECE_CHARS = 64 * 1024
+
+_CJK_WORDS = ["机器学习", "深度", "神经网络", "数据", "模型", "训练", "推理", "检索", "向量", "文档"]
+_EN_WORDS = ["retrieval", "augmented", "generation", "vector", "index", "query", "embedding", "chunk"]
+_ENDS = ["。", "！", "？", ". ", "; ", "\n"]
+
+
+def make_text(size_mb: float, seed: int = 7) -> str:
+    """生成指定大小 (字符数按 MB 计) 的中英混合文本, 含长段落与超长句子"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    length = 0
+    while length < target:
+        sentences = []
+        for _ in range(rng.randint(1, 40)):
+            words = rng.choices(_CJK_WORDS if rng.random() < 0.6 else _EN_WORDS, k=rng.randint(3, 60))
+            sentences.append(" ".join(words) + rng.choice(_ENDS))
+        # 少量没有标点的超长段落, 触发硬切
+        if rng.random() < 0.02:
+            sentences.append("无标点长句" * rng.randint(500, 2000))
+        paragraph = "".join(sentences)
+        parts.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(parts)[:target]
+
+
+def legacy_split(text: str, chunk_size: int = 1500, overlap: int = 300):
+    """改造前的定长窗口分块 (documents.split_text_into_chunks)"""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            last_sentence_end = -1
+            for mark in ('。', '？', '！', '.', '?', '!'):
+                last_sentence_end = text.rfind(mark, start, end)
+                if last_sentence_end != -1:
+                    break
+            if last_sentence_end != -1 and last_sentence_end > start + chunk_size // 2:
+                end = last_sentence_end + 1
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        start = end - overlap
+        if start >= len(text):
+            break
+    return chunks
+
+
+def run(name: str, func, text: str):
+    start = time.perf_counter()
+    count = func(text)
+    elapsed = time.perf_counter() - start
+    mb = len(text) / (1024 * 1024)
+    print(f"   {name:<8} {count:>8} 块  {elapsed:>8.2f}s  {mb / elapsed:>8.2f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分块器吞吐基准测试")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="文本大小 (MB)")
+    parser.add_argument("--max-size", type=int, default=1500, help="按字符分块的最大块长")
+    parser.add_argument("--max-tokens", type=int, default=256, help="按 token 分块的最大块长")
+    parser.add_argument("--tokenizer", default=None, help="HuggingFace 分词模型 (默认使用估算 token 数)")
+    args = parser.parse_args()
+
+    char_chunker = ContentDefinedChunker(max_size=args.max_size, min_size=args.max_size // 3, overlap=args.max_size // 5)
+    length_fn = TokenCounter("huggingface", args.tokenizer) if args.tokenizer else estimate_tokens
+    token_chunker = ContentDefinedChunker(
+        max_size=args.max_tokens,
+        min_size=args.max_tokens * 3 // 8,
+        overlap=args.max_tokens // 5,
+        length_fn=length_fn
+    )
+
+    def stream(text):
+        pieces = (text[i:i + PIECE_CHARS] for i in range(0, len(text), PIECE_CHARS))
+        return sum(1 for _ in char_chunker.split_stream(pieces))
+
+    print("=" * 60)
+    print("📊 分块器吞吐基准测试")
+    print(f"   max_size: {args.max_size} 字符 / {args.max_tokens} tokens  分词器: {args.tokenizer or '估算'}")
+    print("=" * 60)
+
+    for size in args.sizes:
+        text = make_text(size)
+        print(f"\n📝 {size:g} MB")
+        run("legacy", lambda t: len(legacy_split(t, args.max_size, args.max_size // 5)), text)
+        run("split", lambda t: len(char_chunker.split(t)), text)
+        run("stream", stream, text)
+        run("token", lambda t: len(token_chunker.split(t)), text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+向量解码基准测试
+
+对比读取路径解码 N 个向量的吞吐 (行/秒), 数据按 pgvector 的输出格式在本地生成:
+- json.loads / eval: 原先逐行解析文本的方式 (eval 只测前 --eval-rows 行)
+- parse_vector_text: 全局类型转换器使用的 NumPy 文本解析
+- COPY BINARY: 整块缓冲区按结构化 dtype 解码到 float32 矩阵 (vector / halfvec)
+
+用法:
+    python scripts/bench_embedding_parse.py --rows 100000 --dim 384
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils.vector_codec import decode_copy_binary, encode_copy_binary, parse_vector_text
+
+
+def measure(label: str, rows: int, fn, repeat: int = 1):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"   {label:<28} {rows:>8,} 行  {best * 1000:>10.1f}ms  {rows / best:>12,.0f} 行/秒")
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量解码基准测试")
+    parser.add_argument("--rows", type=int, default=100_000, help="向量数")
+    parser.add_argument("--dim", type=int, default=384, help="向量维度")
+    parser.add_argument("--eval-rows", type=int, default=5_000, help="eval 只测前若干行 (太慢)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((args.rows, args.dim), dtype=np.float32)
+    ids = np.arange(1, args.rows + 1)
+    # pgvector 文本输出: float32 约 9 位有效数字, 逗号分隔无空格
+    texts = ['[' + ','.join('%.9g' % value for value in row) + ']' for row in vectors.tolist()]
+    copy_data = encode_copy_binary(ids, vectors)
+    half_data = encode_copy_binary(ids, vectors, half=True)
+
+    print("=" * 80)
+    print(f"📊 向量解码基准测试: {args.rows:,} x {args.dim}")
+    print(f"   文本 {sum(map(len, texts)) / 1024 / 1024:.1f}MB, COPY BINARY {len(copy_data) / 1024 / 1024:.1f}MB "
+          f"(halfvec {len(half_data) / 1024 / 1024:.1f}MB)")
+    print("=" * 80)
+
+    baseline = measure("json.loads", args.rows, lambda: [json.loads(t) for t in texts])
+    measure("eval", args.eval_rows, lambda: [eval(t) for t in texts[:args.eval_rows]])
+    measure("parse_vector_text", args.rows, lambda: [parse_vector_text(t) for t in texts])
+    out = np.empty((args.rows, args.dim), dtype=np.float32)
+    binary = measure("COPY BINARY vector", args.rows, lambda: decode_copy_binary(copy_data, out=out), repeat=3)
+    measure("COPY BINARY halfvec", args.rows, lambda: decode_copy_binary(half_data, out=out), repeat=3)
+    print(f"\n   COPY BINARY 相对 json.loads: {binary / baseline:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
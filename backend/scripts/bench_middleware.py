@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+中间件吞吐基准测试
+
+对比改造前后的请求处理吞吐 (requests/sec):
+- before: 三层 BaseHTTPMiddleware + 同步 RotatingFileHandler
+- after:  单个纯 ASGI RequestLoggingMiddleware + QueueHandler/QueueListener
+
+直接驱动 ASGI 应用 (不经过网络栈), 只衡量中间件与日志本身的开销。
+
+用法:
+    python scripts/bench_middleware.py --requests 20000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.config.logging_config import LoggingConfig, stop_logging
+
+
+async def json_endpoint(request):
+    return JSONResponse({"success": True, "data": {"status": "ok"}})
+
+
+async def sse_endpoint(request):
+    async def events():
+        for i in range(10):
+            yield f"data: {i}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+ROUTES = [
+    Route("/json", json_endpoint),
+    Route("/sse", sse_endpoint),
+]
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    """改造前的请求日志中间件 (请求开始/完成各一条日志)"""
+
+    def __init__(self, app, access_logger):
+        super().__init__(app)
+        self.access_logger = access_logger
+
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        request_id = str(uuid.uuid4())[:8]
+        self.access_logger.info(
+            f"[{request_id}] 请求开始 - {request.method} {request.url.path} "
+            f"来自 {request.client.host if request.client else 'unknown'} - "
+            f"User-Agent: {request.headers.get('user-agent', '')}"
+        )
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        self.access_logger.info(
+            f"[{request_id}] 请求完成 - {request.method} {request.url.path} "
+            f"状态码: {response.status_code} 处理时间: {process_time:.3f}s"
+        )
+        response.headers["X-Request-ID"] = request_id
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+
+class LegacyErrorMiddleware(BaseHTTPMiddleware):
+    """改造前的错误日志中间件"""
+
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+class LegacyPerformanceMiddleware(BaseHTTPMiddleware):
+    """改造前的慢请求中间件"""
+
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        if time.time() - start_time > 2.0:
+            pass
+        return response
+
+
+def build_before_app(log_dir: str):
+    config = LoggingConfig(log_dir=log_dir, enable_console=False, enable_async=False)
+    access_logger = config.setup_logger("bench.before.access", "access/before.log")
+
+    app = Starlette(routes=ROUTES)
+    app.add_middleware(LegacyLoggingMiddleware, access_logger=access_logger)
+    app.add_middleware(LegacyErrorMiddleware)
+    app.add_middleware(LegacyPerformanceMiddleware)
+    return app
+
+
+def build_after_app(log_dir: str):
+    config = LoggingConfig(log_dir=log_dir, enable_console=False, enable_async=True)
+    config.setup_logger("access", "access/after.log")
+    config.setup_logger("error", "error/after.log")
+
+    from app.middleware.logging_middleware import RequestLoggingMiddleware
+
+    app = Starlette(routes=ROUTES)
+    app.add_middleware(RequestLoggingMiddleware, slow_request_threshold=2.0)
+    return app
+
+
+async def call_asgi(app, path: str):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench/1.0")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("bench", 80),
+    }
+
+    # 请求体只交付一次; 之后的 receive() 与真实服务器一样阻塞到响应发送完毕再返回断开,
+    # 否则 BaseHTTPMiddleware 的断开监听会不停收到新请求体而空转
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_done.set()
+
+    await app(scope, receive, send)
+
+
+async def run_load(app, path: str, total: int, concurrency: int) -> float:
+    """以固定并发执行 total 个请求, 返回 requests/sec"""
+    counter = iter(range(total))
+
+    async def worker():
+        for _ in counter:
+            await call_asgi(app, path)
+
+    # 预热
+    for _ in range(100):
+        await call_asgi(app, path)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="中间件吞吐基准测试")
+    parser.add_argument("--requests", type=int, default=20000, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发协程数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        apps = {
+            "before": build_before_app(log_dir),
+            "after": build_after_app(log_dir),
+        }
+
+        print("=" * 60)
+        print("📊 中间件吞吐基准测试")
+        print(f"   请求数: {args.requests}  并发: {args.concurrency}")
+        print("=" * 60)
+
+        for path in ("/json", "/sse"):
+            results = {}
+            for name, app in apps.items():
+                results[name] = await run_load(app, path, args.requests, args.concurrency)
+
+            speedup = results["after"] / results["before"] if results["before"] else 0
+            print(f"\n📝 {path}")
+            print(f"   before: {results['before']:>10.0f} req/s")
+            print(f"   after:  {results['after']:>10.0f} req/s")
+            print(f"   提升:   {speedup:>10.2f}x")
+
+        stop_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
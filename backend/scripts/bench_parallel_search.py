@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+多线程分块精确检索基准测试
+
+在同一个 float32 向量矩阵上测量不同线程数、不同查询批大小的精确 top-k 检索:
+- 单查询延迟 p50 (ms) 与 QPS (批量查询按每个查询折算)
+- 相对 1 线程的加速比
+
+线程数超过机器核数时不会再有收益, 输出中会标注可用核数。
+
+用法:
+    python scripts/bench_parallel_search.py --sizes 1000000 --threads 1 2 4 8 16
+    python scripts/bench_parallel_search.py --sizes 200000 --batch 1 8 32 --block-rows 16384
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.vector_index import normalize, parallel_top_k
+
+
+def measure(vectors: np.ndarray, queries: np.ndarray, k: int, batch: int, threads: int, block_rows: int, repeat: int):
+    """返回 (每批耗时 p50 ms, 每秒查询数)"""
+    latencies = []
+    for _ in range(repeat):
+        for start in range(0, len(queries), batch):
+            chunk = queries[start:start + batch]
+            begin = time.perf_counter()
+            parallel_top_k(vectors, chunk if batch > 1 else chunk[0], k, block_rows=block_rows, threads=threads)
+            latencies.append(time.perf_counter() - begin)
+    latencies = np.asarray(latencies) * 1000
+    return np.percentile(latencies, 50), batch * 1000 / latencies.mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多线程分块精确检索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000], help="向量数")
+    parser.add_argument("--dim", type=int, default=384, help="向量维度")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="线程数")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 16], help="每次检索的查询数")
+    parser.add_argument("--block-rows", type=int, default=32768, help="每个并行块的行数")
+    parser.add_argument("--queries", type=int, default=64, help="查询数")
+    parser.add_argument("--repeat", type=int, default=2, help="重复轮数")
+    parser.add_argument("--k", type=int, default=10, help="top-k")
+    args = parser.parse_args()
+
+    print("=" * 100)
+    print("📊 多线程分块精确检索基准测试")
+    print(f"   维度: {args.dim}  块行数: {args.block_rows}  查询数: {args.queries}  可用核数: {os.cpu_count()}")
+    print("=" * 100)
+
+    rng = np.random.default_rng(7)
+    for size in args.sizes:
+        vectors = normalize(rng.standard_normal((size, args.dim), dtype=np.float32))
+        queries = normalize(rng.standard_normal((args.queries, args.dim), dtype=np.float32))
+        print(f"\n📝 {size:,} 个向量 ({vectors.nbytes / 1024 / 1024:.1f}MB)")
+
+        for batch in args.batch:
+            baseline = None
+            for threads in args.threads:
+                p50, qps = measure(vectors, queries, args.k, batch, threads, args.block_rows, args.repeat)
+                baseline = baseline or qps
+                print(
+                    f"   batch={batch:<4} threads={threads:<3} p50={p50:>9.2f}ms  "
+                    f"QPS={qps:>9.1f}  加速比={qps / baseline:>5.2f}x"
+                )
+        del vectors
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+嵌入模型在线迁移 (影子向量列)
+
+服务保持运行, 按以下步骤切换嵌入模型:
+
+    # 1. 新增影子列, 之后新入库的分块自动双写新模型向量
+    python scripts/reembed_chunks.py start --backend huggingface --model BAAI/bge-small-zh-v1.5 --dim 512
+    # 2. 限速回填已有分块 (可随时 Ctrl+C, 再次运行从断点继续), 完成后自动构建影子列索引
+    python scripts/reembed_chunks.py backfill --rate 200 --metrics-port 9109
+    # 3. (可选) 设置 EMBEDDING_MIGRATION_SHADOW_COMPARE_RATE=0.05 观察
+    #    embedding_migration_shadow_overlap 指标, 然后逐个命名空间切换读取
+    python scripts/reembed_chunks.py flip legal
+    python scripts/reembed_chunks.py unflip legal      # 回退
+    # 4. 全部切换后交换列名, 再把服务配置为新模型 (EMBEDDING_DIM=512 等) 并重启
+    python scripts/reembed_chunks.py finalize
+
+    python scripts/reembed_chunks.py status
+"""
+
+import argparse
+import json
+import signal
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config.settings import (
+    EMBEDDING_MIGRATION_BATCH_SIZE,
+    EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND,
+    EMBEDDING_STORAGE,
+)
+from app.database import get_session_local
+from app.services.embedding_migration import EmbeddingMigrationError, get_embedding_migration_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入模型在线迁移")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    start = commands.add_parser("start", help="新增影子向量列, 开始双写")
+    start.add_argument("--backend", required=True, choices=["openai", "huggingface"], help="新模型的嵌入后端")
+    start.add_argument("--model", required=True, help="新模型名")
+    start.add_argument("--dim", type=int, required=True, help="新模型向量维度")
+    start.add_argument("--storage", choices=["vector", "halfvec"], default=EMBEDDING_STORAGE, help="影子列存储类型")
+
+    backfill = commands.add_parser("backfill", help="分批限速回填影子列 (可中断续跑)")
+    backfill.add_argument("--batch-size", type=int, default=EMBEDDING_MIGRATION_BATCH_SIZE, help="每批分块数")
+    backfill.add_argument("--rate", type=float, default=EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND, help="每秒最多回填的分块数, 0 表示不限")
+    backfill.add_argument("--max-batches", type=int, default=None, help="本次最多处理的批数")
+    backfill.add_argument("--metrics-port", type=int, default=0, help="在该端口暴露 Prometheus 指标 (吞吐/进度/ETA)")
+
+    flip = commands.add_parser("flip", help="命名空间切换到新模型读取")
+    flip.add_argument("namespace")
+    unflip = commands.add_parser("unflip", help="命名空间切回当前模型读取")
+    unflip.add_argument("namespace")
+
+    commands.add_parser("finalize", help="全部切换后交换列名, 完成迁移")
+    commands.add_parser("abort", help="中止迁移并删除影子列")
+    commands.add_parser("status", help="查看迁移状态与各命名空间缺失的新向量数")
+    args = parser.parse_args()
+
+    service = get_embedding_migration_service()
+    db = get_session_local()()
+    try:
+        if args.command == "start":
+            service.start(db, args.backend, args.model, args.dim, args.storage)
+        elif args.command == "backfill":
+            if args.metrics_port:
+                from prometheus_client import start_http_server
+                start_http_server(args.metrics_port)
+
+            stopping = {"flag": False}
+
+            def stop(signum, frame):
+                print("⏸  收到停止信号, 当前批次提交后退出 (断点已保存)")
+                stopping["flag"] = True
+
+            signal.signal(signal.SIGINT, stop)
+            signal.signal(signal.SIGTERM, stop)
+            service.backfill(
+                db, batch_size=args.batch_size, max_rows_per_second=args.rate,
+                max_batches=args.max_batches, should_stop=lambda: stopping["flag"]
+            )
+        elif args.command == "flip":
+            print(f"已切换读取的命名空间: {service.flip(db, args.namespace)}")
+        elif args.command == "unflip":
+            print(f"已切换读取的命名空间: {service.unflip(db, args.namespace)}")
+        elif args.command == "finalize":
+            service.finalize(db)
+            # 按命名空间的部分向量索引随旧列删除, 在新列上重建
+            from app.services.namespace_vector_index import get_namespace_index_manager
+            rebuilt = get_namespace_index_manager().sync_all(db, wait=True)
+            print(f"已在新向量列上重建 {len(rebuilt)} 个命名空间部分索引")
+            print("✅ 迁移完成, 请把嵌入模型配置 (EMBEDDING_BACKEND / 模型名 / EMBEDDING_DIM) 改为新模型并重启服务")
+        elif args.command == "abort":
+            service.abort(db)
+
+        status = service.status(db)
+        if args.command == "status" and status.get("state") not in (None, "completed", "aborted"):
+            status["missing_by_namespace"] = service.missing_by_namespace(db)
+        print(json.dumps(status, ensure_ascii=False, indent=2, default=str))
+    except EmbeddingMigrationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
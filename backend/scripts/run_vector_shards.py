@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+启动本机向量分片进程
+
+与 uvicorn 部署在同一台机器上, 各 worker 通过 Unix socket 共用这组分片。
+需要分片的命名空间在 VECTOR_INDEX_NAMESPACE_BACKENDS 中配置为 shard 后端, 例如:
+
+    VECTOR_INDEX_NAMESPACE_BACKENDS="legal:shard" python scripts/run_vector_shards.py --shards 4
+
+分片进程与 uvicorn 须以同一用户运行, 并配置相同的 VECTOR_SHARD_AUTHKEY (无默认值, 部署时生成):
+
+    python -c 'import secrets; print(secrets.token_hex(32))'
+
+socket 目录 (VECTOR_SHARD_SOCKET_DIR) 不存在时以 0700 创建; 已存在但不归当前用户所有、
+或其他用户可访问时拒绝启动。
+
+分片内容只在内存中, 进程重启后由各 worker 的索引管理器从数据库重新同步。
+"""
+
+import argparse
+import signal
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config.settings import VECTOR_SHARD_BACKEND, VECTOR_SHARD_COUNT, VECTOR_SHARD_SOCKET_DIR
+from app.services.vector_index import start_shard_workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动本机向量分片进程")
+    parser.add_argument("--shards", type=int, default=VECTOR_SHARD_COUNT, help="分片进程数 (需与 VECTOR_SHARD_COUNT 一致)")
+    parser.add_argument("--socket-dir", default=VECTOR_SHARD_SOCKET_DIR, help="Unix socket 目录")
+    parser.add_argument("--backend", default=VECTOR_SHARD_BACKEND, help="分片内的索引后端")
+    args = parser.parse_args()
+
+    try:
+        workers = start_shard_workers(args.shards, args.socket_dir, args.backend)
+    except (ValueError, PermissionError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ 已启动 {len(workers)} 个向量分片进程: {args.socket_dir} (后端={args.backend})")
+
+    def stop(signum=None, frame=None, code=0):
+        for worker in workers:
+            worker.terminate()
+        sys.exit(code)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # 任一分片退出时整组退出, 由进程管理器 (systemd / supervisor) 重启
+    while all(worker.is_alive() for worker in workers):
+        time.sleep(1)
+    print("❌ 有向量分片进程退出, 停止全部分片")
+    stop(code=1)
+
+
+if __name__ == "__main__":
+    main()
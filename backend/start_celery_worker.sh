@@ -15,13 +15,15 @@ source ../venv/bin/activate
 export PYTHONPATH="${PYTHONPATH}:$(pwd)"
 
 # 启动Celery Worker
+# 交互式队列排在前面, 有交互式任务时优先消费 (queue_order_strategy=priority);
+# 需要完全隔离时可另起一个只消费交互式队列的 worker: -Q indexing_interactive
 celery -A app.celery_app worker \
   --loglevel=info \
   --concurrency=4 \
   --max-tasks-per-child=1000 \
   --time-limit=1800 \
   --soft-time-limit=1500 \
-  -Q indexing \
+  -Q "${INDEX_QUEUE_INTERACTIVE:-indexing_interactive},${INDEX_QUEUE_BULK:-indexing}" \
   -n worker@%h
 
 echo "Celery Worker 已停止"
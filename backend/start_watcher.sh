@@ -0,0 +1,25 @@
+#!/bin/bash
+# 目录监听服务启动脚本
+
+echo "==============================================="
+echo "启动目录监听服务"
+echo "==============================================="
+
+# 进入项目目录
+cd "$(dirname "$0")"
+
+# 激活虚拟环境
+source ../venv/bin/activate
+
+# 设置环境变量
+export PYTHONPATH="${PYTHONPATH}:$(pwd)"
+
+if [ -z "${WATCH_DIRECTORIES}" ]; then
+  echo "未设置 WATCH_DIRECTORIES, 格式: 命名空间:目录,命名空间:目录"
+  exit 1
+fi
+
+# 启动目录监听 (单实例运行; 索引任务由 Celery Worker 执行)
+python -m app.services.directory_watcher
+
+echo "目录监听服务已停止"
@@ -0,0 +1,76 @@
+"""
+内存统计单元测试
+"""
+
+import gc
+import sys
+
+from app.monitoring.memory import MemoryRegistry, deep_sizeof, register_sizeof
+
+
+class _Holder:
+    """测试用的缓存持有者"""
+
+    def __init__(self, n: int):
+        self.cache = {str(i): [float(i)] * 8 for i in range(n)}
+
+
+class TestDeepSizeof:
+    """通用估算器测试"""
+
+    def test_grows_with_content(self):
+        """测试估算值随内容增长"""
+        small = deep_sizeof({str(i): [0.0] * 8 for i in range(10)})
+        large = deep_sizeof({str(i): [0.0] * 8 for i in range(1000)})
+
+        assert large > small * 50
+
+    def test_custom_provider(self):
+        """测试按类型注册的 sizeof 提供者优先生效"""
+        class Blob:
+            pass
+
+        register_sizeof(Blob, lambda obj: 12345)
+        assert deep_sizeof([Blob()]) == sys.getsizeof([None], 0) + 12345
+
+
+class TestMemoryRegistry:
+    """注册表测试"""
+
+    def test_provider_and_transient(self):
+        """测试提供者和临时结构统计"""
+        registry = MemoryRegistry()
+        registry.register("static.index", lambda: 1024, category="index")
+        registry.record_transient("request.parsed", 500)
+        registry.record_transient("request.parsed", 200)
+
+        components = {c["name"]: c for c in registry.collect()}
+        assert components["static.index"]["bytes"] == 1024
+        assert components["request.parsed"]["bytes"] == 200
+        assert components["request.parsed"]["peak_bytes"] == 500
+
+    def test_weak_objects_are_merged_and_released(self):
+        """测试同名对象合并统计, 回收后自动移除"""
+        registry = MemoryRegistry()
+        a, b = _Holder(10), _Holder(10)
+        registry.register_object("bm25.corpus", a, sizeof=lambda h: len(h.cache))
+        registry.register_object("bm25.corpus", b, sizeof=lambda h: len(h.cache))
+
+        component = registry.collect()[0]
+        assert component["instances"] == 2
+        assert component["bytes"] == 20
+
+        del a
+        gc.collect()
+        component = registry.collect()[0]
+        assert component["instances"] == 1
+        assert component["bytes"] == 10
+
+    def test_provider_error_is_reported(self):
+        """测试提供者异常不影响其他组件"""
+        registry = MemoryRegistry()
+        registry.register("broken", lambda: 1 / 0)
+
+        component = registry.collect()[0]
+        assert component["bytes"] == 0
+        assert "division" in component["error"]
@@ -0,0 +1,38 @@
+"""
+慢请求采样分析器单元测试
+"""
+
+import threading
+import time
+
+from app.monitoring.profiler import StackSampler
+
+
+def _busy_wait(seconds: float):
+    """占用当前线程一段时间, 便于采样"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestStackSampler:
+    """栈采样测试"""
+
+    def test_collects_collapsed_stacks(self):
+        """测试采样结果包含正在执行的函数"""
+        sampler = StackSampler(threading.get_ident(), interval=0.001, all_threads=False)
+        sampler.start()
+        _busy_wait(0.1)
+        sampler.stop()
+
+        assert sampler.sample_count > 0
+        assert any("_busy_wait" in stack for stack in sampler.stacks)
+
+    def test_collapsed_output_format(self):
+        """测试输出为 'frame;frame count' 格式, 按样本数降序"""
+        sampler = StackSampler(threading.get_ident())
+        sampler.stacks["a:main:1;a:work:2"] = 5
+        sampler.stacks["a:main:1;a:idle:3"] = 2
+
+        lines = sampler.to_collapsed().splitlines()
+        assert lines == ["a:main:1;a:work:2 5", "a:main:1;a:idle:3 2"]
@@ -0,0 +1,70 @@
+"""
+请求链路追踪单元测试
+"""
+
+import asyncio
+
+from app.monitoring.tracing import (
+    start_trace,
+    end_trace,
+    trace_span,
+    record_span,
+    get_current_trace,
+    trace_store,
+)
+
+
+class TestTracing:
+    """span 追踪测试"""
+
+    def test_span_without_trace(self):
+        """测试未开启追踪时 span 不挂树, 也不报错"""
+        assert get_current_trace() is None
+
+        with trace_span("embed") as span:
+            assert span is None
+
+    def test_nested_spans(self):
+        """测试嵌套 span 构成树"""
+        trace, tokens = start_trace("req-nested", "POST", "/api/chat/send")
+        try:
+            with trace_span("retrieval"):
+                with trace_span("vector_sql"):
+                    pass
+                with trace_span("row_parse", rows=10):
+                    pass
+            record_span("llm_ttft", 0.05)
+        finally:
+            end_trace(trace, tokens, 200)
+
+        assert get_current_trace() is None
+
+        data = trace.to_dict()
+        children = data["spans"]["children"]
+        assert [c["name"] for c in children] == ["retrieval", "llm_ttft"]
+        assert [c["name"] for c in children[0]["children"]] == ["vector_sql", "row_parse"]
+        assert children[0]["children"][1]["attributes"] == {"rows": 10}
+        assert data["spans"]["attributes"]["status_code"] == 200
+
+        assert set(trace.stage_totals()) == {"retrieval", "vector_sql", "row_parse", "llm_ttft"}
+        assert "llm_ttft;dur=" in trace.server_timing()
+        assert trace_store.get("req-nested") is trace
+
+    def test_spans_from_gathered_tasks(self):
+        """测试 asyncio.gather 并行分支挂到同一父 span 下"""
+        async def branch(name):
+            with trace_span(name):
+                await asyncio.sleep(0)
+
+        async def run():
+            trace, tokens = start_trace("req-gather")
+            try:
+                with trace_span("hybrid"):
+                    await asyncio.gather(branch("vector"), branch("bm25_score"))
+            finally:
+                end_trace(trace, tokens)
+            return trace
+
+        trace = asyncio.run(run())
+        hybrid = trace.root.children[0]
+        assert sorted(c.name for c in hybrid.children) == ["bm25_score", "vector"]
@@ -0,0 +1,148 @@
+"""
+变更检测单元测试
+"""
+
+import hashlib
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from app.services.change_detector import ChangeDetector, ChangeScan, _REHASH_SQL, _TIER_SQL
+
+MTIME = datetime(2024, 1, 1)
+
+
+def _md5(content: str) -> str:
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+def _fake_db(documents: dict, records: dict) -> Mock:
+    """按 _TIER_SQL / _REHASH_SQL 的判定规则在内存中执行的会话
+
+    documents: 文档ID -> {file_size, file_modified_at, content_hash, content}
+    records: 文档ID -> 索引记录 {file_size, file_modified_at, content_hash}
+    """
+    def tier_of(doc_id):
+        doc, record = documents[doc_id], records.get(doc_id)
+        if record is None:
+            return 'new'
+        if (doc['file_modified_at'] is not None and doc['file_size'] == record['file_size']
+                and doc['file_modified_at'] == record['file_modified_at']):
+            return 'stat'
+        if doc['content_hash'] is None:
+            return 'unhashed'
+        return 'hash' if doc['content_hash'] == record['content_hash'] else 'modified'
+
+    def execute(statement, params):
+        if statement is _TIER_SQL:
+            tiers = {}
+            for doc_id in sorted(documents):
+                tiers.setdefault(tier_of(doc_id), []).append(doc_id)
+            return [
+                SimpleNamespace(tier=tier, count=len(ids),
+                                ids=ids if tier in ('new', 'modified', 'unhashed') else None)
+                for tier, ids in tiers.items()
+            ]
+        if statement is _REHASH_SQL:
+            rows = []
+            for doc_id in params['ids']:
+                doc = documents[doc_id]
+                doc['content_hash'] = _md5(doc['content']) if doc['content'] else ''
+                rows.append(SimpleNamespace(id=doc_id, unchanged=doc['content_hash'] == records[doc_id]['content_hash']))
+            return Mock(all=Mock(return_value=rows))
+        raise AssertionError(statement)
+
+    db = Mock()
+    db.execute.side_effect = execute
+    return db
+
+
+class TestFileHash:
+    """文件哈希测试"""
+
+    def test_large_reads_match_md5(self, tmp_path):
+        """测试大块读取结果与一次性 MD5 一致 (跨多个读取块)"""
+        data = bytes(range(256)) * 5000
+        path = tmp_path / "doc.bin"
+        path.write_bytes(data)
+
+        assert ChangeDetector.compute_file_hash(str(path), read_size=4096) == hashlib.md5(data).hexdigest()
+        assert ChangeDetector.compute_file_hash(str(tmp_path / "missing.txt")) == ""
+
+
+class TestChangeScan:
+    """扫描结果统计测试"""
+
+    def test_counts_and_rate(self):
+        """测试未变更数与扫描速率"""
+        scan = ChangeScan(
+            new_doc_ids=[1, 2],
+            modified_doc_ids=[3],
+            tiers={'new': 2, 'modified': 1, 'stat': 90, 'hash': 7},
+            duration_seconds=0.5
+        )
+
+        assert scan.total == 100
+        assert scan.unchanged == 97
+        assert scan.to_dict()['docs_per_second'] == 200.0
+        assert ChangeScan().docs_per_second == 0.0
+
+
+@patch('app.services.change_detector.record_change_scan')
+class TestTieredDetection:
+    """分层变更判定测试"""
+
+    def test_classification(self, record_scan):
+        """测试新增、stat 未变、哈希未变、哈希变化与补算哈希后的判定"""
+        indexed = {'file_size': 100, 'file_modified_at': MTIME, 'content_hash': _md5('旧内容')}
+        touched = {'file_size': 100, 'file_modified_at': datetime(2024, 2, 1)}
+        documents = {
+            1: {**indexed, 'content': '旧内容'},                                  # stat 未变
+            2: {**touched, 'content_hash': _md5('旧内容'), 'content': '旧内容'},  # 仅修改时间变化, 哈希未变
+            3: {**touched, 'content_hash': _md5('新内容'), 'content': '新内容'},  # 哈希变化
+            4: {**touched, 'content_hash': None, 'content': '旧内容'},            # 补算后未变
+            5: {**touched, 'content_hash': None, 'content': '新内容'},            # 补算后变化
+            6: {**indexed, 'file_modified_at': None, 'content': '旧内容'},        # 无修改时间, 落到哈希比较
+            7: {**touched, 'content_hash': None, 'content': '新内容'},            # 未索引
+        }
+        records = {doc_id: dict(indexed) for doc_id in range(1, 7)}
+        db = _fake_db(documents, records)
+
+        scan = ChangeDetector(db).scan_changes()
+
+        assert scan.new_doc_ids == [7]
+        assert scan.modified_doc_ids == [3, 5]
+        assert scan.tiers == {'stat': 1, 'hash': 2, 'modified': 1, 'new': 1, 'rehashed': 2}
+        assert scan.unchanged == 4
+        assert documents[4]['content_hash'] == _md5('旧内容')
+        db.commit.assert_called_once()
+        record_scan.assert_called_once_with(scan.tiers, scan.duration_seconds)
+
+    def test_unhashed_rehashed_in_batches(self, record_scan):
+        """测试无哈希文档按批补算, 无需补算时不提交"""
+        indexed = {'file_size': 1, 'file_modified_at': MTIME, 'content_hash': ''}
+        documents = {doc_id: {**indexed, 'file_size': 2, 'content_hash': None, 'content': ''} for doc_id in range(5)}
+        db = _fake_db(documents, {doc_id: dict(indexed) for doc_id in documents})
+
+        with patch('app.services.change_detector.CHANGE_HASH_BATCH', 2):
+            scan = ChangeDetector(db).scan_changes()
+        assert scan.modified_doc_ids == [] and scan.tiers == {'rehashed': 5}
+        assert [call.args[1]['ids'] for call in db.execute.call_args_list[1:]] == [[0, 1], [2, 3], [4]]
+
+        # 第二次扫描: 哈希已写回, 只走第 2 层
+        db.reset_mock()
+        scan = ChangeDetector(db).scan_changes()
+        assert scan.tiers == {'hash': 5}
+        assert db.execute.call_count == 1
+        db.commit.assert_not_called()
+
+    def test_deleted_documents(self, record_scan):
+        """测试有索引记录但文档已删除的判定 (反连接) 与命名空间筛选"""
+        db = Mock()
+        query = db.query.return_value.outerjoin.return_value.filter.return_value
+        query.all.return_value = [SimpleNamespace(doc_id=8), SimpleNamespace(doc_id=9)]
+        query.filter.return_value.all.return_value = [SimpleNamespace(doc_id=9)]
+
+        detector = ChangeDetector(db)
+        assert detector.detect_deleted_documents() == [8, 9]
+        assert detector.detect_deleted_documents(namespace='legal') == [9]
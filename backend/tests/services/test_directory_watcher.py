@@ -0,0 +1,120 @@
+"""
+目录监听单元测试
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+from app.services.directory_watcher import (
+    CHANGED,
+    DELETED,
+    RESCAN,
+    DirectoryWatcher,
+    EventDebouncer,
+    InotifySource,
+    PollingSource,
+    is_watched_file,
+    parse_watch_directories,
+)
+
+
+class TestConfig:
+    """配置解析与文件过滤测试"""
+
+    def test_parse_and_namespace(self, tmp_path):
+        """测试按最长目录前缀解析命名空间"""
+        roots = parse_watch_directories(f"docs:{tmp_path}, tech:{tmp_path / 'tech'}")
+        watcher = DirectoryWatcher(roots, session_factory=None, source=object())
+
+        assert watcher.namespace_for(str(tmp_path / "a.txt")) == "docs"
+        assert watcher.namespace_for(str(tmp_path / "tech" / "b.pdf")) == "tech"
+        assert watcher.namespace_for(str(tmp_path) + "2/c.txt") is None
+
+    def test_watched_file(self):
+        """测试忽略隐藏文件、临时文件与不支持的扩展名"""
+        assert is_watched_file("/data/报告.PDF")
+        assert not is_watched_file("/data/.报告.txt")
+        assert not is_watched_file("/data/~$报告.docx")
+        assert not is_watched_file("/data/报告.txt.swp")
+        assert not is_watched_file("/data/image.png")
+
+
+class TestDebouncer:
+    """防抖合并测试"""
+
+    def test_quiet_window_and_max_delay(self):
+        """测试静默窗口、最长等待与同一路径合并"""
+        debouncer = EventDebouncer(debounce=2, max_delay=10, max_batch=100)
+        debouncer.add([(CHANGED, "/a.txt")], now=0)
+        assert not debouncer.ready(now=1)
+        assert debouncer.ready(now=2)
+
+        # 持续有事件时不超过最长等待
+        for t in range(1, 10):
+            debouncer.add([(CHANGED, "/a.txt")], now=t)
+        debouncer.add([(DELETED, "/a.txt"), (RESCAN, "")], now=9.5)
+        assert not debouncer.ready(now=9.9)
+        assert debouncer.ready(now=10)
+
+        batch, rescan, first = debouncer.drain()
+        assert batch == {"/a.txt": DELETED}
+        assert rescan and first == 0
+        assert not debouncer.ready(now=100)
+
+    def test_max_batch(self):
+        """测试累计文件数达到上限时立即就绪"""
+        debouncer = EventDebouncer(debounce=2, max_delay=10, max_batch=3)
+        debouncer.add([(CHANGED, f"/{i}.txt") for i in range(3)], now=0)
+        assert debouncer.ready(now=0)
+
+
+class TestSources:
+    """事件源测试"""
+
+    def test_polling_diff(self, tmp_path):
+        """测试轮询快照比对出新增、修改与删除"""
+        keep = tmp_path / "keep.txt"
+        gone = tmp_path / "gone.txt"
+        keep.write_text("旧内容", encoding="utf-8")
+        gone.write_text("删除", encoding="utf-8")
+        source = PollingSource([str(tmp_path)], interval=0)
+
+        keep.write_text("新内容, 长度变化", encoding="utf-8")
+        gone.unlink()
+        (tmp_path / "new.txt").write_text("新增", encoding="utf-8")
+        (tmp_path / "ignored.png").write_bytes(b"png")
+
+        events = sorted(source.poll(timeout=0))
+        assert events == sorted([
+            (CHANGED, str(keep)),
+            (CHANGED, str(tmp_path / "new.txt")),
+            (DELETED, str(gone)),
+        ])
+        assert source.poll(timeout=0) == []
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify 仅支持 Linux")
+    def test_inotify_events(self, tmp_path):
+        """测试 inotify 报告写完成、新目录中的文件与删除"""
+        source = InotifySource([str(tmp_path)])
+        try:
+            (tmp_path / "a.txt").write_text("内容", encoding="utf-8")
+            sub = tmp_path / "sub"
+            sub.mkdir()
+            (sub / "b.txt").write_text("内容", encoding="utf-8")
+            os.remove(tmp_path / "a.txt")
+
+            events = set()
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline:
+                events.update(source.poll(timeout=0.1))
+                if (DELETED, str(tmp_path / "a.txt")) in events and (CHANGED, str(sub / "b.txt")) in events:
+                    break
+
+            assert (CHANGED, str(tmp_path / "a.txt")) in events
+            assert (CHANGED, str(sub / "b.txt")) in events
+            assert (DELETED, str(tmp_path / "a.txt")) in events
+        finally:
+            source.close()
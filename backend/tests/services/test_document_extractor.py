@@ -0,0 +1,39 @@
+"""
+文档文本提取单元测试
+"""
+
+from app.services.document_extractor import (
+    clean_text_content,
+    extract_file_text,
+    iter_txt_text,
+)
+
+
+class TestDocumentExtractor:
+    """文本提取测试"""
+
+    def test_clean_text_content(self):
+        """测试移除 NUL、替换字符和控制字符, 保留换行与制表符"""
+        assert clean_text_content("a\x00b\ufffdc\x07d\n\te") == "abcd\n\te"
+
+    def test_txt_stream_matches_full_text(self, tmp_path):
+        """测试分块读取的 TXT 文本与原文一致, 进度单调递增"""
+        content = "".join(f"第{i}行: 文本提取测试。\n" for i in range(20000))
+        file_path = tmp_path / "sample.txt"
+        file_path.write_text(content, encoding="utf-8")
+
+        pieces = list(iter_txt_text(str(file_path)))
+
+        assert len(pieces) > 1
+        assert "".join(text for text, _, _ in pieces) == content
+        progress = [done for _, done, _ in pieces]
+        assert progress == sorted(progress)
+        assert pieces[-1][1] == pieces[-1][2]
+
+    def test_extract_file_text(self, tmp_path):
+        """测试进程池 worker 入口返回完整文本"""
+        file_path = tmp_path / "small.txt"
+        file_path.write_text("hello\n\nworld", encoding="utf-8")
+
+        text, _ = extract_file_text(str(file_path), "small.txt")
+        assert text == "hello\n\nworld"
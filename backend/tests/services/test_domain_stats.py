@@ -0,0 +1,71 @@
+"""
+领域统计提供者单元测试
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+
+from app.services.domain_stats import (
+    DomainStatsProvider,
+    NamespaceStats,
+    scale_sampled_counts,
+)
+
+
+@pytest.fixture
+def provider():
+    """创建精确计数模式的统计提供者"""
+    return DomainStatsProvider(ttl=60, count_mode="exact")
+
+
+class TestDomainStatsProvider:
+    """领域统计提供者测试"""
+
+    def test_snapshot_cached_within_ttl(self, provider):
+        """测试 TTL 内复用快照, 只执行一次分组查询"""
+        stats = {"tech": NamespaceStats(namespace="tech", document_count=3, chunk_count=12)}
+
+        with patch.object(provider, "_query_exact", return_value=stats) as query:
+            first = provider.get_snapshot(Mock())
+            second = provider.get_snapshot(Mock())
+
+        assert first is second
+        assert query.call_count == 1
+        assert second.get("tech").chunk_count == 12
+
+    def test_force_refresh_and_invalidate(self, provider):
+        """测试强制刷新和失效都会重新查询"""
+        with patch.object(provider, "_query_exact", return_value={}) as query:
+            provider.get_snapshot(Mock())
+            provider.get_snapshot(Mock(), force_refresh=True)
+            provider.invalidate()
+            provider.get_snapshot(Mock())
+
+        assert query.call_count == 3
+
+    def test_missing_namespace_returns_zero_stats(self, provider):
+        """测试不存在的命名空间返回全零统计"""
+        with patch.object(provider, "_query_exact", return_value={}):
+            stats = provider.get_namespace_stats(Mock(), "unknown")
+
+        assert stats.namespace == "unknown"
+        assert stats.document_count == 0
+        assert stats.chunk_count == 0
+
+    def test_auto_mode_switches_to_estimate(self):
+        """测试 auto 模式在 reltuples 超过阈值时切换到估算"""
+        provider = DomainStatsProvider(count_mode="auto", estimate_threshold=1000)
+
+        with patch.object(provider, "_reltuples", return_value=5000):
+            assert provider._should_estimate(Mock()) is True
+
+        with patch.object(provider, "_reltuples", return_value=10):
+            assert provider._should_estimate(Mock()) is False
+
+
+def test_scale_sampled_counts():
+    """测试抽样计数按比例放大"""
+    estimated = scale_sampled_counts({"a": 30, "b": 10}, 4000)
+
+    assert estimated == {"a": 3000, "b": 1000}
+    assert scale_sampled_counts({"a": 0}, 4000) == {"a": 0}
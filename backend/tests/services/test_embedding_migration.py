@@ -0,0 +1,206 @@
+"""
+嵌入模型在线迁移单元测试
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from app.services.embedding_migration import (
+    SHADOW_COLUMN,
+    STATE_BACKFILLING,
+    STATE_COMPLETED,
+    STATE_READY,
+    EmbeddingMigrationError,
+    EmbeddingMigrationService,
+    MigrationState,
+    backfill_eta,
+    result_overlap,
+    throttle_delay,
+)
+
+
+def _fake_db(migration: Mock, execute=None) -> Mock:
+    """_active 查询返回给定迁移记录的会话"""
+    db = Mock()
+    query = db.query.return_value.filter.return_value
+    query.order_by.return_value.first.return_value = migration
+    query.with_for_update.return_value.order_by.return_value.first.return_value = migration
+    if execute is not None:
+        db.execute.side_effect = execute
+    return db
+
+
+def _session() -> MagicMock:
+    """savepoint 内的异常照常抛出的会话"""
+    db = MagicMock()
+    db.begin_nested.return_value.__exit__.return_value = False
+    return db
+
+
+def _service_with_state(state: str, read_namespaces=()) -> EmbeddingMigrationService:
+    """创建已缓存迁移状态的服务, 不访问数据库"""
+    service = EmbeddingMigrationService(state_ttl=60, shadow_compare_rate=1.0)
+    service._state = MigrationState(
+        id=1, backend='huggingface', model_name='new-model', dimension=512, storage='vector',
+        column_name=SHADOW_COLUMN, state=state, read_namespaces=frozenset(read_namespaces)
+    )
+    service._state_at = time.monotonic()
+    service.target_service = Mock(return_value='new-service')
+    return service
+
+
+class TestEmbeddingMigration:
+    """嵌入模型迁移测试"""
+
+    def test_backfill_throttle_and_eta(self):
+        """测试回填限速等待时间与剩余时间估算"""
+        assert throttle_delay(200, 0.5, 200) == 0.5
+        assert throttle_delay(200, 2.0, 200) == 0.0
+        assert throttle_delay(200, 0.1, 0) == 0.0
+        assert backfill_eta(1000, 50.0) == 20.0
+        assert backfill_eta(0, 0.0) == 0.0
+        assert backfill_eta(1000, 0.0) == -1.0
+
+    def test_result_overlap(self):
+        """测试 top-k 重合率"""
+        assert result_overlap([1, 2, 3, 4], [2, 4, 5, 6]) == 0.5
+        assert result_overlap([1, 2], [1, 2, 3, 4]) == 0.5
+        assert result_overlap([], []) == 1.0
+
+    @patch('app.services.embedding_migration.embedding_service', Mock(model_key='huggingface:old-model'))
+    def test_read_plan_and_write_column(self):
+        """测试按命名空间切换读取, 以及各状态下双写的目标列"""
+        backfilling = _service_with_state(STATE_BACKFILLING)
+        assert backfilling.read_plan(Mock(), 'legal') is None
+        assert backfilling._write_column(backfilling._state) == SHADOW_COLUMN
+
+        ready = _service_with_state(STATE_READY, read_namespaces=['legal'])
+        plan = ready.read_plan(Mock(), 'legal')
+        assert plan.column == SHADOW_COLUMN and plan.service == 'new-service'
+        assert ready.read_plan(Mock(), 'finance') is None
+        assert ready.read_plan(Mock(), None) is None
+        assert ready.should_shadow_compare(Mock(), 'finance')
+        assert not ready.should_shadow_compare(Mock(), 'legal')
+
+        # 已交换列但本进程仍是旧模型: 主列 + 新模型, 双写覆盖主列
+        completed = _service_with_state(STATE_COMPLETED, read_namespaces=['legal', 'finance'])
+        assert completed.read_plan(Mock(), None).column == 'embedding'
+        assert completed._write_column(completed._state) == 'embedding'
+
+    @patch('app.services.embedding_migration.get_vector_index_manager')
+    def test_finalize_resets_vector_indexes(self, get_manager):
+        """测试交换列后丢弃进程内向量索引 (块ID不变, 核对发现不了向量已换)"""
+        migration = Mock(
+            state=STATE_READY, read_namespaces=['legal', 'finance'], column_name=SHADOW_COLUMN,
+            model_key='huggingface:new-model', dimension=512
+        )
+
+        def execute(statement, params=None):
+            sql = str(statement)
+            if 'DISTINCT namespace' in sql:
+                return [Mock(namespace='legal'), Mock(namespace='finance')]
+            if 'pg_indexes' in sql:
+                return [Mock(indexname='idx_chunks_embedding_hnsw')]
+            return Mock(scalar=Mock(return_value=0))
+
+        db = _fake_db(migration, execute)
+        EmbeddingMigrationService().finalize(db)
+
+        assert migration.state == STATE_COMPLETED
+        db.commit.assert_called_once()
+        get_manager.return_value.reset.assert_called_once_with({'legal', 'finance'})
+
+    def test_state_lookup_failure_keeps_caller_transaction(self):
+        """测试迁移状态查询失败只回滚 savepoint, 不回滚调用方已写入的分块"""
+        db = _session()
+        db.query.side_effect = RuntimeError('relation "embedding_migrations" does not exist')
+
+        assert EmbeddingMigrationService().current(db) is None
+        db.begin_nested.assert_called_once()
+        db.rollback.assert_not_called()
+
+    @patch('app.services.embedding_migration.get_embedding_store')
+    @patch('app.services.embedding_migration.embedding_service', Mock(model_key='huggingface:old-model'))
+    def test_dual_write_failure_is_isolated(self, get_store):
+        """测试新模型双写失败只回滚 savepoint, 异常不外抛"""
+        get_store.return_value.get_or_embed.side_effect = RuntimeError('model unavailable')
+        get_store.return_value.aget_or_embed = AsyncMock(side_effect=RuntimeError('model unavailable'))
+        service = _service_with_state(STATE_BACKFILLING)
+        service.target_service = Mock()
+
+        db = _session()
+        service.dual_write(db, [1, 2], ['a', 'b'])
+        assert db.begin_nested.return_value.__exit__.call_args[0][0] is RuntimeError
+        db.rollback.assert_not_called()
+
+        db = _session()
+        asyncio.run(service.adual_write(db, [1, 2], ['a', 'b']))
+        assert db.begin_nested.return_value.__exit__.call_args[0][0] is RuntimeError
+        db.rollback.assert_not_called()
+
+    @patch.object(EmbeddingMigrationService, '_build_shadow_index')
+    @patch('app.services.embedding_migration.get_embedding_store')
+    def test_backfill_checkpoint_and_resume(self, get_store, build_index):
+        """测试回填中断后从断点继续, 第一轮结束后补扫断点之前缺失的行"""
+        get_store.return_value.get_or_embed.side_effect = lambda db, texts, key, embed: ([[0.1, 0.2]] * len(texts), 0)
+        chunks = {10: None, 20: None, 30: None, 40: None, 50: None}
+        scans = []
+
+        def execute(statement, params=None):
+            sql = str(statement)
+            if 'SELECT id, content' in sql:
+                scans.append(params['after_id'])
+                rows = [
+                    Mock(id=chunk_id, content=f'chunk {chunk_id}') for chunk_id in sorted(chunks)
+                    if chunk_id > params['after_id'] and chunks[chunk_id] is None
+                ][:params['limit']]
+                return Mock(fetchall=Mock(return_value=rows))
+            if 'UPDATE document_chunks' in sql:
+                chunks.update(dict.fromkeys(params['ids'], 'new'))
+                return Mock()
+            raise AssertionError(sql)
+
+        migration = SimpleNamespace(
+            id=1, backend='huggingface', model_name='new-model', model_key='huggingface:new-model',
+            dimension=512, storage='vector', column_name=SHADOW_COLUMN, state=STATE_BACKFILLING,
+            read_namespaces=[], checkpoint_id=0, sweeps=0, rows_done=0, rows_total=5
+        )
+        db = _fake_db(migration, execute)
+        service = EmbeddingMigrationService()
+        service.target_service = Mock()
+        service.status = Mock(return_value={})
+
+        service.backfill(db, batch_size=2, max_rows_per_second=0, max_batches=1)
+        assert migration.checkpoint_id == 20 and migration.state == STATE_BACKFILLING
+        assert [chunk_id for chunk_id, vector in chunks.items() if vector] == [10, 20]
+
+        # 中断期间断点之前出现一个缺少新向量的分块 (双写失败)
+        chunks[15] = None
+        scans.clear()
+        service.backfill(db, batch_size=2, max_rows_per_second=0)
+        assert scans[0] == 20
+        assert all(chunks.values()) and migration.rows_done == 6 and migration.sweeps == 2
+        assert migration.state == STATE_READY
+        build_index.assert_called_once_with(migration)
+
+    def test_flip_refuses_namespace_with_missing_rows(self):
+        """测试回填未完成或命名空间仍缺新向量时拒绝切换读取"""
+        migration = Mock(state=STATE_BACKFILLING, read_namespaces=[], column_name=SHADOW_COLUMN)
+        db = _fake_db(migration)
+        with pytest.raises(EmbeddingMigrationError):
+            EmbeddingMigrationService().flip(db, 'legal')
+
+        migration.state = STATE_READY
+        db.execute.return_value.scalar.return_value = 3
+        with pytest.raises(EmbeddingMigrationError, match='3'):
+            EmbeddingMigrationService().flip(db, 'legal')
+        assert migration.read_namespaces == []
+        db.commit.assert_not_called()
+
+        db.execute.return_value.scalar.return_value = 0
+        assert EmbeddingMigrationService().flip(db, 'legal') == ['legal']
+        db.commit.assert_called_once()
@@ -0,0 +1,54 @@
+"""
+向量存储类型 (vector / halfvec) 单元测试
+"""
+
+import numpy as np
+
+from app.migrations.convert_embedding_storage import replace_index_opclass
+from app.services.vector_index import ExactIndex, parse_embedding
+
+
+def _halfvec_text(vector: np.ndarray) -> str:
+    """模拟 halfvec 列的文本输出 (float16 精度)"""
+    return '[' + ','.join(repr(float(value)) for value in vector.astype(np.float16)) + ']'
+
+
+class TestHalfPrecisionStorage:
+    """halfvec 存储测试"""
+
+    def test_recall_parity_with_float32(self):
+        """测试 float16 存储后检索结果与 float32 基本一致"""
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((50, 384))
+        vectors = (centers[rng.integers(0, 50, 5000)] + rng.standard_normal((5000, 384))).astype(np.float32)
+        queries = (centers[rng.integers(0, 50, 50)] + rng.standard_normal((50, 384))).astype(np.float32)
+        ids = np.arange(5000)
+
+        half = np.vstack([parse_embedding(_halfvec_text(vector)) for vector in vectors])
+        assert half.dtype == np.float32
+
+        full_index = ExactIndex().build(ids, vectors)
+        half_index = ExactIndex().build(ids, half)
+        hits = 0
+        for query in queries:
+            expected, expected_scores = full_index.search(query, 10)
+            found, scores = half_index.search(query, 10)
+            hits += len(np.intersect1d(found, expected))
+            assert np.abs(scores - expected_scores).max() < 2e-3
+        assert hits / (len(queries) * 10) >= 0.98
+
+    def test_parse_float16_array(self):
+        """测试 float16 数组 (HalfVector.to_numpy) 转为 float32"""
+        parsed = parse_embedding(np.array([0.5, -1.25], dtype=np.float16))
+        assert parsed.dtype == np.float32
+        assert parsed.tolist() == [0.5, -1.25]
+
+    def test_replace_index_opclass(self):
+        """测试重建索引时替换操作符类"""
+        indexdef = (
+            "CREATE INDEX idx_chunks_embedding_ivfflat ON public.document_chunks "
+            "USING ivfflat (embedding vector_cosine_ops) WITH (lists='100')"
+        )
+        assert "(embedding halfvec_cosine_ops)" in replace_index_opclass(indexdef, 'halfvec')
+        converted = replace_index_opclass(indexdef, 'halfvec')
+        assert replace_index_opclass(converted, 'vector') == indexdef
@@ -0,0 +1,70 @@
+"""
+内容寻址嵌入向量存储单元测试
+"""
+
+from app.services.embedding_store import (
+    EmbeddingBatchStats,
+    EmbeddingStore,
+    compute_text_hash,
+    normalize_text,
+    plan_batch,
+)
+
+
+class TestNormalization:
+    """文本规范化测试"""
+
+    def test_whitespace_and_width_folded(self):
+        """测试空白折叠与全角字符统一"""
+        assert normalize_text("  免责声明：\n\n本文档  仅供参考 ") == "免责声明: 本文档 仅供参考"
+        assert compute_text_hash("ＡＢＣ  def") == compute_text_hash("ABC def")
+
+    def test_case_preserved(self):
+        """测试不折叠大小写"""
+        assert compute_text_hash("Apple") != compute_text_hash("apple")
+
+
+class TestBatchDedup:
+    """批内去重测试"""
+
+    def test_plan_batch_keeps_first_occurrence(self):
+        """测试去重后保留首次出现的文本"""
+        hashes, unique = plan_batch(["页眉", "正文A", "页眉 ", "正文B", "页眉"])
+
+        assert len(hashes) == 5
+        assert hashes[0] == hashes[2] == hashes[4]
+        assert list(unique.values()) == ["页眉", "正文A", "正文B"]
+
+    def test_get_or_embed_without_store(self):
+        """测试关闭存储时仍做批内去重, 结果按原始顺序返回"""
+        calls = []
+
+        def embed_fn(texts):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        store = EmbeddingStore(enabled=False)
+        embeddings, stats = store.get_or_embed(None, ["aa", "b", "aa", "ccc"], "test:model", embed_fn)
+
+        assert calls == [["aa", "b", "ccc"]]
+        assert embeddings == [[2.0], [1.0], [2.0], [3.0]]
+        assert stats.model_calls == 3
+        assert stats.model_calls_saved == 1
+        assert stats.batch_duplicates == 1
+
+
+class TestBatchStats:
+    """去重统计测试"""
+
+    def test_ratio_and_merge(self):
+        """测试去重率与合并"""
+        stats = EmbeddingBatchStats(total=10, unique=8, store_hits=5, model_calls=3)
+        stats.merge(EmbeddingBatchStats(total=10, unique=10, store_hits=0, model_calls=10))
+
+        assert stats.model_calls_saved == 7
+        assert abs(stats.dedup_ratio - 0.35) < 1e-9
+        assert stats.to_dict()["batch_duplicates"] == 2
+
+    def test_empty_batch(self):
+        """测试空批次"""
+        assert EmbeddingBatchStats().dedup_ratio == 0.0
@@ -0,0 +1,52 @@
+"""
+文本提取进程池单元测试
+"""
+
+import os
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services import extraction_pool
+from app.services.document_extractor import ExtractionError
+from app.services.extraction_pool import get_extraction_pool, iter_document_text_parallel, shutdown_extraction_pool
+
+
+@pytest.fixture
+def txt_file(tmp_path, monkeypatch):
+    """单 worker 进程池与一个文本文件, 测试结束后关闭进程池"""
+    monkeypatch.setattr(extraction_pool, 'EXTRACT_WORKERS', 1)
+    path = tmp_path / "报告.txt"
+    path.write_text("第一段内容。\n\n第二段内容。", encoding="utf-8")
+    yield str(path)
+    shutdown_extraction_pool()
+
+
+class TestExtractionPool:
+    """进程池恢复测试"""
+
+    def test_recovers_after_worker_killed(self, txt_file):
+        """测试 worker 被 SIGKILL (如 OOM) 后丢弃进程池, 后续提取正常"""
+        expected = list(iter_document_text_parallel(txt_file, "报告.txt"))
+        pool = get_extraction_pool()
+
+        running = pool.submit(time.sleep, 30)
+        for pid in list(pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        with pytest.raises(BrokenProcessPool):
+            running.result(timeout=30)
+
+        assert list(iter_document_text_parallel(txt_file, "报告.txt")) == expected
+        assert get_extraction_pool() is not pool
+
+    def test_timeout_discards_pool(self, txt_file):
+        """测试提取超时后丢弃进程池, 不让卡住的任务占满 worker"""
+        pool = get_extraction_pool()
+        pool.submit(time.sleep, 30)
+
+        with pytest.raises(ExtractionError, match="超时"):
+            list(iter_document_text_parallel(txt_file, "报告.txt", timeout=0.5))
+        assert get_extraction_pool() is not pool
+        assert list(iter_document_text_parallel(txt_file, "报告.txt"))
@@ -0,0 +1,36 @@
+"""
+批量索引子批次切分单元测试
+"""
+
+import random
+
+from app.services.incremental_indexer import plan_index_batches
+
+
+class TestPlanIndexBatches:
+    """子批次切分测试"""
+
+    def test_balanced_by_content_length(self):
+        """测试子批次覆盖全部文档, 且内容长度大致均衡"""
+        rng = random.Random(3)
+        sizes = {doc_id: rng.randint(100, 200000) for doc_id in range(300)}
+
+        batches = plan_index_batches(sizes, max_chars=2000000, max_docs=50)
+        loads = [sum(sizes[doc_id] for doc_id in batch) for batch in batches]
+
+        assert sorted(doc_id for batch in batches for doc_id in batch) == list(sizes)
+        assert all(len(batch) <= 50 for batch in batches)
+        assert max(loads) - min(loads) <= max(sizes.values())
+
+    def test_keeps_request_order(self):
+        """测试子批次内保持请求顺序"""
+        sizes = {5: 10, 3: 300, 9: 20, 1: 200}
+        for batch in plan_index_batches(sizes, max_chars=250, max_docs=10):
+            assert batch == [doc_id for doc_id in sizes if doc_id in batch]
+
+    def test_doc_limit_and_empty(self):
+        """测试文档数上限与空输入"""
+        assert plan_index_batches({}) == []
+        assert plan_index_batches({1: 10}) == [[1]]
+        batches = plan_index_batches({i: 1 for i in range(10)}, max_chars=10 ** 9, max_docs=3)
+        assert len(batches) == 4 and all(len(batch) <= 3 for batch in batches)
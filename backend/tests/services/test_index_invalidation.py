@@ -0,0 +1,59 @@
+"""
+索引失效单元测试
+"""
+
+from app.services.bm25_retrieval import BM25Retrieval, REBUILD_DELETED_RATIO
+from app.services import index_invalidation
+from app.services.index_invalidation import invalidate_index, register_index_invalidation_hook
+
+
+class _Scores:
+    """按块顺序返回固定分数的 BM25 替身"""
+
+    def __init__(self, scores):
+        self.scores = scores
+
+    def get_scores(self, tokens):
+        return self.scores
+
+
+class TestInvalidation:
+    """失效回调测试"""
+
+    def test_hooks_isolated(self):
+        """测试单个回调失败不影响其他回调, 空删除不触发回调"""
+        calls = []
+
+        def broken(doc_ids, chunks):
+            raise RuntimeError("boom")
+
+        def recorder(doc_ids, chunks):
+            calls.append((doc_ids, chunks))
+
+        register_index_invalidation_hook(broken)
+        register_index_invalidation_hook(recorder)
+        register_index_invalidation_hook(recorder)
+        try:
+            invalidate_index([], {})
+            invalidate_index([1], {"default": [10, 11]})
+            assert calls == [([1], {"default": [10, 11]})]
+        finally:
+            index_invalidation._hooks.remove(broken)
+            index_invalidation._hooks.remove(recorder)
+
+    def test_bm25_skips_deleted_chunks(self):
+        """测试删除后缓存的 BM25 语料立即跳过被删除的块, 删除过多时丢弃缓存"""
+        bm25 = BM25Retrieval(db=None)
+        chunk_ids = list(range(100, 120))
+        bm25._corpus["tech"] = chunk_ids
+        bm25._bm25["tech"] = _Scores([float(i) for i in range(len(chunk_ids))])
+        bm25._last_update["tech"] = 0
+
+        invalidate_index([1], {"tech": [119, 118], "other": [1]})
+        assert bm25._deleted["tech"] == {118, 119}
+        assert "other" not in bm25._deleted
+
+        deleted_limit = int(len(chunk_ids) * REBUILD_DELETED_RATIO)
+        invalidate_index([2], {"tech": chunk_ids[:deleted_limit]})
+        assert "tech" not in bm25._corpus
+        assert "tech" not in bm25._deleted
@@ -0,0 +1,46 @@
+"""
+索引任务调度单元测试
+"""
+
+from app.config.celery_config import INDEX_INTERACTIVE_MAX_DOCS
+from app.config.settings import INDEX_FAIR_SHARE_DOCS, INDEX_FAIR_SHARE_MAX_PENALTY
+from app.services.index_scheduler import (
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    default_priority,
+    fair_share_penalty,
+    priority_class,
+    to_celery_priority,
+)
+
+
+class TestPriorityRouting:
+    """优先级路由测试"""
+
+    def test_priority_class(self):
+        """测试高优先级进入交互式队列, 缺省与越界值被限制"""
+        assert priority_class(10) == PRIORITY_INTERACTIVE
+        assert priority_class(1) == PRIORITY_BULK
+        assert priority_class(None) == PRIORITY_BULK
+        assert priority_class(99) == PRIORITY_INTERACTIVE
+
+    def test_default_priority_by_doc_count(self):
+        """测试未指定优先级时单个/少量文档走交互式队列, 大批量走批量队列"""
+        assert priority_class(default_priority(1)) == PRIORITY_INTERACTIVE
+        assert priority_class(default_priority(INDEX_INTERACTIVE_MAX_DOCS)) == PRIORITY_INTERACTIVE
+        assert priority_class(default_priority(INDEX_INTERACTIVE_MAX_DOCS + 1)) == PRIORITY_BULK
+        assert priority_class(default_priority(0)) == PRIORITY_BULK
+
+    def test_celery_priority_is_inverted(self):
+        """测试 IndexTask 优先级 10 对应 Redis 最高优先级 0, 降级后不超过 9"""
+        assert to_celery_priority(10) == 0
+        assert to_celery_priority(1) == 9
+        assert to_celery_priority(8, penalty=2) == 4
+        assert to_celery_priority(3, penalty=10) == 9
+
+    def test_fair_share_penalty_grows_with_backlog(self):
+        """测试命名空间排队越多降级越多, 且有上限"""
+        assert fair_share_penalty(0) == 0
+        assert fair_share_penalty(INDEX_FAIR_SHARE_DOCS) == 1
+        assert fair_share_penalty(INDEX_FAIR_SHARE_DOCS * 3) == 2
+        assert fair_share_penalty(INDEX_FAIR_SHARE_DOCS * 10 ** 6) == INDEX_FAIR_SHARE_MAX_PENALTY
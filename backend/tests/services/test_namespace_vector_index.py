@@ -0,0 +1,54 @@
+"""
+按命名空间的部分向量索引单元测试
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from app.services.namespace_vector_index import (
+    NamespaceVectorIndexManager,
+    STATE_BUILDING,
+    STATE_READY,
+    build_progress,
+    create_index_sql,
+    partial_index_name,
+)
+
+
+class TestNamespaceVectorIndex:
+    """部分向量索引测试"""
+
+    def test_index_name_unique_and_bounded(self):
+        """测试索引名合法、不超过 63 字符, 且 a-b 与 a_b 不冲突"""
+        assert partial_index_name('a-b') != partial_index_name('a_b')
+        name = partial_index_name('x' * 100)
+        assert len(name) <= 63
+        assert name == name.lower() and name.replace('_', '').isalnum()
+
+    def test_create_index_sql(self):
+        """测试建索引语句: CONCURRENTLY、操作符类与谓词字面量转义"""
+        sql = create_index_sql("o'neil", storage='halfvec', m=16, ef_construction=64)
+        assert sql.startswith('CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_hnsw_ns_')
+        assert 'USING hnsw (embedding halfvec_cosine_ops)' in sql
+        assert sql.endswith("WHERE namespace = 'o''neil'")
+
+    def test_status_reports_progress_and_size(self):
+        """测试状态: 构建中报告阶段与进度, 完成后报告大小"""
+        manager = NamespaceVectorIndexManager(enabled=True)
+        index_row = SimpleNamespace(is_valid=False, size_bytes=8192)
+        progress_row = SimpleNamespace(
+            pid=1, phase='building index: loading tuples',
+            blocks_done=0, blocks_total=0, tuples_done=250, tuples_total=1000
+        )
+        db = Mock()
+        db.execute.return_value.first.side_effect = [index_row, progress_row]
+        status = manager.status(db, 'legal')
+        assert status.state == STATE_BUILDING
+        assert status.progress == 0.25
+        assert status.size_bytes == 8192
+
+        db.execute.return_value.first.side_effect = [SimpleNamespace(is_valid=True, size_bytes=4096), None]
+        status = manager.status(db, 'legal')
+        assert status.state == STATE_READY and status.progress is None
+
+        assert build_progress(5, 10, None, None) == 0.5
@@ -0,0 +1,100 @@
+"""
+内容定义边界分块器单元测试
+"""
+
+import random
+
+from app.services.text_chunker import ContentDefinedChunker, chunk_texts, compute_chunk_hash, estimate_tokens
+
+
+def _make_paragraphs(count: int, seed: int = 7):
+    """生成随机长度的测试段落"""
+    rng = random.Random(seed)
+    alphabet = "机器学习深度神经网络数据模型训练推理。"
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(50, 400)))
+        for _ in range(count)
+    ]
+
+
+class TestContentDefinedChunker:
+    """分块器测试"""
+
+    def test_offsets_and_hashes(self):
+        """测试偏移量指向原文, 哈希与内容一致"""
+        text = "\n\n".join(_make_paragraphs(50))
+        chunks = ContentDefinedChunker().split(text)
+
+        assert chunks
+        for i, chunk in enumerate(chunks):
+            assert chunk.index == i
+            assert text[chunk.start:chunk.end].strip() == chunk.content
+            assert chunk.content_hash == compute_chunk_hash(chunk.content)
+
+    def test_max_size_respected(self):
+        """测试单块长度不超过 max_size + overlap"""
+        chunker = ContentDefinedChunker(max_size=1000, min_size=300, overlap=200)
+        chunks = chunker.split("\n\n".join(_make_paragraphs(100)) + "超长句子" * 2000)
+
+        assert all(len(c.content) <= 1000 + 200 for c in chunks)
+
+    def test_insertion_keeps_unchanged_chunks(self):
+        """测试中间插入段落后, 绝大部分分块哈希保持不变"""
+        paragraphs = _make_paragraphs(300)
+        chunker = ContentDefinedChunker()
+
+        before = chunker.split("\n\n".join(paragraphs))
+        edited = paragraphs[:150] + ["新增的段落。" * 30] + paragraphs[150:]
+        after = chunker.split("\n\n".join(edited))
+
+        before_hashes = {c.content_hash for c in before}
+        reused = sum(1 for c in after if c.content_hash in before_hashes)
+        assert reused >= len(before) - 3
+
+    def test_sentence_units(self):
+        """测试长段落的句末切分 (连续标点与右引号归入前句, 小数点不切) 与超长句硬切"""
+        chunker = ContentDefinedChunker(max_size=8, min_size=1, overlap=0)
+        text = "第一句。”第二句！！pi 3.14 end. next\nline"
+        units = list(chunker._sentence_units(text, 0, 0, len(text)))
+
+        assert [text[start:end] for start, end, _ in units] == [
+            "第一句。”", "第二句！！", "pi 3.14 ", "end.", " next\n", "line"
+        ]
+        assert all(length == end - start for start, end, length in units)
+
+    def test_empty_text(self):
+        """测试空文本"""
+        assert ContentDefinedChunker().split("") == []
+        assert ContentDefinedChunker().split("  \n\n ") == []
+
+    def test_stream_matches_full_split(self):
+        """测试流式分块与整篇分块结果一致 (任意片段切分)"""
+        rng = random.Random(11)
+        text = "\n\n".join(_make_paragraphs(80)) + "超长句子" * 1000 + "\n\n结尾。"
+        chunker = ContentDefinedChunker(max_size=800, min_size=200, overlap=100)
+
+        cuts = sorted(rng.sample(range(len(text)), 60))
+        pieces = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+        expected = [(c.start, c.end, c.content_hash) for c in chunker.split(text)]
+        streamed = [(c.start, c.end, c.content_hash) for c in chunker.split_stream(iter(pieces))]
+        assert streamed == expected
+
+
+    def test_token_mode(self):
+        """测试按 token 计长: 单元长度不超过 max_size, 流式与整篇一致"""
+        text = "\n\n".join(_make_paragraphs(60)) + "超长句子" * 500
+        chunker = ContentDefinedChunker(max_size=120, min_size=40, overlap=20, length_fn=estimate_tokens)
+
+        chunks = chunker.split(text)
+        assert all(length <= 120 for _, _, length in chunker._split_units(text))
+        assert [(c.start, c.end) for c in chunks] == [
+            (c.start, c.end) for c in chunker.split_stream(text[i:i + 997] for i in range(0, len(text), 997))
+        ]
+
+    def test_chunk_texts_matches_chunker(self):
+        """测试兼容接口与全局分块器结果一致"""
+        text = "\n\n".join(_make_paragraphs(40))
+        assert chunk_texts(text, 800, 100) == [
+            c.content for c in ContentDefinedChunker(max_size=800, min_size=266, overlap=100).split(text)
+        ]
@@ -0,0 +1,430 @@
+"""
+进程内向量索引单元测试
+"""
+
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+from app.utils.vector_codec import decode_copy_binary, encode_copy_binary, parse_vector_text
+from app.services.vector_index import (
+    BinaryIndex,
+    ExactIndex,
+    HNSWIndex,
+    Int8Index,
+    IVFIndex,
+    ShardedIndex,
+    VectorIndexManager,
+    normalize,
+    pack_signs,
+    parallel_scores,
+    parallel_top_k,
+    parse_embedding,
+    shard_of,
+    start_shard_workers,
+)
+from app.services.vector_index import shards as shard_module
+from app.services.vector_index.shards import (
+    ShardClient,
+    ShardServer,
+    decode_shard_message,
+    encode_shard_message,
+    ensure_private_dir,
+)
+
+
+def _dataset(n=2000, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dim))
+    vectors = centers[rng.integers(0, 20, n)] + rng.standard_normal((n, dim))
+    queries = centers[rng.integers(0, 20, 20)] + rng.standard_normal((20, dim))
+    return np.arange(1000, 1000 + n), vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def _recall(index, exact, queries, k=10, **params):
+    hits = 0
+    for query in queries:
+        found, _ = index.search(query, k, **params)
+        expected, _ = exact.search(query, k)
+        hits += len(np.intersect1d(found, expected))
+    return hits / (len(queries) * k)
+
+
+class TestHelpers:
+    """辅助函数测试"""
+
+    def test_parse_embedding(self):
+        """测试解析 pgvector 文本格式"""
+        assert parse_embedding("[0.5,-1,2e-1]").tolist() == np.float32([0.5, -1, 0.2]).tolist()
+        assert parse_embedding(None) is None
+        assert parse_embedding("[]") is None
+
+    def test_normalize_keeps_zero_rows(self):
+        """测试零向量归一化后仍为零"""
+        matrix = normalize([[3, 4], [0, 0]])
+        assert np.allclose(matrix, [[0.6, 0.8], [0, 0]])
+
+
+
+class TestVectorCodec:
+    """向量解码测试"""
+
+    def test_parse_vector_text(self):
+        """测试向量文本直接解码为 float32"""
+        parsed = parse_vector_text("[0.5,-1.25,3]")
+        assert parsed.dtype == np.float32 and parsed.tolist() == [0.5, -1.25, 3.0]
+        assert parse_vector_text("[]") is None
+
+    def test_copy_binary_roundtrip(self):
+        """测试 COPY BINARY 整块解码 (vector / halfvec) 与含 NULL 行的逐行解码"""
+        _, vectors, _ = _dataset(n=50, dim=16)
+        ids = np.arange(100, 150)
+        found_ids, found = decode_copy_binary(encode_copy_binary(ids, vectors))
+        assert found_ids.tolist() == ids.tolist()
+        assert found.dtype == np.float32 and np.array_equal(found, vectors)
+
+        _, half = decode_copy_binary(encode_copy_binary(ids, vectors, half=True))
+        assert np.array_equal(half, vectors.astype(np.float16).astype(np.float32))
+
+        out = np.zeros((60, 16), dtype=np.float32)
+        _, found = decode_copy_binary(encode_copy_binary(ids, vectors), out=out)
+        assert np.shares_memory(found, out) and np.array_equal(out[:50], vectors)
+
+        # 第二行 embedding 为 NULL
+        data = bytearray(encode_copy_binary(ids[:1], vectors[:1]))
+        null_row = np.array([2], '>i2').tobytes() + np.array([8], '>i4').tobytes() + np.array([7], '>i8').tobytes() \
+            + np.array([-1], '>i4').tobytes()
+        data[-2:-2] = null_row
+        found_ids, found = decode_copy_binary(bytes(data))
+        assert found_ids.tolist() == [100] and np.array_equal(found, vectors[:1])
+
+class TestExactIndex:
+    """精确检索测试"""
+
+    def test_search_add_remove(self):
+        """测试检索结果与暴力计算一致, 增删后同步"""
+        ids, vectors, queries = _dataset()
+        index = ExactIndex().build(ids[:1500], vectors[:1500])
+        index.add(ids[1500:], vectors[1500:])
+        assert len(index) == 2000
+
+        unit = normalize(vectors)
+        for query in queries[:5]:
+            found, scores = index.search(query, 5)
+            expected = np.argsort(-(unit @ normalize(query)))[:5]
+            assert found.tolist() == ids[expected].tolist()
+            assert np.all(np.diff(scores) <= 0)
+
+        assert index.remove([int(found[0]), -1]) == 1
+        assert int(found[0]) not in index.search(queries[4], 5)[0]
+
+        # 重复加入同一ID只保留最新向量
+        index.add([ids[0]], [-vectors[0]])
+        assert len(index) == 1999
+
+
+class TestParallelSearch:
+    """多线程分块检索测试"""
+
+    def test_blocks_match_single_pass(self):
+        """测试多块多线程的相似度与 top-k 与整块计算一致 (含零向量与查询矩阵)"""
+        _, vectors, queries = _dataset()
+        vectors[7] = 0
+        unit = normalize(vectors)
+
+        scores = parallel_scores(vectors, queries[0], cosine=True, block_rows=300, threads=4)
+        assert scores.shape == (2000,) and scores[7] == 0
+        assert np.allclose(scores, unit @ normalize(queries[0]), atol=1e-5)
+
+        batch = parallel_top_k(unit, normalize(queries), 10, block_rows=300, threads=4)
+        assert len(batch) == len(queries)
+        for query, (rows, top) in zip(queries, batch):
+            expected = np.argsort(-(unit @ normalize(query)))[:10]
+            assert rows.tolist() == expected.tolist()
+            assert np.all(np.diff(top) <= 0)
+
+        rows, _ = parallel_top_k(unit[:5], queries[0], 10, block_rows=2, threads=2)
+        assert sorted(rows.tolist()) == [0, 1, 2, 3, 4]
+
+    def test_exact_search_batch(self):
+        """测试精确检索的批量查询与逐个查询结果一致"""
+        ids, vectors, queries = _dataset()
+        index = ExactIndex().build(ids, vectors)
+        for query, (found, scores) in zip(queries, index.search_batch(queries, 5)):
+            expected, expected_scores = index.search(query, 5)
+            assert found.tolist() == expected.tolist()
+            assert np.allclose(scores, expected_scores, atol=1e-5)
+
+class TestInt8Index:
+    """int8 量化索引测试"""
+
+    def test_recall_and_memory(self):
+        """测试精排后召回率接近精确检索, 内存约为 float32 的 1/4"""
+        ids, vectors, queries = _dataset()
+        exact = ExactIndex().build(ids, vectors)
+        index = Int8Index(rescore=50, block_rows=256).build(ids, vectors)
+        lookup = dict(zip(ids.tolist(), normalize(vectors)))
+
+        assert _recall(index, exact, queries, fetch_vectors=lambda chunk_ids: np.array([lookup[i] for i in chunk_ids])) >= 0.98
+        assert _recall(index, exact, queries, rescore=0) >= 0.8
+        assert index.memory_bytes() < exact.memory_bytes() / 3
+
+    def test_rescore_from_memory_copy(self):
+        """测试保留 float32 副本时的精排分数为精确分数"""
+        ids, vectors, queries = _dataset(n=500)
+        exact = ExactIndex().build(ids, vectors)
+        index = Int8Index(rescore=100, keep_float=True).build(ids, vectors)
+        index.remove(ids[:10])
+        exact.remove(ids[:10])
+
+        found, scores = index.search(queries[0], 5)
+        expected, expected_scores = exact.search(queries[0], 5)
+        assert found.tolist() == expected.tolist()
+        assert np.allclose(scores, expected_scores, atol=1e-6)
+
+
+class TestBinaryIndex:
+    """二值码索引测试"""
+
+    def test_hamming_distances(self):
+        """测试打包符号码的 Hamming 距离与逐位比较一致 (维度非 64 的整数倍)"""
+        ids, vectors, queries = _dataset(n=300, dim=100)
+        index = BinaryIndex(block_rows=64).build(ids, vectors)
+        assert pack_signs(vectors).shape == (300, 2)
+
+        expected = ((vectors > 0) != (queries[0] > 0)).sum(axis=1)
+        assert index.hamming_distances(normalize(queries[0])).tolist() == expected.tolist()
+
+    def test_recall_with_rescore(self):
+        """测试精排后召回率接近精确检索, 增量加入的向量可被检索到"""
+        ids, vectors, queries = _dataset()
+        exact = ExactIndex().build(ids, vectors)
+        index = BinaryIndex(rescore=200, keep_float=True).build(ids[:-100], vectors[:-100])
+        index.add(ids[-100:], vectors[-100:])
+
+        assert _recall(index, exact, queries) >= 0.95
+        assert index.memory_bytes() - index.vectors.nbytes < exact.memory_bytes() / 10
+        found, scores = index.search(vectors[-1], 1)
+        assert found[0] == ids[-1]
+        assert np.isclose(scores[0], 1.0, atol=1e-5)
+
+
+class TestHNSWIndex:
+    """HNSW 图索引测试"""
+
+    def test_recall_and_ef_search(self):
+        """测试召回率随 ef_search 提高, 邻接表不超过上限"""
+        ids, vectors, queries = _dataset()
+        exact = ExactIndex().build(ids, vectors)
+        index = HNSWIndex(m=8, ef_construction=64).build(ids, vectors)
+
+        assert _recall(index, exact, queries, ef_search=64) >= 0.95
+        assert _recall(index, exact, queries, ef_search=64) >= _recall(index, exact, queries, ef_search=10)
+        assert (index.links0[:index.count] >= 0).sum(axis=1).max() <= index.m0
+
+    def test_incremental_insert_and_delete(self):
+        """测试增量插入可被检索到, 删除的块不再返回, 删除过多时标记为需要重建"""
+        ids, vectors, queries = _dataset(n=600)
+        index = HNSWIndex(m=8, ef_construction=64, rebuild_deleted_ratio=0.5).build(ids[:500], vectors[:500])
+        index.add(ids[500:], vectors[500:])
+        assert len(index) == 600
+        assert index.search(vectors[550], 1)[0][0] == ids[550]
+
+        index.remove(ids[:100])
+        found, _ = index.search(vectors[50], 10)
+        assert len(found) == 10 and not np.isin(found, ids[:100]).any()
+        assert index.count == 600 and not index.needs_rebuild()
+
+        # 删除只做标记, 重建交给索引管理器的后台线程
+        index.remove(ids[100:400])
+        assert index.count == 600 and len(index) == 200 and index.needs_rebuild()
+
+        snapshot_ids, snapshot_vectors = index.snapshot()
+        rebuilt = HNSWIndex(m=8, ef_construction=64, rebuild_deleted_ratio=0.5).build(snapshot_ids, snapshot_vectors)
+        assert rebuilt.count == len(rebuilt) == 200 and not rebuilt.needs_rebuild()
+        assert rebuilt.search(vectors[450], 1)[0][0] == ids[450]
+
+    def test_save_and_load(self, tmp_path):
+        """测试持久化后加载的索引检索结果一致"""
+        ids, vectors, queries = _dataset(n=500)
+        index = HNSWIndex(m=8).build(ids, vectors)
+        index.remove(ids[:5])
+        path = str(tmp_path / "hnsw.npz")
+        index.save(path, meta={'watermark': 1499})
+
+        loaded, meta = HNSWIndex.load(path)
+        assert meta == {'watermark': 1499}
+        assert len(loaded) == 495
+        for query in queries[:5]:
+            assert loaded.search(query, 5)[0].tolist() == index.search(query, 5)[0].tolist()
+        loaded.add([5000], vectors[:1])
+        assert loaded.search(vectors[0], 1)[0][0] == 5000
+
+
+class TestIVFIndex:
+    """IVF 倒排分区索引测试"""
+
+    def test_recall_grows_with_nprobe(self):
+        """测试扫描全部列表时等于精确检索, nprobe 越大召回率越高"""
+        ids, vectors, queries = _dataset()
+        exact = ExactIndex().build(ids, vectors)
+        index = IVFIndex(nlist=20, nprobe=2).build(ids, vectors)
+
+        assert index.offsets[-1] == len(ids)
+        assert _recall(index, exact, queries, nprobe=20) == 1.0
+        assert _recall(index, exact, queries, nprobe=5) >= _recall(index, exact, queries, nprobe=1)
+
+    def test_incremental_add_merge_and_remove(self):
+        """测试追加区可被检索, 超过阈值后并入连续存储, 删除后不再返回"""
+        ids, vectors, queries = _dataset(n=1000)
+        index = IVFIndex(nlist=10, merge_rows=300, retrain_growth=1.5).build(ids[:500], vectors[:500])
+        index.add(ids[500:700], vectors[500:700])
+        assert len(index.pending_lists) == 200
+        assert index.search(vectors[600], 1, nprobe=10)[0][0] == ids[600]
+
+        index.remove(ids[550:560])
+        index.add(ids[700:], vectors[700:])
+        assert len(index.pending_lists) == 0 and len(index) == 990
+        assert index.offsets[-1] == 990
+        assert not np.isin(index.search(vectors[555], 10, nprobe=10)[0], ids[550:560]).any()
+        assert index.needs_rebuild()
+
+        snapshot_ids, snapshot_vectors = index.snapshot()
+        rebuilt = IVFIndex(nlist=10).build(snapshot_ids, snapshot_vectors)
+        assert not rebuilt.needs_rebuild()
+        assert rebuilt.search(vectors[900], 1, nprobe=10)[0][0] == ids[900]
+
+
+@pytest.fixture
+def shard_authkey(monkeypatch):
+    """分片连接使用的测试密钥"""
+    monkeypatch.setattr(shard_module, 'VECTOR_SHARD_AUTHKEY', 'test-shard-key')
+
+
+class TestShardedIndex:
+    """分片进程 scatter-gather 检索测试"""
+
+    def test_shard_of_spreads_sequential_ids(self):
+        """测试连续的块ID均匀分到各分片且分配稳定"""
+        shards = shard_of(np.arange(10000), 4)
+        assert np.bincount(shards, minlength=4).min() > 2000
+        assert shards.tolist() == shard_of(np.arange(10000), 4).tolist()
+
+    def test_wire_format(self):
+        """测试分片消息编解码 (数组原样往返, 不接受 pickle 数据)"""
+        ids = np.arange(5, dtype=np.int64)
+        vectors = np.arange(10, dtype=np.float64).reshape(5, 2)
+        message = {'op': 'add', 'namespace': '法律', 'payload': {
+            'ids': ids, 'vectors': vectors, 'top_k': np.int64(3), 'result': (ids[:2], vectors[0])
+        }}
+
+        decoded = decode_shard_message(encode_shard_message(message))
+        payload = decoded['payload']
+        assert decoded['namespace'] == '法律' and payload['top_k'] == 3
+        assert payload['ids'].dtype == np.int64 and payload['ids'].tolist() == ids.tolist()
+        assert payload['vectors'].dtype == np.float32 and payload['vectors'].shape == (5, 2)
+        assert np.array_equal(payload['vectors'], vectors)
+        assert [part.tolist() for part in payload['result']] == [[0, 1], [0.0, 1.0]]
+        payload['ids'][0] = 7
+
+        for data in (pickle.dumps(message), encode_shard_message(message)[:-1], b''):
+            with pytest.raises(ValueError):
+                decode_shard_message(data)
+        with pytest.raises(ValueError):
+            encode_shard_message({'ids': np.array(['a'])})
+
+    def test_requires_authkey_and_private_socket_dir(self, tmp_path, monkeypatch):
+        """测试未配置密钥或 socket 目录可被他人访问时拒绝启动"""
+        monkeypatch.setattr(shard_module, 'VECTOR_SHARD_AUTHKEY', '')
+        with pytest.raises(ValueError, match='VECTOR_SHARD_AUTHKEY'):
+            ShardServer(str(tmp_path / "shard-0.sock"))
+        with pytest.raises(ValueError, match='VECTOR_SHARD_AUTHKEY'):
+            ShardClient(str(tmp_path / "shard-0.sock"))
+        with pytest.raises(ValueError, match='VECTOR_SHARD_AUTHKEY'):
+            start_shard_workers(1, str(tmp_path), 'exact')
+
+        ensure_private_dir(str(tmp_path / "sockets"), create=True)
+        assert os.stat(tmp_path / "sockets").st_mode & 0o777 == 0o700
+
+        shared = tmp_path / "shared"
+        shared.mkdir(mode=0o777)
+        shared.chmod(0o777)
+        with pytest.raises(PermissionError):
+            ensure_private_dir(str(shared))
+        with pytest.raises(PermissionError):
+            start_shard_workers(1, str(shared), 'exact', authkey='test-shard-key')
+        with pytest.raises(ConnectionError):
+            ShardClient(str(shared / "shard-0.sock"), authkey='test-shard-key').request('ping')
+
+    def test_scatter_gather_matches_exact(self, tmp_path, shard_authkey):
+        """测试分片检索结果与精确检索一致, 增删与重新接入"""
+        workers = start_shard_workers(3, str(tmp_path), 'exact')
+        try:
+            deadline = time.time() + 10
+            while not all(os.path.exists(tmp_path / f"shard-{i}.sock") for i in range(3)):
+                assert time.time() < deadline
+                time.sleep(0.05)
+
+            ids, vectors, queries = _dataset()
+            exact = ExactIndex().build(ids, vectors)
+            index = ShardedIndex(shards=3, socket_dir=str(tmp_path))
+            assert index.attach('ns') == {'watermark': 0}
+            index.add(ids[:1500], vectors[:1500])
+            index.add(ids[1500:], vectors[1500:])
+            assert len(index) == 2000
+
+            for query in queries[:5]:
+                found, scores = index.search(query, 10, fetch_vectors=lambda chunk_ids: None)
+                expected, expected_scores = exact.search(query, 10)
+                assert found.tolist() == expected.tolist()
+                assert np.allclose(scores, expected_scores, atol=1e-5)
+
+            assert index.remove([int(found[0]), -1]) == 1
+            assert int(found[0]) not in index.search(queries[4], 10)[0]
+
+            # 另一个 worker 接入同一命名空间时拉取已有块ID
+            other = ShardedIndex(shards=3, socket_dir=str(tmp_path))
+            assert other.attach('ns') == {'watermark': int(ids.max())}
+            assert len(other) == 1999
+            assert other.stats()['shard_sizes'] == [
+                int(n) for n in np.bincount(shard_of(other.ids, 3), minlength=3)
+            ]
+
+            # 未接入的实例按命名空间清空分片
+            ShardedIndex(shards=3, socket_dir=str(tmp_path)).drop_remote('ns')
+            assert ShardedIndex(shards=3, socket_dir=str(tmp_path)).attach('ns') == {'watermark': 0}
+        finally:
+            for worker in workers:
+                worker.terminate()
+
+
+class TestVectorIndexManager:
+    """向量索引管理器测试"""
+
+    def test_persisted_index_bound_to_vector_space(self, tmp_path):
+        """测试持久化文件只在向量空间一致时加载, reset 丢弃索引并删除文件"""
+        ids, vectors, _ = _dataset(n=300)
+        old = VectorIndexManager(default_backend='hnsw', persist_dir=str(tmp_path), space='openai:old:1536')
+        entry = old._entry('hnsw', 'ns')
+        entry.index = HNSWIndex(m=8).build(ids, vectors)
+        entry.watermark, entry.dirty = int(ids.max()), True
+        old._save(entry, 'hnsw', 'ns', force=True)
+        assert os.path.exists(old.index_path('hnsw', 'ns'))
+
+        # 同一向量空间: 加载文件, 只需同步增量
+        same = VectorIndexManager(default_backend='hnsw', persist_dir=str(tmp_path), space='openai:old:1536')
+        restored = same._entry('hnsw', 'ns')
+        same._restore(restored, 'hnsw', 'ns')
+        assert len(restored.index) == 300 and restored.watermark == int(ids.max())
+
+        # 模型迁移后块ID不变, 旧向量不能按水位线沿用
+        new = VectorIndexManager(default_backend='hnsw', persist_dir=str(tmp_path), space='huggingface:new:512')
+        fresh = new._entry('hnsw', 'ns')
+        new._restore(fresh, 'hnsw', 'ns')
+        assert len(fresh.index) == 0 and fresh.watermark == 0
+
+        same.reset(['ns'])
+        assert same.stats() == [] and not list(tmp_path.glob('*.npz'))